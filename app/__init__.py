@@ -2,12 +2,21 @@
 SIP K8s Lab App Package
 
 Detta paket innehåller utility-funktioner för SIP-testning i Kubernetes-miljöer.
+
+Modulerna importeras lat: "import app" kör inga probes och laddar inget
+förrän SippTester eller TestResult faktiskt används. Kommandoraden finns
+i "python -m app".
 """
 
 __version__ = "1.0.0"
 __author__ = "SIP K8s Lab Team"
 
-# Exportera huvudklasser
-from .sipp_support import SippTester, TestResult
+__all__ = ["SippTester", "TestResult"]
+
 
-__all__ = ["SippTester", "TestResult"] 
\ No newline at end of file
+def __getattr__(name):
+    # Exportera huvudklasser vid första användningen
+    if name in __all__:
+        from . import sipp_support
+        return getattr(sipp_support, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Kommandorad för sip-k8s-lab: python -m app {run,probe,status,capacity,sweep,cost,plan,transport,paths,soak,bench,image}
+
+Moduler som probar klustret importeras först i kommandot som behöver dem,
+så att --help och status svarar direkt utan kubectl, docker eller nc.
+"""
+
+import os
+import sys
+from typing import List, Optional
+
+# Modulerna i app importerar varandra platt (som i testerna)
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+def _setup_logging(quiet: bool) -> None:
+    import logging
+    logging.basicConfig(level=logging.WARNING if quiet else logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def cmd_status(args) -> int:
+    """Visa senast kända miljöstatus och körningar utan att proba"""
+    import time
+    from env_cache import get_environment_cache
+
+    print("📋 sip-k8s-lab status")
+    for name in ("KAMAILIO_HOST", "KAMAILIO_PORT", "KAMAILIO_ENVIRONMENT"):
+        if os.getenv(name):
+            print(f"   {name}={os.environ[name]}")
+
+    snapshot = get_environment_cache().latest_snapshot()
+    entries = snapshot.get("entries", {})
+    if not entries:
+        print("ℹ️  Ingen miljö-snapshot ännu, kör 'python -m app probe'")
+    else:
+        newest = max(entry.get("created_at", 0) for entry in entries.values())
+        print(f"🔧 Kube-context: {snapshot.get('kube_context') or '-'} "
+              f"(snapshot {time.time() - newest:.0f}s gammal)")
+        for name, entry in sorted(entries.items()):
+            if name.startswith("endpoint:"):
+                print(f"🎯 Kamailio ({name.split(':', 1)[1]}): {entry['value']}")
+        for check, ok in entries.get("environment_status", {}).get("value", {}).items():
+            print(f"   {'✅' if ok else '❌'} {check}")
+
+    from results_store import ResultsStore, print_runs
+    store = ResultsStore()
+    if store.enabled and store.path.exists():
+        runs = store.query(limit=args.runs)
+        if runs:
+            print(f"📊 Senaste körningar ({store.path}):")
+            print_runs(runs)
+    return 0
+
+
+def cmd_probe(args) -> int:
+    """Proba miljön och Kamailio-endpointen (och uppdatera snapshoten)"""
+    _setup_logging(args.quiet)
+    from env_cache import get_environment_cache, get_cached_environment_status
+    from sipp_support import SippTester
+
+    if args.refresh:
+        get_environment_cache().invalidate()
+    status = get_cached_environment_status()
+    print("🔍 Miljö:")
+    for check, ok in status.items():
+        print(f"   {'✅' if ok else '❌'} {check}")
+
+    tester = SippTester(kamailio_host=args.host, environment=args.environment)
+    print(f"🎯 Kamailio: {tester.kamailio_host}")
+    if args.health:
+        result = tester.health_check()
+        print(f"{'✅' if result.success else '❌'} Health check ({result.duration:.2f}s)")
+        return 0 if result.success else 1
+    return 0
+
+
+def cmd_run(args) -> int:
+    """Kör SIPp-scenarier eller en lastkörning"""
+    _setup_logging(args.quiet)
+    from sipp_support import SippTester, print_test_results
+
+    tester = SippTester(kamailio_host=args.host, environment=args.environment, local_port=args.local_port)
+    capture = True if args.capture else None
+    arrival = {"arrival": args.arrival, "seed": args.seed, "burst_on": args.burst_on, "burst_off": args.burst_off}
+    if args.load and args.workers:
+        result = tester.run_distributed_load_test(args.load, rate=args.rate, duration=args.duration,
+                                                  workers=args.workers, namespace=args.namespace,
+                                                  target=args.in_cluster_target,
+                                                  sample_resources=args.sample_resources,
+                                                  stream_logs=args.stream_logs, **arrival)
+        print(result.output)
+        results = [result]
+    elif args.load and args.remote_workers:
+        result = tester.run_coordinated_load_test(args.load, rate=args.rate, duration=args.duration,
+                                                  workers=args.remote_workers, listen=args.listen, **arrival)
+        print(result.output)
+        results = [result]
+    elif args.load and args.distribution:
+        result = tester.run_distribution_test(args.load, rate=args.rate, duration=args.duration,
+                                              source_ports=args.source_ports or 64,
+                                              stream_logs=args.stream_logs, **arrival)
+        print(result.output)
+        results = [result]
+    elif args.load:
+        result = tester.run_load_test(args.load, rate=args.rate, duration=args.duration,
+                                      sample_kamailio=args.sample_kamailio,
+                                      sample_resources=args.sample_resources,
+                                      capture=capture, stream_logs=args.stream_logs,
+                                      source_ports=args.source_ports or 1, transport=args.transport, **arrival)
+        print(result.output)
+        results = [result]
+    elif args.scenarios:
+        results = [tester.run_sipp_test(scenario, capture=capture) for scenario in args.scenarios]
+    else:
+        results = tester.run_all_tests()
+    print_test_results(results)
+    return 0 if all(result.success for result in results) else 1
+
+
+def _search_options(args) -> dict:
+    """Kapacitetssökningens argument som nyckelord till SippTester.find_capacity"""
+    return {"start_rate": args.start_rate, "max_rate": args.max_rate, "step_duration": args.step_duration,
+            "p99_ms": args.p99_ms, "max_error_ratio": args.max_error_ratio}
+
+
+def cmd_capacity(args) -> int:
+    """Kapacitetssökning, eller skalningskurva över flera antal replikor"""
+    _setup_logging(args.quiet)
+    from sipp_support import SippTester
+
+    tester = SippTester(kamailio_host=args.host, environment=args.environment, local_port=args.local_port)
+    if args.replicas:
+        result = tester.run_scaling_experiment(args.replicas, args.load, namespace=args.namespace,
+                                               **_search_options(args))
+    else:
+        result = tester.find_capacity(args.load, sample_resources=args.sample_resources,
+                                      source_ports=args.source_ports, **_search_options(args))
+    print(result.output)
+    if not result.success:
+        print(f"❌ {result.error}")
+    return 0 if result.success else 1
+
+
+def cmd_sweep(args) -> int:
+    """Parametersvep över Kamailio-konfigurationen"""
+    _setup_logging(args.quiet)
+    from sipp_support import SippTester
+
+    grid = {"children": args.children, "debug": args.debug,
+            "xlog": [value == "on" for value in args.xlog] if args.xlog else None,
+            "reply": args.reply, "tcp_workers": args.tcp_workers}
+    grid = {name: values for name, values in grid.items() if values} or None
+    tester = SippTester(kamailio_host=args.host, environment=args.environment, local_port=args.local_port)
+    options = _search_options(args) if args.capacity else {}
+    result = tester.run_config_sweep(grid, args.load, rate=args.rate, duration=args.duration,
+                                     capacity=args.capacity, namespace=args.namespace,
+                                     source_ports=args.source_ports, **options)
+    print(result.output)
+    return 0 if result.success else 1
+
+
+def cmd_cost(args) -> int:
+    """CPU-gränssvep och kostnadsmodell per scenario"""
+    _setup_logging(args.quiet)
+    from sipp_support import SippTester
+
+    tester = SippTester(kamailio_host=args.host, environment=args.environment, local_port=args.local_port)
+    result = tester.run_cpu_limit_sweep(args.limits, args.scenarios, export_path=args.export,
+                                        namespace=args.namespace, request_ratio=args.request_ratio,
+                                        source_ports=args.source_ports, **_search_options(args))
+    print(result.output)
+    if not result.success:
+        print(f"❌ {result.error}")
+    return 0 if result.success else 1
+
+
+def cmd_plan(args) -> int:
+    """Kapacitetsplan för en trafikmix ur sparade mätningar"""
+    _setup_logging(args.quiet)
+    from capacity_planner import format_capacity_plan, load_measurements, parse_mix, plan_capacity, traffic_demand
+    from results_store import ResultsStore
+
+    try:
+        demand = traffic_demand(parse_mix(args.cps), args.registrations, args.register_interval)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    store = ResultsStore()
+    config_hash = args.config_hash or store.context.get("config_hash")
+    measurements, notes = load_measurements(store, config_hash, args.cost_model)
+    plan = plan_capacity(measurements, demand, args.headroom, min_replicas=args.min_replicas,
+                         cpu_limit_m=args.cpu_limit)
+    plan["hints"] = notes + plan["hints"]
+    if args.json:
+        import json
+        print(json.dumps(dict(plan, config_hash=config_hash), indent=2))
+    else:
+        print(format_capacity_plan(plan, config_hash))
+    return 0 if plan["replicas"] else 1
+
+
+def cmd_transport(args) -> int:
+    """UDP, TCP och TLS med samma scenariomix"""
+    _setup_logging(args.quiet)
+    from sipp_support import SippTester
+
+    tester = SippTester(kamailio_host=args.host, environment=args.environment, local_port=args.local_port)
+    ports = {"tls": args.tls_port} if args.tls_port else None
+    result = tester.run_transport_benchmark(args.transports, args.scenarios, rate=args.rate,
+                                            duration=args.duration, connections=args.connections,
+                                            handshakes=args.handshakes, ports=ports, tls_ca=args.tls_ca,
+                                            sample_resources=not args.no_resources)
+    print(result.output)
+    if not result.success:
+        print(f"❌ {result.error}")
+    return 0 if result.success else 1
+
+
+def cmd_paths(args) -> int:
+    """Pod-IP, ClusterIP, NodePort och MetalLB med samma last"""
+    _setup_logging(args.quiet)
+    from sipp_support import SippTester
+
+    paths = {}
+    for item in args.path or []:
+        name, _, target = item.partition("=")
+        if not target:
+            print(f"❌ Ogiltig väg: {item} (väntade t.ex. metallb=172.18.0.242:5060)")
+            return 2
+        paths[name] = target
+    tester = SippTester(environment=args.environment, local_port=args.local_port)
+    try:
+        result = tester.run_network_path_benchmark(
+            paths or None, args.scenario, rate=args.rate, duration=args.duration, capacity=not args.no_capacity,
+            in_cluster=args.in_cluster, namespace=args.namespace, service=args.service, node=args.node,
+            max_rate=args.max_rate, step_duration=args.step_duration, p99_ms=args.p99)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    print(result.output)
+    if not result.success:
+        print(f"❌ {result.error}")
+    return 0 if result.success else 1
+
+
+def cmd_soak(args) -> int:
+    """Lång lastkörning med rullande fönster och driftflaggor"""
+    _setup_logging(args.quiet)
+    from sipp_support import SippTester
+
+    tester = SippTester(kamailio_host=args.host, environment=args.environment, local_port=args.local_port)
+    result = tester.run_soak_test(args.scenario, rate=args.rate, hours=args.hours, window=args.window,
+                                  compact_every=args.compact_every, output=args.output,
+                                  sample_kamailio=not args.no_kamailio, namespace=args.namespace,
+                                  source_ports=args.source_ports, transport=args.transport,
+                                  arrival=args.arrival, seed=args.seed)
+    print(result.output)
+    if not result.success:
+        print(f"❌ {result.error}")
+    return 0 if result.success else 1
+
+
+def cmd_bench(args) -> int:
+    """Benchmark av test-harnessen (se harness_bench.py)"""
+    from harness_bench import main as bench_main
+    return bench_main(args.bench_args)
+
+
+def cmd_image(args) -> int:
+    """Bygg SIPp test-imagen om Dockerfile eller test-script ändrats"""
+    _setup_logging(args.quiet)
+    from image_builder import ImageBuilder
+
+    builder = ImageBuilder(image=args.image)
+    result = builder.ensure_image(force=args.force, rebuild_base=args.rebuild_base)
+    if not result["success"]:
+        print(f"❌ Kunde inte bygga {args.image}")
+        return 1
+    print(f"✅ {args.image} {'byggd' if result['built'] else 'aktuell'} (hash {result['hash']})")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m app", description="SIP-tester mot Kamailio i Kubernetes")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def target_options(command_parser):
+        command_parser.add_argument("--host", help="Kamailio host[:port] (auto-detekteras annars)")
+        command_parser.add_argument("--environment", default=os.getenv("KAMAILIO_ENVIRONMENT", "auto"),
+                                    choices=["auto", "local", "prod"], help="Miljö för auto-detektering")
+        command_parser.add_argument("-q", "--quiet", action="store_true", help="Visa bara varningar i loggen")
+
+    run_parser = sub.add_parser("run", help="Kör SIPp-scenarier (alla om inga anges) eller ett lasttest")
+    run_parser.add_argument("scenarios", nargs="*", help="Scenarier, t.ex. options register")
+    target_options(run_parser)
+    run_parser.add_argument("--local-port", type=int, default=5065, help="Lokal SIP-port")
+    run_parser.add_argument("--load", metavar="SCENARIO", help="Lasttest med den inbyggda lastgeneratorn")
+    run_parser.add_argument("--rate", type=float, default=100.0, help="Transaktioner per sekund (--load)")
+    run_parser.add_argument("--duration", type=float, default=10.0, help="Sekunder (--load)")
+    run_parser.add_argument("--sample-kamailio", action="store_true", help="Sampla kamcmd-statistik (--load)")
+    run_parser.add_argument("--sample-resources", action="store_true", help="Sampla CPU och minne (--load)")
+    run_parser.add_argument("--stream-logs", action="store_true", help="Följ Kamailios loggar (--load)")
+    run_parser.add_argument("--capture", action="store_true", help="Spela in SIP-trafiken till pcap")
+    run_parser.add_argument("--transport", default="udp", choices=["udp", "tcp", "tls"],
+                            help="Transport för --load (TLS: ange porten i --host, t.ex. :5061)")
+    run_parser.add_argument("--arrival", default="constant", choices=["constant", "poisson", "onoff"],
+                            help="Ankomstprocess för --load (öppen loop, latens från planerad sändtid)")
+    run_parser.add_argument("--seed", type=int, help="Frö för --arrival poisson")
+    run_parser.add_argument("--burst-on", type=float, default=1.0, help="Sekunder per skur (--arrival onoff)")
+    run_parser.add_argument("--burst-off", type=float, default=1.0,
+                            help="Sekunder tyst mellan skurar (--arrival onoff)")
+    run_parser.add_argument("--source-ports", type=int,
+                            help="Sprid --load över så många källportar (standard 1, 64 med --distribution)")
+    run_parser.add_argument("--distribution", action="store_true",
+                            help="Mät fördelningen mellan Kamailio-replikorna (--load)")
+    run_parser.add_argument("--workers", type=int, help="Kör --load från så många poddar i klustret (Job)")
+    run_parser.add_argument("--namespace", default="kamailio", help="Namespace för generator-poddarna (--workers)")
+    run_parser.add_argument("--in-cluster-target", metavar="HOST[:PORT]",
+                            help="Kamailio sett inifrån klustret (--workers, standard Servicens ClusterIP)")
+    run_parser.add_argument("--remote-workers", type=int,
+                            help="Kör --load från så många lasthosts (load_coordinator.py worker)")
+    run_parser.add_argument("--listen", help="Koordinatorns host:port (--remote-workers, standard 0.0.0.0:5099)")
+    run_parser.set_defaults(func=cmd_run)
+
+    probe_parser = sub.add_parser("probe", help="Proba miljön och Kamailio-endpointen")
+    target_options(probe_parser)
+    probe_parser.add_argument("--refresh", action="store_true", help="Ignorera miljö-cachen")
+    probe_parser.add_argument("--health", action="store_true", help="Kör även en health check")
+    probe_parser.set_defaults(func=cmd_probe)
+
+    status_parser = sub.add_parser("status", help="Senast kända status, utan probning")
+    status_parser.add_argument("--runs", type=int, default=5, help="Antal körningar att visa")
+    status_parser.set_defaults(func=cmd_status)
+
+    capacity_parser = sub.add_parser("capacity", help="Sök högsta takt inom fel- och latensgränsen")
+    target_options(capacity_parser)
+    capacity_parser.add_argument("--load", default="options", metavar="SCENARIO", help="Scenario för lasten")
+    capacity_parser.add_argument("--local-port", type=int, default=5065, help="Lokal SIP-port")
+    capacity_parser.add_argument("--start-rate", type=float, default=100.0, help="Första stegets takt")
+    capacity_parser.add_argument("--max-rate", type=float, default=20000.0, help="Högsta takt som provas")
+    capacity_parser.add_argument("--step-duration", type=float, default=10.0, help="Sekunder per steg")
+    capacity_parser.add_argument("--p99-ms", type=float, default=100.0, help="Högsta tillåtna p99-latens")
+    capacity_parser.add_argument("--max-error-ratio", type=float, default=0.01, help="Högsta andel fel")
+    capacity_parser.add_argument("--source-ports", type=int, default=1, help="Sprid lasten över källportar")
+    capacity_parser.add_argument("--sample-resources", action="store_true", help="Sampla CPU och minne")
+    capacity_parser.add_argument("--replicas", type=int, nargs="+",
+                                 help="Skala Kamailio till varje antal och rita en skalningskurva")
+    capacity_parser.add_argument("--namespace", default="kamailio", help="Kamailios namespace (--replicas)")
+    capacity_parser.set_defaults(func=cmd_capacity)
+
+    cost_parser = sub.add_parser("cost", help="CPU-gränssvep och millicores per 1k CPS per scenario")
+    target_options(cost_parser)
+    cost_parser.add_argument("--limits", type=int, nargs="+", default=[250, 500, 1000],
+                             help="CPU-gränser i millicores")
+    cost_parser.add_argument("--scenarios", nargs="+", default=["options"], help="Scenarier att mäta")
+    cost_parser.add_argument("--request-ratio", type=float, default=1.0, help="CPU-request som andel av gränsen")
+    cost_parser.add_argument("--export", help="Fil för kostnadsmodellen (standard SIP_LAB_COST_MODEL)")
+    cost_parser.add_argument("--local-port", type=int, default=5065, help="Lokal SIP-port")
+    cost_parser.add_argument("--namespace", default="kamailio", help="Kamailios namespace")
+    cost_parser.add_argument("--source-ports", type=int, default=64, help="Sprid lasten över källportar")
+    cost_parser.add_argument("--start-rate", type=float, default=100.0, help="Första stegets takt")
+    cost_parser.add_argument("--max-rate", type=float, default=20000.0, help="Högsta takt som provas")
+    cost_parser.add_argument("--step-duration", type=float, default=10.0, help="Sekunder per steg")
+    cost_parser.add_argument("--p99-ms", type=float, default=100.0, help="Högsta tillåtna p99-latens")
+    cost_parser.add_argument("--max-error-ratio", type=float, default=0.01, help="Högsta andel fel")
+    cost_parser.set_defaults(func=cmd_cost)
+
+    plan_parser = sub.add_parser("plan", help="Replikor, requests och p99 för en trafikmix (sparade mätningar)")
+    plan_parser.add_argument("--cps", nargs="+", default=[], metavar="SCENARIO=CPS",
+                             help="CPS-mix, t.ex. options=50 invite=20 message=10")
+    plan_parser.add_argument("--registrations", type=int, default=0, help="Antal registrerade kontakter")
+    plan_parser.add_argument("--register-interval", type=float, default=3600.0,
+                             help="Sekunder mellan förnyelser per kontakt")
+    plan_parser.add_argument("--headroom", type=float, default=30.0, help="Headroom i procent")
+    plan_parser.add_argument("--min-replicas", type=int, default=1, help="Minsta antal replikor")
+    plan_parser.add_argument("--cpu-limit", type=int, help="CPU-gräns per replika i millicores")
+    plan_parser.add_argument("--config-hash", help="Konfigurationen att planera för (standard den aktuella)")
+    plan_parser.add_argument("--cost-model", help="Exporterad kostnadsmodell (standard SIP_LAB_COST_MODEL)")
+    plan_parser.add_argument("--json", action="store_true", help="Skriv planen som JSON")
+    plan_parser.add_argument("-q", "--quiet", action="store_true", help="Visa bara varningar i loggen")
+    plan_parser.set_defaults(func=cmd_plan)
+
+    sweep_parser = sub.add_parser("sweep", help="Ranka varianter av kamailio.cfg med samma lastprofil")
+    target_options(sweep_parser)
+    sweep_parser.add_argument("--load", default="options", metavar="SCENARIO", help="Scenario för lasten")
+    sweep_parser.add_argument("--local-port", type=int, default=5065, help="Lokal SIP-port")
+    sweep_parser.add_argument("--rate", type=float, default=1000.0, help="Takt för lastprofilen")
+    sweep_parser.add_argument("--duration", type=float, default=30.0, help="Sekunder per variant")
+    sweep_parser.add_argument("--source-ports", type=int, default=64, help="Sprid lasten över källportar")
+    sweep_parser.add_argument("--namespace", default="kamailio", help="Kamailios namespace")
+    sweep_parser.add_argument("--children", type=int, nargs="+", help="Antal UDP-workers")
+    sweep_parser.add_argument("--debug", type=int, nargs="+", help="Loggnivåer")
+    sweep_parser.add_argument("--xlog", nargs="+", choices=["on", "off"], help="xlog per request")
+    sweep_parser.add_argument("--reply", nargs="+", choices=["sl", "tm"], help="sl_send_reply eller t_reply")
+    sweep_parser.add_argument("--tcp-workers", type=int, nargs="+", help="Antal TCP-workers")
+    sweep_parser.add_argument("--capacity", action="store_true",
+                              help="Kapacitetssökning per variant i stället för fast takt")
+    sweep_parser.add_argument("--start-rate", type=float, default=100.0, help="Första stegets takt (--capacity)")
+    sweep_parser.add_argument("--max-rate", type=float, default=20000.0, help="Högsta takt (--capacity)")
+    sweep_parser.add_argument("--step-duration", type=float, default=10.0, help="Sekunder per steg (--capacity)")
+    sweep_parser.add_argument("--p99-ms", type=float, default=100.0, help="Högsta p99-latens (--capacity)")
+    sweep_parser.add_argument("--max-error-ratio", type=float, default=0.01, help="Högsta andel fel (--capacity)")
+    sweep_parser.set_defaults(func=cmd_sweep)
+
+    transport_parser = sub.add_parser("transport", help="Jämför UDP, TCP och TLS med samma scenariomix")
+    target_options(transport_parser)
+    transport_parser.add_argument("--transports", nargs="+", default=["udp", "tcp", "tls"],
+                                  choices=["udp", "tcp", "tls"], help="Transporter att jämföra")
+    transport_parser.add_argument("--scenarios", nargs="+", default=["options"], help="Scenariomixen")
+    transport_parser.add_argument("--local-port", type=int, default=5065, help="Lokal SIP-port")
+    transport_parser.add_argument("--rate", type=float, default=500.0, help="Takt per lastkörning")
+    transport_parser.add_argument("--duration", type=float, default=10.0, help="Sekunder per lastkörning")
+    transport_parser.add_argument("--connections", type=int, default=16,
+                                  help="Källportar (UDP) eller anslutningar (TCP/TLS)")
+    transport_parser.add_argument("--handshakes", type=int, default=500, help="Uppkopplingar för connect-/TLS-mätningen")
+    transport_parser.add_argument("--tls-port", type=int, help="Kamailios TLS-port (standard 5061)")
+    transport_parser.add_argument("--tls-ca", help="CA-fil för att verifiera Kamailios certifikat")
+    transport_parser.add_argument("--no-resources", action="store_true", help="Sampla inte serverns CPU")
+    transport_parser.set_defaults(func=cmd_transport)
+
+    paths_parser = sub.add_parser("paths", help="Jämför pod-IP, ClusterIP, NodePort och MetalLB")
+    paths_parser.add_argument("--path", action="append", metavar="NAMN=IP:PORT",
+                              help="Väg att mäta (pod_ip, cluster_ip, node_port, metallb); "
+                                   "standard slås alla upp med kubectl")
+    paths_parser.add_argument("--scenario", default="options", help="Scenario för lasten")
+    paths_parser.add_argument("--rate", type=float, default=200.0, help="Takt för latensmätningen")
+    paths_parser.add_argument("--duration", type=float, default=10.0, help="Sekunder per latensmätning")
+    paths_parser.add_argument("--no-capacity", action="store_true", help="Sök inte högsta takt per väg")
+    paths_parser.add_argument("--in-cluster", action="store_true",
+                              help="Kör lasten från en pod i klustret (når även pod-IP och ClusterIP)")
+    paths_parser.add_argument("--namespace", default="kamailio", help="Kamailios namespace")
+    paths_parser.add_argument("--service", default="kamailio-loadbalancer", help="Service för ClusterIP/NodePort/MetalLB")
+    paths_parser.add_argument("--node", help="Nodens IP för NodePort (standard noden med första podden)")
+    paths_parser.add_argument("--max-rate", type=float, default=20000.0, help="Högsta takt i kapacitetssökningen")
+    paths_parser.add_argument("--step-duration", type=float, default=5.0, help="Sekunder per kapacitetssteg")
+    paths_parser.add_argument("--p99", type=float, default=100.0, help="Högsta p99 (ms) i kapacitetssökningen")
+    paths_parser.add_argument("--local-port", type=int, default=5065, help="Lokal SIP-port")
+    paths_parser.add_argument("--environment", default=os.getenv("KAMAILIO_ENVIRONMENT", "auto"),
+                              choices=["auto", "local", "prod"], help="Miljö för auto-detektering")
+    paths_parser.add_argument("-q", "--quiet", action="store_true", help="Visa bara varningar i loggen")
+    paths_parser.set_defaults(func=cmd_paths)
+
+    soak_parser = sub.add_parser("soak", help="Soak-test i timmar med rullande fönster och driftflaggor")
+    target_options(soak_parser)
+    soak_parser.add_argument("--scenario", default="options", help="Scenario för lasten")
+    soak_parser.add_argument("--rate", type=float, default=100.0, help="Transaktioner per sekund")
+    soak_parser.add_argument("--hours", type=float, default=12.0, help="Körningens längd i timmar")
+    soak_parser.add_argument("--window", type=float, default=60.0, help="Sekunder per fönster")
+    soak_parser.add_argument("--compact-every", type=int, default=60, help="Fönster per timfönster")
+    soak_parser.add_argument("--output", help="JSONL-fil för fönstren (standard SIP_LAB_SOAK_DIR)")
+    soak_parser.add_argument("--no-kamailio", action="store_true", help="Läs inte Kamailios shm via kamcmd")
+    soak_parser.add_argument("--namespace", default="kamailio", help="Kamailios namespace")
+    soak_parser.add_argument("--local-port", type=int, default=5065, help="Lokal SIP-port")
+    soak_parser.add_argument("--source-ports", type=int, default=1, help="Sprid lasten över så många källportar")
+    soak_parser.add_argument("--transport", default="udp", choices=["udp", "tcp", "tls"], help="Transport")
+    soak_parser.add_argument("--arrival", default="poisson", choices=["constant", "poisson", "onoff"],
+                             help="Ankomstprocess")
+    soak_parser.add_argument("--seed", type=int, help="Frö för --arrival poisson")
+    soak_parser.set_defaults(func=cmd_soak)
+
+    bench_parser = sub.add_parser("bench", help="Benchmark av harnessens overhead")
+    bench_parser.add_argument("bench_args", nargs=argparse.REMAINDER, help="Argument till harness_bench")
+    bench_parser.set_defaults(func=cmd_bench)
+
+    image_parser = sub.add_parser("image", help="Bygg test-imagen om indata ändrats (innehållshash)")
+    image_parser.add_argument("--image", default="local/sipp-tester:latest", help="Namn:tagg för imagen")
+    image_parser.add_argument("--force", action="store_true", help="Bygg test-lagret även om hashen finns")
+    image_parser.add_argument("--rebuild-base", action="store_true", help="Kompilera om SIPp-basen")
+    image_parser.add_argument("-q", "--quiet", action="store_true", help="Visa bara varningar i loggen")
+    image_parser.set_defaults(func=cmd_image)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
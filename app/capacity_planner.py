@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Kapacitetsplanering från sparade mätningar
+
+Planen räknas fram ur det som redan finns i resultatdatabasen för den
+aktuella Kamailio-konfigurationen (config-hash): kostnadsmodeller från
+CPU-gränssvepet (scenario cost_model) och kapacitetssökningar
+(capacity_<scenario>). Indata är en registreringspopulation, en CPS-mix
+och en headroom; utdata är antal replikor, CPU- och minnes-request per
+replika och förväntad p99.
+"""
+
+import json
+import logging
+import math
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Scenarionamn i mixen som heter något annat i lastgeneratorn
+SCENARIO_ALIASES = {"message": "ping"}
+PLANNED_SCENARIOS = ("options", "register", "invite", "ping")
+
+# Expires i register.xml: varje registrering förnyas en gång per intervall
+DEFAULT_REGISTER_INTERVAL = 3600.0
+DEFAULT_HEADROOM_PCT = 30.0
+CPU_STEP_M = 10
+MEMORY_STEP = 1024 * 1024
+
+
+def parse_mix(values: List[str]) -> Dict[str, float]:
+    """
+    Tolka en CPS-mix på formen ["options=50", "invite=20"]
+
+    Returns:
+        Dict med CPS per scenario (message blir ping)
+    """
+    mix: Dict[str, float] = {}
+    for value in values or []:
+        name, sep, rate = value.partition("=")
+        name = SCENARIO_ALIASES.get(name.strip(), name.strip())
+        if not sep or name not in PLANNED_SCENARIOS:
+            raise ValueError(f"Ogiltig mix '{value}', förväntade scenario=CPS "
+                             f"({', '.join(PLANNED_SCENARIOS)} eller message)")
+        mix[name] = mix.get(name, 0.0) + float(rate)
+    return mix
+
+
+def traffic_demand(mix: Dict[str, float], registrations: int = 0,
+                   register_interval: float = DEFAULT_REGISTER_INTERVAL) -> Dict[str, float]:
+    """
+    CPS per scenario inklusive förnyelserna från registreringspopulationen
+
+    Args:
+        mix: CPS per scenario
+        registrations: Antal registrerade kontakter
+        register_interval: Sekunder mellan förnyelser per kontakt
+
+    Returns:
+        Dict med CPS per scenario (bara scenarier med trafik)
+    """
+    demand = {SCENARIO_ALIASES.get(name, name): float(rate) for name, rate in mix.items() if rate}
+    if registrations:
+        if register_interval <= 0:
+            raise ValueError("register_interval måste vara större än 0")
+        demand["register"] = demand.get("register", 0.0) + registrations / register_interval
+    return demand
+
+
+def _extra(run: Dict) -> Dict:
+    try:
+        return json.loads(run.get("extra") or "{}")
+    except ValueError:
+        return {}
+
+
+def measurement_from_cost_model(scenario: str, model: Dict, source: str) -> Optional[Dict]:
+    """
+    Mätunderlag för ett scenario ur en kostnadsmodell (cpu_limit_sweep)
+
+    Modellens fasta kostnad gäller hela deploymenten vid svepets antal
+    replikor och räknas om till millicores per replika.
+    """
+    measured = {int(limit): cps for limit, cps in (model.get("cps_per_replica") or {}).items() if cps}
+    if not measured or not model.get("millicores_per_1k_cps"):
+        return None
+    limit_m = max(measured)
+    return {
+        "scenario": scenario,
+        "source": source,
+        "cpu_limit_m": limit_m,
+        "cps_per_replica": measured[limit_m],
+        "millicores_per_1k_cps": model["millicores_per_1k_cps"],
+        "fixed_millicores_per_replica": max(0.0, model.get("fixed_millicores") or 0.0) / (model.get("replicas") or 1),
+        "memory_bytes_per_replica": model.get("memory_bytes_per_replica"),
+        "p99_ms": model.get("p99_ms"),
+        "curve": [],
+    }
+
+
+def measurement_from_capacity(run: Dict) -> Optional[Dict]:
+    """
+    Mätunderlag ur en sparad kapacitetssökning (capacity_<scenario>)
+
+    Antal replikor och CPU-gräns kommer från resurssamplingen (eller
+    fördelningsrapporten); utan dem går kapaciteten inte att räkna per
+    replika och körningen används inte.
+    """
+    extra = _extra(run)
+    capacity = extra.get("capacity_cps")
+    resources = extra.get("resources") or {}
+    pods = resources.get("pods") or {}
+    replicas = len(pods) or len((extra.get("distribution") or {}).get("replicas") or {})
+    if not capacity or not replicas:
+        return None
+    limits = [p["cpu_limit_cores"] for p in pods.values() if p.get("cpu_limit_cores")]
+    memory = [p["memory_working_set_max"] for p in pods.values() if p.get("memory_working_set_max")]
+    # Latens mot belastning: varje godkänt steg som andel av kapaciteten
+    curve = sorted((round(step["cps"] / capacity, 3), step["p99_ms"]) for step in extra.get("steps", [])
+                   if step.get("ok") and step.get("cps") and step.get("p99_ms") is not None)
+    return {
+        "scenario": run["scenario"][len("capacity_"):],
+        "source": f"{run['scenario']} #{run['id']}",
+        "cpu_limit_m": round(max(limits) * 1000) if limits else None,
+        "cps_per_replica": capacity / replicas,
+        # Uppmätt vid kapaciteten, så den fasta kostnaden ingår redan
+        "millicores_per_1k_cps": resources.get("millicores_per_1k_rps"),
+        "fixed_millicores_per_replica": 0.0,
+        "memory_bytes_per_replica": max(memory) if memory else None,
+        "p99_ms": run.get("p99_ms"),
+        "curve": [list(point) for point in curve],
+    }
+
+
+def load_measurements(store=None, config_hash: Optional[str] = None,
+                      cost_model_path: Optional[Path] = None) -> Tuple[Dict[str, Dict], List[str]]:
+    """
+    Samla mätunderlaget för en Kamailio-konfiguration
+
+    Kostnadsmodellen (senaste cost_model-körningen, annars exporterad fil)
+    går före en enskild kapacitetssökning eftersom den spänner över flera
+    CPU-gränser; kapacitetssökningens latenskurva används ändå när den är
+    mätt vid samma CPU-gräns.
+
+    Args:
+        store: ResultsStore (standard get_results_store())
+        config_hash: Konfigurationen (standard storens kontext)
+        cost_model_path: Exporterad kostnadsmodell (se cpu_limit_sweep.model_path)
+
+    Returns:
+        (mätunderlag per scenario, noteringar om vad som saknas eller valts bort)
+    """
+    from cpu_limit_sweep import load_cost_model
+    from results_store import get_results_store
+
+    store = store or get_results_store()
+    config_hash = config_hash or store.context.get("config_hash")
+    measurements: Dict[str, Dict] = {}
+    notes: List[str] = []
+
+    if store.path.exists():
+        runs = store.query(config_hash=config_hash, success=True)
+    else:
+        runs = []
+    for run in runs:
+        if run["scenario"] != "cost_model":
+            continue
+        for scenario, model in (_extra(run).get("model") or {}).items():
+            if scenario not in measurements:
+                measurement = measurement_from_cost_model(scenario, model, f"cost_model #{run['id']}")
+                if measurement:
+                    measurements[scenario] = measurement
+
+    document = load_cost_model(cost_model_path)
+    if document:
+        if document.get("config_hash") == config_hash:
+            for scenario, model in (document.get("scenarios") or {}).items():
+                if scenario not in measurements:
+                    measurement = measurement_from_cost_model(scenario, model, "kostnadsmodell (fil)")
+                    if measurement:
+                        measurements[scenario] = measurement
+        else:
+            notes.append(f"Kostnadsmodellen är mätt med config {document.get('config_hash') or '-'}, används inte")
+
+    for run in runs:
+        if not run["scenario"].startswith("capacity_"):
+            continue
+        measurement = measurement_from_capacity(run)
+        if measurement is None:
+            notes.append(f"{run['scenario']} #{run['id']}: ingen resurssampling, kapacitet per replika okänd")
+            continue
+        existing = measurements.get(measurement["scenario"])
+        if existing is None:
+            measurements[measurement["scenario"]] = measurement
+        elif (not existing["curve"] and measurement["curve"]
+              and measurement["cpu_limit_m"] in (None, existing["cpu_limit_m"])):
+            existing["curve"] = measurement["curve"]
+    return measurements, notes
+
+
+def _capacity_at(measurement: Dict, cpu_limit_m: Optional[int]) -> float:
+    """CPS per replika vid given CPU-gräns"""
+    if cpu_limit_m is None or cpu_limit_m == measurement["cpu_limit_m"] or not measurement["cpu_limit_m"]:
+        return measurement["cps_per_replica"]
+    if measurement["millicores_per_1k_cps"]:
+        usable = cpu_limit_m - measurement["fixed_millicores_per_replica"]
+        return max(0.0, usable * 1000 / measurement["millicores_per_1k_cps"])
+    return measurement["cps_per_replica"] * cpu_limit_m / measurement["cpu_limit_m"]
+
+
+def expected_p99(measurement: Dict, utilization: float) -> Optional[float]:
+    """
+    p99 vid en belastning (andel av kapaciteten per replika)
+
+    Första uppmätta steget med minst samma belastning; utan kurva, eller
+    över kurvan, p99 vid kapaciteten (en övre gräns).
+    """
+    for load, p99 in measurement.get("curve") or []:
+        if load >= utilization:
+            return p99
+    return measurement.get("p99_ms")
+
+
+def plan_capacity(measurements: Dict[str, Dict], demand: Dict[str, float],
+                  headroom_pct: float = DEFAULT_HEADROOM_PCT, min_replicas: int = 1,
+                  cpu_limit_m: Optional[int] = None) -> Dict:
+    """
+    Räkna fram replikor, resurser och latens för en trafikmix
+
+    Headroom är extra kapacitet utöver efterfrågan: 30% betyder att
+    replikorna ska klara 1.3 gånger trafiken och att requests sätts
+    30% över den förväntade förbrukningen.
+
+    Args:
+        measurements: Mätunderlag per scenario (load_measurements)
+        demand: CPS per scenario (traffic_demand)
+        headroom_pct: Headroom i procent
+        min_replicas: Minsta antal replikor
+        cpu_limit_m: CPU-gräns per replika (standard den lägsta uppmätta i mixen)
+
+    Returns:
+        Dict med replicas, cpu_limit_m, cpu_request_m, memory_request_bytes,
+        p99_ms, utilization, per-scenario-detaljer, saknade scenarier och hints
+    """
+    if headroom_pct < 0:
+        raise ValueError("headroom_pct får inte vara negativ")
+    factor = 1 + headroom_pct / 100
+    missing = sorted(scenario for scenario in demand if scenario not in measurements)
+    used = {scenario: measurements[scenario] for scenario in demand if scenario in measurements}
+    plan: Dict = {
+        "demand": demand,
+        "headroom_pct": headroom_pct,
+        "missing": missing,
+        "replicas": None,
+        "cpu_limit_m": None,
+        "cpu_request_m": None,
+        "memory_request_bytes": None,
+        "p99_ms": None,
+        "utilization": None,
+        "scenarios": {},
+        "hints": [],
+    }
+    if missing:
+        plan["hints"].append(f"Inget mätunderlag för {', '.join(missing)} med den här konfigurationen "
+                             f"- kör 'python -m app cost --scenarios {' '.join(missing)}'")
+        return plan
+    if not used:
+        plan["hints"].append("Ingen trafik att planera för")
+        return plan
+
+    limits = [m["cpu_limit_m"] for m in used.values() if m["cpu_limit_m"]]
+    if cpu_limit_m is None and limits:
+        cpu_limit_m = min(limits)
+    capacities = {scenario: _capacity_at(m, cpu_limit_m) for scenario, m in used.items()}
+    if not all(capacities.values()):
+        plan["hints"].append(f"CPU-gränsen {cpu_limit_m}m räcker inte till den fasta kostnaden")
+        return plan
+
+    # Andel av en replikas kapacitet som trafiken kräver, scenarierna delar replikorna
+    replica_units = sum(demand[scenario] / capacities[scenario] for scenario in used)
+    replicas = max(min_replicas, math.ceil(replica_units * factor - 1e-9), 1)
+    utilization = replica_units / replicas
+
+    cpu_m = 0.0
+    fixed = max(m["fixed_millicores_per_replica"] for m in used.values())
+    for scenario, measurement in used.items():
+        per_replica = demand[scenario] / replicas
+        if measurement["millicores_per_1k_cps"]:
+            cpu_m += per_replica * measurement["millicores_per_1k_cps"] / 1000
+        elif cpu_limit_m:
+            cpu_m += cpu_limit_m * per_replica / capacities[scenario]
+        p99 = expected_p99(measurement, utilization)
+        plan["scenarios"][scenario] = {
+            "cps": round(demand[scenario], 1),
+            "cps_per_replica": round(per_replica, 1),
+            "capacity_per_replica": round(capacities[scenario], 1),
+            "p99_ms": p99,
+            "source": measurement["source"],
+        }
+    cpu_request = math.ceil((fixed + cpu_m) * factor / CPU_STEP_M) * CPU_STEP_M if cpu_m else None
+    if cpu_request and cpu_limit_m:
+        cpu_request = min(cpu_request, cpu_limit_m)
+    memory = [m["memory_bytes_per_replica"] for m in used.values() if m.get("memory_bytes_per_replica")]
+    p99s = [entry["p99_ms"] for entry in plan["scenarios"].values() if entry["p99_ms"] is not None]
+
+    plan.update(
+        replicas=replicas,
+        cpu_limit_m=cpu_limit_m,
+        cpu_request_m=cpu_request,
+        memory_request_bytes=math.ceil(max(memory) * factor / MEMORY_STEP) * MEMORY_STEP if memory else None,
+        p99_ms=max(p99s) if p99s else None,
+        utilization=round(utilization, 3),
+    )
+    if not memory:
+        plan["hints"].append("Minnet är inte uppmätt - kör kapacitetssökningen med --sample-resources")
+    if any(not entry.get("curve") for entry in used.values()):
+        plan["hints"].append("p99 är uppmätt vid kapaciteten och är en övre gräns för scenarier utan latenskurva")
+    if "register" in demand:
+        plan["hints"].append("kamailio.cfg laddar inte registrar/usrloc, så populationen kostar bara "
+                             "REGISTER-trafik och inget minne för kontakter")
+    if replicas == 1:
+        plan["hints"].append("En replika ger ingen redundans - överväg min_replicas 2")
+    return plan
+
+
+def format_capacity_plan(plan: Dict, config_hash: Optional[str] = None) -> str:
+    """Planen som text"""
+    lines = [f"Kapacitetsplan (config {config_hash or '-'}, headroom {plan['headroom_pct']:g}%):"]
+    lines.append("  Trafik: " + ", ".join(f"{scenario} {rate:.1f}/s" for scenario, rate in plan["demand"].items()))
+    if plan["replicas"]:
+        lines.append(f"  Replikor: {plan['replicas']} (CPU-gräns {plan['cpu_limit_m'] or '-'}m, "
+                     f"belastning {plan['utilization'] * 100:.0f}% per replika)")
+        lines.append(f"  CPU-request: {plan['cpu_request_m'] or '-'}m per replika")
+        memory = plan["memory_request_bytes"]
+        lines.append(f"  Minnes-request: {f'{memory // MEMORY_STEP}Mi' if memory else '-'} per replika")
+        lines.append(f"  Förväntad p99: {plan['p99_ms'] if plan['p99_ms'] is not None else '-'}ms")
+        for scenario, entry in plan["scenarios"].items():
+            lines.append(f"    {scenario:<9} {entry['cps_per_replica']:>9.1f}/{entry['capacity_per_replica']:.1f} CPS "
+                         f"per replika, p99 {entry['p99_ms']}ms ({entry['source']})")
+    lines.extend(f"Plan: {hint}" for hint in plan["hints"])
+    return "\n".join(lines)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Kapacitetssökning: högsta takt som klarar felgräns och latensgräns
+
+Takten dubbleras från start_rate tills ett steg inte klarar kraven och
+halveras sedan mellan sista godkända och första underkända steg tills
+intervallet är smalare än resolution. Varje steg är en vanlig
+lastkörning, så alla steg hamnar i resultatdatabasen.
+"""
+
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Kraven för ett godkänt steg
+DEFAULT_P99_MS = 100.0
+DEFAULT_MAX_ERROR_RATIO = 0.01
+DEFAULT_MIN_RATE_RATIO = 0.95
+
+# Serversidans sammanfattningar som följer med från steget vid kapaciteten
+CARRIED_SOURCES = ("resources", "kamailio", "kamailio_logs", "distribution")
+
+
+def completed_rate(statistics: Dict) -> float:
+    """Lyckade transaktioner per sekund under sändningen (CPS)"""
+    sent = statistics.get("requests_sent", 0)
+    if not sent:
+        return 0.0
+    return round(statistics.get("achieved_rate", 0.0) * statistics.get("successful", 0) / sent, 1)
+
+
+def evaluate_step(statistics: Dict, rate: float, p99_ms: float = DEFAULT_P99_MS,
+                  max_error_ratio: float = DEFAULT_MAX_ERROR_RATIO,
+                  min_rate_ratio: float = DEFAULT_MIN_RATE_RATIO) -> Tuple[bool, str]:
+    """
+    Avgör om ett steg klarade kraven
+
+    Args:
+        statistics: Lastgeneratorns statistik för steget
+        rate: Begärd takt
+        p99_ms: Högsta tillåtna p99-latens
+        max_error_ratio: Högsta andel timeouts och felsvar
+        min_rate_ratio: Minsta andel av begärd takt som måste nås
+
+    Returns:
+        (godkänt, orsak om underkänt)
+    """
+    sent = statistics.get("requests_sent", 0)
+    if not sent:
+        return False, "inga requests skickades"
+    errors = statistics.get("timeouts", 0) + statistics.get("failed", 0)
+    if errors / sent > max_error_ratio:
+        return False, f"{errors / sent * 100:.1f}% fel"
+    if statistics.get("achieved_rate", 0.0) < rate * min_rate_ratio:
+        return False, f"generatorn nådde {statistics.get('achieved_rate', 0.0):g}/s"
+    p99 = statistics.get("latency_ms", {}).get("p99")
+    if p99 is None or p99 > p99_ms:
+        return False, f"p99 {p99}ms"
+    return True, ""
+
+
+class CapacitySearch:
+    """
+    Sök högsta takt där ett steg klarar kraven
+
+    Args:
+        run: Kör ett steg med given takt och returnerar lastgeneratorns statistik
+        start_rate: Första stegets takt
+        max_rate: Högsta takt som provas
+        resolution: Sluta halvera när intervallet är smalare än denna andel
+        max_steps: Högsta antal steg totalt
+        p99_ms, max_error_ratio, min_rate_ratio: Se evaluate_step()
+    """
+
+    def __init__(self, run: Callable[[float], Dict], start_rate: float = 100.0, max_rate: float = 50000.0,
+                 resolution: float = 0.05, max_steps: int = 12, p99_ms: float = DEFAULT_P99_MS,
+                 max_error_ratio: float = DEFAULT_MAX_ERROR_RATIO,
+                 min_rate_ratio: float = DEFAULT_MIN_RATE_RATIO):
+        if start_rate <= 0 or max_rate < start_rate:
+            raise ValueError("start_rate måste vara större än 0 och högst max_rate")
+        self.run = run
+        self.start_rate = float(start_rate)
+        self.max_rate = float(max_rate)
+        self.resolution = resolution
+        self.max_steps = max_steps
+        self.p99_ms = p99_ms
+        self.max_error_ratio = max_error_ratio
+        self.min_rate_ratio = min_rate_ratio
+        self.steps: List[Dict] = []
+        self.best: Optional[Dict] = None
+
+    def _step(self, rate: float) -> bool:
+        statistics = self.run(rate) or {}
+        ok, reason = evaluate_step(statistics, rate, self.p99_ms, self.max_error_ratio, self.min_rate_ratio)
+        latency = statistics.get("latency_ms", {})
+        self.steps.append({
+            "rate": round(rate, 1),
+            "achieved_rate": statistics.get("achieved_rate", 0.0),
+            "cps": completed_rate(statistics),
+            "p50_ms": latency.get("p50"),
+            "p99_ms": latency.get("p99"),
+            "ok": ok,
+            "reason": reason,
+        })
+        logger.info(f"{'✅' if ok else '❌'} {rate:.0f}/s: {completed_rate(statistics):g} CPS, "
+                    f"p99 {latency.get('p99')}ms{f' ({reason})' if reason else ''}")
+        if ok and (self.best is None or rate > self.best["target_rate"]):
+            self.best = dict(statistics, target_rate=rate)
+        return ok
+
+    def search(self) -> Dict:
+        """
+        Kör sökningen
+
+        Returns:
+            Dict med capacity_cps, takten och latensen vid kapaciteten, vad som
+            begränsade (limit), alla steg och serversidans sammanfattningar
+            från steget vid kapaciteten
+        """
+        self.steps = []
+        self.best = None
+        low, high = 0.0, None
+        rate = self.start_rate
+        while len(self.steps) < self.max_steps:
+            if self._step(rate):
+                low = rate
+                if rate >= self.max_rate:
+                    break
+                rate = min(rate * 2, self.max_rate)
+            else:
+                high = rate
+                break
+
+        while high is not None and len(self.steps) < self.max_steps and (high - low) / high > self.resolution:
+            rate = (low + high) / 2
+            if self._step(rate):
+                low = rate
+            else:
+                high = rate
+        return self.summarize(high)
+
+    def summarize(self, high: Optional[float] = None) -> Dict:
+        failed = [step for step in self.steps if not step["ok"]]
+        if high is None:
+            limit = f"max_rate {self.max_rate:g}/s nådd" if self.best else "inga steg kördes"
+        else:
+            limit = next((step["reason"] for step in failed if step["rate"] == round(high, 1)), "")
+        best = self.best or {}
+        summary = {
+            "scenario": best.get("scenario"),
+            "target": best.get("target"),
+            "capacity_cps": completed_rate(best) if best else 0.0,
+            "target_rate": best.get("target_rate", 0.0),
+            "throughput": best.get("throughput", 0.0),
+            "latency_ms": best.get("latency_ms", {}),
+            "limit": limit,
+            "criteria": {"p99_ms": self.p99_ms, "max_error_ratio": self.max_error_ratio,
+                         "min_rate_ratio": self.min_rate_ratio},
+            "steps": self.steps,
+        }
+        for source in CARRIED_SOURCES:
+            if source in best:
+                summary[source] = best[source]
+        return summary
+
+
+def format_capacity_summary(summary: Dict) -> str:
+    """Kort textsammanfattning av en kapacitetssökning"""
+    latency = summary.get("latency_ms") or {}
+    lines = [f"Kapacitet: {summary['capacity_cps']:g} CPS vid {summary['target_rate']:g}/s "
+             f"(p50 {latency.get('p50')}ms, p99 {latency.get('p99')}ms), begränsning: {summary['limit'] or '-'}"]
+    for step in summary["steps"]:
+        lines.append(f"  {step['rate']:>9.1f}/s {step['cps']:>9.1f} CPS p99 {step['p99_ms']}ms "
+                     f"{'ok' if step['ok'] else step['reason']}")
+    return "\n".join(lines)
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Command Tracing
+Spårar varje externt kommando (kubectl, docker, nc, sipp) och probe som harnessen kör
+"""
+
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    """Ett tidsintervall för ett kommando eller en probe"""
+    name: str
+    kind: str
+    start: float
+    duration: float
+    argv: List[str] = field(default_factory=list)
+    exit_code: Optional[int] = None
+    error: str = ""
+    test: str = ""
+    thread_id: int = 0
+    # Processen som körde spannet (0 = denna), t.ex. en xdist-worker
+    pid: int = 0
+
+
+def _current_test() -> str:
+    """Namnet på testet som körs just nu (sätts av pytest)"""
+    return os.environ.get("PYTEST_CURRENT_TEST", "").split(" ")[0]
+
+
+def command_key(argv: List[str], words: int = 3) -> str:
+    """
+    Gruppnyckel för ett kommando, t.ex. "kubectl get nodes"
+
+    Flaggor, sökvägar, adresser och siffror hoppas över så att samma sorts
+    anrop hamnar i samma grupp.
+    """
+    if not argv:
+        return "?"
+    parts = [os.path.basename(str(argv[0]))]
+    for arg in argv[1:]:
+        if len(parts) >= words:
+            break
+        arg = str(arg)
+        if arg.startswith("-") or "=" in arg or "/" in arg or ":" in arg or re.match(r"^[\d.]+$", arg):
+            continue
+        parts.append(arg)
+    return " ".join(parts)
+
+
+class CommandTracer:
+    """
+    Samlar spans för alla subprocesser och probes
+
+    install() byter ut subprocess.Popen mot en spårande subklass. Eftersom
+    subprocess.run, check_output och direkta Popen-anrop alla går via Popen
+    fångas varje externt kommando utan att anropsställena behöver ändras.
+    """
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._origin = time.perf_counter()
+        self._wall_origin = time.time()
+        self._original_popen = None
+
+    @property
+    def installed(self) -> bool:
+        return self._original_popen is not None
+
+    def install(self) -> 'CommandTracer':
+        """Börja spåra alla subprocesser"""
+        if self.installed:
+            return self
+        tracer = self
+        original = subprocess.Popen
+
+        class TracedPopen(original):
+            def __init__(self, args, *popen_args, **kwargs):
+                self._trace_start = time.perf_counter()
+                self._trace_recorded = False
+                self._trace_argv = [str(a) for a in args] if isinstance(args, (list, tuple)) else [str(args)]
+                self._trace_test = _current_test()
+                try:
+                    super().__init__(args, *popen_args, **kwargs)
+                except OSError as e:
+                    self._trace_recorded = True
+                    tracer._record_command(self._trace_argv, self._trace_start, None,
+                                           str(e), self._trace_test)
+                    raise
+
+            def _trace_finish(self):
+                if not self._trace_recorded and self.returncode is not None:
+                    self._trace_recorded = True
+                    tracer._record_command(self._trace_argv, self._trace_start, self.returncode,
+                                           "", self._trace_test)
+
+            def wait(self, *args, **kwargs):
+                try:
+                    return super().wait(*args, **kwargs)
+                finally:
+                    self._trace_finish()
+
+            def poll(self):
+                try:
+                    return super().poll()
+                finally:
+                    self._trace_finish()
+
+            def communicate(self, *args, **kwargs):
+                try:
+                    return super().communicate(*args, **kwargs)
+                finally:
+                    self._trace_finish()
+
+        self._original_popen = original
+        subprocess.Popen = TracedPopen
+        return self
+
+    def uninstall(self) -> None:
+        """Sluta spåra och återställ subprocess.Popen"""
+        if self.installed:
+            subprocess.Popen = self._original_popen
+            self._original_popen = None
+
+    def _record_command(self, argv: List[str], start: float, exit_code: Optional[int],
+                        error: str, test: str) -> None:
+        self.spans.append(Span(
+            name=command_key(argv),
+            kind="command",
+            start=start - self._origin,
+            duration=time.perf_counter() - start,
+            argv=argv,
+            exit_code=exit_code,
+            error=error,
+            test=test,
+            thread_id=threading.get_ident()
+        ))
+
+    @contextmanager
+    def span(self, name: str, kind: str = "probe"):
+        """Spåra ett eget kodblock, t.ex. en probe som inte kör något kommando"""
+        start = time.perf_counter()
+        error = ""
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self.spans.append(Span(
+                name=name,
+                kind=kind,
+                start=start - self._origin,
+                duration=time.perf_counter() - start,
+                error=error,
+                test=_current_test(),
+                thread_id=threading.get_ident()
+            ))
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """Exportera spans i Chrome trace-event-format (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            args: Dict[str, Any] = {"test": span.test}
+            if span.argv:
+                args["argv"] = " ".join(span.argv)
+                args["exit_code"] = span.exit_code
+            if span.error:
+                args["error"] = span.error
+            events.append({
+                "name": span.name,
+                "cat": span.kind,
+                "ph": "X",
+                "ts": round(span.start * 1e6, 1),
+                "dur": round(span.duration * 1e6, 1),
+                "pid": span.pid or pid,
+                "tid": span.thread_id,
+                "args": args
+            })
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"start_time": self._wall_origin}
+        }
+
+    def merge_chrome_trace(self, trace: Dict[str, Any]) -> int:
+        """
+        Lägg till spans från en annan process trace (t.ex. en xdist-workers fil)
+
+        Tiderna flyttas till denna tracers tidsaxel med hjälp av start_time.
+
+        Args:
+            trace: Chrome trace-JSON från write_chrome_trace
+
+        Returns:
+            Antal spans som lades till
+        """
+        offset = trace.get("otherData", {}).get("start_time", self._wall_origin) - self._wall_origin
+        events = [e for e in trace.get("traceEvents", []) if e.get("ph") == "X"]
+        for event in events:
+            args = event.get("args", {})
+            self.spans.append(Span(
+                name=event["name"],
+                kind=event.get("cat", "command"),
+                start=offset + event["ts"] / 1e6,
+                duration=event["dur"] / 1e6,
+                argv=args["argv"].split(" ") if args.get("argv") else [],
+                exit_code=args.get("exit_code"),
+                error=args.get("error", ""),
+                test=args.get("test", ""),
+                thread_id=event.get("tid", 0),
+                pid=event.get("pid", 0)
+            ))
+        return len(events)
+
+    def write_chrome_trace(self, path: str) -> None:
+        """Skriv Chrome trace-JSON till fil"""
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+    def summary(self, kind: Optional[str] = "command") -> List[Dict[str, Any]]:
+        """
+        Sammanställ tid per kommando-grupp, sorterat på total tid
+
+        Args:
+            kind: Vilken sorts spans som ska räknas ("command", "probe" eller None för alla)
+
+        Returns:
+            Lista med dicts (name, count, total_s, mean_ms, max_ms, failures, share)
+        """
+        session = max(time.perf_counter() - self._origin, 1e-9)
+        groups: Dict[str, Dict[str, Any]] = {}
+        for span in self.spans:
+            if kind and span.kind != kind:
+                continue
+            group = groups.setdefault(span.name, {"name": span.name, "count": 0, "total_s": 0.0,
+                                                  "max_ms": 0.0, "failures": 0})
+            group["count"] += 1
+            group["total_s"] += span.duration
+            group["max_ms"] = max(group["max_ms"], span.duration * 1000)
+            if span.error or (span.exit_code not in (None, 0)):
+                group["failures"] += 1
+
+        rows = sorted(groups.values(), key=lambda g: g["total_s"], reverse=True)
+        for row in rows:
+            row["mean_ms"] = row["total_s"] * 1000 / row["count"]
+            row["share"] = row["total_s"] / session
+        return rows
+
+    def format_summary(self, top: int = 15) -> str:
+        """Tabell över de största tidskonsumenterna"""
+        rows = self.summary()
+        lines = [
+            f"{'Kommando':32} {'antal':>6} {'total':>9} {'medel':>9} {'max':>9} {'fel':>5} {'andel':>6}"
+        ]
+        for row in rows[:top]:
+            lines.append(
+                f"{row['name'][:32]:32} {row['count']:>6} {row['total_s']:>8.2f}s "
+                f"{row['mean_ms']:>7.1f}ms {row['max_ms']:>7.1f}ms {row['failures']:>5} "
+                f"{row['share'] * 100:>5.1f}%"
+            )
+        return "\n".join(lines)
+
+
+_tracer: Optional[CommandTracer] = None
+
+
+def get_tracer() -> Optional[CommandTracer]:
+    """Hämta installerad tracer (None om spårning inte är aktiv)"""
+    return _tracer
+
+
+def start_tracing() -> CommandTracer:
+    """Installera en processgemensam tracer"""
+    global _tracer
+    if _tracer is None:
+        _tracer = CommandTracer().install()
+    return _tracer
+
+
+def stop_tracing() -> Optional[CommandTracer]:
+    """Avinstallera tracern och returnera den med insamlade spans"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer:
+        tracer.uninstall()
+    return tracer
+
+
+@contextmanager
+def trace_span(name: str):
+    """Spåra ett kodblock om spårning är aktiv, annars no-op"""
+    if _tracer is None:
+        yield
+    else:
+        with _tracer.span(name):
+            yield
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Parametersvep över Kamailio-konfigurationen
+
+Varianter av kamailio.cfg renderas från ett parameterrutnät (children,
+debug-nivå, xlog av/på, tillståndslöst sl_send_reply mot t_reply och
+TCP-workers). Varje variant läggs i ConfigMap:en, poddarna rullas om och
+samma lastprofil körs, och varianterna rankas efter resultatet. Den
+ursprungliga konfigurationen läggs tillbaka efteråt.
+"""
+
+import itertools
+import json
+import logging
+import re
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CONFIGMAP_PATH = Path(__file__).parent.parent / "k8s" / "configmap.yaml"
+DEFAULT_CONFIGMAP = "kamailio-config"
+CONFIG_KEY = "kamailio.cfg"
+
+PARAMETERS = ("children", "debug", "xlog", "reply", "tcp_workers")
+REPLY_MODES = ("sl", "tm")
+
+# Rutnät som svepet använder om inget anges (TCP-workers spelar ingen roll för UDP-last)
+DEFAULT_GRID: Dict[str, List] = {
+    "children": [4, 8],
+    "debug": [2, 0],
+    "xlog": [True, False],
+    "reply": ["sl", "tm"],
+}
+
+# Tillståndsfullt svar: ACK hör till INVITE-transaktionen och besvaras inte,
+# t_newtran() fångar omsändningar innan t_reply()
+STATEFUL_REPLY = """if ($rm == "ACK") {{
+{indent}    exit;
+{indent}}}
+{indent}if (!t_newtran()) {{
+{indent}    sl_reply_error();
+{indent}    exit;
+{indent}}}
+{indent}t_reply("200", "OK");"""
+
+
+def read_repo_config(path: Path = CONFIGMAP_PATH) -> str:
+    """
+    kamailio.cfg ur ConfigMap-manifestet i repot
+
+    Returns:
+        Konfigurationen (blockets indrag borttaget)
+    """
+    lines = path.read_text().splitlines()
+    for index, line in enumerate(lines):
+        if line.strip() == f"{CONFIG_KEY}: |":
+            key_indent = len(line) - len(line.lstrip())
+            block = []
+            for body in lines[index + 1:]:
+                if body.strip() and len(body) - len(body.lstrip()) <= key_indent:
+                    break
+                block.append(body)
+            indent = min((len(b) - len(b.lstrip()) for b in block if b.strip()), default=0)
+            return "\n".join(b[indent:] for b in block).rstrip() + "\n"
+    raise ValueError(f"{CONFIG_KEY} saknas i {path}")
+
+
+def read_live_config(namespace: str = "kamailio", configmap: str = DEFAULT_CONFIGMAP) -> Optional[str]:
+    """kamailio.cfg som den ligger i klustret, eller None"""
+    try:
+        result = subprocess.run(["kubectl", "get", "configmap", configmap, "-n", namespace, "-o", "json"],
+                                capture_output=True, text=True, timeout=10)
+        if result.returncode == 0:
+            return json.loads(result.stdout).get("data", {}).get(CONFIG_KEY)
+    except Exception:
+        pass
+    return None
+
+
+def apply_config(config: str, namespace: str = "kamailio", configmap: str = DEFAULT_CONFIGMAP) -> bool:
+    """Skriv kamailio.cfg till ConfigMap:en (kubectl apply)"""
+    manifest = {
+        "apiVersion": "v1",
+        "kind": "ConfigMap",
+        "metadata": {"name": configmap, "namespace": namespace},
+        "data": {CONFIG_KEY: config},
+    }
+    try:
+        result = subprocess.run(["kubectl", "apply", "-f", "-"], input=json.dumps(manifest),
+                                capture_output=True, text=True, timeout=30)
+    except Exception as e:
+        logger.error(f"Kunde inte uppdatera {configmap}: {e}")
+        return False
+    if result.returncode != 0:
+        logger.error(f"Kunde inte uppdatera {configmap}: {result.stderr}")
+    return result.returncode == 0
+
+
+def _replace(pattern: str, replacement, config: str, name: str, count: int = 1) -> str:
+    config, replaced = re.subn(pattern, replacement, config, count=count, flags=re.MULTILINE)
+    if not replaced:
+        raise ValueError(f"Hittar inte {name} i konfigurationen")
+    return config
+
+
+def render_config(base: str, children: Optional[int] = None, debug: Optional[int] = None,
+                  xlog: Optional[bool] = None, reply: Optional[str] = None,
+                  tcp_workers: Optional[int] = None) -> str:
+    """
+    Rendera en variant av kamailio.cfg
+
+    Args:
+        base: Konfigurationen varianten utgår från
+        children: Antal UDP-workers (children=)
+        debug: Loggnivå (debug=)
+        xlog: False kommenterar bort xlog-raderna i routingen
+        reply: "sl" (sl_send_reply) eller "tm" (t_newtran + t_reply)
+        tcp_workers: Antal TCP-workers (tcp_children=)
+
+    Returns:
+        Den renderade konfigurationen
+    """
+    config = base
+    if children is not None:
+        config = _replace(r"^(\s*)children=\d+", rf"\g<1>children={int(children)}", config, "children=")
+    if debug is not None:
+        config = _replace(r"^(\s*)debug=-?\d+", rf"\g<1>debug={int(debug)}", config, "debug=")
+    if tcp_workers is not None:
+        if re.search(r"^\s*tcp_children=", config, flags=re.MULTILINE):
+            config = _replace(r"^(\s*)tcp_children=\d+", rf"\g<1>tcp_children={int(tcp_workers)}",
+                              config, "tcp_children=")
+        else:
+            config = _replace(r"^(\s*)(children=\d+)", rf"\g<1>\g<2>\n\g<1>tcp_children={int(tcp_workers)}",
+                              config, "children=")
+    if xlog is False:
+        config = _replace(r"^(\s*)(xlog\(.*)$", r"\g<1># \g<2>", config, "xlog(", count=0)
+    if reply is not None:
+        if reply not in REPLY_MODES:
+            raise ValueError(f"Okänt reply-läge: {reply} (välj bland {', '.join(REPLY_MODES)})")
+        if reply == "tm":
+            config = _replace(r'^(\s*)sl_send_reply\("200", "OK"\);',
+                              lambda m: m.group(1) + STATEFUL_REPLY.format(indent=m.group(1)),
+                              config, 'sl_send_reply("200", "OK")')
+    return config
+
+
+def expand_grid(grid: Dict[str, List]) -> List[Dict]:
+    """
+    Alla kombinationer av ett parameterrutnät
+
+    Args:
+        grid: Parameter -> värden, t.ex. {"children": [4, 8], "xlog": [True, False]}
+
+    Returns:
+        En dict per variant
+    """
+    unknown = set(grid) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Okända parametrar: {', '.join(sorted(unknown))} (välj bland {', '.join(PARAMETERS)})")
+    names = [name for name in PARAMETERS if grid.get(name)]
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def variant_name(variant: Dict) -> str:
+    """Kort namn för en variant, t.ex. children=8 debug=0 xlog=off reply=tm"""
+    parts = []
+    for name in PARAMETERS:
+        if name in variant:
+            value = variant[name]
+            parts.append(f"{name}={('on' if value else 'off') if isinstance(value, bool) else value}")
+    return " ".join(parts)
+
+
+def rank_variants(entries: List[Dict], by_capacity: bool = False) -> List[Dict]:
+    """
+    Ranka varianterna
+
+    Godkända varianter först; med kapacitetssökning efter högst kapacitet,
+    annars efter lägst p99 och därefter lägst CPU-kostnad.
+
+    Args:
+        entries: En post per variant (se ConfigSweep.measure)
+        by_capacity: Ranka efter capacity_cps
+
+    Returns:
+        Posterna sorterade, med rank (1 = bäst)
+    """
+    def key(entry: Dict):
+        cost = entry.get("millicores_per_1k_rps")
+        p99 = entry.get("p99_ms")
+        if by_capacity:
+            return (not entry["ok"], -(entry.get("capacity_cps") or 0.0), p99 if p99 is not None else float("inf"))
+        return (not entry["ok"], p99 if p99 is not None else float("inf"),
+                cost if cost is not None else float("inf"))
+
+    ranked = sorted(entries, key=key)
+    for index, entry in enumerate(ranked, start=1):
+        entry["rank"] = index
+    return ranked
+
+
+class ConfigSweep:
+    """
+    Kör samma lastprofil mot varje konfigurationsvariant
+
+    Args:
+        tester: SippTester som kör lasten
+        grid: Parameterrutnät (standard DEFAULT_GRID)
+        scenario: Scenario för lasten
+        rate: Takt för lastprofilen
+        duration: Sekunder per variant
+        capacity: Kör en kapacitetssökning per variant i stället för en fast takt
+        namespace: Kamailios namespace
+        configmap: ConfigMap med kamailio.cfg
+        deployment: Deploymenten som rullas om
+        ready_timeout: Sekunder att vänta på omrullningen
+        base_config: Konfigurationen varianterna utgår från (standard den i klustret,
+                     annars k8s/configmap.yaml)
+        **load_options: Vidare till run_load_test/find_capacity
+    """
+
+    def __init__(self, tester, grid: Optional[Dict[str, List]] = None, scenario: str = "options",
+                 rate: float = 1000.0, duration: float = 30.0, capacity: bool = False,
+                 namespace: str = "kamailio", configmap: str = DEFAULT_CONFIGMAP,
+                 deployment: str = "kamailio", ready_timeout: int = 300,
+                 base_config: Optional[str] = None, **load_options):
+        self.tester = tester
+        self.variants = expand_grid(grid or DEFAULT_GRID)
+        self.scenario = scenario
+        self.rate = rate
+        self.duration = duration
+        self.capacity = capacity
+        self.namespace = namespace
+        self.configmap = configmap
+        self.deployment = deployment
+        self.ready_timeout = ready_timeout
+        self.base_config = base_config
+        self.load_options = load_options
+        self.entries: List[Dict] = []
+
+    def _deploy(self, config: str) -> bool:
+        from sip_test_utils import KubernetesUtils
+        return (apply_config(config, self.namespace, self.configmap)
+                and KubernetesUtils.restart_deployment(self.deployment, self.namespace, self.ready_timeout))
+
+    def measure(self, variant: Dict, config: str) -> Dict:
+        """Lägg ut en variant och kör lastprofilen"""
+        from results_store import get_results_store
+
+        name = variant_name(variant)
+        entry = {"name": name, "variant": variant, "ok": False}
+        logger.info(f"🔧 Variant {name}")
+        if not self._deploy(config):
+            entry["error"] = "kunde inte lägga ut konfigurationen"
+            return entry
+        # Körningarna ska sparas med variantens config-hash
+        entry["config_hash"] = get_results_store().refresh_context().get("config_hash")
+
+        if self.capacity:
+            result = self.tester.find_capacity(self.scenario, sample_resources=True, **self.load_options)
+            entry["capacity_cps"] = result.statistics.get("capacity_cps")
+        else:
+            result = self.tester.run_load_test(self.scenario, self.rate, self.duration, sample_kamailio=True,
+                                               sample_resources=True, **self.load_options)
+        statistics = result.statistics
+        latency = statistics.get("latency_ms", {})
+        entry.update({
+            "ok": result.success,
+            "throughput": statistics.get("throughput"),
+            "p50_ms": latency.get("p50"),
+            "p99_ms": latency.get("p99"),
+            "millicores_per_1k_rps": (statistics.get("resources") or {}).get("millicores_per_1k_rps"),
+        })
+        if not result.success:
+            entry["error"] = str(result.error)
+        return entry
+
+    def run(self) -> Dict:
+        """
+        Svep alla varianter och lägg tillbaka den ursprungliga konfigurationen
+
+        Returns:
+            Se summarize()
+        """
+        original = read_live_config(self.namespace, self.configmap)
+        base = self.base_config or original or read_repo_config()
+        self.entries = []
+        try:
+            for variant in self.variants:
+                self.entries.append(self.measure(variant, render_config(base, **variant)))
+        finally:
+            if original is not None:
+                logger.info(f"↩️  Återställer {self.configmap}")
+                self._deploy(original)
+                from results_store import get_results_store
+                get_results_store().refresh_context()
+        return self.summarize()
+
+    def summarize(self) -> Dict:
+        """
+        Returns:
+            Dict med scenario, lastprofil och rankade varianter
+        """
+        profile = ({"capacity": True} if self.capacity
+                   else {"rate": self.rate, "duration": self.duration})
+        return {
+            "scenario": self.scenario,
+            "profile": profile,
+            "variants": rank_variants([dict(entry) for entry in self.entries], by_capacity=self.capacity),
+        }
+
+
+def format_sweep_ranking(summary: Dict) -> str:
+    """Rankade varianter som tabell"""
+    profile = summary["profile"]
+    title = ("kapacitetssökning" if profile.get("capacity")
+             else f"{profile['rate']:g}/s i {profile['duration']:g}s")
+    lines = [f"Konfigurationssvep ({summary['scenario']}, {title}):"]
+    for entry in summary["variants"]:
+        if entry.get("error") and entry.get("p99_ms") is None:
+            lines.append(f"{entry['rank']:>3}. {entry['name']}: {entry['error']}")
+            continue
+        measured = (f"{entry['capacity_cps']:g} CPS, " if entry.get("capacity_cps") is not None else "")
+        cost = entry.get("millicores_per_1k_rps")
+        lines.append(f"{entry['rank']:>3}. {entry['name']}: {measured}p50 {entry['p50_ms']}ms, "
+                     f"p99 {entry['p99_ms']}ms, {cost if cost is not None else '-'} mcores/1k"
+                     f"{'' if entry['ok'] else ' (underkänd)'}")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rendera en variant av kamailio.cfg")
+    parser.add_argument("--children", type=int)
+    parser.add_argument("--debug", type=int)
+    parser.add_argument("--xlog", choices=["on", "off"])
+    parser.add_argument("--reply", choices=REPLY_MODES)
+    parser.add_argument("--tcp-workers", type=int)
+    args = parser.parse_args()
+
+    xlog = None if args.xlog is None else args.xlog == "on"
+    print(render_config(read_repo_config(), args.children, args.debug, xlog, args.reply, args.tcp_workers), end="")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
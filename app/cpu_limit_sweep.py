@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+CPU-gränssvep och kostnadsmodell per scenario
+
+Kamailio-containerns CPU-gräns sätts till varje värde i en lista, och
+vid varje gräns söks högsta hållbara takt (CPS) och latensen där. En
+linjär modell, CPS = lutning * millicores + skärning, anpassas per
+scenario och ger kostnaden i millicores per 1000 CPS. Modellen
+exporteras som JSON för kapacitetsplanering (HPA-mål, nodstorlek).
+"""
+
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = Path.home() / ".local" / "share" / "sip-k8s-lab" / "cost_model.json"
+DEFAULT_CONTAINER = "kamailio"
+
+# Punkter där replikorna varken throttlas eller går nära gränsen begränsas av
+# något annat än CPU och tas inte med i anpassningen
+THROTTLED_LIMIT = 0.05
+CPU_BOUND_UTILIZATION = 0.8
+
+
+def model_path(path: Optional[Path] = None) -> Path:
+    """Kostnadsmodellens fil (argument, SIP_LAB_COST_MODEL eller standard)"""
+    return Path(path or os.getenv("SIP_LAB_COST_MODEL") or DEFAULT_MODEL_PATH)
+
+
+def fit_cost_model(points: List[Dict]) -> Optional[Dict]:
+    """
+    Anpassa CPS mot tilldelade millicores med minsta kvadrat
+
+    Args:
+        points: Punkter med allotted_m (gräns * replikor), capacity_cps och cpu_bound
+
+    Returns:
+        Dict med millicores_per_1k_cps (marginalkostnad), fixed_millicores
+        (millicores innan någon trafik hanteras), r2 och antal punkter, eller
+        None utan CPU-bundna mätpunkter
+    """
+    usable = [p for p in points if p.get("capacity_cps") and p.get("cpu_bound")]
+    if not usable:
+        return None
+    xs = [float(p["allotted_m"]) for p in usable]
+    ys = [float(p["capacity_cps"]) for p in usable]
+    n = len(usable)
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    if sxx:
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sxx
+        intercept = mean_y - slope * mean_x
+    else:
+        # En gräns: linje genom origo
+        slope, intercept = mean_y / mean_x, 0.0
+    if slope <= 0:
+        return None
+    ss_tot = sum((y - mean_y) ** 2 for y in ys)
+    ss_res = sum((y - (slope * x + intercept)) ** 2 for x, y in zip(xs, ys))
+    return {
+        "millicores_per_1k_cps": round(1000.0 / slope, 1),
+        "fixed_millicores": round(-intercept / slope, 1),
+        "r2": round(1 - ss_res / ss_tot, 4) if ss_tot else 1.0,
+        "points": n,
+    }
+
+
+def _resource_point(summary: Dict) -> Dict:
+    """CPU-användning, throttling och minne vid kapaciteten"""
+    pods = (summary.get("resources") or {}).get("pods", {})
+    throttled = max((p["throttled_ratio"] for p in pods.values()), default=None)
+    utilization = max((p["cpu_utilization"] for p in pods.values() if p.get("cpu_utilization")), default=None)
+    memory = max((p["memory_working_set_max"] for p in pods.values()), default=None)
+    cores = (summary.get("resources") or {}).get("cpu_cores_total")
+    return {
+        "cpu_used_m": round(cores * 1000, 1) if cores is not None else None,
+        "throttled_ratio": throttled,
+        "cpu_utilization": utilization,
+        "memory_bytes": memory,
+        # Utan sampling antas gränsen vara taket
+        "cpu_bound": (throttled is None or throttled >= THROTTLED_LIMIT
+                      or (utilization or 0.0) >= CPU_BOUND_UTILIZATION),
+    }
+
+
+class CpuLimitSweep:
+    """
+    Mät kapaciteten vid olika CPU-gränser för Kamailio-containern
+
+    Args:
+        tester: SippTester som kör kapacitetssökningarna
+        limits_m: CPU-gränser i millicores, t.ex. [250, 500, 1000]
+        scenarios: Scenarier att mäta vid varje gräns
+        deployment: Deploymenten som patchas
+        namespace: Deploymentens namespace
+        container: Containern vars resurser ändras
+        request_ratio: CPU-request som andel av gränsen (1.0 = request = limit)
+        ready_timeout: Sekunder att vänta på omrullningen
+        **search_options: Vidare till SippTester.find_capacity
+    """
+
+    def __init__(self, tester, limits_m: List[int], scenarios: Optional[List[str]] = None,
+                 deployment: str = "kamailio", namespace: str = "kamailio",
+                 container: str = DEFAULT_CONTAINER, request_ratio: float = 1.0,
+                 ready_timeout: int = 300, **search_options):
+        if not limits_m or min(limits_m) <= 0:
+            raise ValueError("limits_m måste innehålla gränser större än 0")
+        self.tester = tester
+        self.limits_m = sorted(set(int(limit) for limit in limits_m))
+        self.scenarios = scenarios or ["options"]
+        self.deployment = deployment
+        self.namespace = namespace
+        self.container = container
+        self.request_ratio = request_ratio
+        self.ready_timeout = ready_timeout
+        self.search_options = search_options
+        self.points: Dict[str, List[Dict]] = {}
+        self.errors: List[str] = []
+
+    def resources_for(self, limit_m: int, original: Dict) -> Dict:
+        """Resurser med ny CPU-gräns; minnet behålls som det var"""
+        limits = dict(original.get("limits", {}), cpu=f"{limit_m}m")
+        requests = dict(original.get("requests", {}), cpu=f"{max(1, int(limit_m * self.request_ratio))}m")
+        return {"limits": limits, "requests": requests}
+
+    def measure(self, limit_m: int, scenario: str, replicas: int) -> Dict:
+        """Kapacitetssökning för ett scenario vid nuvarande gräns"""
+        result = self.tester.find_capacity(scenario, sample_resources=True, **self.search_options)
+        summary = result.statistics
+        latency = summary.get("latency_ms", {})
+        point = {
+            "cpu_limit_m": limit_m,
+            "replicas": replicas,
+            "allotted_m": limit_m * replicas,
+            "capacity_cps": summary.get("capacity_cps") or None,
+            "p50_ms": latency.get("p50"),
+            "p99_ms": latency.get("p99"),
+            "limit": summary.get("limit"),
+        }
+        point.update(_resource_point(summary))
+        return point
+
+    def run(self) -> Dict:
+        """
+        Mät alla gränser och scenarier och återställ containerns resurser
+
+        Returns:
+            Se summarize()
+        """
+        from sip_test_utils import KubernetesUtils
+
+        original = KubernetesUtils.get_container_resources(self.deployment, self.namespace, self.container)
+        if original is None:
+            self.errors.append(f"Hittar inte containern {self.container} i {self.namespace}/{self.deployment}")
+            return self.summarize()
+        replicas = KubernetesUtils.get_deployment_replicas(self.deployment, self.namespace) or 1
+
+        self.points = {scenario: [] for scenario in self.scenarios}
+        try:
+            for limit_m in self.limits_m:
+                logger.info(f"⚙️  CPU-gräns {limit_m}m för {self.deployment}/{self.container}")
+                if not KubernetesUtils.set_container_resources(self.deployment, self.namespace, self.container,
+                                                               self.resources_for(limit_m, original),
+                                                               self.ready_timeout):
+                    self.errors.append(f"{limit_m}m: replikorna blev inte redo")
+                    continue
+                for scenario in self.scenarios:
+                    self.points[scenario].append(self.measure(limit_m, scenario, replicas))
+        finally:
+            logger.info(f"↩️  Återställer resurserna för {self.deployment}/{self.container}")
+            KubernetesUtils.set_container_resources(self.deployment, self.namespace, self.container, original,
+                                                    self.ready_timeout)
+        return self.summarize()
+
+    def summarize(self) -> Dict:
+        """
+        Returns:
+            Dict med mätpunkter och kostnadsmodell per scenario samt hints
+        """
+        hints = list(self.errors)
+        model: Dict[str, Dict] = {}
+        for scenario, points in self.points.items():
+            fit = fit_cost_model(points)
+            measured = [p for p in points if p.get("capacity_cps")]
+            for point in measured:
+                if not point["cpu_bound"]:
+                    hints.append(f"{scenario} vid {point['cpu_limit_m']}m: taket är inte CPU "
+                                 f"({point['limit']}), punkten ingår inte i modellen")
+            if fit is None:
+                hints.append(f"{scenario}: inga CPU-bundna mätpunkter, ingen modell")
+                continue
+            if fit["r2"] < 0.9 and fit["points"] > 2:
+                hints.append(f"{scenario}: kapaciteten är inte linjär i CPU (r² {fit['r2']})")
+            p99 = [p["p99_ms"] for p in measured if p.get("p99_ms") is not None]
+            memory = [p["memory_bytes"] for p in measured if p.get("memory_bytes")]
+            model[scenario] = dict(fit, replicas=measured[-1]["replicas"], p99_ms=max(p99) if p99 else None,
+                                   memory_bytes_per_replica=max(memory) if memory else None,
+                                   cps_per_replica={str(p["cpu_limit_m"]): round(p["capacity_cps"] / p["replicas"], 1)
+                                                    for p in measured})
+        return {
+            "deployment": f"{self.namespace}/{self.deployment}",
+            "container": self.container,
+            "limits_m": self.limits_m,
+            "request_ratio": self.request_ratio,
+            "points": self.points,
+            "model": model,
+            "hints": hints,
+        }
+
+
+def export_cost_model(summary: Dict, path: Optional[Path] = None, config_hash: Optional[str] = None) -> Path:
+    """
+    Skriv kostnadsmodellen till JSON för kapacitetsplanering
+
+    Args:
+        summary: CpuLimitSweep.summarize()
+        path: Filen (se model_path())
+        config_hash: Kamailio-konfigurationen som modellen mättes med
+
+    Returns:
+        Sökvägen som skrevs
+    """
+    target = model_path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        "created": time.time(),
+        "config_hash": config_hash,
+        "deployment": summary["deployment"],
+        "container": summary["container"],
+        "request_ratio": summary["request_ratio"],
+        "scenarios": summary["model"],
+    }
+    tmp = target.with_suffix(".tmp")
+    tmp.write_text(json.dumps(document, indent=2))
+    tmp.replace(target)
+    return target
+
+
+def load_cost_model(path: Optional[Path] = None) -> Optional[Dict]:
+    """Läs en exporterad kostnadsmodell, eller None om den saknas"""
+    target = model_path(path)
+    try:
+        return json.loads(target.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def format_cost_model(summary: Dict) -> str:
+    """Mätpunkter och modell per scenario som text"""
+    lines = [f"CPU-gränssvep för {summary['deployment']} ({summary['container']}):"]
+    for scenario, points in summary["points"].items():
+        lines.append(f"  {scenario}:")
+        for p in points:
+            if not p.get("capacity_cps"):
+                lines.append(f"    {p['cpu_limit_m']:>6}m  - ({p.get('limit') or 'ingen kapacitet'})")
+                continue
+            lines.append(f"    {p['cpu_limit_m']:>6}m {p['capacity_cps']:>9.1f} CPS p99 {p['p99_ms']}ms "
+                         f"{'' if p['cpu_bound'] else '(inte CPU-bunden)'}".rstrip())
+        fit = summary["model"].get(scenario)
+        if fit:
+            lines.append(f"    Kostnad: {fit['millicores_per_1k_cps']:g} millicores per 1k CPS "
+                         f"+ {fit['fixed_millicores']:g}m fast (r² {fit['r2']})")
+    lines.extend(f"Kostnad: {hint}" for hint in summary["hints"])
+    return "\n".join(lines)
@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+"""
+Distributed Load
+Lastgenerering inifrån klustret: N poddar i ett Kubernetes Job kör
+sip_load.SipLoadGenerator mot Kamailios ClusterIP, var och en med sin del
+av takten, och strömmar statistik via loggen som harnessen slår ihop
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import logging
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = Path(__file__).parent
+# Moduler som workern behöver; monteras i podden från en ConfigMap
+WORKER_MODULES = ("distributed_load.py", "sip_load.py", "metrics.py")
+WORKER_MOUNT = "/opt/sip-load"
+DEFAULT_IMAGE = "python:3.11-slim"
+DEFAULT_SERVICE = "kamailio-loadbalancer"
+# Prefix för workerns statistikrader i loggen (övrig loggning ignoreras)
+STREAM_PREFIX = "@sip-load "
+RUN_LABEL = "sip-load-run"
+
+
+def shard_requests(max_requests: Optional[int], workers: int, index: int) -> Optional[int]:
+    """Workerns andel av max_requests (resten fördelas på de första)"""
+    if max_requests is None:
+        return None
+    return max_requests // workers + (1 if index < max_requests % workers else 0)
+
+
+def build_manifests(name: str, namespace: str, workers: int, scenario: str, host: str, port: int,
+                    rate: float, duration: float, start_at: float, image: str = DEFAULT_IMAGE,
+                    cpu: Optional[str] = None, worker_options: Optional[Dict] = None,
+                    create_namespace: bool = False) -> List[Dict]:
+    """
+    Manifest för en distribuerad körning: ConfigMap med koden och ett Indexed Job
+
+    Varje pod får sitt index i JOB_COMPLETION_INDEX och tar rate/workers.
+    Poddarna sprids över noderna när det går (topologySpreadConstraints).
+
+    Args:
+        name: Körningens namn (Job, ConfigMap och label)
+        namespace: Namespace för Job:et
+        workers: Antal generator-poddar
+        scenario: Scenario (options, register, invite, ping)
+        host: Kamailio-adress sedd inifrån klustret
+        port: Kamailio-port
+        rate: Total takt för alla workers
+        duration: Sekunder per worker
+        start_at: Gemensam starttid (epoch) för alla workers
+        image: Image med Python 3
+        cpu: CPU-request per pod (t.ex. "500m")
+        worker_options: Extra flaggor till workern (t1, max_requests, arrival, seed, burst_on, burst_off)
+        create_namespace: Ta med ett Namespace-objekt
+
+    Returns:
+        Lista med manifest (dict) för kubectl apply
+    """
+    labels = {"app": "sip-load", "project": "sip-k8s-lab", RUN_LABEL: name}
+    data = {module: (APP_DIR / module).read_text() for module in WORKER_MODULES}
+    command = ["python", f"{WORKER_MOUNT}/distributed_load.py", "worker",
+               "--host", host, "--port", str(port), "--scenario", scenario,
+               "--rate", repr(float(rate)), "--workers", str(workers),
+               "--duration", repr(float(duration)), "--start-at", repr(float(start_at))]
+    for option, value in (worker_options or {}).items():
+        if value is not None:
+            command += [f"--{option.replace('_', '-')}", str(value)]
+
+    container = {
+        "name": "sip-load",
+        "image": image,
+        "command": command,
+        "env": [
+            {"name": "PYTHONDONTWRITEBYTECODE", "value": "1"},
+            {"name": "PYTHONUNBUFFERED", "value": "1"},
+            {"name": "NODE_NAME", "valueFrom": {"fieldRef": {"fieldPath": "spec.nodeName"}}},
+        ],
+        "volumeMounts": [{"name": "code", "mountPath": WORKER_MOUNT, "readOnly": True}],
+    }
+    if cpu:
+        container["resources"] = {"requests": {"cpu": cpu}}
+
+    manifests = []
+    if create_namespace:
+        manifests.append({"apiVersion": "v1", "kind": "Namespace",
+                          "metadata": {"name": namespace, "labels": {"project": "sip-k8s-lab"}}})
+    manifests.append({"apiVersion": "v1", "kind": "ConfigMap",
+                      "metadata": {"name": name, "namespace": namespace, "labels": labels},
+                      "data": data})
+    manifests.append({
+        "apiVersion": "batch/v1",
+        "kind": "Job",
+        "metadata": {"name": name, "namespace": namespace, "labels": labels},
+        "spec": {
+            "completions": workers,
+            "parallelism": workers,
+            "completionMode": "Indexed",
+            "backoffLimit": 0,
+            "ttlSecondsAfterFinished": 600,
+            "template": {
+                "metadata": {"labels": labels},
+                "spec": {
+                    "restartPolicy": "Never",
+                    "topologySpreadConstraints": [{
+                        "maxSkew": 1,
+                        "topologyKey": "kubernetes.io/hostname",
+                        "whenUnsatisfiable": "ScheduleAnyway",
+                        "labelSelector": {"matchLabels": {RUN_LABEL: name}},
+                    }],
+                    "containers": [container],
+                    "volumes": [{"name": "code", "configMap": {"name": name}}],
+                },
+            },
+        },
+    })
+    return manifests
+
+
+def merge_shard_results(shards: Dict[int, Dict]) -> Dict:
+    """
+    Slå ihop workernas slutresultat till en statistik som SipLoadGenerator.run()
+
+    Räknare och svar per kod summeras, latens-histogrammen slås ihop så att
+    percentilerna gäller hela lasten, och takterna summeras.
+
+    Args:
+        shards: index -> {"stats": ..., "latency": histogram-dict, ...}
+
+    Returns:
+        Sammanslagen statistik
+    """
+    from metrics import LatencyHistogram
+
+    latency = LatencyHistogram()
+    merged = {"requests_sent": 0, "successful": 0, "failed": 0, "timeouts": 0, "retransmissions": 0,
+              "stray_responses": 0, "achieved_rate": 0.0, "throughput": 0.0, "target_rate": 0.0,
+              "duration_s": 0.0, "source_addresses": 0}
+    responses: Dict[str, int] = {}
+    jitter_total, jitter_weight = 0.0, 0
+    send_windows = []
+    first = None
+    for index in sorted(shards):
+        stats = shards[index]["stats"]
+        first = first or stats
+        for key in ("requests_sent", "successful", "failed", "timeouts", "retransmissions", "stray_responses"):
+            merged[key] += stats.get(key, 0)
+        for key in ("achieved_rate", "throughput", "target_rate"):
+            merged[key] = round(merged[key] + stats.get(key, 0.0), 2)
+        merged["duration_s"] = max(merged["duration_s"], stats.get("duration_s", 0.0))
+        merged["source_addresses"] += stats.get("source_addresses", 1)
+        for code, count in stats.get("responses", {}).items():
+            responses[code] = responses.get(code, 0) + count
+        if shards[index].get("latency"):
+            latency.merge(LatencyHistogram.from_dict(shards[index]["latency"]))
+        if stats.get("jitter_ms") is not None and stats.get("successful"):
+            jitter_total += stats["jitter_ms"] * stats["successful"]
+            jitter_weight += stats["successful"]
+        if stats.get("send_window"):
+            send_windows.append(stats["send_window"])
+
+    merged.update({
+        "scenario": first["scenario"] if first else "",
+        "method": first["method"] if first else "",
+        "target": first["target"] if first else "",
+        "responses": dict(sorted(responses.items())),
+        "latency_ms": latency.summary_ms(),
+        # Workernas jitter viktat med antal svar (skillnader mellan workers räknas inte)
+        "jitter_ms": round(jitter_total / jitter_weight, 3) if jitter_weight else None,
+    })
+    if send_windows:
+        # Från första workerns start till sista workerns sista sändning
+        merged["send_window"] = {"start": min(w["start"] for w in send_windows),
+                                 "end": max(w["end"] for w in send_windows)}
+    return merged
+
+
+class DistributedLoadTest:
+    """
+    Kör lastgeneratorn i N poddar och slår ihop deras statistik
+
+    Har samma gränssnitt som samplers (start/stop/summarize/samples) så att
+    den sparas med körningen. Workernas räknare strömmas varje sekund via
+    "kubectl logs -f" och summeras live i metrics (LoadMetrics), som andra
+    samplers och /metrics kan läsa som om lasten kom från en klient.
+    """
+
+    source = "distributed"
+
+    def __init__(self, scenario: str = "options", rate: float = 1000.0, duration: float = 10.0,
+                 workers: int = 2, namespace: str = "kamailio", host: Optional[str] = None,
+                 port: int = 5060, image: Optional[str] = None, start_delay: float = 10.0,
+                 pod_timeout: float = 120.0, cpu: Optional[str] = None, name: Optional[str] = None,
+                 **worker_options):
+        """
+        Args:
+            scenario: Scenario (options, register, invite, ping)
+            rate: Total takt för alla workers
+            duration: Sekunder som lasten körs
+            workers: Antal generator-poddar
+            namespace: Namespace för Job:et (skapas om det inte är kamailio)
+            host: Kamailio sedd inifrån klustret (standard Servicens DNS-namn, dvs ClusterIP)
+            port: Kamailio-port
+            image: Image med Python 3 (SIP_LAB_LOADGEN_IMAGE, annars python:3.11-slim)
+            start_delay: Sekunder från apply till gemensam start (image-pull och schemaläggning)
+            pod_timeout: Max sekunder att vänta på att poddarna startar
+            cpu: CPU-request per pod
+            **worker_options: Vidare till workern (t1, max_requests, arrival, seed, burst_on, burst_off)
+        """
+        from metrics import LoadMetrics
+
+        if workers < 1:
+            raise ValueError("workers måste vara minst 1")
+        self.scenario = scenario
+        self.rate = float(rate)
+        self.duration = float(duration)
+        self.workers = workers
+        self.namespace = namespace
+        self.host = host or f"{DEFAULT_SERVICE}.kamailio.svc.cluster.local"
+        self.port = int(port)
+        self.image = image or os.getenv("SIP_LAB_LOADGEN_IMAGE") or DEFAULT_IMAGE
+        self.start_delay = start_delay
+        self.pod_timeout = pod_timeout
+        self.cpu = cpu
+        self.worker_options = worker_options
+        self.name = name or f"sip-load-{int(time.time()) % 100000:05d}-{os.getpid() % 1000:03d}"
+        self.metrics = LoadMetrics({"scenario": scenario, "target": f"{self.host}:{self.port}",
+                                    "mode": "distributed"})
+        self.samples = []
+        self.started: Dict[int, Dict] = {}
+        self.progress: Dict[int, Dict] = {}
+        self.results: Dict[int, Dict] = {}
+        self.pods: List[str] = []
+        self.errors: List[str] = []
+        self.start_at = 0.0
+        self._lock = threading.Lock()
+        self._processes: Dict[str, subprocess.Popen] = {}
+        self._threads: List[threading.Thread] = []
+
+    def manifests(self) -> List[Dict]:
+        return build_manifests(self.name, self.namespace, self.workers, self.scenario, self.host, self.port,
+                               self.rate, self.duration, self.start_at, self.image, self.cpu,
+                               self.worker_options, create_namespace=self.namespace != "kamailio")
+
+    def _kubectl(self, args: List[str], input: Optional[str] = None, timeout: float = 30):
+        return subprocess.run(["kubectl"] + args, input=input, capture_output=True, text=True, timeout=timeout)
+
+    def _pod_phases(self) -> Dict[str, str]:
+        try:
+            result = self._kubectl(["get", "pods", "-n", self.namespace, "-l", f"{RUN_LABEL}={self.name}",
+                                    "-o", "json"])
+            items = json.loads(result.stdout).get("items", []) if result.returncode == 0 else []
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            return {}
+        return {pod["metadata"]["name"]: pod.get("status", {}).get("phase", "") for pod in items}
+
+    def wait_for_pods(self) -> List[str]:
+        """Vänta tills alla poddar startat (eller redan avslutats) och returnera dem"""
+        deadline = time.time() + self.pod_timeout
+        ready: List[str] = []
+        while time.time() < deadline:
+            phases = self._pod_phases()
+            ready = sorted(pod for pod, phase in phases.items() if phase in ("Running", "Succeeded", "Failed"))
+            if len(ready) >= self.workers:
+                break
+            time.sleep(1.0)
+        return ready
+
+    def feed(self, pod: str, lines: Iterable[str]) -> None:
+        """Parsa workerns statistikrader inkrementellt (en lästråd per pod)"""
+        for line in lines:
+            position = line.find(STREAM_PREFIX)
+            if position < 0:
+                continue
+            try:
+                message = json.loads(line[position + len(STREAM_PREFIX):])
+                shard = int(message["shard"])
+            except (ValueError, KeyError, TypeError):
+                continue
+            message["pod"] = pod
+            kind = message.get("type")
+            if kind == "start":
+                self.started[shard] = message
+            elif kind == "progress":
+                self._record_progress(shard, message)
+            elif kind == "result":
+                self.results[shard] = message
+            elif kind == "error":
+                self.errors.append(f"shard {shard}: {message.get('error')}")
+
+    def _record_progress(self, shard: int, message: Dict) -> None:
+        from samplers import Sample
+        with self._lock:
+            self.progress[shard] = message
+            latest = list(self.progress.values())
+            metrics = self.metrics
+            metrics.requests_sent = sum(p.get("sent", 0) for p in latest)
+            metrics.completed = sum(p.get("completed", 0) for p in latest)
+            metrics.timeouts = sum(p.get("timeouts", 0) for p in latest)
+            metrics.retransmissions = sum(p.get("retransmissions", 0) for p in latest)
+            metrics.stray_responses = sum(p.get("stray", 0) for p in latest)
+            metrics.target_rate = sum(p.get("target_rate", 0.0) for p in latest)
+        self.samples.append(Sample(message.get("ts", time.time()), f"shard-{shard}", {
+            "client:requests_sent": float(message.get("sent", 0)),
+            "client:completed": float(message.get("completed", 0)),
+            "client:timeouts": float(message.get("timeouts", 0)),
+            "client:retransmissions": float(message.get("retransmissions", 0)),
+        }))
+
+    def _follow(self, pod: str, process: subprocess.Popen) -> None:
+        try:
+            self.feed(pod, process.stdout)
+        except (OSError, ValueError):
+            pass
+
+    def start(self) -> 'DistributedLoadTest':
+        """Skapa Job:et, vänta på poddarna och börja följa deras loggar"""
+        self.start_at = time.time() + self.start_delay
+        manifest = json.dumps({"apiVersion": "v1", "kind": "List", "items": self.manifests()})
+        logger.info(f"🚀 Distribuerad last: {self.workers} workers i {self.namespace}, "
+                    f"{self.rate:g}/s totalt mot {self.host}:{self.port}")
+        result = self._kubectl(["apply", "-f", "-"], input=manifest)
+        if result.returncode != 0:
+            raise RuntimeError(f"Kunde inte skapa Job {self.name}: {result.stderr.strip()}")
+
+        self.pods = self.wait_for_pods()
+        if len(self.pods) < self.workers:
+            logger.warning(f"Bara {len(self.pods)} av {self.workers} poddar startade inom {self.pod_timeout:g}s")
+        for pod in self.pods:
+            try:
+                process = subprocess.Popen(["kubectl", "logs", "-f", pod, "-n", self.namespace],
+                                           stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                           text=True, errors="replace")
+            except OSError as e:
+                self.errors.append(f"{pod}: {e}")
+                continue
+            self._processes[pod] = process
+            thread = threading.Thread(target=self._follow, args=(pod, process), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> Dict:
+        """
+        Vänta tills workernas loggar tagit slut och slå ihop resultaten
+
+        Returns:
+            Sammanslagen statistik (se merge_shard_results)
+        """
+        if timeout is None:
+            # Sändtid + Timer B/F för de sista transaktionerna + marginal
+            t1 = self.worker_options.get("t1") or 0.5
+            timeout = max(0.0, self.start_at - time.time()) + self.duration + 64 * t1 + 60
+        deadline = time.time() + timeout
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.time()))
+        if any(thread.is_alive() for thread in self._threads):
+            self.errors.append(f"workers blev inte klara inom {timeout:.0f}s")
+        statistics = merge_shard_results(self.results)
+        statistics["target_rate"] = self.rate
+        return statistics
+
+    def stop(self) -> 'DistributedLoadTest':
+        """Sluta följa loggarna och ta bort Job och ConfigMap"""
+        for process in self._processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        for process in self._processes.values():
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self._processes.clear()
+        self._threads.clear()
+        try:
+            self._kubectl(["delete", "job,configmap", "-n", self.namespace, "-l", f"{RUN_LABEL}={self.name}",
+                           "--ignore-not-found", "--wait=false"])
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"Kunde inte ta bort Job {self.name}: {e}")
+        return self
+
+    def run(self) -> Dict:
+        """start(), wait() och stop() i ett anrop"""
+        self.start()
+        try:
+            return self.wait()
+        finally:
+            self.stop()
+
+    def summarize(self, statistics: Optional[Dict] = None) -> Dict:
+        """
+        Per worker: pod, nod, takt och sen start; hints om obalans mellan workers
+
+        Returns:
+            {"workers", "namespace", "image", "nodes", "shards": [...], "hints": [...]}
+        """
+        share = self.rate / self.workers
+        shards = []
+        hints = list(self.errors)
+        for index in range(self.workers):
+            started = self.started.get(index, {})
+            result = self.results.get(index)
+            stats = result["stats"] if result else {}
+            shards.append({
+                "shard": index,
+                "pod": started.get("pod") or (result or {}).get("pod"),
+                "node": started.get("node"),
+                "late_s": started.get("late_s"),
+                "requests_sent": stats.get("requests_sent", 0),
+                "achieved_rate": stats.get("achieved_rate", 0.0),
+                "timeouts": stats.get("timeouts", 0),
+            })
+            if result is None:
+                hints.append(f"shard {index} rapporterade inget resultat (poddens logg saknas eller avbröts)")
+            elif stats.get("achieved_rate", 0.0) < 0.95 * share:
+                hints.append(f"shard {index} nådde {stats['achieved_rate']:g}/s av {share:g}/s: "
+                             "generator-podden hinner inte (CPU-request eller fler workers)")
+            if (started.get("late_s") or 0) > 1.0:
+                hints.append(f"shard {index} startade {started['late_s']:.1f}s sent: öka start_delay")
+        nodes = sorted({shard["node"] for shard in shards if shard["node"]})
+        if self.workers > 1 and len(nodes) == 1:
+            hints.append(f"alla workers kördes på {nodes[0]}: lasten begränsas av en nods nätverk och CPU")
+        return {
+            "workers": self.workers,
+            "namespace": self.namespace,
+            "job": self.name,
+            "image": self.image,
+            "nodes": nodes,
+            "shards": shards,
+            "hints": hints,
+        }
+
+
+def _emit(message: Dict) -> None:
+    sys.stdout.write(STREAM_PREFIX + json.dumps(message, separators=(",", ":")) + "\n")
+    sys.stdout.flush()
+
+
+def run_worker(args) -> int:
+    """
+    Körs i generator-podden: vänta på gemensam start, kör sin andel och
+    skriv räknare varje sekund samt slutresultat med latens-histogram
+    """
+    from sip_load import SipLoadGenerator
+
+    shard = int(os.getenv("JOB_COMPLETION_INDEX", args.shard))
+    rate = args.rate / args.workers
+    try:
+        # Eget frö per shard, annars skulle alla workers skicka i samma takt samtidigt
+        generator = SipLoadGenerator(args.host, args.port, args.scenario, rate, args.duration,
+                                     max_requests=shard_requests(args.max_requests, args.workers, shard),
+                                     t1=args.t1, register_metrics=False, arrival=args.arrival,
+                                     seed=None if args.seed is None else args.seed + shard,
+                                     burst_on=args.burst_on, burst_off=args.burst_off)
+    except ValueError as e:
+        _emit({"type": "error", "shard": shard, "error": str(e)})
+        return 1
+
+    delay = args.start_at - time.time()
+    if delay > 0:
+        time.sleep(delay)
+    _emit({"type": "start", "shard": shard, "node": os.getenv("NODE_NAME"), "rate": rate,
+           "late_s": round(max(0.0, -delay), 3)})
+
+    metrics = generator.metrics
+    outcome: Dict = {}
+    runner = threading.Thread(target=lambda: outcome.update(generator.run()), daemon=True)
+    runner.start()
+
+    def progress() -> None:
+        _emit({"type": "progress", "shard": shard, "ts": round(time.time(), 3),
+               "sent": metrics.requests_sent, "completed": metrics.completed, "timeouts": metrics.timeouts,
+               "retransmissions": metrics.retransmissions, "stray": metrics.stray_responses,
+               "target_rate": metrics.target_rate})
+
+    while runner.is_alive():
+        runner.join(args.interval)
+        progress()
+    _emit({"type": "result", "shard": shard, "stats": outcome, "latency": metrics.latency.to_dict()})
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Distribuerad SIP-last via Kubernetes Job")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    worker = sub.add_parser("worker", help="Körs i generator-podden")
+    worker.add_argument("--host", required=True)
+    worker.add_argument("--port", type=int, default=5060)
+    worker.add_argument("--scenario", default="options")
+    worker.add_argument("--rate", type=float, required=True, help="Total takt för alla workers")
+    worker.add_argument("--workers", type=int, default=1)
+    worker.add_argument("--shard", type=int, default=0, help="Index om JOB_COMPLETION_INDEX saknas")
+    worker.add_argument("--duration", type=float, default=10.0)
+    worker.add_argument("--start-at", type=float, default=0.0, help="Gemensam starttid (epoch)")
+    worker.add_argument("--max-requests", type=int)
+    worker.add_argument("--t1", type=float, default=0.5)
+    worker.add_argument("--arrival", default="constant", help="Ankomstprocess (constant, poisson, onoff)")
+    worker.add_argument("--seed", type=int, help="Frö för poisson (shardens index läggs till)")
+    worker.add_argument("--burst-on", type=float, default=1.0)
+    worker.add_argument("--burst-off", type=float, default=1.0)
+    worker.add_argument("--interval", type=float, default=1.0, help="Sekunder mellan räknarrader")
+
+    run = sub.add_parser("run", help="Skapa Job:et och slå ihop resultatet")
+    run.add_argument("--scenario", default="options")
+    run.add_argument("--rate", type=float, default=1000.0)
+    run.add_argument("--duration", type=float, default=10.0)
+    run.add_argument("--workers", type=int, default=2)
+    run.add_argument("--namespace", default="kamailio")
+    run.add_argument("--host", help="Kamailio inifrån klustret (standard Servicens ClusterIP-namn)")
+    run.add_argument("--port", type=int, default=5060)
+    run.add_argument("--image")
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        return run_worker(args)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load = DistributedLoadTest(args.scenario, args.rate, args.duration, args.workers, args.namespace,
+                               args.host, args.port, args.image)
+    statistics = load.run()
+    statistics[load.source] = load.summarize(statistics)
+    print(json.dumps(statistics, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
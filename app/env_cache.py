@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Environment Snapshot Cache
+Delad, diskbaserad cache för miljöfakta mellan pytest-processer och körningar
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "sip-k8s-lab"
+DEFAULT_TTL = 300
+# Misslyckade probes (kluster som startar, tillfälligt kubectl-fel) cachas bara kort
+DEFAULT_NEGATIVE_TTL = 10
+DEFAULT_IMAGE = "local/sipp-tester:latest"
+
+
+class EnvironmentCache:
+    """
+    Snapshot-cache för miljöstatus
+
+    Snapshoten nycklas på kube-context och image-ID, så att byte av kluster
+    eller ombyggd image automatiskt ger en ny snapshot. Varje post har egen
+    TTL och filen skrivs atomiskt så att parallella pytest-workers kan dela den.
+    Negativa resultat får negative_ttl, så att ett kluster som håller på att
+    starta inte ser trasigt ut i fem minuter.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, ttl: Optional[float] = None,
+                 docker_image: str = DEFAULT_IMAGE, negative_ttl: Optional[float] = None):
+        self.cache_dir = Path(cache_dir or os.getenv("SIP_LAB_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        self.ttl = float(ttl if ttl is not None else os.getenv("SIP_LAB_ENV_CACHE_TTL", DEFAULT_TTL))
+        self.negative_ttl = min(self.ttl, float(negative_ttl if negative_ttl is not None
+                                                else os.getenv("SIP_LAB_ENV_CACHE_NEGATIVE_TTL",
+                                                               DEFAULT_NEGATIVE_TTL)))
+        self.docker_image = docker_image
+        self.enabled = not os.getenv("SIP_LAB_NO_ENV_CACHE")
+        self._key: Optional[str] = None
+        self._context: Optional[str] = None
+        self._image_id: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _run(command) -> str:
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, timeout=10)
+            if result.returncode == 0:
+                return result.stdout.strip()
+        except Exception:
+            pass
+        return ""
+
+    @property
+    def key(self) -> str:
+        """Cache-nyckel baserad på kube-context och image-ID (beräknas en gång per process)"""
+        if self._key is None:
+            self._context = self._run(["kubectl", "config", "current-context"]) or "none"
+            self._image_id = self._run(
+                ["docker", "image", "inspect", "--format", "{{.Id}}", self.docker_image]
+            ) or "none"
+            digest = hashlib.sha256(f"{self._context}|{self._image_id}".encode()).hexdigest()
+            self._key = digest[:16]
+        return self._key
+
+    @property
+    def path(self) -> Path:
+        return self.cache_dir / f"env-{self.key}.json"
+
+    @contextmanager
+    def _file_lock(self):
+        """Exklusivt lås mellan processer under läs-modifiera-skriv"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_dir / f"env-{self.key}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, snapshot: Dict[str, Any]) -> None:
+        """Skriv snapshot atomiskt (temporär fil + os.replace)"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".env-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def _fresh(self, entry: Optional[Dict[str, Any]]) -> bool:
+        """Posten finns och är yngre än sin TTL (negativa poster har kortare TTL)"""
+        return bool(entry) and time.time() - entry.get("created_at", 0) < entry.get("ttl", self.ttl)
+
+    def get(self, name: str) -> Optional[Any]:
+        """Hämta en färsk post eller None"""
+        if not self.enabled:
+            return None
+        entry = self._read().get("entries", {}).get(name)
+        if self._fresh(entry):
+            return entry["value"]
+        return None
+
+    def put(self, name: str, value: Any) -> None:
+        """Spara en post i snapshoten"""
+        if not self.enabled:
+            return
+        with self._lock, self._file_lock():
+            self._store_locked(name, value)
+
+    def _store_locked(self, name: str, value: Any, ttl: Optional[float] = None) -> None:
+        snapshot = self._read()
+        snapshot.update({"key": self.key, "kube_context": self._context, "image_id": self._image_id})
+        entry = {"created_at": time.time(), "value": value}
+        if ttl is not None:
+            entry["ttl"] = ttl
+        snapshot.setdefault("entries", {})[name] = entry
+        self._write(snapshot)
+
+    def get_or_compute(self, name: str, compute: Callable[[], Any],
+                       healthy: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Hämta post från cachen eller beräkna och spara den
+
+        Låset hålls under beräkningen så att samtidiga workers inte probar
+        samma sak parallellt - de som väntar läser resultatet efteråt.
+        Tomma värden (None) sparas inte.
+
+        Args:
+            name: Postens namn
+            compute: Probe som beräknar värdet
+            healthy: Avgör om värdet är ett lyckat resultat; andra sparas bara negative_ttl
+        """
+        value = self.get(name)
+        if value is not None:
+            return value
+        if not self.enabled:
+            return compute()
+
+        with self._lock, self._file_lock():
+            entry = self._read().get("entries", {}).get(name)
+            if self._fresh(entry):
+                return entry["value"]
+
+            from command_tracing import trace_span
+            with trace_span(f"probe {name}"):
+                value = compute()
+            if value is not None:
+                negative = healthy is not None and not healthy(value)
+                self._store_locked(name, value, self.negative_ttl if negative else None)
+            return value
+
+    def latest_snapshot(self) -> Dict[str, Any]:
+        """
+        Senast skrivna snapshot, utan att beräkna nyckeln
+
+        Kör varken kubectl eller docker, så den passar för snabba
+        statusvisningar; snapshoten kan höra till en annan kontext.
+        """
+        try:
+            paths = sorted(self.cache_dir.glob("env-*.json"), key=lambda p: p.stat().st_mtime)
+        except OSError:
+            return {}
+        for path in reversed(paths):
+            try:
+                with open(path) as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                continue
+        return {}
+
+    def invalidate(self) -> None:
+        """Ta bort snapshoten och beräkna om nyckeln (t.ex. efter image-bygge)"""
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+        self._key = None
+
+    def clear(self) -> None:
+        """Ta bort alla snapshots i cache-katalogen"""
+        for path in self.cache_dir.glob("env-*.json"):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        self._key = None
+
+
+_cache: Optional[EnvironmentCache] = None
+
+
+def get_environment_cache() -> EnvironmentCache:
+    """Hämta den processgemensamma miljö-cachen"""
+    global _cache
+    if _cache is None:
+        _cache = EnvironmentCache()
+    return _cache
+
+
+def get_cached_environment_status() -> Dict[str, bool]:
+    """get_environment_status() via snapshot-cachen"""
+    from sip_test_utils import get_environment_status
+    return get_environment_cache().get_or_compute("environment_status", get_environment_status,
+                                                  healthy=lambda status: all(status.values()))
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Harness Benchmark
+Mäter overhead i själva test-harnessen (detektering, health check, SIPp-körning,
+miljöstatus) offline mot fejkade kubectl/docker/nc/sipp och den lokala respondern
+"""
+
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Ett enda shim-script som beter sig olika beroende på namnet det anropas med
+SHIM_SCRIPT = r'''#!{python}
+import json, os, socket, sys
+
+tool = os.path.basename(sys.argv[0])
+args = sys.argv[1:]
+
+
+def out(text="", code=0):
+    if text:
+        print(text)
+    sys.exit(code)
+
+
+if tool == "kubectl":
+    joined = " ".join(args)
+    if args[:1] in (["version"], ["cluster-info"]):
+        out("Kubernetes control plane is running")
+    if args[:2] == ["config", "current-context"]:
+        out("kind-sipp-k8s-lab")
+    if "InternalIP" in joined:
+        out(os.environ.get("BENCH_NODE_IP", "127.0.0.1"))
+    if "loadBalancer.ingress" in joined:
+        out(os.environ.get("BENCH_LB_IP", ""), 0)
+    if "nodePort" in joined:
+        out("30600")
+    if args[:2] == ["get", "pods"] and "json" in args:
+        out(json.dumps({{"items": [{{"metadata": {{"name": "kamailio-0"}}, "status": {{"phase": "Running"}}}}]}}))
+    if args[:1] == ["get"]:
+        out("ok")
+    out("", 1)
+
+if tool == "docker":
+    if args[:1] == ["--version"]:
+        out("Docker version 24.0.0, build bench")
+    if args[:1] == ["images"]:
+        out("0123456789ab")
+    if args[:2] == ["image", "inspect"]:
+        out("sha256:0123456789ab")
+    if args[:1] == ["run"]:
+        rest = args[1:]
+        while rest and rest[0].startswith("-"):
+            flag = rest.pop(0)
+            if flag in ("-v", "-e", "--network", "--name") and rest:
+                rest.pop(0)
+        command = rest[1:]
+        if not command or command[0] == "test":
+            out()
+        os.execvp(command[0], command)
+    out("", 1)
+
+if tool == "nc":
+    out()
+
+if tool == "sipp":
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(2)
+    port = int(os.environ["BENCH_RESPONDER_PORT"])
+    request = (
+        "OPTIONS sip:kamailio.local SIP/2.0\r\n"
+        "Via: SIP/2.0/UDP 127.0.0.1:5065;branch=z9hG4bK-bench\r\n"
+        "From: <sip:bench@kamailio.local>;tag=1\r\n"
+        "To: <sip:kamailio.local>\r\n"
+        "Call-ID: bench-{{}}\r\n"
+        "CSeq: 1 OPTIONS\r\n"
+        "Content-Length: 0\r\n\r\n"
+    ).format(os.getpid())
+    sock.sendto(request.encode(), ("127.0.0.1", port))
+    try:
+        sock.recvfrom(65535)
+    except socket.timeout:
+        out("Total: 1 Messages, 1 Errors, 1 Failures", 1)
+    out("Total: 1 Messages, 0 Errors, 0 Failures")
+
+out("", 127)
+'''
+
+SHIM_TOOLS = ("kubectl", "docker", "nc", "sipp")
+
+
+def create_shims(directory: Path) -> Path:
+    """
+    Skapa fejkade kubectl/docker/nc/sipp i directory
+
+    Returns:
+        Katalogen med shims (läggs först i PATH)
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    script = SHIM_SCRIPT.format(python=sys.executable)
+    for tool in SHIM_TOOLS:
+        path = directory / tool
+        path.write_text(script)
+        path.chmod(0o755)
+    return directory
+
+
+@contextmanager
+def bench_environment(shim_dir: Path, responder_port: int, cache_dir: Path):
+    """
+    Sätt PATH och miljövariabler för en benchmark-körning och återställ efteråt
+
+    Miljö-cachen byts mot en avstängd cache i en temporär katalog, så att
+    varje mätning gör hela probningen (fall med cache slår på den själva).
+    Resultatdatabasen stängs av så att mätningarna inte sparas som körningar.
+    """
+    import env_cache
+    import results_store
+
+    saved = dict(os.environ)
+    saved_cache = env_cache._cache
+    saved_store = results_store._store
+    try:
+        for name in ("KAMAILIO_HOST", "KAMAILIO_PORT", "KAMAILIO_ENVIRONMENT"):
+            os.environ.pop(name, None)
+        os.environ["PATH"] = f"{shim_dir}{os.pathsep}{saved.get('PATH', '')}"
+        os.environ["BENCH_RESPONDER_PORT"] = str(responder_port)
+        os.environ["BENCH_NODE_IP"] = "127.0.0.1"
+        env_cache._cache = env_cache.EnvironmentCache(cache_dir=cache_dir)
+        env_cache._cache.enabled = False
+        results_store._store = results_store.ResultsStore(cache_dir / "results.sqlite")
+        results_store._store.enabled = False
+        yield
+    finally:
+        env_cache._cache = saved_cache
+        results_store._store = saved_store
+        os.environ.clear()
+        os.environ.update(saved)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Statistik i millisekunder för en lista med mätningar i sekunder"""
+    ms = sorted(s * 1000 for s in samples)
+    p95_index = min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))
+    return {
+        "iterations": len(ms),
+        "min_ms": round(ms[0], 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p95_ms": round(ms[p95_index], 3),
+        "max_ms": round(ms[-1], 3),
+        "stdev_ms": round(statistics.stdev(ms), 3) if len(ms) > 1 else 0.0,
+    }
+
+
+def measure(func: Callable[[], object], iterations: int, warmup: int) -> Dict[str, float]:
+    """Kör func warmup + iterations gånger och returnera statistik"""
+    for _ in range(warmup):
+        func()
+    gc.collect()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def _git_sha() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                timeout=5, cwd=Path(__file__).parent)
+        if result.returncode == 0:
+            return result.stdout.strip()
+    except Exception:
+        pass
+    return None
+
+
+def _with_node_ip(ip: str, func: Callable[[], object]) -> Callable[[], object]:
+    """Kör func med given worker node IP (172.18.x ger host-SIPp, annars Docker)"""
+    def run():
+        os.environ["BENCH_NODE_IP"] = ip
+        return func()
+    return run
+
+
+def build_cases() -> Dict[str, Callable[[], object]]:
+    """Bygg benchmark-fallen; körs inuti bench_environment()"""
+    from sipp_support import SippTester
+    from sip_test_utils import get_environment_status
+    from env_cache import get_environment_cache
+
+    def init():
+        # Endpointen detekteras först vid användning - läs den så att probningen mäts
+        tester = SippTester(environment="auto")
+        tester.kamailio_host
+        return tester
+
+    def cached_init():
+        cache = get_environment_cache()
+        cache.enabled = True
+        try:
+            return init()
+        finally:
+            cache.enabled = False
+
+    docker_tester = SippTester(environment="auto")
+    os.environ["BENCH_NODE_IP"] = "172.18.0.2"
+    host_tester = SippTester(environment="auto")
+    os.environ["BENCH_NODE_IP"] = "127.0.0.1"
+
+    return {
+        "sipp_tester_init": _with_node_ip("127.0.0.1", init),
+        "sipp_tester_init_cached": _with_node_ip("127.0.0.1", cached_init),
+        "health_check": _with_node_ip("127.0.0.1", docker_tester.health_check),
+        "run_sipp_test_docker": _with_node_ip("127.0.0.1", lambda: docker_tester.run_sipp_test("options")),
+        "run_sipp_test_host": _with_node_ip("172.18.0.2", lambda: host_tester.run_sipp_test("options")),
+        "get_environment_status": _with_node_ip("127.0.0.1", get_environment_status),
+    }
+
+
+def run_benchmarks(iterations: int = 20, warmup: int = 3,
+                   only: Optional[List[str]] = None) -> Dict[str, object]:
+    """
+    Kör hela benchmark-sviten offline
+
+    Args:
+        iterations: Antal mätningar per fall
+        warmup: Antal uppvärmningskörningar per fall
+        only: Kör bara dessa fall
+
+    Returns:
+        Dict med metadata och statistik per fall
+    """
+    from local_responder import LocalSipResponder
+
+    meta = {
+        "git_sha": _git_sha(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "iterations": iterations,
+        "warmup": warmup,
+    }
+
+    workdir = Path(tempfile.mkdtemp(prefix="sip-lab-bench-"))
+    results: Dict[str, Dict[str, float]] = {}
+    try:
+        shim_dir = create_shims(workdir / "bin")
+        with LocalSipResponder() as responder, \
+                bench_environment(shim_dir, responder.port, workdir / "cache"):
+            cases = build_cases()
+            for name, func in cases.items():
+                if only and name not in only:
+                    continue
+                logger.info(f"Benchmark: {name}")
+                results[name] = measure(func, iterations, warmup)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {"meta": meta, "results": results}
+
+
+def compare_results(baseline: Dict, current: Dict, threshold: float = 0.2,
+                    min_delta_ms: float = 1.0) -> List[str]:
+    """
+    Jämför två benchmark-körningar
+
+    Ett fall räknas som långsammare om medianen ökat mer än threshold
+    (relativt) och mer än min_delta_ms (absolut).
+
+    Returns:
+        Lista med beskrivningar av försämringar
+    """
+    regressions = []
+    for name, stats in current.get("results", {}).items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        before, after = base["median_ms"], stats["median_ms"]
+        if after - before > min_delta_ms and after > before * (1 + threshold):
+            regressions.append(f"{name}: {before:.1f}ms -> {after:.1f}ms (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def print_benchmark_results(report: Dict) -> None:
+    """Skriv ut benchmark-resultat som tabell"""
+    print("\n" + "=" * 72)
+    print("HARNESS BENCHMARK")
+    print("=" * 72)
+    print(f"{'Fall':28} {'median':>9} {'p95':>9} {'min':>9} {'stdev':>9}")
+    for name, stats in report["results"].items():
+        print(f"{name:28} {stats['median_ms']:>7.1f}ms {stats['p95_ms']:>7.1f}ms "
+              f"{stats['min_ms']:>7.1f}ms {stats['stdev_ms']:>7.1f}ms")
+    print("=" * 72)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark av test-harnessens overhead")
+    parser.add_argument("--iterations", type=int, default=20, help="Mätningar per fall")
+    parser.add_argument("--warmup", type=int, default=3, help="Uppvärmningskörningar per fall")
+    parser.add_argument("--only", action="append", help="Kör bara angivet fall (kan upprepas)")
+    parser.add_argument("--output", help="Skriv JSON-resultat till fil")
+    parser.add_argument("--compare", help="Jämför mot tidigare JSON-resultat")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Tillåten relativ försämring")
+    args = parser.parse_args(argv)
+
+    # Harnessens INFO-loggning påverkar mätningarna, visa bara varningar
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    report = run_benchmarks(args.iterations, args.warmup, args.only)
+    print_benchmark_results(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Resultat sparat i {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.threshold)
+        if regressions:
+            print("⚠️  Långsammare än baseline:")
+            for line in regressions:
+                print(f"    {line}")
+            return 1
+        print("✅ Inga försämringar mot baseline")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
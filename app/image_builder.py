@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Innehållsadresserat bygge av SIPp test-imagen
+
+Imagen byggs i två lager: en bas med SIPp kompilerat från källa
+(Dockerfile.base) och ett tunt lager med test-script (Dockerfile).
+Båda märks med en hash av sina indata, och bygget hoppas över när en
+image med samma hash redan finns. Scenarierna ingår inte i hashen
+eftersom de monteras som volym när testerna körs.
+"""
+
+import hashlib
+import logging
+import os
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT = Path(__file__).parent.parent / "sipp-tester"
+DEFAULT_IMAGE = "local/sipp-tester:latest"
+DEFAULT_BASE_IMAGE = "local/sipp-base"
+HASH_LABEL = "sip-k8s-lab.content-hash"
+BASE_DOCKERFILE = "Dockerfile.base"
+
+# Indata som påverkar test-lagret (relativt bygg-kontexten)
+IMAGE_INPUTS = ("Dockerfile", "test-scripts")
+BUILD_TIMEOUT = 300
+BASE_BUILD_TIMEOUT = 1800
+
+
+def content_hash(root: Path, inputs: Iterable[str], extra: str = "") -> str:
+    """
+    Hash av filinnehåll och relativa sökvägar under root
+
+    Args:
+        root: Bygg-kontexten
+        inputs: Filer eller kataloger relativt root (saknade hoppas över)
+        extra: Ytterligare sträng som ingår i hashen (t.ex. basens hash)
+
+    Returns:
+        Hex-hash (16 tecken)
+    """
+    digest = hashlib.sha256(extra.encode())
+    for name in sorted(inputs):
+        path = root / name
+        files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+        for file in files:
+            if not file.is_file() or "__pycache__" in file.parts:
+                continue
+            digest.update(str(file.relative_to(root)).encode() + b"\0")
+            # Körbar-biten ändrar imagens innehåll även när bytena är samma
+            digest.update(b"x" if os.access(file, os.X_OK) else b"-")
+            digest.update(file.read_bytes())
+            digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def _docker(args: List[str], timeout: float = 30) -> subprocess.CompletedProcess:
+    return subprocess.run(["docker"] + args, capture_output=True, text=True, timeout=timeout)
+
+
+class ImageBuilder:
+    """
+    Bygger local/sipp-tester bara när Dockerfile eller test-script ändrats
+
+    Args:
+        context: Bygg-kontexten (sipp-tester/)
+        image: Namn:tagg för test-imagen
+        base_image: Repository för SIPp-basen (taggas med sin hash)
+    """
+
+    def __init__(self, context: Optional[Path] = None, image: str = DEFAULT_IMAGE,
+                 base_image: str = DEFAULT_BASE_IMAGE):
+        self.context = Path(context or os.getenv("SIP_LAB_IMAGE_CONTEXT") or DEFAULT_CONTEXT)
+        self.image = image
+        self.base_image = base_image
+
+    @property
+    def has_base(self) -> bool:
+        return (self.context / BASE_DOCKERFILE).is_file()
+
+    def base_hash(self) -> str:
+        return content_hash(self.context, [BASE_DOCKERFILE])
+
+    def image_hash(self) -> str:
+        """Hash för test-lagret, inklusive basens hash"""
+        return content_hash(self.context, IMAGE_INPUTS, extra=self.base_hash() if self.has_base else "")
+
+    @property
+    def base_tag(self) -> str:
+        return f"{self.base_image}:{self.base_hash()}"
+
+    def find_image(self, content: str) -> Optional[str]:
+        """ID för en lokal image märkt med hashen, eller None"""
+        try:
+            result = _docker(["images", "-q", "--filter", f"label={HASH_LABEL}={content}"])
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        ids = result.stdout.split() if result.returncode == 0 else []
+        return ids[0] if ids else None
+
+    def _tag(self, image_id: str, tag: str) -> bool:
+        return _docker(["tag", image_id, tag]).returncode == 0
+
+    def _build(self, dockerfile: str, tags: List[str], content: str, build_args: Dict[str, str],
+               timeout: float) -> bool:
+        command = ["build", "-f", str(self.context / dockerfile), "--label", f"{HASH_LABEL}={content}"]
+        for tag in tags:
+            command += ["-t", tag]
+        for name, value in build_args.items():
+            command += ["--build-arg", f"{name}={value}"]
+        try:
+            result = _docker(command + [str(self.context)], timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.error(f"Fel vid byggning av {tags[0]}: {e}")
+            return False
+        if result.returncode != 0:
+            logger.error(f"Fel vid byggning av {tags[0]}: {result.stderr}")
+            return False
+        return True
+
+    def ensure_base(self, force: bool = False) -> bool:
+        """Bygg SIPp-basen om ingen image med samma hash finns"""
+        content = self.base_hash()
+        existing = None if force else self.find_image(content)
+        if existing:
+            logger.info(f"♻️  SIPp-basen {self.base_tag} finns redan")
+            return self._tag(existing, self.base_tag) and self._tag(existing, f"{self.base_image}:latest")
+        logger.info(f"🔨 Bygger SIPp-basen {self.base_tag} (kompilerar SIPp, tar några minuter)...")
+        return self._build(BASE_DOCKERFILE, [self.base_tag, f"{self.base_image}:latest"], content, {},
+                           BASE_BUILD_TIMEOUT)
+
+    def ensure_image(self, force: bool = False, rebuild_base: bool = False) -> Dict[str, object]:
+        """
+        Se till att test-imagen motsvarar nuvarande indata
+
+        Args:
+            force: Bygg test-lagret även om hashen redan finns
+            rebuild_base: Bygg även SIPp-basen från början
+
+        Returns:
+            Dict med success, built (om något byggdes), hash och image
+        """
+        content = self.image_hash()
+        result = {"success": False, "built": False, "hash": content, "image": self.image}
+
+        existing = None if force or rebuild_base else self.find_image(content)
+        if existing:
+            logger.info(f"♻️  {self.image} är aktuell (hash {content}), hoppar över bygget")
+            result["success"] = self._tag(existing, self.image)
+            return result
+
+        build_args = {}
+        if self.has_base:
+            if not self.ensure_base(force=rebuild_base):
+                return result
+            build_args["BASE_IMAGE"] = self.base_tag
+
+        logger.info(f"🔨 Bygger {self.image} (hash {content})...")
+        result["built"] = result["success"] = self._build("Dockerfile", [self.image], content, build_args,
+                                                          BUILD_TIMEOUT)
+        if result["built"]:
+            # Ny image ger nytt image-ID, dvs en ny miljö-snapshot
+            from env_cache import get_environment_cache
+            get_environment_cache().invalidate()
+        return result
+
+
+def scenario_volume_args(scenario_dir: Optional[Path] = None) -> List[str]:
+    """
+    docker run-argument som monterar scenarierna över dem i imagen
+
+    Katalogen tas från argumentet, SIP_LAB_SCENARIO_DIR eller
+    sipp-tester/sipp-scenarios; SIP_LAB_SCENARIO_DIR=image använder
+    scenarierna som byggts in i imagen.
+    """
+    configured = os.getenv("SIP_LAB_SCENARIO_DIR")
+    if scenario_dir is None and configured == "image":
+        return []
+    directory = Path(scenario_dir or configured or DEFAULT_CONTEXT / "sipp-scenarios").resolve()
+    if not directory.is_dir():
+        return []
+    return ["-v", f"{directory}:/app/sipp-scenarios:ro"]
+
+
+def main() -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bygg SIPp test-imagen om indata ändrats")
+    parser.add_argument("--context", type=Path, help="Bygg-kontext (standard sipp-tester/)")
+    parser.add_argument("--image", default=DEFAULT_IMAGE, help="Namn:tagg för test-imagen")
+    parser.add_argument("--force", action="store_true", help="Bygg test-lagret även om hashen finns")
+    parser.add_argument("--rebuild-base", action="store_true", help="Kompilera om SIPp-basen")
+    parser.add_argument("--hash", action="store_true", help="Skriv bara ut hashen")
+    args = parser.parse_args()
+
+    builder = ImageBuilder(args.context, args.image)
+    if args.hash:
+        print(builder.image_hash())
+        return 0
+    result = builder.ensure_image(force=args.force, rebuild_base=args.rebuild_base)
+    if not result["success"]:
+        print(f"❌ Kunde inte bygga {args.image}")
+        return 1
+    print(f"✅ {args.image} {'byggd' if result['built'] else 'aktuell'} (hash {result['hash']})")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    raise SystemExit(main())
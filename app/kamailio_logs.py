@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Kamailio Logs
+Följer loggarna från alla Kamailio-poddar samtidigt och räknar mottagna
+requests per sekund och replika, samt serverns ankomsttid per Call-ID
+"""
+
+import re
+import threading
+import time
+import logging
+import subprocess
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from samplers import Sample
+
+
+logger = logging.getLogger(__name__)
+
+# xlog-raden i k8s/configmap.yaml; metod, Call-ID, källa och Kamailios egen tid
+# finns med i den nya konfigurationen men äldre rader räknas också
+RECEIVED_LINE = re.compile(
+    r"Received SIP request"
+    r"(?: (?P<method>[A-Z]+) (?P<call_id>\S+) (?P<source>\S+))?"
+    r"(?: t=(?P<t>\d+\.\d+))?"
+)
+
+# kubectl logs --timestamps: "2025-08-04T10:00:00.123456789Z <rad>"
+KUBECTL_TIMESTAMP = re.compile(r"^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:\d\d)\s")
+
+
+@dataclass
+class LogRecord:
+    """En mottagen request enligt Kamailios logg"""
+    timestamp: float
+    pod: str
+    method: Optional[str] = None
+    call_id: Optional[str] = None
+    source: Optional[str] = None
+
+
+def parse_kubectl_timestamp(line: str) -> Optional[float]:
+    """Tidsstämpeln som kubectl logs --timestamps lägger först på raden"""
+    match = KUBECTL_TIMESTAMP.match(line)
+    if not match:
+        return None
+    from datetime import datetime, timezone
+    base, fraction, zone = match.groups()
+    moment = datetime.strptime(base, "%Y-%m-%dT%H:%M:%S")
+    if zone == "Z":
+        moment = moment.replace(tzinfo=timezone.utc)
+    else:
+        moment = datetime.fromisoformat(base + zone)
+    return moment.timestamp() + (float("0." + fraction) if fraction else 0.0)
+
+
+def parse_log_line(line: str, pod: str) -> Optional[LogRecord]:
+    """
+    Parsa en loggrad
+
+    Kamailios egen tid (t=) används om den finns, annars kubectl:s tidsstämpel.
+
+    Returns:
+        LogRecord för "Received SIP request"-rader, annars None
+    """
+    match = RECEIVED_LINE.search(line)
+    if not match:
+        return None
+    timestamp = float(match.group("t")) if match.group("t") else parse_kubectl_timestamp(line)
+    if timestamp is None:
+        timestamp = time.time()
+    return LogRecord(timestamp, pod, match.group("method"), match.group("call_id"), match.group("source"))
+
+
+class PodLogStats:
+    """Inkrementell statistik för en pods logg (en skrivare: podens lästråd)"""
+
+    def __init__(self, pod: str, max_calls: int = 500000):
+        self.pod = pod
+        self.max_calls = max_calls
+        self.received = 0
+        self.per_second: Dict[int, int] = {}
+        self.methods: Dict[str, int] = {}
+        self.arrivals: Dict[str, float] = {}
+        self.dropped_calls = 0
+        self.lines = 0
+
+    def add(self, record: LogRecord) -> None:
+        """Registrera en mottagen request"""
+        self.received += 1
+        second = int(record.timestamp)
+        self.per_second[second] = self.per_second.get(second, 0) + 1
+        if record.method:
+            self.methods[record.method] = self.methods.get(record.method, 0) + 1
+        if record.call_id and record.call_id not in self.arrivals:
+            # Första ankomsten per Call-ID; omsändningar räknas men ändrar inte tiden
+            if len(self.arrivals) < self.max_calls:
+                self.arrivals[record.call_id] = record.timestamp
+            else:
+                self.dropped_calls += 1
+
+
+class KamailioLogStreamer:
+    """
+    Följer "kubectl logs -f" för alla Kamailio-poddar parallellt
+
+    Har samma gränssnitt som samplers (start/stop/summarize/samples), så
+    den kan köras bredvid dem under run_load_test. Varje pod har en egen
+    lästråd och egen statistik, så inga lås behövs per rad.
+    """
+
+    source = "kamailio_logs"
+
+    def __init__(self, namespace: str = "kamailio", label_selector: str = "app=kamailio",
+                 pods: Optional[List[str]] = None, container: Optional[str] = None,
+                 send_time: Optional[Callable[[str], Optional[float]]] = None,
+                 max_calls: int = 500000):
+        """
+        Args:
+            namespace: Namespace för poddarna
+            label_selector: Label selector för poddarna
+            pods: Poddar att följa (hämtas med label selector om None)
+            container: Container i podden (None = podens enda)
+            send_time: Call-ID -> klientens sändtid (t.ex. SipLoadGenerator.send_time)
+            max_calls: Max antal Call-ID:n vars ankomsttid sparas per pod
+        """
+        self.namespace = namespace
+        self.label_selector = label_selector
+        self.pods = list(pods) if pods else []
+        self.container = container
+        self.send_time = send_time
+        self.max_calls = max_calls
+        self.stats: Dict[str, PodLogStats] = {}
+        self.samples: List[Sample] = []
+        self.errors = 0
+        self.started_at = 0.0
+        self._processes: Dict[str, subprocess.Popen] = {}
+        self._threads: List[threading.Thread] = []
+
+    def discover_pods(self) -> List[str]:
+        """Hämta körande poddar"""
+        from sip_test_utils import KubernetesUtils
+        _, pods = KubernetesUtils.check_pods_running(self.namespace, self.label_selector)
+        return pods
+
+    def command(self, pod: str) -> List[str]:
+        """kubectl-kommandot som följer en pods logg"""
+        container_args = ["-c", self.container] if self.container else []
+        return ["kubectl", "logs", "-f", "--timestamps", "--since=5s", pod, "-n", self.namespace] + container_args
+
+    def feed(self, pod: str, lines) -> None:
+        """Parsa rader inkrementellt för en pod (rader före start() ignoreras)"""
+        stats = self.stats.setdefault(pod, PodLogStats(pod, self.max_calls))
+        for line in lines:
+            stats.lines += 1
+            record = parse_log_line(line, pod)
+            if record is not None and record.timestamp >= self.started_at:
+                stats.add(record)
+
+    def _follow(self, pod: str, process: subprocess.Popen) -> None:
+        try:
+            self.feed(pod, process.stdout)
+        except (OSError, ValueError):
+            pass
+        if process.poll() not in (None, 0, -15):
+            self.errors += 1
+
+    def start(self) -> 'KamailioLogStreamer':
+        """Börja följa loggarna i bakgrundstrådar"""
+        if not self.pods:
+            self.pods = self.discover_pods()
+        if not self.pods:
+            logger.warning(f"Inga poddar att följa loggar för ({self.namespace}, {self.label_selector})")
+        self.started_at = time.time()
+        for pod in self.pods:
+            self.stats[pod] = PodLogStats(pod, self.max_calls)
+            try:
+                process = subprocess.Popen(self.command(pod), stdout=subprocess.PIPE,
+                                           stderr=subprocess.DEVNULL, text=True, errors="replace")
+            except OSError as e:
+                logger.warning(f"Kunde inte följa loggen för {pod}: {e}")
+                self.errors += 1
+                continue
+            self._processes[pod] = process
+            thread = threading.Thread(target=self._follow, args=(pod, process), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, settle: float = 1.0) -> 'KamailioLogStreamer':
+        """
+        Sluta följa loggarna
+
+        Args:
+            settle: Sekunder att vänta så att de sista raderna hinner komma fram
+        """
+        if self._processes:
+            time.sleep(settle)
+        for process in self._processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        for process in self._processes.values():
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self._processes.clear()
+        self._threads.clear()
+        self.samples = [Sample(float(second), pod, {"kamailio:received_per_second": float(count)})
+                        for pod, stats in self.stats.items() for second, count in sorted(stats.per_second.items())]
+        return self
+
+    def __enter__(self) -> 'KamailioLogStreamer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def rate_per_second(self) -> Dict[str, List[int]]:
+        """Mottagna requests per sekund och pod, på en gemensam tidsaxel"""
+        seconds = [second for stats in self.stats.values() for second in stats.per_second]
+        if not seconds:
+            return {pod: [] for pod in self.stats}
+        first, last = min(seconds), max(seconds)
+        return {pod: [stats.per_second.get(second, 0) for second in range(first, last + 1)]
+                for pod, stats in self.stats.items()}
+
+    def one_way_delays(self, send_time: Optional[Callable[[str], Optional[float]]] = None) -> Dict:
+        """
+        Envägsfördröjning klient → server per Call-ID
+
+        Kräver att klientens och nodernas klockor går lika (samma kärna i
+        Kind, annars NTP); negativa fördröjningar räknas som klockfel.
+
+        Returns:
+            {"matched", "clock_skew", "delay_ms": percentiler, "pods": {pod: percentiler}}
+        """
+        from metrics import LatencyHistogram
+        send_time = send_time or self.send_time
+        if send_time is None:
+            return {}
+        total = LatencyHistogram()
+        matched = skew = 0
+        pods = {}
+        for pod, stats in self.stats.items():
+            histogram = LatencyHistogram()
+            for call_id, arrival in stats.arrivals.items():
+                sent = send_time(call_id)
+                if sent is None:
+                    continue
+                delay = arrival - sent
+                if delay < 0:
+                    skew += 1
+                    continue
+                matched += 1
+                histogram.record(delay)
+                total.record(delay)
+            if histogram.count:
+                pods[pod] = histogram.summary_ms()
+        return {"matched": matched, "clock_skew": skew, "delay_ms": total.summary_ms(), "pods": pods}
+
+    def summarize(self, client_stats: Optional[Dict] = None) -> Dict:
+        """
+        Sammanfatta loggarna
+
+        Args:
+            client_stats: Lastgeneratorns statistik (för jämförelse med det som skickades)
+
+        Returns:
+            Per pod: mottagna requests, snitt- och topptakt, andel; total
+            obalans, envägsfördröjning och hints
+        """
+        rates = self.rate_per_second()
+        total = sum(stats.received for stats in self.stats.values())
+        pods = {}
+        for pod, stats in self.stats.items():
+            series = rates.get(pod, [])
+            pods[pod] = {
+                "received": stats.received,
+                "rate_avg": round(stats.received / len(series), 1) if series else 0.0,
+                "rate_peak": max(series) if series else 0,
+                "share": round(stats.received / total, 3) if total else 0.0,
+                "methods": dict(stats.methods),
+                "call_ids": len(stats.arrivals),
+            }
+
+        hints = []
+        imbalance = None
+        if total and len(pods) > 1:
+            imbalance = round(max(p["share"] for p in pods.values()) * len(pods), 2)
+            for pod, values in pods.items():
+                if values["received"] == 0:
+                    hints.append(f"{pod} fick inga requests: Servicen skickar inte trafik dit")
+            if imbalance > 1.5:
+                busiest = max(pods, key=lambda pod: pods[pod]["share"])
+                hints.append(f"Ojämn lastfördelning: {busiest} tog {pods[busiest]['share'] * 100:.0f}% "
+                             f"av {len(pods)} replikor (obalans {imbalance}x)")
+        if self.stats and not total:
+            hints.append("Inga 'Received SIP request'-rader: kontrollera xlog och debug-nivån i configmap")
+        if client_stats and total:
+            sent = client_stats.get("requests_sent", 0) + client_stats.get("retransmissions", 0)
+            missing = sent - total
+            if sent and missing > 0.01 * sent:
+                hints.append(f"{missing} av {sent} skickade requests syns inte i Kamailios logg: "
+                             "nätverksvägen (eller loggar som inte hunnit fram)")
+
+        summary = {
+            "pods": pods,
+            "total_received": total,
+            "imbalance": imbalance,
+            "per_second": rates,
+            "errors": self.errors,
+            "hints": hints,
+        }
+        delays = self.one_way_delays()
+        if delays:
+            summary["one_way_delay"] = delays
+        return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="Följ Kamailios loggar och räkna mottagna requests")
+    parser.add_argument("--namespace", default="kamailio")
+    parser.add_argument("--selector", default="app=kamailio")
+    parser.add_argument("--duration", type=float, default=10.0, help="Sekunder att följa loggarna")
+    args = parser.parse_args(argv)
+
+    streamer = KamailioLogStreamer(args.namespace, args.selector)
+    with streamer:
+        time.sleep(args.duration)
+    summary = streamer.summarize()
+    summary.pop("per_second")
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    raise SystemExit(main())
@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+"""
+Load Coordinator
+Lastgenerering från flera hosts: workers registrerar sig hos en koordinator
+över TCP, får scenario, takt och starttid, och skickar kompakta binära
+räknardeltan varje sekund som koordinatorn slår ihop medan lasten pågår
+"""
+
+import json
+import socket
+import struct
+import threading
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 5099
+
+# Ram: typ (1 byte) + längd (4 byte) + payload
+FRAME = struct.Struct("!BI")
+MSG_HELLO = 1    # worker -> koordinator, JSON {"name"}
+MSG_JOB = 2      # koordinator -> worker, JSON (scenario, takt, start_in, ...)
+MSG_STATS = 3    # worker -> koordinator, binärt delta (se encode_stats)
+MSG_RESULT = 4   # worker -> koordinator, JSON slutresultat med latens-histogram
+MSG_ERROR = 5    # worker -> koordinator, JSON {"error"}
+MAX_FRAME = 16 * 1024 * 1024
+
+# Delta: sekund, skickade, klara, timeouts, omsändningar, ströksvar,
+# latenssumma, min och max (kumulativa), antal svarskoder, antal buckets
+STATS_HEADER = struct.Struct("!IIIIIIdffHH")
+# (svarskod eller bucket-index, antal)
+STATS_PAIR = struct.Struct("!HI")
+
+
+@dataclass
+class StatsDelta:
+    """Förändringen i en workers räknare sedan föregående delta"""
+    second: int
+    sent: int = 0
+    completed: int = 0
+    timeouts: int = 0
+    retransmissions: int = 0
+    stray: int = 0
+    latency_total: float = 0.0
+    latency_min: float = 0.0
+    latency_max: float = 0.0
+    responses: Dict[int, int] = field(default_factory=dict)
+    buckets: Dict[int, int] = field(default_factory=dict)
+
+
+def encode_stats(delta: StatsDelta) -> bytes:
+    """Packa ett delta (44 byte + 6 byte per svarskod och latens-bucket som ändrats)"""
+    parts = [STATS_HEADER.pack(delta.second, delta.sent, delta.completed, delta.timeouts,
+                               delta.retransmissions, delta.stray, delta.latency_total,
+                               delta.latency_min, delta.latency_max,
+                               len(delta.responses), len(delta.buckets))]
+    parts.extend(STATS_PAIR.pack(code, count) for code, count in delta.responses.items())
+    parts.extend(STATS_PAIR.pack(index, count) for index, count in delta.buckets.items())
+    return b"".join(parts)
+
+
+def decode_stats(payload: bytes) -> StatsDelta:
+    """Packa upp ett delta från encode_stats"""
+    (second, sent, completed, timeouts, retransmissions, stray, total, low, high,
+     n_codes, n_buckets) = STATS_HEADER.unpack_from(payload)
+    offset = STATS_HEADER.size
+    pairs = [STATS_PAIR.unpack_from(payload, offset + i * STATS_PAIR.size) for i in range(n_codes + n_buckets)]
+    return StatsDelta(second, sent, completed, timeouts, retransmissions, stray, total, low, high,
+                      dict(pairs[:n_codes]), dict(pairs[n_codes:]))
+
+
+def send_frame(sock: socket.socket, kind: int, payload: bytes) -> None:
+    sock.sendall(FRAME.pack(kind, len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("anslutningen stängdes")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock: socket.socket) -> Tuple[int, bytes]:
+    """Läs en ram; ConnectionError om motparten stänger"""
+    kind, length = FRAME.unpack(_recv_exact(sock, FRAME.size))
+    if length > MAX_FRAME:
+        raise ConnectionError(f"för stor ram ({length} byte)")
+    return kind, _recv_exact(sock, length)
+
+
+def send_json(sock: socket.socket, kind: int, message: Dict) -> None:
+    send_frame(sock, kind, json.dumps(message, separators=(",", ":")).encode())
+
+
+class DeltaTracker:
+    """Räknar ut deltan mellan två ögonblicksbilder av en LoadMetrics"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self._counters = (0, 0, 0, 0, 0)
+        self._total = 0.0
+        self._responses = [0] * len(metrics.responses)
+        self._buckets = [0] * len(metrics.latency.counts)
+
+    def delta(self, second: int) -> StatsDelta:
+        from metrics import RESPONSE_CODE_BASE
+        metrics = self.metrics
+        latency = metrics.latency
+        counters = (metrics.requests_sent, metrics.completed, metrics.timeouts,
+                    metrics.retransmissions, metrics.stray_responses)
+        responses = list(metrics.responses)
+        buckets = list(latency.counts)
+        total = latency.total
+        delta = StatsDelta(
+            second,
+            *(now - before for now, before in zip(counters, self._counters)),
+            latency_total=total - self._total,
+            latency_min=latency.min if latency.count else 0.0,
+            latency_max=latency.max,
+            responses={RESPONSE_CODE_BASE + i: now - before
+                       for i, (now, before) in enumerate(zip(responses, self._responses)) if now != before},
+            buckets={i: now - before for i, (now, before) in enumerate(zip(buckets, self._buckets)) if now != before},
+        )
+        self._counters, self._total, self._responses, self._buckets = counters, total, responses, buckets
+        return delta
+
+
+class LoadWorker:
+    """
+    Worker på en lasthost: registrerar sig hos koordinatorn och kör jobben den får
+
+    Args:
+        coordinator: Koordinatorns "host:port"
+        name: Namn i koordinatorns rapport (standard hostnamnet)
+        interval: Sekunder mellan räknardeltan
+    """
+
+    def __init__(self, coordinator: str, name: Optional[str] = None, interval: float = 1.0):
+        host, _, port = coordinator.rpartition(":")
+        self.address = (host or "127.0.0.1", int(port or DEFAULT_PORT))
+        self.name = name or socket.gethostname()
+        self.interval = interval
+        self.jobs = 0
+        self._sock: Optional[socket.socket] = None
+
+    def run(self) -> int:
+        """Anslut och kör jobb tills koordinatorn stänger; returnerar antal jobb"""
+        self._sock = socket.create_connection(self.address, timeout=10)
+        self._sock.settimeout(None)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            send_json(self._sock, MSG_HELLO, {"name": self.name})
+            while True:
+                try:
+                    kind, payload = recv_frame(self._sock)
+                except (ConnectionError, OSError):
+                    break
+                if kind == MSG_JOB:
+                    self._run_job(json.loads(payload))
+                    self.jobs += 1
+        finally:
+            self._sock.close()
+        return self.jobs
+
+    def serve(self, retry: float = 2.0) -> None:
+        """Kör run() om och om igen, med ny anslutning när koordinatorn startas om"""
+        while True:
+            try:
+                self.run()
+            except OSError as e:
+                logger.debug(f"Ingen koordinator på {self.address[0]}:{self.address[1]}: {e}")
+            time.sleep(retry)
+
+    def _run_job(self, job: Dict) -> None:
+        from sip_load import SipLoadGenerator
+
+        shard = job["shard"]
+        received = time.monotonic()
+        try:
+            generator = SipLoadGenerator(job["host"], job["port"], job["scenario"], job["rate"], job["duration"],
+                                         max_requests=job.get("max_requests"), t1=job.get("t1", 0.5),
+                                         register_metrics=False, arrival=job.get("arrival", "constant"),
+                                         seed=job.get("seed"), burst_on=job.get("burst_on", 1.0),
+                                         burst_off=job.get("burst_off", 1.0))
+        except ValueError as e:
+            send_json(self._sock, MSG_ERROR, {"shard": shard, "error": str(e)})
+            return
+
+        # Starttiden är relativ mottagandet, så workernas klockor behöver inte vara synkade
+        delay = received + job.get("start_in", 0.0) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        logger.info(f"🚀 Worker {self.name}: {job['rate']:g}/s {job['scenario']} mot {job['host']}:{job['port']}")
+
+        tracker = DeltaTracker(generator.metrics)
+        outcome: Dict = {}
+        runner = threading.Thread(target=lambda: outcome.update(generator.run()), daemon=True)
+        runner.start()
+        second = 0
+        while runner.is_alive():
+            runner.join(self.interval)
+            second += 1
+            send_frame(self._sock, MSG_STATS, encode_stats(tracker.delta(second)))
+        send_json(self._sock, MSG_RESULT, {"shard": shard, "name": self.name, "stats": outcome,
+                                           "latency": generator.metrics.latency.to_dict()})
+
+
+class _Connection:
+    """En registrerad worker hos koordinatorn"""
+
+    def __init__(self, sock: socket.socket, name: str, address: Tuple[str, int]):
+        self.sock = sock
+        self.name = name
+        self.address = address
+
+
+class LoadCoordinator:
+    """
+    Fördelar en lastkörning på registrerade workers och slår ihop deras statistik
+
+    Deltan från alla workers summeras i metrics (LoadMetrics) medan lasten
+    pågår, så /metrics och samplers ser den totala lasten live; varje
+    workers slutresultat med latens-histogram slås ihop när den är klar.
+    Har samma gränssnitt som samplers (samples/summarize) för resultatdatabasen.
+    """
+
+    source = "coordinator"
+
+    def __init__(self, host: str = "0.0.0.0", port: int = DEFAULT_PORT):
+        from metrics import LoadMetrics
+
+        self.host = host
+        self.port = port
+        self.metrics = LoadMetrics({"mode": "coordinated"})
+        self.samples = []
+        self.results: Dict[int, Dict] = {}
+        self.errors: List[str] = []
+        self.per_second: Dict[int, Dict[str, int]] = {}
+        self.workers: List[_Connection] = []
+        self._assigned: List[_Connection] = []
+        self._server: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+        self._registered = threading.Condition(self._lock)
+        self._closing = threading.Event()
+        self._job_started = 0.0
+        self._rate = 0.0
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def start(self) -> 'LoadCoordinator':
+        """Börja ta emot workers"""
+        self._server = socket.create_server((self.host, self.port), reuse_port=False)
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        logger.info(f"📡 Koordinator lyssnar på {self.address}")
+        return self
+
+    def _accept_loop(self) -> None:
+        while not self._closing.is_set():
+            try:
+                sock, address = self._server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._register, args=(sock, address), daemon=True).start()
+
+    def _register(self, sock: socket.socket, address: Tuple[str, int]) -> None:
+        try:
+            sock.settimeout(10)
+            kind, payload = recv_frame(sock)
+            if kind != MSG_HELLO:
+                raise ConnectionError(f"väntade HELLO, fick {kind}")
+            name = json.loads(payload).get("name") or address[0]
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ogiltig worker från {address[0]}: {e}")
+            sock.close()
+            return
+        with self._registered:
+            self.workers.append(_Connection(sock, name, address))
+            self._registered.notify_all()
+        logger.info(f"➕ Worker {name} ({address[0]}) registrerad, {len(self.workers)} totalt")
+
+    def wait_for_workers(self, count: int, timeout: float = 60.0) -> int:
+        """Vänta tills count workers registrerats; returnerar antalet"""
+        deadline = time.monotonic() + timeout
+        with self._registered:
+            while len(self.workers) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._registered.wait(remaining)
+            return len(self.workers)
+
+    def run(self, scenario: str, rate: float, duration: float, host: str, port: int = 5060,
+            start_in: float = 1.0, timeout: Optional[float] = None, **worker_options) -> Dict:
+        """
+        Kör lasten på alla registrerade workers och slå ihop resultatet
+
+        Args:
+            scenario: Scenario (options, register, invite, ping)
+            rate: Total takt, delas lika mellan workers
+            duration: Sekunder som lasten körs
+            host: Kamailio sett från workers
+            port: Kamailio-port
+            start_in: Sekunder från jobbet till gemensam start
+            timeout: Max sekunder att vänta på resultaten
+            **worker_options: Vidare till workers (t1, max_requests, arrival, seed, burst_on, burst_off)
+
+        Returns:
+            Sammanslagen statistik (se distributed_load.merge_shard_results)
+        """
+        from distributed_load import merge_shard_results, shard_requests
+
+        with self._lock:
+            assigned = list(self.workers)
+        if not assigned:
+            raise RuntimeError("Inga workers registrerade hos koordinatorn")
+        from metrics import LoadMetrics
+        count = len(assigned)
+        self._assigned = assigned
+        self.metrics = LoadMetrics({"mode": "coordinated"})
+        self.samples, self.results, self.errors, self.per_second = [], {}, [], {}
+        self._rate = float(rate)
+        self.metrics.labels.update({"scenario": scenario, "target": f"{host}:{port}"})
+        self.metrics.target_rate = float(rate)
+        logger.info(f"🚀 Koordinerad last: {rate:g}/s {scenario} mot {host}:{port} från {count} workers")
+
+        readers = []
+        for shard, worker in enumerate(assigned):
+            job = {"shard": shard, "workers": count, "scenario": scenario, "rate": rate / count,
+                   "duration": duration, "host": host, "port": int(port), "start_in": start_in,
+                   "max_requests": shard_requests(worker_options.get("max_requests"), count, shard),
+                   "t1": worker_options.get("t1", 0.5), "arrival": worker_options.get("arrival", "constant"),
+                   "burst_on": worker_options.get("burst_on", 1.0), "burst_off": worker_options.get("burst_off", 1.0),
+                   # Eget frö per worker så att deras Poisson-strömmar blir oberoende
+                   "seed": None if worker_options.get("seed") is None else worker_options["seed"] + shard}
+            try:
+                send_json(worker.sock, MSG_JOB, job)
+            except OSError as e:
+                self.errors.append(f"{worker.name}: {e}")
+                continue
+            reader = threading.Thread(target=self._read_worker, args=(shard, worker), daemon=True)
+            reader.start()
+            readers.append(reader)
+        self._job_started = time.time() + start_in
+
+        if timeout is None:
+            timeout = start_in + duration + 64 * worker_options.get("t1", 0.5) + 30
+        deadline = time.monotonic() + timeout
+        for reader in readers:
+            reader.join(max(0.0, deadline - time.monotonic()))
+        if any(reader.is_alive() for reader in readers):
+            self.errors.append(f"workers blev inte klara inom {timeout:.0f}s")
+        self.metrics.target_rate = 0.0
+
+        statistics = merge_shard_results(self.results)
+        statistics["target_rate"] = float(rate)
+        return statistics
+
+    def _read_worker(self, shard: int, worker: _Connection) -> None:
+        while True:
+            try:
+                kind, payload = recv_frame(worker.sock)
+            except (ConnectionError, OSError) as e:
+                self.errors.append(f"{worker.name}: {e}")
+                with self._lock:
+                    if worker in self.workers:
+                        self.workers.remove(worker)
+                return
+            if kind == MSG_STATS:
+                self._merge(shard, worker, decode_stats(payload))
+            elif kind == MSG_RESULT:
+                self.results[shard] = json.loads(payload)
+                return
+            elif kind == MSG_ERROR:
+                self.errors.append(f"{worker.name}: {json.loads(payload).get('error')}")
+                return
+
+    def _merge(self, shard: int, worker: _Connection, delta: StatsDelta) -> None:
+        """Lägg ett delta till den totala statistiken (under lås, flera läsartrådar)"""
+        from metrics import RESPONSE_CODE_BASE
+        from samplers import Sample
+
+        with self._lock:
+            metrics = self.metrics
+            metrics.requests_sent += delta.sent
+            metrics.completed += delta.completed
+            metrics.timeouts += delta.timeouts
+            metrics.retransmissions += delta.retransmissions
+            metrics.stray_responses += delta.stray
+            for code, count in delta.responses.items():
+                metrics.responses[code - RESPONSE_CODE_BASE] += count
+            latency = metrics.latency
+            for index, count in delta.buckets.items():
+                latency.counts[index] += count
+            latency.count += sum(delta.buckets.values())
+            latency.total += delta.latency_total
+            if delta.buckets:
+                latency.min = min(latency.min, delta.latency_min)
+                latency.max = max(latency.max, delta.latency_max)
+
+            second = self.per_second.setdefault(delta.second, {"workers": 0, "sent": 0, "completed": 0,
+                                                                "timeouts": 0})
+            second["workers"] += 1
+            second["sent"] += delta.sent
+            second["completed"] += delta.completed
+            second["timeouts"] += delta.timeouts
+            complete = second["workers"] == len(self._assigned)
+
+        self.samples.append(Sample(self._job_started + delta.second, worker.name, {
+            "client:sent_per_second": float(delta.sent),
+            "client:completed_per_second": float(delta.completed),
+            "client:timeouts": float(delta.timeouts),
+            "client:retransmissions": float(delta.retransmissions),
+        }))
+        if complete:
+            logger.info(f"📈 {delta.second}s: {second['sent']} skickade, {second['completed']} klara "
+                        f"från {second['workers']} workers (p99 {metrics.latency.percentile(99) * 1000:.1f}ms)")
+
+    def summarize(self, statistics: Optional[Dict] = None) -> Dict:
+        """
+        Per worker: namn, adress och uppnådd takt; total takt per sekund och hints
+
+        Returns:
+            {"workers", "shards": [...], "rate_per_second": [...], "hints": [...]}
+        """
+        count = len(self._assigned)
+        share = self._rate / count if count else 0.0
+        hints = list(self.errors)
+        shards = []
+        for shard, worker in enumerate(self._assigned):
+            result = self.results.get(shard)
+            stats = result["stats"] if result else {}
+            shards.append({
+                "shard": shard,
+                "worker": worker.name,
+                "address": worker.address[0],
+                "requests_sent": stats.get("requests_sent", 0),
+                "achieved_rate": stats.get("achieved_rate", 0.0),
+                "timeouts": stats.get("timeouts", 0),
+            })
+            if result is None:
+                hints.append(f"{worker.name} rapporterade inget resultat")
+            elif share and stats.get("achieved_rate", 0.0) < 0.95 * share:
+                hints.append(f"{worker.name} nådde {stats['achieved_rate']:g}/s av {share:g}/s: "
+                             "workern hinner inte (CPU eller nätverk på lasthosten)")
+        seconds = sorted(self.per_second)
+        return {
+            "workers": count,
+            "coordinator": self.address,
+            "shards": shards,
+            "rate_per_second": [self.per_second[second]["sent"] for second in seconds],
+            "hints": hints,
+        }
+
+    def stop(self) -> 'LoadCoordinator':
+        """Stäng workers och sluta lyssna"""
+        self._closing.set()
+        if self._server is not None:
+            self._server.close()
+        with self._lock:
+            for worker in self.workers:
+                try:
+                    worker.sock.close()
+                except OSError:
+                    pass
+            self.workers.clear()
+        return self
+
+    def __enter__(self) -> 'LoadCoordinator':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Koordinerad SIP-last från flera hosts")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    worker = sub.add_parser("worker", help="Kör på varje lasthost")
+    worker.add_argument("--coordinator", required=True, help="Koordinatorns host:port")
+    worker.add_argument("--name", help="Namn i rapporten (standard hostnamnet)")
+    worker.add_argument("--once", action="store_true", help="Avsluta när koordinatorn stänger")
+
+    run = sub.add_parser("run", help="Starta koordinatorn, vänta på workers och kör lasten")
+    run.add_argument("target", help="Kamailio host[:port] sett från workers")
+    run.add_argument("--listen", default=f"0.0.0.0:{DEFAULT_PORT}")
+    run.add_argument("--workers", type=int, default=2, help="Antal workers att vänta på")
+    run.add_argument("--scenario", default="options")
+    run.add_argument("--rate", type=float, default=1000.0)
+    run.add_argument("--duration", type=float, default=10.0)
+    run.add_argument("--wait", type=float, default=60.0, help="Sekunder att vänta på workers")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == "worker":
+        load_worker = LoadWorker(args.coordinator, args.name)
+        if args.once:
+            load_worker.run()
+        else:
+            load_worker.serve()
+        return 0
+
+    host, _, port = args.listen.rpartition(":")
+    target_host, _, target_port = args.target.partition(":")
+    with LoadCoordinator(host or "0.0.0.0", int(port)) as coordinator:
+        if coordinator.wait_for_workers(args.workers, args.wait) < args.workers:
+            print(f"❌ Bara {len(coordinator.workers)} av {args.workers} workers registrerade")
+            return 1
+        statistics = coordinator.run(args.scenario, args.rate, args.duration, target_host,
+                                     int(target_port or 5060))
+        statistics[coordinator.source] = coordinator.summarize(statistics)
+    print(json.dumps(statistics, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Local SIP Responder
+Minimal SIP-server som svarar på alla requests, för tester och benchmarks utan kluster
+"""
+
+import socket
+import ssl
+import threading
+import logging
+from typing import List, Optional, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Headers som kopieras från request till svar (RFC 3261 8.2.6.2)
+COPIED_HEADERS = ("via", "from", "to", "call-id", "cseq")
+
+
+def build_response(request: bytes, code: int = 200, reason: str = "OK") -> Optional[bytes]:
+    """
+    Bygg ett SIP-svar på en request
+
+    Args:
+        request: Rå SIP-request
+        code: Svarskod
+        reason: Reason phrase
+
+    Returns:
+        Rått SIP-svar, eller None om meddelandet inte är en request
+    """
+    try:
+        head = request.split(b"\r\n\r\n", 1)[0].decode("utf-8", errors="replace")
+    except Exception:
+        return None
+
+    lines = head.split("\r\n")
+    if not lines or lines[0].startswith("SIP/2.0"):
+        return None
+
+    headers: List[str] = []
+    for line in lines[1:]:
+        name = line.split(":", 1)[0].strip().lower()
+        if name in COPIED_HEADERS:
+            if name == "to" and ";tag=" not in line:
+                line = f"{line};tag=responder"
+            headers.append(line)
+
+    response = [f"SIP/2.0 {code} {reason}"] + headers + ["Server: sip-k8s-lab responder", "Content-Length: 0", "", ""]
+    return "\r\n".join(response).encode()
+
+
+class LocalSipResponder:
+    """SIP-responder över UDP, TCP eller TLS som körs i bakgrundstrådar"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 response_code: int = 200, reason: str = "OK", drop_every: int = 0,
+                 transport: str = "udp", tls_context: Optional[ssl.SSLContext] = None):
+        """
+        Args:
+            host: Adress att lyssna på
+            port: Port att lyssna på (0 väljer en ledig port)
+            response_code: Svarskod för alla requests
+            reason: Reason phrase
+            drop_every: Släpp var N:te request utan svar (0 = svara på allt)
+            transport: udp, tcp eller tls
+            tls_context: Serverkontext med certifikat (krävs för tls)
+        """
+        if transport == "tls" and tls_context is None:
+            raise ValueError("tls kräver tls_context med certifikat")
+        self.host = host
+        self.port = port
+        self.response_code = response_code
+        self.reason = reason
+        self.drop_every = drop_every
+        self.transport = transport
+        self.tls_context = tls_context
+        self.requests_received = 0
+        self.responses_sent = 0
+        self.connections = 0
+        self.resumed = 0
+        self.sources: Set[Tuple[str, int]] = set()
+        self._sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._streams: List[socket.socket] = []
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.host, self.port
+
+    def start(self) -> 'LocalSipResponder':
+        """Starta respondern"""
+        stream = self.transport != "udp"
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM if stream else socket.SOCK_DGRAM)
+        if stream:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.settimeout(0.2)
+        self.port = self._sock.getsockname()[1]
+        if stream:
+            self._sock.listen(128)
+        self._running.set()
+        self._thread = threading.Thread(target=self._accept if stream else self._serve, daemon=True)
+        self._thread.start()
+        logger.info(f"Lokal SIP-responder lyssnar på {self.transport}:{self.host}:{self.port}")
+        return self
+
+    def _respond(self, data: bytes, addr: Tuple[str, int]) -> Optional[bytes]:
+        """Räkna requesten och bygg svaret (None om den ska släppas)"""
+        with self._lock:
+            self.requests_received += 1
+            self.sources.add(addr)
+            if self.drop_every and self.requests_received % self.drop_every == 0:
+                return None
+        return build_response(data, self.response_code, self.reason)
+
+    def _accept(self) -> None:
+        while self._running.is_set():
+            try:
+                conn, addr = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self._serve_stream, args=(conn, addr), daemon=True).start()
+
+    def _serve_stream(self, conn: socket.socket, addr: Tuple[str, int]) -> None:
+        """En TCP/TLS-anslutning: dela upp strömmen och svara på samma anslutning"""
+        from sip_load import split_stream_messages
+
+        try:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.settimeout(5.0)
+            if self.transport == "tls":
+                conn = self.tls_context.wrap_socket(conn, server_side=True)
+            conn.settimeout(0.2)
+        except (OSError, ssl.SSLError) as e:
+            logger.debug(f"Handskakning med {addr} misslyckades: {e}")
+            conn.close()
+            return
+        with self._lock:
+            self.connections += 1
+            self.resumed += isinstance(conn, ssl.SSLSocket) and conn.session_reused
+            self._streams.append(conn)
+
+        buffer = b""
+        while self._running.is_set():
+            try:
+                data = conn.recv(65535)
+            except (socket.timeout, ssl.SSLWantReadError):
+                continue
+            except OSError:
+                break
+            if not data:
+                break
+            messages, buffer = split_stream_messages(buffer + data)
+            for message in messages:
+                response = self._respond(message, addr)
+                if response:
+                    try:
+                        conn.sendall(response)
+                    except OSError:
+                        break
+                    with self._lock:
+                        self.responses_sent += 1
+        conn.close()
+
+    def _serve(self) -> None:
+        while self._running.is_set():
+            try:
+                data, addr = self._sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            response = self._respond(data, addr)
+            if response:
+                try:
+                    self._sock.sendto(response, addr)
+                    self.responses_sent += 1
+                except OSError:
+                    pass
+
+    def stop(self) -> None:
+        """Stoppa respondern"""
+        self._running.clear()
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self._sock:
+            self._sock.close()
+        with self._lock:
+            for conn in self._streams:
+                try:
+                    conn.close()
+                except OSError:
+                    pass
+            self._streams = []
+
+    def __enter__(self) -> 'LocalSipResponder':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Lokal SIP-responder")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5060)
+    parser.add_argument("--code", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    responder = LocalSipResponder(args.host, args.port, args.code).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        responder.stop()
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Load Metrics
+Räknare, gauges och latens-histogram för lastkörningar, exponerade som
+Prometheus-text på en lokal HTTP /metrics-endpoint
+"""
+
+import math
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Prometheus-buckets för latens i sekunder
+PROMETHEUS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                      0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Index i LoadMetrics.responses är svarskod - RESPONSE_CODE_BASE
+RESPONSE_CODE_BASE = 100
+RESPONSE_CODE_COUNT = 600
+
+
+class LatencyHistogram:
+    """
+    Logaritmiskt latens-histogram med fast minnesåtgång
+
+    Varje bucket är growth gånger bredare än föregående, så percentiler har
+    ett relativt fel på högst (growth - 1) oavsett hur många värden som
+    registrerats. Histogrammet har en enda skrivande tråd och tar inga lås;
+    läsare tar en kopia av bucket-listan.
+    """
+
+    def __init__(self, min_value: float = 1e-5, max_value: float = 120.0, growth: float = 1.05):
+        """
+        Args:
+            min_value: Minsta upplösta värde i sekunder (lägre hamnar i första bucketen)
+            max_value: Största upplösta värde i sekunder (högre hamnar i sista bucketen)
+            growth: Kvot mellan två intilliggande bucket-gränser
+        """
+        self.min_value = min_value
+        self.max_value = max_value
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self._buckets = int(math.ceil(math.log(max_value / min_value) / self._log_growth)) + 1
+        self.counts: List[int] = [0] * (self._buckets + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return min(self._buckets, 1 + int(math.log(value / self.min_value) / self._log_growth))
+
+    def upper_bound(self, index: int) -> float:
+        """Övre gräns (sekunder) för en bucket"""
+        if index >= self._buckets:
+            return math.inf
+        return self.min_value * self.growth ** index
+
+    def record(self, value: float) -> None:
+        """Registrera ett värde i sekunder"""
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        """Lägg till värdena från ett annat histogram med samma bucket-layout"""
+        if len(other.counts) != len(self.counts):
+            raise ValueError("Histogrammen har olika bucket-layout")
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def copy(self) -> 'LatencyHistogram':
+        """Ögonblicksbild av histogrammet (för att räkna skillnaden mot senare)"""
+        histogram = LatencyHistogram(self.min_value, self.max_value, self.growth)
+        histogram.counts = list(self.counts)
+        histogram.count = sum(histogram.counts)
+        histogram.total = self.total
+        histogram.min = self.min
+        histogram.max = self.max
+        return histogram
+
+    def difference(self, earlier: 'LatencyHistogram') -> 'LatencyHistogram':
+        """
+        Värdena som registrerats sedan earlier (en copy() av samma histogram)
+
+        Min och max för intervallet är inte kända; de sätts till gränserna
+        för första och sista bucketen med värden (inom totalens min/max).
+        """
+        histogram = LatencyHistogram(self.min_value, self.max_value, self.growth)
+        histogram.counts = [now - before for now, before in zip(list(self.counts), earlier.counts)]
+        histogram.count = sum(histogram.counts)
+        histogram.total = self.total - earlier.total
+        used = [index for index, count in enumerate(histogram.counts) if count]
+        if used:
+            lower = self.upper_bound(used[0] - 1) if used[0] > 0 else self.min
+            histogram.min = max(lower, self.min)
+            histogram.max = min(self.upper_bound(used[-1]), self.max)
+        return histogram
+
+    def percentile(self, q: float) -> float:
+        """
+        Percentil i sekunder
+
+        Args:
+            q: Percentil mellan 0 och 100
+
+        Returns:
+            Övre gränsen för bucketen där percentilen ligger (begränsad till
+            uppmätt min/max), eller 0.0 om histogrammet är tomt
+        """
+        counts = list(self.counts)
+        total = sum(counts)
+        if total == 0:
+            return 0.0
+        rank = max(1, math.ceil(q / 100.0 * total))
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return min(max(self.upper_bound(index), self.min), self.max)
+        return self.max
+
+    def cumulative(self, bounds: Iterable[float]) -> Tuple[List[int], int]:
+        """
+        Kumulativa antal per gräns, för Prometheus-buckets
+
+        En fin bucket räknas till en gräns om hela bucketen ligger under den,
+        så felet per gräns är högst en fin bucket (growth - 1 relativt).
+
+        Returns:
+            (antal per gräns, totalt antal)
+        """
+        counts = list(self.counts)
+        result = []
+        index = 0
+        seen = 0
+        for bound in bounds:
+            while index < len(counts) and self.upper_bound(index) <= bound * (1 + 1e-9):
+                seen += counts[index]
+                index += 1
+            result.append(seen)
+        return result, sum(counts)
+
+    def summary_ms(self) -> Dict[str, float]:
+        """Min, medel, percentiler och max i millisekunder"""
+        if self.count == 0:
+            return {}
+        return {
+            "min": round(self.min * 1000, 3),
+            "mean": round(self.total / self.count * 1000, 3),
+            "p50": round(self.percentile(50) * 1000, 3),
+            "p90": round(self.percentile(90) * 1000, 3),
+            "p95": round(self.percentile(95) * 1000, 3),
+            "p99": round(self.percentile(99) * 1000, 3),
+            "p999": round(self.percentile(99.9) * 1000, 3),
+            "max": round(self.max * 1000, 3),
+        }
+
+    def to_dict(self) -> Dict:
+        """Glesa bucket-antal för JSON (endast buckets med värden)"""
+        return {
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            "growth": self.growth,
+            "buckets": {str(i): c for i, c in enumerate(self.counts) if c},
+            "count": self.count,
+            "total": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LatencyHistogram':
+        """Återskapa ett histogram från to_dict()"""
+        histogram = cls(data["min_value"], data["max_value"], data["growth"])
+        for index, count in data.get("buckets", {}).items():
+            histogram.counts[int(index)] = count
+        histogram.count = data.get("count", 0)
+        histogram.total = data.get("total", 0.0)
+        histogram.min = data["min"] if data.get("min") is not None else math.inf
+        histogram.max = data.get("max", 0.0)
+        return histogram
+
+
+class LoadMetrics:
+    """
+    Mätvärden för en lastkörning
+
+    Varje fält har exakt en skrivande tråd (sändaren eller mottagaren), så
+    uppdateringar på hot path görs utan lås. Scrape-tråden läser bara.
+    """
+
+    def __init__(self, labels: Optional[Dict[str, str]] = None):
+        self.labels: Dict[str, str] = dict(labels or {})
+        # Skrivs av sändartråden
+        self.requests_sent = 0
+        self.retransmissions = 0
+        self.timeouts = 0
+        self.target_rate = 0.0
+        self.schedule_lag = LatencyHistogram()
+        # Skrivs av mottagartråden
+        self.responses: List[int] = [0] * RESPONSE_CODE_COUNT
+        self.completed = 0
+        self.stray_responses = 0
+        # Från planerad sändtid (med köande hos generatorn) respektive från faktisk sändning
+        self.latency = LatencyHistogram()
+        self.service_latency = LatencyHistogram()
+
+    def record_response(self, code: int) -> None:
+        """Räkna ett svar per kod (anropas av mottagartråden)"""
+        if RESPONSE_CODE_BASE <= code < RESPONSE_CODE_BASE + RESPONSE_CODE_COUNT:
+            self.responses[code - RESPONSE_CODE_BASE] += 1
+
+    @property
+    def inflight(self) -> int:
+        """Transaktioner som väntar på slutgiltigt svar"""
+        return max(0, self.requests_sent - self.completed - self.timeouts)
+
+    def responses_by_code(self) -> Dict[int, int]:
+        """Antal svar per svarskod"""
+        return {RESPONSE_CODE_BASE + i: c for i, c in enumerate(list(self.responses)) if c}
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def render_prometheus(metrics_list: List[LoadMetrics]) -> str:
+    """
+    Rendera mätvärden i Prometheus text-format (version 0.0.4)
+
+    Args:
+        metrics_list: Mätvärden för en eller flera lastkörningar
+
+    Returns:
+        Text för en /metrics-response
+    """
+    lines: List[str] = []
+
+    def family(name: str, kind: str, help_text: str) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    simple = (
+        ("sip_load_requests_sent_total", "counter", "Skickade SIP-requests (nya transaktioner)",
+         lambda m: m.requests_sent),
+        ("sip_load_retransmissions_total", "counter", "Omsändningar enligt Timer A/E",
+         lambda m: m.retransmissions),
+        ("sip_load_timeouts_total", "counter", "Transaktioner utan slutgiltigt svar (Timer B/F)",
+         lambda m: m.timeouts),
+        ("sip_load_stray_responses_total", "counter", "Svar som inte matchade någon öppen transaktion",
+         lambda m: m.stray_responses),
+        ("sip_load_inflight_transactions", "gauge", "Transaktioner som väntar på slutgiltigt svar",
+         lambda m: m.inflight),
+        ("sip_load_target_rate", "gauge", "Aktuell mål-takt i requests per sekund",
+         lambda m: m.target_rate),
+    )
+    for name, kind, help_text, getter in simple:
+        family(name, kind, help_text)
+        for metrics in metrics_list:
+            lines.append(f"{name}{_format_labels(metrics.labels)} {_format_value(getter(metrics))}")
+
+    family("sip_load_responses_total", "counter", "Mottagna SIP-svar per svarskod")
+    for metrics in metrics_list:
+        for code, count in sorted(metrics.responses_by_code().items()):
+            labels = dict(metrics.labels, code=str(code))
+            lines.append(f"sip_load_responses_total{_format_labels(labels)} {count}")
+
+    family("sip_load_latency_seconds", "histogram", "Tid från planerad sändning till slutgiltigt svar")
+    for metrics in metrics_list:
+        cumulative, total = metrics.latency.cumulative(PROMETHEUS_BUCKETS)
+        for bound, count in zip(PROMETHEUS_BUCKETS, cumulative):
+            labels = dict(metrics.labels, le=_format_value(float(bound)))
+            lines.append(f"sip_load_latency_seconds_bucket{_format_labels(labels)} {count}")
+        labels = dict(metrics.labels, le="+Inf")
+        lines.append(f"sip_load_latency_seconds_bucket{_format_labels(labels)} {total}")
+        lines.append(f"sip_load_latency_seconds_sum{_format_labels(metrics.labels)} "
+                     f"{repr(float(metrics.latency.total))}")
+        lines.append(f"sip_load_latency_seconds_count{_format_labels(metrics.labels)} {total}")
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsRegistry:
+    """Senaste mätvärden per lastkörning (en serie per unik label-uppsättning)"""
+
+    def __init__(self):
+        self._metrics: Dict[Tuple[Tuple[str, str], ...], LoadMetrics] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metrics: LoadMetrics) -> LoadMetrics:
+        """Registrera mätvärden; ersätter tidigare körning med samma labels"""
+        key = tuple(sorted(metrics.labels.items()))
+        with self._lock:
+            self._metrics[key] = metrics
+        return metrics
+
+    def unregister(self, metrics: LoadMetrics) -> None:
+        key = tuple(sorted(metrics.labels.items()))
+        with self._lock:
+            if self._metrics.get(key) is metrics:
+                del self._metrics[key]
+
+    def collect(self) -> List[LoadMetrics]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self) -> str:
+        return render_prometheus(self.collect())
+
+
+class MetricsServer:
+    """HTTP-server i en bakgrundstråd som svarar på GET /metrics"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "0.0.0.0", port: int = 9464):
+        """
+        Args:
+            registry: Registret som renderas vid varje scrape
+            host: Adress att lyssna på
+            port: Port att lyssna på (0 väljer en ledig port)
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host = "127.0.0.1" if self.host in ("0.0.0.0", "") else self.host
+        return f"http://{host}:{self.port}/metrics"
+
+    def start(self) -> 'MetricsServer':
+        """Starta servern"""
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"metrics: {format % args}")
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"📈 Prometheus-metrics på {self.url}")
+        return self
+
+    def stop(self) -> None:
+        """Stoppa servern"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def __enter__(self) -> 'MetricsServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+_registry = MetricsRegistry()
+_server: Optional[MetricsServer] = None
+_server_lock = threading.Lock()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Hämta det processgemensamma registret"""
+    return _registry
+
+
+def start_metrics_server(port: int = 9464, host: str = "0.0.0.0") -> MetricsServer:
+    """
+    Starta den processgemensamma /metrics-servern (en gång per process)
+
+    Args:
+        port: Port att lyssna på
+        host: Adress att lyssna på
+
+    Returns:
+        Den körande servern
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = MetricsServer(_registry, host, port).start()
+        elif port and _server.port != port:
+            logger.warning(f"Metrics-servern kör redan på port {_server.port}, ignorerar port {port}")
+        return _server
+
+
+def stop_metrics_server() -> None:
+    """Stoppa den processgemensamma /metrics-servern"""
+    global _server
+    with _server_lock:
+        if _server:
+            _server.stop()
+            _server = None
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Nätverksvägar till Kamailio: pod-IP, ClusterIP, NodePort och MetalLB
+
+Samma last körs mot Kamailio via varje väg som går att nå, och varje väg
+jämförs med direkt pod-IP: tillagd latens (p50/p99), jitter och högsta
+takt inom latens- och felgränsen. Skillnaden visar vad kube-proxy (NAT
+för ClusterIP och NodePort) och MetalLB (L2-annonsering plus NodePort-
+vägen) kostar per transaktion.
+
+Pod-IP och ClusterIP nås normalt bara inifrån klustret eller från en
+nod (se felsökningar/2025-08-04); med in_cluster körs lasten från en
+pod i klustret (distributed_load) och alla fyra vägarna kan mätas.
+"""
+
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PATHS = ("pod_ip", "cluster_ip", "node_port", "metallb")
+PATH_LABELS = {"pod_ip": "Pod-IP", "cluster_ip": "ClusterIP", "node_port": "NodePort", "metallb": "MetalLB"}
+DEFAULT_SERVICE = "kamailio-loadbalancer"
+# Kind-labbets NodePort om Servicen inte anger någon för UDP
+DEFAULT_NODE_PORT = 30600
+
+
+def discover_paths(namespace: str = "kamailio", service: str = DEFAULT_SERVICE, port: int = 5060,
+                   node: Optional[str] = None,
+                   label_selector: str = "app=kamailio") -> Tuple[Dict[str, str], List[str]]:
+    """
+    Slå upp adressen för varje väg via kubectl
+
+    Args:
+        namespace: Kamailios namespace
+        service: Servicen för ClusterIP, NodePort och MetalLB
+        port: Servicens och poddens SIP-port
+        node: Nodens IP för NodePort (standard noden som kör första podden)
+        label_selector: Label selector för Kamailio-poddarna
+
+    Returns:
+        ({väg: "ip:port"}, anteckningar om vägar som saknas)
+    """
+    from sip_test_utils import KubernetesUtils
+
+    paths: Dict[str, str] = {}
+    notes: List[str] = []
+    pods = KubernetesUtils.get_pod_addresses(namespace, label_selector)
+    if pods:
+        paths["pod_ip"] = f"{pods[0]['pod_ip']}:{port}"
+        if len(pods) > 1:
+            notes.append(f"Pod-IP går bara till {pods[0]['name']} (1 av {len(pods)} replikor) - "
+                         "jämför med samma antal replikor bakom Servicen")
+    else:
+        notes.append(f"Inga körande pods med {label_selector} i {namespace}")
+
+    addresses = KubernetesUtils.get_service_addresses(service, namespace, port)
+    if addresses["cluster_ip"]:
+        paths["cluster_ip"] = f"{addresses['cluster_ip']}:{port}"
+    node = node or (pods[0]["host_ip"] if pods else None)
+    if node:
+        paths["node_port"] = f"{node}:{addresses['node_port'] or DEFAULT_NODE_PORT}"
+    else:
+        notes.append("Ingen nod-IP för NodePort (ange --node)")
+    if addresses["load_balancer_ip"]:
+        paths["metallb"] = f"{addresses['load_balancer_ip']}:{port}"
+    else:
+        notes.append(f"{service} har ingen LoadBalancer-IP - är MetalLB installerat?")
+    return paths, notes
+
+
+def probe_path(target: str, requests: int = 5, timeout: float = 1.0) -> bool:
+    """Skicka några OPTIONS mot vägen och se om något svar kommer tillbaka"""
+    from sip_load import SipLoadGenerator
+    from sip_test_utils import parse_kamailio_address
+
+    host, port = parse_kamailio_address(target, 5060)
+    try:
+        statistics = SipLoadGenerator(host, int(port), "options", rate=requests * 10, duration=1.0,
+                                      max_requests=requests, transaction_timeout=timeout,
+                                      register_metrics=False).run()
+    except OSError as e:
+        logger.debug(f"Kunde inte nå {target}: {e}")
+        return False
+    return statistics["successful"] > 0
+
+
+def path_entry(statistics: Dict, capacity: Optional[Dict] = None) -> Dict:
+    """Nyckeltal för lasten (och kapacitetssökningen) över en väg"""
+    from capacity_search import completed_rate
+
+    latency = statistics.get("latency_ms", {})
+    return {
+        "cps": completed_rate(statistics),
+        "p50_ms": latency.get("p50"),
+        "p99_ms": latency.get("p99"),
+        "jitter_ms": statistics.get("jitter_ms"),
+        "timeouts": statistics.get("timeouts", 0),
+        "capacity_cps": capacity.get("capacity_cps") if capacity else None,
+        "capacity_limit": capacity.get("limit") if capacity else None,
+    }
+
+
+def compare_to_baseline(entries: Dict[str, Dict], baseline: str = "pod_ip") -> Dict[str, Dict]:
+    """
+    Skillnad mot baslinjevägen
+
+    Returns:
+        {väg: {added_p50_ms, added_p99_ms, added_jitter_ms, capacity_ratio}}
+    """
+    def delta(entry: Dict, reference: Dict, key: str, digits: int = 3) -> Optional[float]:
+        if entry.get(key) is None or reference.get(key) is None:
+            return None
+        return round(entry[key] - reference[key], digits)
+
+    reference = entries.get(baseline)
+    if not reference or "error" in reference:
+        return {}
+    relative = {}
+    for path, entry in entries.items():
+        if path == baseline or "error" in entry:
+            continue
+        capacity, base_capacity = entry.get("capacity_cps"), reference.get("capacity_cps")
+        relative[path] = {
+            "added_p50_ms": delta(entry, reference, "p50_ms"),
+            "added_p99_ms": delta(entry, reference, "p99_ms"),
+            "added_jitter_ms": delta(entry, reference, "jitter_ms"),
+            "capacity_ratio": round(capacity / base_capacity, 3) if capacity and base_capacity else None,
+        }
+    return relative
+
+
+class NetworkPathBenchmark:
+    """
+    Kör samma last mot Kamailio via pod-IP, ClusterIP, NodePort och MetalLB
+
+    Args:
+        tester: SippTester som kör lastkörningarna
+        paths: {väg: "ip:port"} i stället för att slå upp adresserna med kubectl
+        scenario: Scenario för lasten
+        rate: Takt för latensmätningen (under kapaciteten så att kön inte dominerar)
+        duration: Sekunder per latensmätning
+        capacity: Sök även högsta takt per väg
+        in_cluster: Kör lasten från en pod i klustret (distributed_load) i stället för hosten
+        namespace: Kamailios namespace
+        service: Servicen för ClusterIP, NodePort och MetalLB
+        node: Nodens IP för NodePort
+        start_rate: Kapacitetssökningens första takt
+        max_rate: Kapacitetssökningens högsta takt
+        step_duration: Sekunder per steg i kapacitetssökningen
+        p99_ms: Högsta tillåtna p99 i kapacitetssökningen
+        **load_options: Vidare till run_load_test respektive run_distributed_load_test
+    """
+
+    def __init__(self, tester, paths: Optional[Dict[str, str]] = None, scenario: str = "options",
+                 rate: float = 200.0, duration: float = 10.0, capacity: bool = True, in_cluster: bool = False,
+                 namespace: str = "kamailio", service: str = DEFAULT_SERVICE, node: Optional[str] = None,
+                 start_rate: float = 100.0, max_rate: float = 20000.0, step_duration: float = 5.0,
+                 p99_ms: float = 100.0, **load_options):
+        unknown = [path for path in paths or {} if path not in PATHS]
+        if unknown:
+            raise ValueError(f"Okänd väg: {', '.join(unknown)} (välj bland {', '.join(PATHS)})")
+        self.tester = tester
+        self.paths = {path: paths[path] for path in PATHS if path in paths} if paths else None
+        self.scenario = scenario
+        self.rate = rate
+        self.duration = duration
+        self.capacity = capacity
+        self.in_cluster = in_cluster
+        self.namespace = namespace
+        self.service = service
+        self.node = node
+        self.search_options = {"start_rate": start_rate, "max_rate": max_rate, "p99_ms": p99_ms}
+        self.step_duration = step_duration
+        self.load_options = load_options
+        self.results: Dict[str, Dict] = {}
+        self.notes: List[str] = []
+
+    def _load(self, target: str, rate: float, duration: float) -> Dict:
+        """En lastkörning mot target; statistiken (tom om körningen inte kom igång)"""
+        if self.in_cluster:
+            result = self.tester.run_distributed_load_test(self.scenario, rate, duration, workers=1,
+                                                           namespace=self.namespace, target=target,
+                                                           **self.load_options)
+        else:
+            result = self.tester.run_load_test(self.scenario, rate, duration, host=target, **self.load_options)
+        return result.statistics
+
+    def _measure(self, path: str, target: str) -> Dict:
+        statistics = self._load(target, self.rate, self.duration)
+        if not statistics.get("successful"):
+            return {"error": "inga svar"}
+        capacity = None
+        if self.capacity:
+            from capacity_search import CapacitySearch
+
+            logger.info(f"🔎 Söker kapaciteten via {PATH_LABELS[path]} ({target})")
+            capacity = CapacitySearch(lambda rate: self._load(target, rate, self.step_duration),
+                                      **self.search_options).search()
+        return path_entry(statistics, capacity)
+
+    def run(self) -> Dict:
+        """
+        Mät varje väg som svarar
+
+        Returns:
+            Se summarize()
+        """
+        if self.paths is None:
+            self.paths, self.notes = discover_paths(self.namespace, self.service, node=self.node)
+        for path, target in self.paths.items():
+            # Inifrån klustret syns en väg som inte går att nå som en körning utan svar
+            if not self.in_cluster and not probe_path(target):
+                logger.warning(f"⚠️ {PATH_LABELS[path]} ({target}) svarar inte härifrån")
+                self.results[path] = {"error": "nås inte"}
+                continue
+            logger.info(f"🛣️ Mäter {PATH_LABELS[path]} ({target})")
+            self.results[path] = self._measure(path, target)
+        return self.summarize()
+
+    def summarize(self) -> Dict:
+        """
+        Returns:
+            Dict med adress och nyckeltal per väg, skillnaden mot pod-IP och hints
+        """
+        hints = list(self.notes)
+        unreachable = [path for path, entry in self.results.items() if entry.get("error") == "nås inte"]
+        if unreachable and not self.in_cluster and any(p in unreachable for p in ("pod_ip", "cluster_ip")):
+            hints.append("Pod-IP och ClusterIP nås bara inifrån klustret - kör med --in-cluster "
+                         "för att mäta alla vägar från en pod")
+        baseline = "pod_ip" if "error" not in self.results.get("pod_ip", {"error": ""}) else None
+        if baseline is None and self.results:
+            hints.append("Pod-IP kunde inte mätas - ingen baslinje att jämföra vägarna mot")
+        return {
+            "paths": self.paths or {},
+            "scenario": self.scenario,
+            "rate": self.rate,
+            "duration": self.duration,
+            "in_cluster": self.in_cluster,
+            "results": self.results,
+            "relative": compare_to_baseline(self.results) if baseline else {},
+            "hints": hints,
+        }
+
+
+def format_network_paths(summary: Dict) -> str:
+    """Vägjämförelsen som text"""
+    origin = "från en pod i klustret" if summary["in_cluster"] else "från hosten"
+    lines = [f"Nätverksvägar ({summary['scenario']}, {summary['rate']:g}/s i {summary['duration']:g}s, {origin}):"]
+    for path, entry in summary["results"].items():
+        label = f"{PATH_LABELS[path]} ({summary['paths'].get(path, '-')})"
+        if "error" in entry:
+            lines.append(f"  {label:<28} - ({entry['error']})")
+            continue
+        line = f"  {label:<28} p50 {entry['p50_ms']}ms p99 {entry['p99_ms']}ms"
+        if entry["jitter_ms"] is not None:
+            line += f" jitter {entry['jitter_ms']}ms"
+        if entry["capacity_cps"] is not None:
+            line += f", max {entry['capacity_cps']:g} CPS"
+        relative = summary["relative"].get(path)
+        if relative:
+            added = [f"p50 {relative['added_p50_ms']:+g}ms" if relative["added_p50_ms"] is not None else "",
+                     f"p99 {relative['added_p99_ms']:+g}ms" if relative["added_p99_ms"] is not None else "",
+                     f"jitter {relative['added_jitter_ms']:+g}ms" if relative["added_jitter_ms"] is not None else "",
+                     f"kapacitet {relative['capacity_ratio']:g}x" if relative["capacity_ratio"] else ""]
+            line += f" ({', '.join(a for a in added if a)} mot Pod-IP)"
+        lines.append(line)
+    lines.extend(f"Vägar: {hint}" for hint in summary["hints"])
+    return "\n".join(lines)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Packet Capture
+Spelar in SIP-trafik till pcap under en SippTester-körning, hos klienten och
+(om det går) på Kind-noden och i Kamailio-poddarna, och analyserar efteråt
+"""
+
+import os
+import time
+import signal
+import subprocess
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+
+logger = logging.getLogger(__name__)
+
+# Capture-punkter i trafikens riktning
+HOP_ORDER = ("client", "node", "pod")
+
+# Fjärr-tcpdump som stoppas när stdin stängs (kubectl/docker exec skickar inga signaler vidare)
+REMOTE_TCPDUMP = "tcpdump -i any -U -s 0 -w - {filter} 2>/dev/null & read _; kill -INT $!; wait"
+
+
+def get_capture_dir() -> Path:
+    """Katalog för pcap-filer (SIP_LAB_CAPTURE_DIR eller ~/.local/share/sip-k8s-lab/captures)"""
+    configured = os.getenv("SIP_LAB_CAPTURE_DIR")
+    if configured:
+        return Path(configured)
+    return Path.home() / ".local" / "share" / "sip-k8s-lab" / "captures"
+
+
+def capture_filter(ports: Sequence[int]) -> str:
+    """tcpdump-filter för UDP-trafik på portarna"""
+    return "udp and (" + " or ".join(f"port {port}" for port in sorted(set(ports))) + ")"
+
+
+class PacketCapture:
+    """En capture-punkt: tcpdump som skriver pcap till en lokal fil"""
+
+    def __init__(self, hop: str, command: List[str], path: Path, remote: bool = False):
+        """
+        Args:
+            hop: Hop-namn (client, node eller pod)
+            command: tcpdump-kommandot (remote=True: skriver pcap till stdout)
+            path: Lokal pcap-fil
+            remote: Kommandot körs via kubectl/docker exec och stoppas via stdin
+        """
+        self.hop = hop
+        self.command = command
+        self.path = Path(path)
+        self.remote = remote
+        self.process: Optional[subprocess.Popen] = None
+        self._stdout = None
+
+    @classmethod
+    def local(cls, path: Path, ports: Sequence[int], interface: str = "any") -> 'PacketCapture':
+        """tcpdump på den här maskinen (kräver root eller CAP_NET_RAW)"""
+        return cls("client", ["tcpdump", "-i", interface, "-U", "-s", "0", "-w", str(path),
+                              capture_filter(ports)], path)
+
+    @classmethod
+    def in_pod(cls, pod: str, namespace: str, path: Path, ports: Sequence[int],
+               container: Optional[str] = None) -> 'PacketCapture':
+        """tcpdump i en pod via kubectl exec (kräver tcpdump och NET_RAW i containern)"""
+        container_args = ["-c", container] if container else []
+        return cls("pod", ["kubectl", "exec", "-i", pod, "-n", namespace] + container_args +
+                   ["--", "sh", "-c", REMOTE_TCPDUMP.format(filter=f"'{capture_filter(ports)}'")],
+                   path, remote=True)
+
+    @classmethod
+    def on_kind_node(cls, node: str, path: Path, ports: Sequence[int]) -> 'PacketCapture':
+        """tcpdump i en Kind-nods container via docker exec"""
+        return cls("node", ["docker", "exec", "-i", node, "sh", "-c",
+                            REMOTE_TCPDUMP.format(filter=f"'{capture_filter(ports)}'")],
+                   path, remote=True)
+
+    def start(self, settle: float = 1.0) -> bool:
+        """
+        Starta inspelningen
+
+        Args:
+            settle: Max sekunder att vänta på att tcpdump kommit igång
+
+        Returns:
+            True om tcpdump fortfarande kör efter uppstarten
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if self.remote:
+                self._stdout = open(self.path, "wb")
+                self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                                stdout=self._stdout, stderr=subprocess.DEVNULL)
+            else:
+                self.process = subprocess.Popen(self.command, stdout=subprocess.DEVNULL,
+                                                stderr=subprocess.DEVNULL)
+        except OSError as e:
+            logger.warning(f"Kunde inte starta capture ({self.hop}): {e}")
+            self._close()
+            return False
+
+        deadline = time.time() + settle
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                logger.warning(f"Capture ({self.hop}) avslutades direkt med kod {self.process.returncode}")
+                self._close()
+                return False
+            if self.ok:
+                return True
+            time.sleep(0.05)
+        # tcpdump skriver pcap-huvudet direkt, så ingen fil betyder att det inte kom igång
+        logger.warning(f"Capture ({self.hop}) kom inte igång: {' '.join(self.command[:3])} ...")
+        self.stop(timeout=1.0)
+        return False
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stoppa inspelningen och vänta på att pcap-filen skrivits klart"""
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            try:
+                if self.remote:
+                    self.process.stdin.close()
+                else:
+                    self.process.send_signal(signal.SIGINT)
+                self.process.wait(timeout=timeout)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        self._close()
+
+    def _close(self) -> None:
+        if self._stdout is not None:
+            self._stdout.close()
+            self._stdout = None
+
+    @property
+    def ok(self) -> bool:
+        """Finns det en pcap-fil med åtminstone ett huvud"""
+        return self.path.exists() and self.path.stat().st_size >= 24
+
+
+class CaptureSession:
+    """
+    Capture under en körning, med samma gränssnitt som samplers
+
+    start()/stop() runt körningen och summarize() analyserar pcap-filerna
+    med pcap_analyzer. Hops vars tcpdump inte gick att starta hoppas över.
+    """
+
+    source = "capture"
+
+    def __init__(self, directory: Path, captures: List[PacketCapture], timeout: float = 32.0):
+        self.directory = Path(directory)
+        self.captures = captures
+        self.timeout = timeout
+        self.samples: List = []
+        self.failed: List[str] = []
+
+    def start(self) -> None:
+        """Starta alla capture-punkter"""
+        for capture in self.captures:
+            if not capture.start():
+                self.failed.append(capture.hop)
+        logger.info(f"Spelar in SIP-trafik till {self.directory}")
+
+    def stop(self) -> None:
+        """Stoppa alla capture-punkter"""
+        for capture in self.captures:
+            capture.stop()
+
+    def hops(self) -> List[tuple]:
+        """[(hop, [pcap-filer])] i trafikens riktning för de inspelningar som lyckades"""
+        files: Dict[str, List[str]] = {}
+        for capture in self.captures:
+            if capture.ok:
+                files.setdefault(capture.hop, []).append(str(capture.path))
+        return [(hop, files[hop]) for hop in HOP_ORDER if hop in files]
+
+    def summarize(self, statistics: Optional[Dict] = None) -> Dict:
+        """
+        Analysera inspelningen
+
+        Returns:
+            Rapport från pcap_analyzer plus katalog och misslyckade hops
+        """
+        from pcap_analyzer import analyze_captures
+        hops = self.hops()
+        if not hops or hops[0][0] != "client":
+            return {"directory": str(self.directory), "failed_hops": self.failed,
+                    "hints": ["Ingen capture hos klienten (tcpdump kräver root eller CAP_NET_RAW)"]}
+        try:
+            report = analyze_captures(hops, timeout=self.timeout)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Kunde inte analysera capture: {e}")
+            return {"directory": str(self.directory), "failed_hops": self.failed, "hints": [str(e)]}
+        report["directory"] = str(self.directory)
+        report["failed_hops"] = self.failed
+        return report
+
+
+def _kamailio_pod_nodes(namespace: str, label_selector: str) -> Dict[str, str]:
+    """Kamailio-poddar och noden de kör på"""
+    try:
+        result = subprocess.run(
+            ["kubectl", "get", "pods", "-n", namespace, "-l", label_selector, "-o",
+             "jsonpath={range .items[*]}{.metadata.name} {.spec.nodeName}{\"\\n\"}{end}"],
+            capture_output=True,
+            text=True,
+            timeout=10
+        )
+    except Exception:
+        return {}
+    if result.returncode != 0:
+        return {}
+    pods = {}
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            pods[parts[0]] = parts[1]
+    return pods
+
+
+def build_capture_session(name: str, ports: Sequence[int], hops: Sequence[str] = HOP_ORDER,
+                          directory: Optional[Path] = None, namespace: str = "kamailio",
+                          label_selector: str = "app=kamailio", kind: bool = False,
+                          timeout: float = 32.0) -> CaptureSession:
+    """
+    Sätt upp capture för en körning
+
+    Args:
+        name: Körningens namn (del av katalognamnet)
+        ports: Portar att spela in (Kamailio, NodePort och lokal port)
+        hops: Capture-punkter att försöka med (client, node, pod)
+        directory: Katalog för pcap-filerna (standard: get_capture_dir()/<tid>-<name>)
+        namespace: Kamailios namespace
+        label_selector: Label selector för Kamailio-poddarna
+        kind: Spela in på Kind-noderna via docker exec
+        timeout: Sekunder innan en transaktion räknas som förlorad vid analysen
+
+    Returns:
+        CaptureSession (ej startad)
+    """
+    directory = Path(directory) if directory else get_capture_dir() / f"{time.strftime('%Y%m%d-%H%M%S')}-{name}"
+    captures = []
+    if "client" in hops:
+        captures.append(PacketCapture.local(directory / "client.pcap", ports))
+    pod_nodes = _kamailio_pod_nodes(namespace, label_selector) if ("pod" in hops or "node" in hops) else {}
+    if "node" in hops and kind:
+        for node in sorted(set(pod_nodes.values())):
+            captures.append(PacketCapture.on_kind_node(node, directory / f"node-{node}.pcap", ports))
+    if "pod" in hops:
+        for pod in sorted(pod_nodes):
+            captures.append(PacketCapture.in_pod(pod, namespace, directory / f"pod-{pod}.pcap", ports))
+    return CaptureSession(directory, captures, timeout=timeout)
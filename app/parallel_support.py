@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Parallel Support
+Hjälpfunktioner för att köra tester parallellt med pytest-xdist (-n auto)
+"""
+
+import fcntl
+import json
+import os
+import re
+import tempfile
+import logging
+from pathlib import Path
+from typing import Any, Callable
+
+
+logger = logging.getLogger(__name__)
+
+# Antal portar som varje worker får per portintervall
+PORTS_PER_WORKER = 10
+
+
+def get_worker_id() -> str:
+    """Hämta xdist worker-id ("gw0", "gw1", ...) eller "master" utan xdist"""
+    return os.getenv("PYTEST_XDIST_WORKER", "master")
+
+
+def get_worker_index() -> int:
+    """Hämta workerns index (0 för master och gw0)"""
+    match = re.match(r"gw(\d+)$", get_worker_id())
+    return int(match.group(1)) if match else 0
+
+
+def is_parallel_run() -> bool:
+    """Kontrollera om testerna körs under pytest-xdist"""
+    return get_worker_id() != "master"
+
+
+def get_worker_port(base_port: int, offset: int = 0) -> int:
+    """
+    Hämta en lokal port som är unik för workern
+
+    Varje worker får ett eget intervall om PORTS_PER_WORKER portar med start
+    i base_port, så att parallella SIPp-instanser inte krockar.
+
+    Args:
+        base_port: Första porten i intervallet (t.ex. 5065 för SIPp)
+        offset: Port inom workerns intervall
+
+    Returns:
+        Portnummer
+    """
+    if offset >= PORTS_PER_WORKER:
+        raise ValueError(f"offset måste vara mindre än {PORTS_PER_WORKER}")
+    return base_port + get_worker_index() * PORTS_PER_WORKER + offset
+
+
+def run_once(name: str, shared_dir: Path, func: Callable[[], Any]) -> Any:
+    """
+    Kör func exakt en gång per testsession, oavsett antal workers
+
+    Den första workern som tar låset kör func och sparar resultatet som JSON
+    i shared_dir; övriga workers väntar på låset och läser resultatet.
+
+    Args:
+        name: Namn på operationen (används som filnamn)
+        shared_dir: Katalog som delas av alla workers i sessionen
+        func: Funktion som returnerar ett JSON-serialiserbart värde
+
+    Returns:
+        Resultatet från func
+    """
+    shared_dir = Path(shared_dir)
+    shared_dir.mkdir(parents=True, exist_ok=True)
+    result_file = shared_dir / f"{name}.json"
+
+    with open(shared_dir / f"{name}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if result_file.exists():
+                with open(result_file) as f:
+                    return json.load(f)["result"]
+
+            logger.info(f"Kör {name} för hela sessionen ({get_worker_id()})")
+            result = func()
+
+            fd, tmp_path = tempfile.mkstemp(dir=shared_dir, prefix=f".{name}-", suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"worker": get_worker_id(), "result": result}, f)
+            os.replace(tmp_path, result_file)
+            return result
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
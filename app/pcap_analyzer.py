@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+"""
+Pcap Analyzer
+Strömmande analys av SIP-trafik i pcap-filer: parar requests och svar per
+transaktion och ger latens, förluster, retransmissioner och var paketen tappas
+
+Filerna läses via mmap paket för paket och minnet begränsas av antalet
+samtidiga transaktioner (takt × timeout), inte av filstorleken.
+"""
+
+import heapq
+import json
+import mmap
+import socket
+import struct
+import logging
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from metrics import LatencyHistogram
+
+
+logger = logging.getLogger(__name__)
+
+# magic -> (byteordning, tidsupplösning)
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_MAGIC = b"\x0a\x0d\x0d\x0a"
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+# Så mycket av filen som hålls mappad innan sidorna släpps
+RELEASE_BYTES = 64 * 1024 * 1024
+
+
+class PcapReader:
+    """
+    Läser en klassisk pcap-fil (tcpdump -w) via mmap
+
+    Ett trunkerat sista paket (tcpdump som avbröts) ignoreras.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.truncated = False
+        with open(self.path, "rb") as f:
+            header = f.read(24)
+        if header[:4] == PCAPNG_MAGIC:
+            raise ValueError(f"{path}: pcapng stöds inte, konvertera med 'editcap -F pcap'")
+        if len(header) < 24 or header[:4] not in PCAP_MAGIC:
+            raise ValueError(f"{path}: inte en pcap-fil")
+        self.endian, self.resolution = PCAP_MAGIC[header[:4]]
+        self.linktype = struct.unpack(self.endian + "I", header[20:24])[0] & 0x0FFFFFFF
+
+    def packets(self) -> Iterator[Tuple[float, bytes]]:
+        """
+        Iterera över paketen
+
+        Yields:
+            (tidsstämpel i sekunder, länklagerdata)
+        """
+        record = struct.Struct(self.endian + "IIII")
+        with open(self.path, "rb") as f:
+            size = f.seek(0, 2)
+            if size <= 24:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if hasattr(data, "madvise"):
+                    data.madvise(mmap.MADV_SEQUENTIAL)
+                offset = 24
+                released = 0
+                while offset + 16 <= size:
+                    seconds, fraction, caplen, _ = record.unpack_from(data, offset)
+                    end = offset + 16 + caplen
+                    if end > size:
+                        self.truncated = True
+                        break
+                    yield seconds + fraction * self.resolution, data[offset + 16:end]
+                    offset = end
+                    if offset - released >= RELEASE_BYTES and hasattr(mmap, "MADV_DONTNEED"):
+                        boundary = offset - offset % mmap.PAGESIZE
+                        data.madvise(mmap.MADV_DONTNEED, released, boundary - released)
+                        released = boundary
+
+
+def _network_offset(linktype: int, frame: bytes) -> Optional[int]:
+    """Var IP-huvudet börjar i ramen (None om det inte är IP)"""
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 14
+        ethertype = frame[12:14]
+        while ethertype in (b"\x81\x00", b"\x88\xa8"):
+            ethertype = frame[offset + 2:offset + 4]
+            offset += 4
+        return offset if ethertype in (b"\x08\x00", b"\x86\xdd") else None
+    if linktype == LINKTYPE_LINUX_SLL:
+        return 16 if frame[14:16] in (b"\x08\x00", b"\x86\xdd") else None
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return 20 if frame[0:2] in (b"\x08\x00", b"\x86\xdd") else None
+    if linktype == LINKTYPE_NULL:
+        return 4
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        return 0
+    return None
+
+
+def extract_udp(linktype: int, frame: bytes) -> Tuple[str, Optional[Tuple[str, int, str, int, bytes]]]:
+    """
+    Plocka ut UDP-payload ur en ram
+
+    Returns:
+        (typ, (src, sport, dst, dport, payload)) där typ är "udp", "tcp",
+        "fragment" eller "other"
+    """
+    offset = _network_offset(linktype, frame)
+    if offset is None or len(frame) < offset + 20:
+        return "other", None
+    version = frame[offset] >> 4
+    if version == 4:
+        header_length = (frame[offset] & 0x0F) * 4
+        protocol = frame[offset + 9]
+        flags_fragment = struct.unpack_from("!H", frame, offset + 6)[0]
+        if flags_fragment & 0x3FFF:
+            return "fragment", None
+        total_length = struct.unpack_from("!H", frame, offset + 2)[0]
+        src = socket.inet_ntoa(frame[offset + 12:offset + 16])
+        dst = socket.inet_ntoa(frame[offset + 16:offset + 20])
+        udp = offset + header_length
+        end = min(len(frame), offset + total_length) if total_length else len(frame)
+    elif version == 6 and len(frame) >= offset + 40:
+        protocol = frame[offset + 6]
+        src = socket.inet_ntop(socket.AF_INET6, frame[offset + 8:offset + 24])
+        dst = socket.inet_ntop(socket.AF_INET6, frame[offset + 24:offset + 40])
+        udp = offset + 40
+        end = len(frame)
+    else:
+        return "other", None
+    if protocol == 6:
+        return "tcp", None
+    if protocol != 17 or len(frame) < udp + 8:
+        return "other", None
+    sport, dport, length = struct.unpack_from("!HHH", frame, udp)
+    return "udp", (src, sport, dst, dport, frame[udp + 8:min(end, udp + length)])
+
+
+class SipMessage:
+    """De fält ur ett SIP-meddelande som behövs för att para transaktioner"""
+
+    __slots__ = ("method", "code", "branch", "call_id", "cseq")
+
+    def __init__(self, method: Optional[str], code: Optional[int], branch: str, call_id: str, cseq: str):
+        self.method = method
+        self.code = code
+        self.branch = branch
+        self.call_id = call_id
+        self.cseq = cseq
+
+    @property
+    def is_request(self) -> bool:
+        return self.method is not None
+
+    @property
+    def cseq_method(self) -> str:
+        return self.cseq.split()[-1].upper() if self.cseq else ""
+
+    @property
+    def transaction_key(self) -> Tuple[str, ...]:
+        """Översta Via-branch plus CSeq-metod (RFC 3261 17.1.3); Call-ID + CSeq utan branch"""
+        if self.branch:
+            return (self.branch, self.cseq_method)
+        return (self.call_id, self.cseq)
+
+
+COMPACT_HEADERS = {"v": "via", "i": "call-id"}
+
+
+def parse_sip_message(payload: bytes) -> Optional[SipMessage]:
+    """
+    Parsa start-raden och Via/Call-ID/CSeq ur ett SIP-meddelande
+
+    Returns:
+        SipMessage eller None om payloaden inte är SIP (t.ex. keep-alive)
+    """
+    head_end = payload.find(b"\r\n\r\n")
+    head = payload[:head_end] if head_end >= 0 else payload
+    lines = head.decode("utf-8", errors="replace").split("\r\n")
+    first = lines[0].split(" ", 2)
+    method = code = None
+    if first[0] == "SIP/2.0" and len(first) >= 2 and first[1].isdigit():
+        code = int(first[1])
+    elif len(first) == 3 and first[2].startswith("SIP/2.0") and first[0].isupper():
+        method = first[0]
+    else:
+        return None
+
+    branch = call_id = cseq = ""
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if not sep:
+            continue
+        name = name.strip().lower()
+        name = COMPACT_HEADERS.get(name, name)
+        if name == "via" and not branch:
+            top = value.split(",", 1)[0]
+            start = top.find("branch=")
+            branch = top[start + 7:].split(";", 1)[0].strip() if start >= 0 else "-"
+        elif name == "call-id" and not call_id:
+            call_id = value.strip()
+        elif name == "cseq" and not cseq:
+            cseq = value.strip()
+    if branch == "-":
+        branch = ""
+    return SipMessage(method, code, branch, call_id, cseq)
+
+
+def iter_sip_messages(path: str, counters: Optional[Dict[str, int]] = None) -> Iterator[Tuple[float, SipMessage]]:
+    """
+    Strömma SIP-meddelandena i en pcap-fil
+
+    Args:
+        path: pcap-fil
+        counters: Dict som räknar paket och överhoppade typer (uppdateras)
+
+    Yields:
+        (tidsstämpel, SipMessage)
+    """
+    counters = counters if counters is not None else {}
+    reader = PcapReader(path)
+    for timestamp, frame in reader.packets():
+        counters["packets"] = counters.get("packets", 0) + 1
+        kind, udp = extract_udp(reader.linktype, frame)
+        if udp is None:
+            counters[kind] = counters.get(kind, 0) + 1
+            continue
+        message = parse_sip_message(udp[4])
+        if message is None:
+            counters["non_sip"] = counters.get("non_sip", 0) + 1
+            continue
+        counters["sip_messages"] = counters.get("sip_messages", 0) + 1
+        yield timestamp, message
+    if reader.truncated:
+        counters["truncated_files"] = counters.get("truncated_files", 0) + 1
+
+
+class _Transaction:
+    """Var en transaktion har setts, per hop"""
+
+    __slots__ = ("requests", "first_request", "first_final", "code", "completed")
+
+    def __init__(self, hops: int):
+        self.requests = [0] * hops
+        self.first_request: List[Optional[float]] = [None] * hops
+        self.first_final: List[Optional[float]] = [None] * hops
+        self.code: Optional[int] = None
+        self.completed = False
+
+
+class TransactionAnalyzer:
+    """
+    Parar requests och slutgiltiga svar per transaktion över en eller flera hops
+
+    Hops anges i trafikens riktning (t.ex. client → node → pod). Latens mäts
+    mellan första request och första slutgiltiga svar sett i samma hop, så
+    olika klockor i olika capture-punkter påverkar inte resultatet.
+    """
+
+    def __init__(self, hops: Sequence[str], timeout: float = 32.0, linger: float = 2.0):
+        """
+        Args:
+            hops: Hop-namn i trafikens riktning; första hoppet är klienten
+            timeout: Sekunder utan slutgiltigt svar innan transaktionen räknas som förlorad
+            linger: Sekunder efter svar hos klienten som andra hops får komma ikapp
+        """
+        self.hops = list(hops)
+        self.timeout = timeout
+        self.linger = linger
+        self.open: Dict[Tuple[str, ...], _Transaction] = {}
+        self.max_open = 0
+        self._pending: deque = deque()
+        self._completed: deque = deque()
+        self.transactions = 0
+        self.completed = 0
+        self.lost = 0
+        self.lost_at_end = 0
+        self.foreign = 0
+        self.stray_responses = 0
+        self.acks = 0
+        self.retransmissions = [0] * len(self.hops)
+        self.responses: Dict[int, int] = {}
+        self.latency = LatencyHistogram()
+        self.hop_latency = [LatencyHistogram() for _ in self.hops]
+        self.drops: Dict[str, Dict[str, int]] = {"request": {}, "response": {}, "no_response": {}}
+        self._now = 0.0
+
+    def add(self, timestamp: float, hop: int, message: SipMessage) -> None:
+        """Registrera ett meddelande sett i hop"""
+        self._now = max(self._now, timestamp)
+        key = message.transaction_key
+        if message.is_request:
+            if message.method == "ACK":
+                self.acks += 1
+                return
+            transaction = self.open.get(key)
+            if transaction is None:
+                transaction = _Transaction(len(self.hops))
+                self.open[key] = transaction
+                self._pending.append((timestamp, key))
+                self.max_open = max(self.max_open, len(self.open))
+            transaction.requests[hop] += 1
+            if transaction.first_request[hop] is None:
+                transaction.first_request[hop] = timestamp
+            return
+
+        transaction = self.open.get(key)
+        if transaction is None:
+            self.stray_responses += 1
+            return
+        if message.code < 200 or transaction.first_final[hop] is not None:
+            return
+        transaction.first_final[hop] = timestamp
+        if hop == 0 or transaction.code is None:
+            transaction.code = message.code
+        if hop == 0 and not transaction.completed:
+            transaction.completed = True
+            self._completed.append((timestamp, key))
+
+    def expire(self, now: Optional[float] = None) -> None:
+        """Avsluta transaktioner som är klara (efter linger) eller har nått timeout"""
+        now = self._now if now is None else now
+        while self._completed and self._completed[0][0] + self.linger <= now:
+            self._finish(self._completed.popleft()[1])
+        while self._pending and self._pending[0][0] + self.timeout <= now:
+            self._finish(self._pending.popleft()[1])
+
+    def finish(self) -> None:
+        """Avsluta alla kvarvarande transaktioner (slutet av capturen)"""
+        for _, key in self._pending:
+            transaction = self.open.get(key)
+            if (transaction is not None and not transaction.completed
+                    and transaction.first_request[0] is not None):
+                self.lost_at_end += 1
+            self._finish(key)
+        self._pending.clear()
+        self._completed.clear()
+
+    def _finish(self, key: Tuple[str, ...]) -> None:
+        transaction = self.open.pop(key, None)
+        if transaction is None:
+            return
+        if transaction.first_request[0] is None:
+            # Startade inte hos klienten (t.ex. Kamailio som proxar vidare)
+            self.foreign += 1
+            return
+
+        self.transactions += 1
+        for hop, count in enumerate(transaction.requests):
+            if count > 1:
+                self.retransmissions[hop] += count - 1
+        for hop, (sent, answered) in enumerate(zip(transaction.first_request, transaction.first_final)):
+            if sent is not None and answered is not None and answered >= sent:
+                self.hop_latency[hop].record(answered - sent)
+
+        if transaction.completed:
+            self.completed += 1
+            self.latency.record(max(0.0, transaction.first_final[0] - transaction.first_request[0]))
+            self.responses[transaction.code] = self.responses.get(transaction.code, 0) + 1
+            return
+
+        self.lost += 1
+        self._locate_drop(transaction)
+
+    def _locate_drop(self, transaction: _Transaction) -> None:
+        """Hitta hoppet där en obesvarad transaktion försvann"""
+        for hop in range(1, len(self.hops)):
+            if transaction.first_request[hop] is None:
+                self._count_drop("request", f"{self.hops[hop - 1]} → {self.hops[hop]}")
+                return
+        answered = [hop for hop, t in enumerate(transaction.first_final) if t is not None]
+        if not answered:
+            self._count_drop("no_response", self.hops[-1])
+        else:
+            hop = min(answered)
+            self._count_drop("response", f"{self.hops[hop]} → {self.hops[hop - 1]}")
+
+    def _count_drop(self, direction: str, where: str) -> None:
+        self.drops[direction][where] = self.drops[direction].get(where, 0) + 1
+
+    def report(self) -> Dict:
+        """Sammanställ analysen"""
+        hints = []
+        if self.transactions and self.lost:
+            request_drops = self.drops["request"]
+            response_drops = self.drops["response"]
+            no_response = self.drops["no_response"]
+            for where, count in sorted(request_drops.items(), key=lambda item: -item[1]):
+                hints.append(f"{count} requests nådde aldrig {where.split(' → ')[1]}: "
+                             f"routing/NAT mellan {where.replace(' → ', ' och ')}")
+            for where, count in no_response.items():
+                if len(self.hops) == 1:
+                    hints.append(f"{count} transaktioner utan svar; capture bara hos klienten, "
+                                 "lägg till node/pod-capture för att se var paketen tappas")
+                else:
+                    hints.append(f"{count} requests nådde {where} men inget svar skickades: "
+                                 "Kamailio tog emot men svarade inte (kontrollera loggar och config)")
+            for where, count in sorted(response_drops.items(), key=lambda item: -item[1]):
+                hints.append(f"{count} svar försvann {where}: returvägen (SNAT/conntrack)")
+        if self.transactions and sum(self.retransmissions[:1]) > 0.05 * self.transactions:
+            hints.append(f"{self.retransmissions[0]} retransmissioner från klienten: "
+                         "svar kommer sent eller tappas")
+        if self.stray_responses:
+            hints.append(f"{self.stray_responses} svar utan matchande request i capturen")
+
+        return {
+            "hops": list(self.hops),
+            "transactions": self.transactions,
+            "completed": self.completed,
+            "lost": self.lost,
+            "lost_at_end": self.lost_at_end,
+            "loss_ratio": round(self.lost / self.transactions, 6) if self.transactions else 0.0,
+            "retransmissions": dict(zip(self.hops, self.retransmissions)),
+            "responses": {str(code): n for code, n in sorted(self.responses.items())},
+            "stray_responses": self.stray_responses,
+            "foreign_transactions": self.foreign,
+            "acks": self.acks,
+            "latency_ms": self.latency.summary_ms(),
+            "hop_latency_ms": {hop: histogram.summary_ms()
+                               for hop, histogram in zip(self.hops, self.hop_latency)},
+            "drops": {direction: dict(where) for direction, where in self.drops.items()},
+            "max_open_transactions": self.max_open,
+            "hints": hints,
+        }
+
+
+def analyze_captures(hops: Sequence[Tuple[str, Sequence[str]]], timeout: float = 32.0,
+                     linger: float = 2.0) -> Dict:
+    """
+    Analysera en eller flera pcap-filer per hop
+
+    Filerna strömmas och slås ihop i tidsordning, så att en transaktion kan
+    följas genom alla hops utan att något läses in helt.
+
+    Args:
+        hops: [(hop-namn, [pcap-filer])] i trafikens riktning, klienten först
+        timeout: Sekunder utan svar innan en transaktion räknas som förlorad
+        linger: Sekunder som andra hops får komma ikapp efter svar hos klienten
+
+    Returns:
+        Rapport med latens, förluster, retransmissioner och drops per hop
+    """
+    analyzer = TransactionAnalyzer([name for name, _ in hops], timeout, linger)
+    counters: Dict[str, int] = {}
+
+    def stream(hop: int, path: str):
+        for timestamp, message in iter_sip_messages(path, counters):
+            yield timestamp, hop, message
+
+    streams = [stream(index, path) for index, (_, paths) in enumerate(hops) for path in paths]
+    for timestamp, hop, message in heapq.merge(*streams, key=lambda item: item[0]):
+        analyzer.add(timestamp, hop, message)
+        analyzer.expire()
+    analyzer.finish()
+
+    report = analyzer.report()
+    report["files"] = {name: [str(p) for p in paths] for name, paths in hops}
+    report["packets"] = counters.get("packets", 0)
+    report["sip_messages"] = counters.get("sip_messages", 0)
+    report["skipped"] = {kind: counters[kind] for kind in ("tcp", "fragment", "non_sip", "other")
+                         if counters.get(kind)}
+    if counters.get("fragment"):
+        report["hints"].append(f"{counters['fragment']} IP-fragment hoppades över "
+                               "(stora SIP-meddelanden över UDP)")
+    if counters.get("tcp"):
+        report["hints"].append(f"{counters['tcp']} TCP-paket hoppades över (bara UDP analyseras)")
+    return report
+
+
+def format_capture_report(report: Dict) -> str:
+    """Formatera en capture-rapport för utskrift"""
+    lines = [
+        f"📦 Capture: {report['packets']} paket, {report['sip_messages']} SIP-meddelanden "
+        f"({' → '.join(report['hops'])})",
+        f"   Transaktioner: {report['transactions']}, besvarade: {report['completed']}, "
+        f"förlorade: {report['lost']} ({report['loss_ratio'] * 100:.2f}%)",
+    ]
+    latency = report["latency_ms"]
+    if report["completed"]:
+        lines.append(f"   Latens (ms): p50 {latency['p50']:.2f}, p90 {latency['p90']:.2f}, "
+                     f"p99 {latency['p99']:.2f}, max {latency['max']:.2f}")
+        for hop, hop_latency in report["hop_latency_ms"].items():
+            if len(report["hops"]) > 1 and hop_latency["max"] > 0:
+                lines.append(f"     {hop:>8}: p50 {hop_latency['p50']:.2f}, p99 {hop_latency['p99']:.2f}")
+    retransmissions = {hop: n for hop, n in report["retransmissions"].items() if n}
+    if retransmissions:
+        lines.append("   Retransmissioner: " + ", ".join(f"{hop} {n}" for hop, n in retransmissions.items()))
+    if report["responses"]:
+        lines.append("   Svar: " + ", ".join(f"{code}×{n}" for code, n in report["responses"].items()))
+    for hint in report["hints"]:
+        lines.append(f"   💡 {hint}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Analysera SIP-transaktioner i pcap-filer")
+    parser.add_argument("files", nargs="*", help="pcap-filer från klienten")
+    parser.add_argument("--hop", action="append", default=[], metavar="NAMN=FIL[,FIL]",
+                        help="Capture från ett hop, i trafikens riktning (t.ex. --hop node=node.pcap)")
+    parser.add_argument("--timeout", type=float, default=32.0, help="Sekunder innan en transaktion är förlorad")
+    parser.add_argument("--json", action="store_true", help="Skriv rapporten som JSON")
+    args = parser.parse_args(argv)
+
+    hops: List[Tuple[str, List[str]]] = []
+    if args.files:
+        hops.append(("client", args.files))
+    for spec in args.hop:
+        name, _, paths = spec.partition("=")
+        hops.append((name, paths.split(",")))
+    if not hops:
+        parser.error("ange minst en pcap-fil")
+
+    try:
+        report = analyze_captures(hops, timeout=args.timeout)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        return 2
+    print(json.dumps(report, indent=2, ensure_ascii=False) if args.json else format_capture_report(report))
+    return 1 if report["lost"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Port-forward Manager
+Håller kubectl port-forward vid liv per (service, port) under hela sessionen
+"""
+
+import atexit
+import re
+import subprocess
+import threading
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# kubectl skriver t.ex. "Forwarding from 127.0.0.1:5060 -> 5060" när den är redo
+FORWARDING_PATTERN = re.compile(r"Forwarding from (\S+):(\d+) -> (\d+)")
+
+
+class PortForwardSession:
+    """En körande kubectl port-forward-process"""
+
+    def __init__(self, service_name: str, namespace: str, local_port: int, remote_port: int):
+        self.service_name = service_name
+        self.namespace = namespace
+        self.requested_local_port = local_port
+        self.local_port = local_port
+        self.remote_port = remote_port
+        self.process: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        self.refcount = 0
+        # Håller start/omstart för just denna port-forward (managerns lås hålls inte under väntan)
+        self.lock = threading.Lock()
+        self._ready = threading.Event()
+        self._exited = threading.Event()
+        self._output: List[str] = []
+
+    @property
+    def command(self) -> List[str]:
+        """kubectl-kommandot för denna port-forward"""
+        # Lokal port 0 låter kubectl välja en ledig port
+        local = str(self.requested_local_port) if self.requested_local_port else ""
+        return ["kubectl", "port-forward", f"svc/{self.service_name}",
+                f"{local}:{self.remote_port}", "-n", self.namespace]
+
+    def start(self) -> None:
+        """Starta port-forward och läs output i bakgrunden"""
+        self._ready.clear()
+        self._exited.clear()
+        self._output = []
+        self.process = subprocess.Popen(
+            self.command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1
+        )
+        reader = threading.Thread(target=self._read_output, args=(self.process,), daemon=True)
+        reader.start()
+
+    def _read_output(self, process: subprocess.Popen) -> None:
+        """Läs kubectl-output och markera redo vid "Forwarding from" """
+        for line in process.stdout:
+            line = line.strip()
+            if len(self._output) < 50:
+                self._output.append(line)
+            match = FORWARDING_PATTERN.search(line)
+            if match and not self._ready.is_set():
+                self.local_port = int(match.group(2))
+                self._ready.set()
+        process.wait()
+        self._exited.set()
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Vänta tills port-forward är redo eller processen har avslutats"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._ready.wait(0.05):
+                return self.is_alive()
+            if self._exited.is_set():
+                return False
+        return False
+
+    def is_alive(self) -> bool:
+        """Kontrollera att processen lever och har rapporterat redo"""
+        return (self.process is not None and self.process.poll() is None
+                and self._ready.is_set())
+
+    def stop(self) -> None:
+        """Stoppa port-forward-processen"""
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+    @property
+    def last_output(self) -> str:
+        """Senaste output från kubectl (för felmeddelanden)"""
+        return "\n".join(self._output[-5:])
+
+
+class PortForwardHandle:
+    """
+    Delat handtag till en port-forward
+
+    Har samma poll/terminate/wait-gränssnitt som subprocess.Popen så att
+    befintliga anropare fungerar, men terminate() släpper bara handtaget -
+    själva port-forward lever vidare tills managern stoppas.
+    """
+
+    def __init__(self, manager: 'PortForwardManager', session: PortForwardSession):
+        self._manager = manager
+        self._session = session
+        self._released = False
+
+    @property
+    def local_port(self) -> int:
+        return self._session.local_port
+
+    @property
+    def remote_port(self) -> int:
+        return self._session.remote_port
+
+    @property
+    def service_name(self) -> str:
+        return self._session.service_name
+
+    def is_alive(self) -> bool:
+        return self._session.is_alive()
+
+    def ensure_ready(self, timeout: float = 15) -> bool:
+        """Säkerställ att port-forward lever, starta om den vid behov"""
+        return self._manager._ensure_session(self._session, timeout)
+
+    def release(self) -> None:
+        """Släpp handtaget (port-forward fortsätter att köra)"""
+        if not self._released:
+            self._released = True
+            self._manager._release(self._session)
+
+    # Popen-kompatibelt gränssnitt
+    def poll(self) -> Optional[int]:
+        return None if self.is_alive() else 1
+
+    def terminate(self) -> None:
+        self.release()
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        return 0
+
+
+class PortForwardManager:
+    """
+    Håller port-forwards vid liv per (namespace, service, lokal port, remote port)
+
+    Managerns lås skyddar bara sessionstabellen och refcount; väntan på
+    "Forwarding from" sker under sessionens eget lås, så en port-forward
+    som startar blockerar inte andra services eller release().
+    """
+
+    def __init__(self, ready_timeout: float = 15, max_restarts: int = 3):
+        self.ready_timeout = ready_timeout
+        self.max_restarts = max_restarts
+        self._sessions: Dict[Tuple[str, str, int, int], PortForwardSession] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, service_name: str, namespace: str, local_port: int, remote_port: int,
+                timeout: Optional[float] = None) -> Optional[PortForwardHandle]:
+        """
+        Hämta ett delat handtag till en port-forward
+
+        Startar port-forward om den inte finns och startar om den om den har dött.
+
+        Args:
+            service_name: Service att forwarda till
+            namespace: Namespace för servicen
+            local_port: Lokal port (0 låter kubectl välja)
+            remote_port: Port på servicen
+            timeout: Max tid att vänta på "Forwarding from"
+
+        Returns:
+            PortForwardHandle eller None om port-forward inte blev redo
+        """
+        key = (namespace, service_name, local_port, remote_port)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = PortForwardSession(service_name, namespace, local_port, remote_port)
+                self._sessions[key] = session
+
+        if not self._ensure_session(session, timeout or self.ready_timeout):
+            return None
+
+        with self._lock:
+            session.refcount += 1
+        return PortForwardHandle(self, session)
+
+    def _ensure_session(self, session: PortForwardSession, timeout: float) -> bool:
+        with session.lock:
+            return self._ensure_session_locked(session, timeout)
+
+    def _ensure_session_locked(self, session: PortForwardSession, timeout: float) -> bool:
+        """Starta eller starta om sessionen om den inte lever (sessionens lås hålls)"""
+        if session.is_alive():
+            return True
+
+        first_start = session.process is None
+        if not first_start:
+            if session.restarts >= self.max_restarts:
+                logger.error(f"Port-forward svc/{session.service_name} har startats om "
+                             f"{session.restarts} gånger, ger upp")
+                return False
+            session.restarts += 1
+            logger.warning(f"Port-forward svc/{session.service_name} har dött, startar om "
+                           f"({session.restarts}/{self.max_restarts})")
+            session.stop()
+
+        try:
+            session.start()
+        except Exception as e:
+            logger.error(f"Kunde inte starta port-forward: {e}")
+            return False
+
+        from command_tracing import trace_span
+        with trace_span(f"port-forward svc/{session.service_name} ready"):
+            ready = session.wait_ready(timeout)
+        if ready:
+            logger.info(f"Port-forward redo: localhost:{session.local_port} -> "
+                        f"svc/{session.service_name}:{session.remote_port}")
+            # Bara omstarter i följd räknas mot max_restarts
+            session.restarts = 0
+            return True
+
+        logger.error(f"Port-forward svc/{session.service_name} blev inte redo: {session.last_output}")
+        session.stop()
+        return False
+
+    def _release(self, session: PortForwardSession) -> None:
+        with self._lock:
+            session.refcount = max(0, session.refcount - 1)
+
+    def active_sessions(self) -> List[PortForwardSession]:
+        """Lista levande port-forwards"""
+        with self._lock:
+            return [s for s in self._sessions.values() if s.is_alive()]
+
+    def stop_all(self) -> None:
+        """Stoppa alla port-forwards"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.stop()
+
+
+_manager: Optional[PortForwardManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_port_forward_manager() -> PortForwardManager:
+    """Hämta den processgemensamma port-forward-managern"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = PortForwardManager()
+            atexit.register(_manager.stop_all)
+        return _manager
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Lastfördelning mellan Kamailio-replikor
+
+Räknar fram andel, takt och obalans per replika från serversidans
+räknare (kamcmd via KamailioStatsSampler) eller loggar
+(KamailioLogStreamer). Obalansen är största replikans takt delat med
+medeltakten: 1.0 är perfekt fördelning och N betyder att en av N
+replikor tog all trafik.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+# Över så här stor obalans räknas fördelningen som ojämn
+IMBALANCE_LIMIT = 1.5
+
+# Källadresser per replika som behövs för att hashningen ska jämna ut sig
+SOURCES_PER_REPLICA = 8
+
+
+def server_side_counts(statistics: Dict) -> Optional[Tuple[str, Dict[str, float]]]:
+    """
+    Mottagna requests per replika från serversidan av en lastkörning
+
+    Räknarna från kamcmd föredras; loggarna används om de saknas.
+
+    Args:
+        statistics: Statistik från SippTester.run_load_test
+
+    Returns:
+        (källa, {pod: mottagna requests}), eller None utan serverdata
+    """
+    kamailio = statistics.get("kamailio") or {}
+    if kamailio.get("pods"):
+        return "kamcmd", {pod: values["received_requests"] for pod, values in kamailio["pods"].items()}
+    logs = statistics.get("kamailio_logs") or {}
+    if logs.get("pods"):
+        return "loggar", {pod: values["received"] for pod, values in logs["pods"].items()}
+    return None
+
+
+def replica_distribution(counts: Dict[str, float], duration: float, source: str = "",
+                         source_addresses: int = 1) -> Dict:
+    """
+    Fördelning, takt och obalans per replika
+
+    Args:
+        counts: Mottagna requests per pod
+        duration: Körningens längd i sekunder (för takt per replika)
+        source: Var räknarna kommer ifrån (kamcmd, loggar)
+        source_addresses: Antal källadresser lastgeneratorn skickade från
+
+    Returns:
+        Dict med replicas (received, share, rate), imbalance (max/medel),
+        min_max_ratio, idle (replikor utan trafik) och hints
+    """
+    total = sum(counts.values())
+    replicas = {
+        pod: {
+            "received": int(received),
+            "share": round(received / total, 3) if total else 0.0,
+            "rate": round(received / duration, 1) if duration else 0.0,
+        }
+        for pod, received in sorted(counts.items())
+    }
+    idle = [pod for pod, received in sorted(counts.items()) if not received]
+
+    imbalance = None
+    min_max_ratio = None
+    if total:
+        imbalance = round(max(counts.values()) / (total / len(counts)), 2)
+        min_max_ratio = round(min(counts.values()) / max(counts.values()), 2)
+
+    return {
+        "source": source,
+        "replicas": replicas,
+        "total_received": int(total),
+        "imbalance": imbalance,
+        "min_max_ratio": min_max_ratio,
+        "idle": idle,
+        "hints": diagnose(replicas, imbalance, idle, source_addresses),
+    }
+
+
+def diagnose(replicas: Dict[str, Dict], imbalance: Optional[float], idle: List[str],
+             source_addresses: int) -> List[str]:
+    """Tips om varför lasten inte fördelas jämnt"""
+    hints = []
+    if not replicas:
+        return ["Ingen serverdata per replika (kör med sample_kamailio eller stream_logs)"]
+    if imbalance is None:
+        return ["Inga mottagna requests på någon replika"]
+    if len(replicas) == 1:
+        hints.append("Bara en replika hittades: fördelningen kan inte verifieras")
+        return hints
+    if idle:
+        hints.append(f"{', '.join(idle)} fick ingen trafik")
+    if imbalance > IMBALANCE_LIMIT:
+        if source_addresses == 1:
+            hints.append("All trafik kom från en källport: conntrack låser UDP-flödet till en replika, "
+                         "sprid lasten med source_ports")
+        elif source_addresses < SOURCES_PER_REPLICA * len(replicas):
+            hints.append(f"{source_addresses} källadresser är för få för en jämn hashning över "
+                         f"{len(replicas)} replikor (prova minst {SOURCES_PER_REPLICA * len(replicas)})")
+        else:
+            hints.append(f"Obalans {imbalance}x trots {source_addresses} källadresser: "
+                         "kontrollera Servicens sessionAffinity och externalTrafficPolicy")
+    return hints
+
+
+def summarize_distribution(statistics: Dict) -> Optional[Dict]:
+    """
+    Fördelning per replika för en lastkörning, om serversidan samplades
+
+    Args:
+        statistics: Statistik från SippTester.run_load_test
+
+    Returns:
+        Se replica_distribution(), eller None utan serverdata
+    """
+    counts = server_side_counts(statistics)
+    if counts is None:
+        return None
+    source, per_pod = counts
+    return replica_distribution(per_pod, statistics.get("duration_s", 0.0), source,
+                                statistics.get("source_addresses", 1))
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Result Storage
+Begränsad lagring av TestResult.output/error: stora texter skrivs komprimerade
+till disk och ersätts av ett lat handtag med head/tail-förhandsvisning i minnet
+"""
+
+import atexit
+import gzip
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import itertools
+import logging
+from pathlib import Path
+from typing import Iterator, List, Optional, Union
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPILL_THRESHOLD = 1024 * 1024
+PREVIEW_CHARS = 4096
+CHUNK_CHARS = 1024 * 1024
+
+
+def _spill_threshold() -> int:
+    return int(os.getenv("SIP_LAB_SPILL_THRESHOLD", DEFAULT_SPILL_THRESHOLD))
+
+
+_spill_dir: Optional[Path] = None
+_spill_lock = threading.Lock()
+_spill_counter = itertools.count()
+
+
+def get_spill_dir() -> Path:
+    """
+    Katalog för utskrivna texter
+
+    SIP_LAB_SPILL_DIR behålls efter körningen; annars används en temporär
+    katalog per process som tas bort när processen avslutas.
+    """
+    global _spill_dir
+    with _spill_lock:
+        if _spill_dir is None:
+            configured = os.getenv("SIP_LAB_SPILL_DIR")
+            if configured:
+                _spill_dir = Path(configured)
+                _spill_dir.mkdir(parents=True, exist_ok=True)
+            else:
+                _spill_dir = Path(tempfile.mkdtemp(prefix="sip-k8s-lab-results-"))
+                atexit.register(shutil.rmtree, str(_spill_dir), True)
+        return _spill_dir
+
+
+def _new_spill_path(label: str) -> Path:
+    return get_spill_dir() / f"{os.getpid()}-{next(_spill_counter)}-{label}.txt.gz"
+
+
+class SpilledText:
+    """
+    Lat handtag till en stor text som ligger gzip-komprimerad på disk
+
+    Beter sig som en str där TestResult används: "x" in text söker
+    strömmande i filen, str()/f-strängar och strip() ger en förhandsvisning
+    (head + tail) och read() laddar hela texten vid behov.
+    """
+
+    def __init__(self, path: Path, length: int, head: str, tail: str):
+        self.path = Path(path)
+        self.length = length
+        self.head = head
+        self.tail = tail
+
+    @classmethod
+    def write(cls, chunks, label: str = "output", preview: int = PREVIEW_CHARS) -> 'SpilledText':
+        """
+        Skriv text i delar till en komprimerad fil
+
+        Args:
+            chunks: Itererbar med str-delar
+            label: Del av filnamnet (t.ex. "output" eller "error")
+            preview: Antal tecken i head och tail
+
+        Returns:
+            SpilledText för filen
+        """
+        path = _new_spill_path(label)
+        head = ""
+        tail = ""
+        length = 0
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as f:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                f.write(chunk)
+                length += len(chunk)
+                if len(head) < preview:
+                    head += chunk[:preview - len(head)]
+                tail = (tail + chunk)[-preview:]
+        return cls(path, length, head, tail)
+
+    def open(self):
+        """Öppna hela texten som en ström"""
+        return gzip.open(self.path, "rt", encoding="utf-8", errors="replace")
+
+    def read(self) -> str:
+        """Läs in hela texten i minnet"""
+        with self.open() as f:
+            return f.read()
+
+    def iter_lines(self) -> Iterator[str]:
+        """Iterera över raderna utan att läsa in hela texten"""
+        with self.open() as f:
+            for line in f:
+                yield line.rstrip("\n")
+
+    def preview(self) -> str:
+        """Head och tail med en markering för det som utelämnats"""
+        omitted = self.length - len(self.head) - len(self.tail)
+        if omitted <= 0:
+            return self.read()
+        return (f"{self.head}\n... [{omitted} tecken utelämnade, hela texten i {self.path}] ...\n"
+                f"{self.tail}")
+
+    def __contains__(self, needle: str) -> bool:
+        overlap = max(0, len(needle) - 1)
+        previous = ""
+        with self.open() as f:
+            while True:
+                chunk = f.read(CHUNK_CHARS)
+                if not chunk:
+                    return False
+                if needle in previous + chunk:
+                    return True
+                previous = chunk[-overlap:] if overlap else ""
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __bool__(self) -> bool:
+        return self.length > 0
+
+    def __str__(self) -> str:
+        return self.preview()
+
+    def __format__(self, spec: str) -> str:
+        return format(str(self), spec)
+
+    def __repr__(self) -> str:
+        return f"SpilledText({str(self.path)!r}, length={self.length})"
+
+    def strip(self, chars: Optional[str] = None) -> str:
+        return str(self).strip(chars)
+
+    def splitlines(self) -> List[str]:
+        """Raderna i förhandsvisningen (använd iter_lines() för hela texten)"""
+        return str(self).splitlines()
+
+    def delete(self) -> None:
+        """Ta bort filen på disk"""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+TextLike = Union[str, SpilledText]
+
+
+def bounded_text(text: Optional[TextLike], label: str = "output",
+                 threshold: Optional[int] = None) -> TextLike:
+    """
+    Skriv ut text till disk om den är större än tröskeln
+
+    Args:
+        text: Text (eller redan utskriven SpilledText)
+        label: Del av filnamnet
+        threshold: Max antal tecken i minnet (standard SIP_LAB_SPILL_THRESHOLD eller 1 MiB)
+
+    Returns:
+        Samma str om den är liten, annars SpilledText
+    """
+    if text is None:
+        return ""
+    if isinstance(text, SpilledText):
+        return text
+    limit = _spill_threshold() if threshold is None else threshold
+    if len(text) <= limit:
+        return text
+    return SpilledText.write((text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)), label)
+
+
+def _file_chunks(f) -> Iterator[str]:
+    f.seek(0)
+    while True:
+        chunk = f.read(CHUNK_CHARS)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _captured_text(f, label: str) -> TextLike:
+    """Läs en fångad ström: liten -> str, stor -> SpilledText utan att läsa in allt"""
+    size = os.fstat(f.fileno()).st_size
+    if size <= _spill_threshold():
+        f.seek(0)
+        return f.read()
+    return SpilledText.write(_file_chunks(f), label)
+
+
+def run_captured(command: List[str], timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+    """
+    Som subprocess.run(capture_output=True, text=True) men med begränsat minne
+
+    stdout och stderr skrivs till temporära filer; stora strömmar blir
+    SpilledText utan att någonsin ligga i sin helhet i minnet.
+
+    Raises:
+        subprocess.TimeoutExpired: Om kommandot tar längre tid än timeout
+    """
+    with tempfile.TemporaryFile("w+", encoding="utf-8", errors="replace") as out, \
+            tempfile.TemporaryFile("w+", encoding="utf-8", errors="replace") as err:
+        process = subprocess.Popen(command, stdout=out, stderr=err, text=True)
+        try:
+            returncode = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            raise
+        return subprocess.CompletedProcess(command, returncode,
+                                           _captured_text(out, "output"), _captured_text(err, "error"))
@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+"""
+Results Store
+Sparar resultat från varje körning i en lokal SQLite-databas och flaggar
+statistiskt signifikanta försämringar mot en rullande baseline
+"""
+
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import statistics
+import subprocess
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = Path.home() / ".local" / "share" / "sip-k8s-lab" / "results.sqlite"
+CONFIGMAP_PATH = Path(__file__).parent.parent / "k8s" / "configmap.yaml"
+
+# (kolumn, SQLite-typ) - en platt rad per körning; nya kolumner läggs till med ALTER TABLE
+_COLUMNS: List[Tuple[str, str]] = [
+    ("timestamp", "REAL"),
+    ("git_sha", "TEXT"),
+    ("kube_context", "TEXT"),
+    ("config_hash", "TEXT"),
+    ("environment", "TEXT"),
+    ("target", "TEXT"),
+    ("scenario", "TEXT"),
+    ("rate", "REAL"),
+    ("duration", "REAL"),
+    ("success", "INTEGER"),
+    ("requests", "INTEGER"),
+    ("successful", "INTEGER"),
+    ("failed", "INTEGER"),
+    ("timeouts", "INTEGER"),
+    ("retransmissions", "INTEGER"),
+    ("errors", "INTEGER"),
+    ("throughput", "REAL"),
+    ("mean_ms", "REAL"),
+    ("p50_ms", "REAL"),
+    ("p90_ms", "REAL"),
+    ("p99_ms", "REAL"),
+    ("p999_ms", "REAL"),
+    ("max_ms", "REAL"),
+    ("extra", "TEXT"),
+]
+
+# Mått som regressionskontrollen tittar på: (kolumn, True om högre är sämre)
+REGRESSION_METRICS: List[Tuple[str, bool]] = [
+    ("throughput", False),
+    ("p50_ms", True),
+    ("p99_ms", True),
+    ("error_rate", True),
+]
+
+
+def _run(command: List[str], cwd: Optional[Path] = None) -> str:
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=10, cwd=cwd)
+        if result.returncode == 0:
+            return result.stdout.strip()
+    except Exception:
+        pass
+    return ""
+
+
+def get_git_sha() -> str:
+    """Git SHA för repot (tom sträng utanför git)"""
+    return _run(["git", "rev-parse", "HEAD"], cwd=Path(__file__).parent)
+
+
+def get_kube_context() -> str:
+    """Aktuell kube-context (tom sträng utan kubectl)"""
+    return _run(["kubectl", "config", "current-context"])
+
+
+def get_config_hash(namespace: str = "kamailio", configmap: str = "kamailio-config") -> str:
+    """
+    Hash av Kamailio-konfigurationen
+
+    Använder konfigurationen som faktiskt ligger i klustret och faller
+    tillbaka på k8s/configmap.yaml i repot om klustret inte nås.
+
+    Returns:
+        De 12 första hex-tecknen av sha256
+    """
+    config = _run(["kubectl", "get", "configmap", configmap, "-n", namespace,
+                   "-o", "jsonpath={.data}"])
+    if not config and CONFIGMAP_PATH.exists():
+        config = CONFIGMAP_PATH.read_text()
+    if not config:
+        return ""
+    return hashlib.sha256(config.encode()).hexdigest()[:12]
+
+
+def collect_run_context() -> Dict[str, str]:
+    """Git SHA, kube-context och config-hash för aktuell miljö"""
+    return {
+        "git_sha": get_git_sha(),
+        "kube_context": get_kube_context(),
+        "config_hash": get_config_hash(),
+    }
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def result_to_row(result, context: Optional[Dict[str, Any]] = None, **overrides) -> Dict[str, Any]:
+    """
+    Platta ut ett TestResult till en rad
+
+    Förstår både lastgeneratorns statistik och SIPp-statistiken från
+    _parse_sipp_statistics. Övrig statistik sparas som JSON i extra.
+
+    Args:
+        result: TestResult
+        context: git_sha/kube_context/config_hash m.m.
+        **overrides: Värden som ersätter det som räknats fram
+
+    Returns:
+        Dict med kolumnvärden
+    """
+    stats = dict(result.statistics or {})
+    latency = stats.pop("latency_ms", {}) or {}
+    row: Dict[str, Any] = {
+        "timestamp": time.time(),
+        "scenario": result.scenario,
+        "duration": result.duration,
+        "success": 1 if result.success else 0,
+        "target": stats.pop("target", None),
+        "rate": stats.pop("target_rate", None),
+        "requests": _as_int(stats.pop("requests_sent", stats.pop("total_messages", None))),
+        "successful": _as_int(stats.pop("successful", None)),
+        "failed": _as_int(stats.pop("failed", stats.pop("failures", None))),
+        "timeouts": _as_int(stats.pop("timeouts", None)),
+        "retransmissions": _as_int(stats.pop("retransmissions", None)),
+        "errors": _as_int(stats.pop("errors", None)),
+        "throughput": stats.pop("throughput", None),
+        "mean_ms": latency.get("mean"),
+        "p50_ms": latency.get("p50"),
+        "p90_ms": latency.get("p90"),
+        "p99_ms": latency.get("p99"),
+        "p999_ms": latency.get("p999"),
+        "max_ms": latency.get("max"),
+    }
+    if row["errors"] is None and row["failed"] is not None:
+        row["errors"] = (row["failed"] or 0) + (row["timeouts"] or 0)
+    row.update(context or {})
+    row.update(overrides)
+    if stats:
+        row["extra"] = json.dumps(stats, default=str)
+    return {name: row.get(name) for name, _ in _COLUMNS}
+
+
+def _error_rate(run: Dict[str, Any]) -> Optional[float]:
+    if not run.get("requests"):
+        return None
+    return (run.get("errors") or 0) / run["requests"]
+
+
+def _betacf(a: float, b: float, x: float) -> float:
+    """Kedjebråk för den regulariserade ofullständiga betafunktionen"""
+    tiny = 1e-300
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c, d = 1.0, 1.0 - qab * x / qap
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 200):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < 3e-12:
+            break
+    return h
+
+
+def _betainc(a: float, b: float, x: float) -> float:
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                     + a * math.log(x) + b * math.log(1 - x))
+    if x < (a + 1) / (a + b + 2):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1 - x) / b
+
+
+def student_t_sf(t: float, df: float) -> float:
+    """Ensidigt p-värde P(T > t) för Student t-fördelningen"""
+    tail = 0.5 * _betainc(df / 2.0, 0.5, df / (df + t * t))
+    return tail if t > 0 else 1.0 - tail
+
+
+@dataclass
+class Regression:
+    """En signifikant försämring mot baseline"""
+    metric: str
+    value: float
+    baseline_mean: float
+    baseline_stdev: float
+    change: float
+    p_value: float
+    baseline_runs: int
+
+    def describe(self) -> str:
+        return (f"{self.metric}: {self.baseline_mean:.3f} -> {self.value:.3f} "
+                f"({self.change * 100:+.1f}%, p={self.p_value:.4f}, n={self.baseline_runs})")
+
+
+class ResultsStore:
+    """
+    SQLite-databas med en rad per körning
+
+    Schemat är platt med en typad kolumn per mått, så att det går att läsa
+    kolumnvis (t.ex. med pandas/DuckDB) utan att packa upp JSON.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or os.getenv("SIP_LAB_RESULTS_DB") or DEFAULT_DB_PATH)
+        self.enabled = not os.getenv("SIP_LAB_NO_RESULTS_STORE")
+        self._context: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            self._migrate(conn)
+            self._initialized = True
+        return conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        """Skapa tabellen och lägg till kolumner som saknas"""
+        columns = ", ".join(f"{name} {kind}" for name, kind in _COLUMNS)
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})")
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(runs)")}
+            for name, kind in _COLUMNS:
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE runs ADD COLUMN {name} {kind}")
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_lookup ON runs (scenario, rate, timestamp)")
+            # Tidsserier under en körning (serverstatistik m.m.), en rad per värde
+            conn.execute("CREATE TABLE IF NOT EXISTS samples (run_id INTEGER, source TEXT, "
+                         "timestamp REAL, pod TEXT, name TEXT, value REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS samples_run ON samples (run_id, source)")
+
+    @property
+    def context(self) -> Dict[str, str]:
+        """Körningens kontext (beräknas en gång per process)"""
+        if self._context is None:
+            from command_tracing import trace_span
+            with trace_span("probe results context"):
+                self._context = collect_run_context()
+        return self._context
+
+    def refresh_context(self) -> Dict[str, str]:
+        """Beräkna om kontexten, t.ex. efter att Kamailio-konfigurationen ändrats"""
+        self._context = None
+        return self.context
+
+    def record(self, result, environment: Optional[str] = None, **overrides) -> Optional[int]:
+        """
+        Spara ett TestResult
+
+        Args:
+            result: TestResult att spara
+            environment: Miljö (local, prod, auto)
+            **overrides: Kolumnvärden som ersätter det som räknats fram
+
+        Returns:
+            Radens id, eller None om lagringen är avstängd eller misslyckades
+        """
+        if not self.enabled:
+            return None
+        row = result_to_row(result, self.context, environment=environment, **overrides)
+        names = [name for name, _ in _COLUMNS]
+        try:
+            with self._lock:
+                conn = self._connect()
+                try:
+                    with conn:
+                        cursor = conn.execute(
+                            f"INSERT INTO runs ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                            [row[name] for name in names]
+                        )
+                    return cursor.lastrowid
+                finally:
+                    conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Kunde inte spara resultat i {self.path}: {e}")
+            return None
+
+    def record_samples(self, run_id: int, source: str, samples) -> int:
+        """
+        Spara tidsserier för en körning
+
+        Args:
+            run_id: Körningen samplen hör till
+            source: Källa, t.ex. "kamailio"
+            samples: Sample-objekt (timestamp, pod, values) från samplers.py
+
+        Returns:
+            Antal sparade värden
+        """
+        if not self.enabled:
+            return 0
+        rows = [(run_id, source, sample.timestamp, sample.pod, name, value)
+                for sample in samples for name, value in sample.values.items()]
+        if not rows:
+            return 0
+        try:
+            with self._lock:
+                conn = self._connect()
+                try:
+                    with conn:
+                        conn.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?)", rows)
+                finally:
+                    conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Kunde inte spara samples i {self.path}: {e}")
+            return 0
+        return len(rows)
+
+    def query_samples(self, run_id: int, source: Optional[str] = None,
+                      name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Hämta tidsserier för en körning, sorterade på tid"""
+        sql = "SELECT timestamp, source, pod, name, value FROM samples WHERE run_id = ?"
+        params: List[Any] = [run_id]
+        if source is not None:
+            sql += " AND source = ?"
+            params.append(source)
+        if name is not None:
+            sql += " AND name = ?"
+            params.append(name)
+        sql += " ORDER BY timestamp, pod, name"
+        with self._lock:
+            conn = self._connect()
+            try:
+                return [dict(row) for row in conn.execute(sql, params)]
+            finally:
+                conn.close()
+
+    def query(self, scenario: Optional[str] = None, rate: Optional[float] = None,
+              config_hash: Optional[str] = None, git_sha: Optional[str] = None,
+              kube_context: Optional[str] = None, target: Optional[str] = None,
+              success: Optional[bool] = None, since: Optional[float] = None,
+              before_id: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Hämta körningar, nyaste först
+
+        Args:
+            scenario, rate, config_hash, git_sha, kube_context, target: Filtrera på exakt värde
+            success: Bara lyckade (True) eller misslyckade (False) körningar
+            since: Bara körningar efter denna tidpunkt (epoch-sekunder)
+            before_id: Bara körningar med lägre id
+            limit: Max antal rader
+
+        Returns:
+            Lista med dicts (en per körning)
+        """
+        clauses, params = [], []
+        for name, value in (("scenario", scenario), ("rate", rate), ("config_hash", config_hash),
+                            ("git_sha", git_sha), ("kube_context", kube_context), ("target", target)):
+            if value is not None:
+                clauses.append(f"{name} = ?")
+                params.append(value)
+        if success is not None:
+            clauses.append("success = ?")
+            params.append(1 if success else 0)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+
+        sql = "SELECT * FROM runs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                return [dict(row) for row in conn.execute(sql, params)]
+            finally:
+                conn.close()
+
+    def get(self, run_id: int) -> Optional[Dict[str, Any]]:
+        """Hämta en körning via id"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+                return dict(row) if row else None
+            finally:
+                conn.close()
+
+    def baseline(self, run: Dict[str, Any], window: int = 20) -> List[Dict[str, Any]]:
+        """
+        Rullande baseline för en körning
+
+        De window senaste lyckade körningarna före run med samma scenario,
+        takt, kube-context och target.
+        """
+        return self.query(scenario=run["scenario"], rate=run.get("rate"),
+                          kube_context=run.get("kube_context"), target=run.get("target"),
+                          success=True, before_id=run["id"], limit=window)
+
+    def check_regression(self, run_id: Optional[int] = None, window: int = 20, min_runs: int = 5,
+                         alpha: float = 0.01, min_change: float = 0.05) -> List[Regression]:
+        """
+        Jämför en körning med sin rullande baseline
+
+        Ett mått räknas som försämrat om det ligger utanför baselinens
+        prediktionsintervall (ensidigt t-test, p < alpha) och har ändrats
+        mer än min_change relativt baselinens medelvärde.
+
+        Args:
+            run_id: Körningen att kontrollera (None = senaste)
+            window: Antal körningar i baseline
+            min_runs: Minsta antal baseline-körningar för att kunna avgöra
+            alpha: Signifikansnivå
+            min_change: Minsta relativa ändring som räknas
+
+        Returns:
+            Lista med Regression (tom om inget försämrats eller baseline saknas)
+        """
+        if run_id is None:
+            latest = self.query(limit=1)
+            if not latest:
+                return []
+            run = latest[0]
+        else:
+            run = self.get(run_id)
+            if run is None:
+                return []
+
+        history = self.baseline(run, window)
+        if len(history) < min_runs:
+            logger.info(f"För få baseline-körningar ({len(history)}/{min_runs}) för {run['scenario']}")
+            return []
+
+        regressions = []
+        for metric, higher_is_worse in REGRESSION_METRICS:
+            getter = _error_rate if metric == "error_rate" else (lambda r, m=metric: r.get(m))
+            value = getter(run)
+            samples = [v for v in (getter(r) for r in history) if v is not None]
+            if value is None or len(samples) < min_runs:
+                continue
+
+            mean = statistics.fmean(samples)
+            stdev = statistics.stdev(samples)
+            delta = value - mean if higher_is_worse else mean - value
+            change = (value - mean) / mean if mean else (math.inf if delta > 0 else 0.0)
+            if delta <= 0 or abs(change) < min_change:
+                continue
+
+            n = len(samples)
+            if stdev == 0:
+                p_value = 0.0
+            else:
+                t = delta / (stdev * math.sqrt(1 + 1.0 / n))
+                p_value = student_t_sf(t, n - 1)
+            if p_value < alpha:
+                regressions.append(Regression(metric, value, mean, stdev, change, p_value, n))
+
+        return regressions
+
+
+_store: Optional[ResultsStore] = None
+
+
+def get_results_store() -> ResultsStore:
+    """Hämta den processgemensamma resultatdatabasen"""
+    global _store
+    if _store is None:
+        _store = ResultsStore()
+    return _store
+
+
+def print_runs(runs: List[Dict[str, Any]]) -> None:
+    """Skriv ut körningar som tabell"""
+    print(f"{'id':>5} {'tid':19} {'scenario':16} {'takt':>7} {'ok':>3} {'tput':>8} "
+          f"{'p50':>8} {'p99':>8} {'fel':>5} {'git':8} {'config':12}")
+    for run in runs:
+        def num(value, fmt):
+            return format(value, fmt) if value is not None else "-"
+        print(f"{run['id']:>5} {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['timestamp'])):19} "
+              f"{run['scenario'][:16]:16} {num(run['rate'], '>7g')} {'✅' if run['success'] else '❌':>2} "
+              f"{num(run['throughput'], '>8.1f')} {num(run['p50_ms'], '>8.2f')} {num(run['p99_ms'], '>8.2f')} "
+              f"{num(run['errors'], '>5')} {(run['git_sha'] or '-')[:8]:8} {run['config_hash'] or '-':12}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sparade testresultat och regressionskontroll")
+    parser.add_argument("--db", help="Sökväg till databasen")
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_parser = sub.add_parser("list", help="Lista körningar")
+    list_parser.add_argument("--scenario")
+    list_parser.add_argument("--limit", type=int, default=20)
+    check_parser = sub.add_parser("check", help="Jämför en körning mot rullande baseline")
+    check_parser.add_argument("--id", type=int, help="Körning (standard: senaste)")
+    check_parser.add_argument("--window", type=int, default=20)
+    check_parser.add_argument("--alpha", type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.db)
+    if args.command == "list":
+        print_runs(store.query(scenario=args.scenario, limit=args.limit))
+        return 0
+
+    regressions = store.check_regression(args.id, window=args.window, alpha=args.alpha)
+    if regressions:
+        print("⚠️  Signifikanta försämringar mot baseline:")
+        for regression in regressions:
+            print(f"    {regression.describe()}")
+        return 1
+    print("✅ Inga signifikanta försämringar mot baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+"""
+Pod Samplers
+Samplar serversidans statistik och resursanvändning från Kamailio-poddarna
+under en lastkörning, tidsmässigt i linje med lastgeneratorns mätvärden
+"""
+
+import re
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Statistikgrupper som hämtas med stats.get_statistics
+KAMAILIO_STAT_GROUPS = ("core:", "tm:", "sl:", "shmem:")
+
+STAT_LINE = re.compile(r"^\s*([\w.-]+:[\w.-]+)\s*=\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+@dataclass
+class Sample:
+    """Mätvärden från en källa (pod eller "client") vid en tidpunkt"""
+    timestamp: float
+    pod: str
+    values: Dict[str, float] = field(default_factory=dict)
+
+
+def parse_statistics(output: str) -> Dict[str, float]:
+    """
+    Parsa output från "kamcmd stats.get_statistics"
+
+    Exempel: "core:rcv_requests = 1234"
+    """
+    stats = {}
+    for line in output.splitlines():
+        match = STAT_LINE.match(line)
+        if match:
+            stats[match.group(1)] = float(match.group(2))
+    return stats
+
+
+def parse_pkg_stats(output: str) -> Dict[str, float]:
+    """
+    Parsa output från "kamcmd pkg.stats" (ett block per Kamailio-process)
+
+    Returns:
+        Summa och max av privat minne över processerna
+    """
+    processes: List[Dict[str, float]] = []
+    current: Dict[str, float] = {}
+    for line in output.splitlines():
+        line = line.strip()
+        if line == "{":
+            current = {}
+        elif line == "}":
+            processes.append(current)
+        elif ":" in line:
+            key, value = line.split(":", 1)
+            try:
+                current[key.strip()] = float(value.strip())
+            except ValueError:
+                pass
+    if not processes:
+        return {}
+    return {
+        "pkg:processes": float(len(processes)),
+        "pkg:used_total": sum(p.get("used", 0) for p in processes),
+        "pkg:real_used_total": sum(p.get("real_used", 0) for p in processes),
+        "pkg:real_used_max": max(p.get("real_used", 0) for p in processes),
+        "pkg:free_min": min(p.get("free", 0) for p in processes),
+    }
+
+
+class PodSampler:
+    """
+    Bas för samplers som hämtar värden från varje pod med jämna mellanrum
+
+    Alla poddar samplas parallellt vid varje tick, och om lastgeneratorns
+    LoadMetrics är angivna sparas klientens räknare med samma tidsstämpel
+    (pod "client"), så att server- och klientsidan kan jämföras sekund för sekund.
+    """
+
+    source = "pods"
+
+    def __init__(self, namespace: str = "kamailio", label_selector: str = "app=kamailio",
+                 interval: float = 1.0, client_metrics=None, pods: Optional[List[str]] = None):
+        """
+        Args:
+            namespace: Namespace för poddarna
+            label_selector: Label selector för poddarna
+            interval: Sekunder mellan samplingar
+            client_metrics: LoadMetrics från lastgeneratorn att sampla samtidigt
+            pods: Poddar att sampla (hämtas med label selector om None)
+        """
+        self.namespace = namespace
+        self.label_selector = label_selector
+        self.interval = interval
+        self.client_metrics = client_metrics
+        self.pods = list(pods) if pods else []
+        self.samples: List[Sample] = []
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def discover_pods(self) -> List[str]:
+        """Hämta körande poddar"""
+        from sip_test_utils import KubernetesUtils
+        _, pods = KubernetesUtils.check_pods_running(self.namespace, self.label_selector)
+        return pods
+
+    def collect(self, pod: str) -> Optional[Dict[str, float]]:
+        """Hämta värden från en pod (implementeras av subklasser)"""
+        raise NotImplementedError
+
+    def _client_values(self) -> Dict[str, float]:
+        metrics = self.client_metrics
+        return {
+            "client:requests_sent": float(metrics.requests_sent),
+            "client:completed": float(metrics.completed),
+            "client:timeouts": float(metrics.timeouts),
+            "client:retransmissions": float(metrics.retransmissions),
+            "client:inflight": float(metrics.inflight),
+            "client:target_rate": float(metrics.target_rate),
+        }
+
+    def sample_once(self) -> float:
+        """Sampla alla poddar en gång och returnera tidsstämpeln"""
+        start = time.time()
+        if self._executor is not None:
+            results = list(self._executor.map(self.collect, self.pods))
+        else:
+            results = [self.collect(pod) for pod in self.pods]
+        # Tidsstämpeln är mitten av insamlingen
+        timestamp = (start + time.time()) / 2
+        for pod, values in zip(self.pods, results):
+            if values is None:
+                self.errors += 1
+                continue
+            self.samples.append(Sample(timestamp, pod, values))
+        if self.client_metrics is not None:
+            self.samples.append(Sample(timestamp, "client", self._client_values()))
+        return timestamp
+
+    def _loop(self) -> None:
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            self.sample_once()
+            next_tick += self.interval
+            # Hoppa över tick som redan passerat om insamlingen tog för lång tid
+            now = time.monotonic()
+            while next_tick <= now:
+                next_tick += self.interval
+            self._stop.wait(next_tick - now)
+
+    def start(self) -> 'PodSampler':
+        """Starta samplingen i en bakgrundstråd"""
+        if not self.pods:
+            self.pods = self.discover_pods()
+        if not self.pods:
+            logger.warning(f"Inga poddar att sampla ({self.namespace}, {self.label_selector})")
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.pods))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> 'PodSampler':
+        """Stoppa samplingen och ta ett sista sampel"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 15)
+            self._thread = None
+            self.sample_once()
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        return self
+
+    def __enter__(self) -> 'PodSampler':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def series(self, pod: str, name: str) -> List[Tuple[float, float]]:
+        """(tidsstämpel, värde) för ett mått från en pod"""
+        return [(s.timestamp, s.values[name]) for s in self.samples if s.pod == pod and name in s.values]
+
+    def deltas(self) -> Dict[str, Dict[str, float]]:
+        """Skillnad mellan sista och första sampel per pod och mått"""
+        first: Dict[str, Sample] = {}
+        last: Dict[str, Sample] = {}
+        for sample in self.samples:
+            first.setdefault(sample.pod, sample)
+            last[sample.pod] = sample
+        return {
+            pod: {name: last[pod].values.get(name, value) - value for name, value in first[pod].values.items()}
+            for pod in first
+        }
+
+    def peaks(self) -> Dict[str, Dict[str, float]]:
+        """Största värde per pod och mått"""
+        result: Dict[str, Dict[str, float]] = {}
+        for sample in self.samples:
+            pod_peaks = result.setdefault(sample.pod, {})
+            for name, value in sample.values.items():
+                if value > pod_peaks.get(name, float("-inf")):
+                    pod_peaks[name] = value
+        return result
+
+    def summarize(self, client_stats: Optional[Dict] = None) -> Dict:
+        """Sammanfatta samplingen (implementeras av subklasser)"""
+        return {"samples": len(self.samples), "errors": self.errors}
+
+
+class KamailioStatsSampler(PodSampler):
+    """Samplar Kamailios interna statistik (tm, sl, core, shmem, pkg) via kamcmd"""
+
+    source = "kamailio"
+
+    def collect(self, pod: str) -> Optional[Dict[str, float]]:
+        from sip_test_utils import KamailioUtils
+
+        output = KamailioUtils.kamcmd(pod, "stats.get_statistics", *KAMAILIO_STAT_GROUPS,
+                                      namespace=self.namespace)
+        if output is None:
+            return None
+        values = parse_statistics(output)
+        pkg = KamailioUtils.kamcmd(pod, "pkg.stats", namespace=self.namespace)
+        if pkg:
+            values.update(parse_pkg_stats(pkg))
+        return values
+
+    def summarize(self, client_stats: Optional[Dict] = None) -> Dict:
+        """
+        Sammanfatta serversidan och peka ut var en platå uppstår
+
+        Args:
+            client_stats: Lastgeneratorns statistik för samma körning
+
+        Returns:
+            Dict med totaler, per pod-värden och hints
+        """
+        deltas = self.deltas()
+        peaks = self.peaks()
+        pods: Dict[str, Dict[str, float]] = {}
+        for pod in self.pods:
+            if pod not in deltas:
+                continue
+            delta = deltas[pod]
+            peak = peaks.get(pod, {})
+            pods[pod] = {
+                "received_requests": delta.get("core:rcv_requests", 0.0),
+                "sent_replies": delta.get("sl:sent_replies", 0.0) + delta.get("tm:rpl_sent", 0.0),
+                "dropped_requests": delta.get("core:drop_requests", 0.0),
+                "shmem_used_max": peak.get("shmem:real_used_size", 0.0),
+                "shmem_total": peak.get("shmem:total_size", 0.0),
+                "pkg_real_used_max": peak.get("pkg:real_used_max", 0.0),
+            }
+
+        totals = {
+            key: sum(p[key] for p in pods.values())
+            for key in ("received_requests", "sent_replies", "dropped_requests")
+        }
+        summary = {
+            "samples": len(self.samples),
+            "errors": self.errors,
+            "pods": pods,
+            "totals": totals,
+            "hints": self.diagnose(pods, totals, client_stats or {}),
+        }
+        return summary
+
+    @staticmethod
+    def diagnose(pods: Dict[str, Dict[str, float]], totals: Dict[str, float], client_stats: Dict) -> List[str]:
+        """Tips om var förluster eller en platå uppstår"""
+        hints = []
+        if not pods:
+            return ["Ingen serverstatistik (saknas ctl/kex-modulerna eller kubectl-åtkomst?)"]
+
+        sent = client_stats.get("requests_sent", 0) + client_stats.get("retransmissions", 0)
+        received = totals["received_requests"]
+        if sent and received < sent * 0.98:
+            hints.append(f"Nätverksvägen: {sent - received:.0f} av {sent} requests nådde aldrig Kamailio")
+        if received and totals["sent_replies"] < received * 0.98:
+            hints.append(f"Kamailio svarade på {totals['sent_replies']:.0f} av {received:.0f} requests "
+                         f"(workers mättade? se children i kamailio.cfg)")
+        if totals["dropped_requests"]:
+            hints.append(f"Kamailio droppade {totals['dropped_requests']:.0f} requests")
+        answered = client_stats.get("successful", 0) + client_stats.get("failed", 0)
+        if answered and totals["sent_replies"] > answered * 1.02 + client_stats.get("retransmissions", 0):
+            hints.append("Svar försvinner på vägen tillbaka till lastgeneratorn")
+        for pod, values in pods.items():
+            if values["shmem_total"] and values["shmem_used_max"] > 0.9 * values["shmem_total"]:
+                hints.append(f"{pod}: delat minne nästan fullt "
+                             f"({values['shmem_used_max'] / values['shmem_total'] * 100:.0f}%)")
+        return hints
+
+
+# cgroup-filer som läses med en enda "kubectl exec ... grep -H" per pod och tick
+CGROUP_V2_FILES = (
+    "/sys/fs/cgroup/cpu.stat",
+    "/sys/fs/cgroup/cpu.max",
+    "/sys/fs/cgroup/memory.current",
+    "/sys/fs/cgroup/memory.max",
+    "/sys/fs/cgroup/memory.stat",
+)
+CGROUP_V1_FILES = (
+    "/sys/fs/cgroup/cpuacct/cpuacct.usage",
+    "/sys/fs/cgroup/cpu/cpu.stat",
+    "/sys/fs/cgroup/cpu/cpu.cfs_quota_us",
+    "/sys/fs/cgroup/cpu/cpu.cfs_period_us",
+    "/sys/fs/cgroup/memory/memory.usage_in_bytes",
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+    "/sys/fs/cgroup/memory/memory.stat",
+)
+
+# cgroup v1 anger "ingen gräns" som ett mycket stort tal
+CGROUP_V1_UNLIMITED = 1 << 60
+
+QUANTITY_SUFFIXES = {
+    "n": 1e-9, "u": 1e-6, "m": 1e-3, "": 1.0,
+    "k": 1e3, "M": 1e6, "G": 1e9, "T": 1e12,
+    "Ki": 1024.0, "Mi": 1024.0 ** 2, "Gi": 1024.0 ** 3, "Ti": 1024.0 ** 4,
+}
+
+
+def parse_quantity(quantity: str) -> float:
+    """Parsa en Kubernetes-kvantitet, t.ex. "250m", "12345678n" eller "512Mi" """
+    match = re.match(r"^([0-9.eE+-]+)([a-zA-Z]*)$", quantity.strip())
+    if not match or match.group(2) not in QUANTITY_SUFFIXES:
+        raise ValueError(f"Okänd kvantitet: {quantity}")
+    return float(match.group(1)) * QUANTITY_SUFFIXES[match.group(2)]
+
+
+def parse_cgroup_output(output: str) -> Dict[str, List[str]]:
+    """Dela upp "grep -H" -output i rader per fil"""
+    files: Dict[str, List[str]] = {}
+    for line in output.splitlines():
+        path, sep, content = line.partition(":")
+        if sep:
+            files.setdefault(path.rsplit("/", 1)[-1], []).append(content.strip())
+    return files
+
+
+def _key_values(lines: List[str]) -> Dict[str, float]:
+    values = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 2:
+            try:
+                values[parts[0]] = float(parts[1])
+            except ValueError:
+                pass
+    return values
+
+
+def _single_value(lines: List[str]) -> Optional[float]:
+    try:
+        return float(lines[0].split()[0])
+    except (IndexError, ValueError):
+        return None
+
+
+def parse_cgroup_v2(files: Dict[str, List[str]]) -> Dict[str, float]:
+    """Normalisera cgroup v2-värden (sekunder och bytes)"""
+    cpu = _key_values(files.get("cpu.stat", []))
+    memory = _key_values(files.get("memory.stat", []))
+    values = {
+        "cpu:usage_seconds": cpu.get("usage_usec", 0.0) / 1e6,
+        "cpu:periods": cpu.get("nr_periods", 0.0),
+        "cpu:throttled_periods": cpu.get("nr_throttled", 0.0),
+        "cpu:throttled_seconds": cpu.get("throttled_usec", 0.0) / 1e6,
+    }
+    cpu_max = (files.get("cpu.max") or ["max"])[0].split()
+    if cpu_max and cpu_max[0] != "max" and len(cpu_max) == 2:
+        values["cpu:limit_cores"] = float(cpu_max[0]) / float(cpu_max[1])
+    current = _single_value(files.get("memory.current", []))
+    if current is not None:
+        values["memory:working_set_bytes"] = max(0.0, current - memory.get("inactive_file", 0.0))
+    limit = _single_value(files.get("memory.max", []))
+    if limit is not None:
+        values["memory:limit_bytes"] = limit
+    return values
+
+
+def parse_cgroup_v1(files: Dict[str, List[str]]) -> Dict[str, float]:
+    """Normalisera cgroup v1-värden (sekunder och bytes)"""
+    cpu = _key_values(files.get("cpu.stat", []))
+    memory = _key_values(files.get("memory.stat", []))
+    values = {
+        "cpu:usage_seconds": (_single_value(files.get("cpuacct.usage", [])) or 0.0) / 1e9,
+        "cpu:periods": cpu.get("nr_periods", 0.0),
+        "cpu:throttled_periods": cpu.get("nr_throttled", 0.0),
+        "cpu:throttled_seconds": cpu.get("throttled_time", 0.0) / 1e9,
+    }
+    quota = _single_value(files.get("cpu.cfs_quota_us", []))
+    period = _single_value(files.get("cpu.cfs_period_us", []))
+    if quota and quota > 0 and period:
+        values["cpu:limit_cores"] = quota / period
+    usage = _single_value(files.get("memory.usage_in_bytes", []))
+    if usage is not None:
+        values["memory:working_set_bytes"] = max(0.0, usage - memory.get("total_inactive_file", 0.0))
+    limit = _single_value(files.get("memory.limit_in_bytes", []))
+    if limit is not None and limit < CGROUP_V1_UNLIMITED:
+        values["memory:limit_bytes"] = limit
+    return values
+
+
+class PodResourceSampler(PodSampler):
+    """
+    Samplar CPU, CPU-throttling och minne per container
+
+    Läser cgroup-statistik med kubectl exec (v2, annars v1) och faller
+    tillbaka på metrics API när containern saknar grep eller cgroup-filerna
+    inte går att läsa. Metrics API ger bara CPU och minne, inte throttling.
+    """
+
+    source = "resources"
+
+    def __init__(self, namespace: str = "kamailio", label_selector: str = "app=kamailio",
+                 interval: float = 1.0, client_metrics=None, pods: Optional[List[str]] = None,
+                 container: str = "kamailio"):
+        """
+        Args:
+            container: Containern vars resurser samplas (övriga se PodSampler)
+        """
+        super().__init__(namespace, label_selector, interval, client_metrics, pods)
+        self.container = container
+        self.methods: Dict[str, str] = {}
+
+    def _read_cgroup(self, pod: str, files) -> Optional[Dict[str, List[str]]]:
+        from sip_test_utils import KubernetesUtils
+        output = KubernetesUtils.exec_in_pod(pod, self.namespace, ["grep", "-H", ""] + list(files),
+                                             container=self.container, timeout=5)
+        return parse_cgroup_output(output) if output else None
+
+    def _read_metrics_api(self, pod: str) -> Optional[Dict[str, float]]:
+        from sip_test_utils import KubernetesUtils
+        data = KubernetesUtils.get_pod_metrics(pod, self.namespace)
+        if not data:
+            return None
+        for container in data.get("containers", []):
+            if container.get("name") == self.container:
+                usage = container.get("usage", {})
+                try:
+                    return {
+                        "cpu:usage_cores": parse_quantity(usage.get("cpu", "0")),
+                        "memory:working_set_bytes": parse_quantity(usage.get("memory", "0")),
+                    }
+                except ValueError:
+                    return None
+        return None
+
+    def collect(self, pod: str) -> Optional[Dict[str, float]]:
+        method = self.methods.get(pod)
+        if method in (None, "cgroup-v2"):
+            files = self._read_cgroup(pod, CGROUP_V2_FILES)
+            if files and "cpu.stat" in files:
+                self.methods[pod] = "cgroup-v2"
+                return parse_cgroup_v2(files)
+        if method in (None, "cgroup-v1"):
+            files = self._read_cgroup(pod, CGROUP_V1_FILES)
+            if files and "cpuacct.usage" in files:
+                self.methods[pod] = "cgroup-v1"
+                return parse_cgroup_v1(files)
+        values = self._read_metrics_api(pod)
+        if values is not None:
+            self.methods[pod] = "metrics-api"
+        return values
+
+    def _pod_intervals(self, pod: str) -> List[Tuple[float, float, float]]:
+        """(start, slut, använda cores) per intervall för en pod (metrics API: punktvärden)"""
+        usage = self.series(pod, "cpu:usage_seconds")
+        if len(usage) >= 2:
+            return [(t0, t1, (u1 - u0) / (t1 - t0)) for (t0, u0), (t1, u1) in zip(usage, usage[1:]) if t1 > t0]
+        return [(t, t, cores) for t, cores in self.series(pod, "cpu:usage_cores")]
+
+    def _pod_cores(self, pod: str) -> List[Tuple[float, float]]:
+        """(tidsstämpel, använda cores) per intervall för en pod"""
+        return [(t1, cores) for _, t1, cores in self._pod_intervals(pod)]
+
+    def _window_cores(self, pod: str, window: Optional[Dict]) -> List[float]:
+        """
+        Använda cores per intervall inom generatorns sändfönster
+
+        Tomgång före första requesten och avvecklingen efter sista (upp till
+        Timer B) räknas inte, annars blir utnyttjandet för lågt.
+
+        Args:
+            pod: Podden
+            window: {"start", "end"} i väggklocktid (None = alla intervall)
+        """
+        intervals = self._pod_intervals(pod)
+        if window:
+            inside = [c for t0, t1, c in intervals if t0 >= window["start"] and t1 <= window["end"]]
+            # Korta körningar där inget intervall ryms helt: de som överlappar fönstret
+            inside = inside or [c for t0, t1, c in intervals if t1 >= window["start"] and t0 <= window["end"]]
+            if inside:
+                return inside
+        return [c for _, _, c in intervals]
+
+    def profile(self) -> List[Dict[str, float]]:
+        """
+        Lastprofil per intervall: klientens takt bredvid CPU och throttling
+
+        Returns:
+            En rad per tick med tid (s från start), takt, cores och throttlade perioder (%)
+        """
+        client = self.series("client", "client:requests_sent")
+        if not client:
+            return []
+        start = client[0][0]
+        cores_by_time: Dict[float, float] = {}
+        throttled_by_time: Dict[float, Tuple[float, float]] = {}
+        for pod in self.pods:
+            for timestamp, cores in self._pod_cores(pod):
+                cores_by_time[timestamp] = cores_by_time.get(timestamp, 0.0) + cores
+            periods = self.series(pod, "cpu:periods")
+            throttled = self.series(pod, "cpu:throttled_periods")
+            for (t0, p0), (t1, p1), (_, n0), (_, n1) in zip(periods, periods[1:], throttled, throttled[1:]):
+                total, count = throttled_by_time.get(t1, (0.0, 0.0))
+                throttled_by_time[t1] = (total + p1 - p0, count + n1 - n0)
+
+        rows = []
+        for (t0, s0), (t1, s1) in zip(client, client[1:]):
+            periods, throttled = throttled_by_time.get(t1, (0.0, 0.0))
+            rows.append({
+                "time_s": round(t1 - start, 2),
+                "rate": round((s1 - s0) / (t1 - t0), 1) if t1 > t0 else 0.0,
+                "cpu_cores": round(cores_by_time.get(t1, 0.0), 3),
+                "throttled_pct": round(throttled / periods * 100, 1) if periods else 0.0,
+            })
+        return rows
+
+    def summarize(self, client_stats: Optional[Dict] = None) -> Dict:
+        """
+        Sammanfatta CPU, throttling och minne per pod
+
+        Args:
+            client_stats: Lastgeneratorns statistik (CPU-kostnad per 1k RPS; både CPU och
+                          takt räknas inom dess send_window)
+
+        Returns:
+            Dict med per pod-värden, totaler, millicores per 1k RPS, profil och hints
+        """
+        client_stats = client_stats or {}
+        deltas = self.deltas()
+        peaks = self.peaks()
+        pods: Dict[str, Dict] = {}
+        for pod in self.pods:
+            if pod not in deltas:
+                continue
+            delta = deltas[pod]
+            peak = peaks.get(pod, {})
+            cores = self._window_cores(pod, client_stats.get("send_window"))
+            periods = delta.get("cpu:periods", 0.0)
+            limit_cores = peak.get("cpu:limit_cores", 0.0)
+            memory_limit = peak.get("memory:limit_bytes", 0.0)
+            cores_avg = sum(cores) / len(cores) if cores else 0.0
+            pods[pod] = {
+                "method": self.methods.get(pod, ""),
+                "cpu_cores_avg": round(cores_avg, 4),
+                "cpu_cores_peak": round(max(cores), 4) if cores else 0.0,
+                "cpu_limit_cores": limit_cores,
+                "cpu_utilization": round(cores_avg / limit_cores, 3) if limit_cores else None,
+                "throttled_ratio": round(delta.get("cpu:throttled_periods", 0.0) / periods, 3) if periods else 0.0,
+                "throttled_seconds": round(delta.get("cpu:throttled_seconds", 0.0), 3),
+                "memory_working_set_max": peak.get("memory:working_set_bytes", 0.0),
+                "memory_limit": memory_limit,
+                "memory_utilization": (round(peak.get("memory:working_set_bytes", 0.0) / memory_limit, 3)
+                                       if memory_limit else None),
+            }
+
+        total_cores = sum(p["cpu_cores_avg"] for p in pods.values())
+        # Takten över samma fönster som CPU:n; throughput delar även med avvecklingen (upp till Timer B)
+        window = client_stats.get("send_window")
+        window_s = window["end"] - window["start"] if window else 0.0
+        if window_s > 0 and client_stats.get("successful") is not None:
+            rps = client_stats["successful"] / window_s
+        else:
+            rps = client_stats.get("throughput") or client_stats.get("achieved_rate") or 0.0
+        summary = {
+            "samples": len(self.samples),
+            "errors": self.errors,
+            "pods": pods,
+            "cpu_cores_total": round(total_cores, 4),
+            # CPU-kostnad: millicores per 1000 requests/s
+            "millicores_per_1k_rps": round(total_cores * 1000 / (rps / 1000), 1) if rps else None,
+            "profile": self.profile(),
+            "hints": [],
+        }
+        for pod, values in pods.items():
+            if values["throttled_ratio"] > 0.05:
+                summary["hints"].append(
+                    f"{pod}: CPU-throttling i {values['throttled_ratio'] * 100:.0f}% av perioderna "
+                    f"(gräns {values['cpu_limit_cores']:g} cores) - taket är troligen CPU-gränsen")
+            if values["memory_utilization"] and values["memory_utilization"] > 0.9:
+                summary["hints"].append(f"{pod}: minnet nära gränsen ({values['memory_utilization'] * 100:.0f}%)")
+        return summary
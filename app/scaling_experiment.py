@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Skalningsexperiment: kapacitet mot antal Kamailio-replikor
+
+Deploymenten skalas till varje antal i listan, och när replikerna är
+redo körs en kapacitetssökning med CPU-sampling per pod. Resultatet är
+en skalningskurva med effektivitet: hur mycket av en replikas kapacitet
+varje tillagd replika faktiskt gav.
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEPLOYMENT = "kamailio"
+
+# Under denna marginaleffektivitet lönar det sig inte att lägga till poddar
+EFFICIENCY_LIMIT = 0.7
+
+# Replikor som räknas som CPU-bundna vid kapaciteten (andel av CPU-gränsen)
+CPU_BOUND_UTILIZATION = 0.8
+
+
+def scaling_curve(points: List[Dict]) -> List[Dict]:
+    """
+    Effektivitet per punkt på skalningskurvan
+
+    Basen är kapaciteten per replika i den första lyckade punkten.
+    efficiency är kapaciteten delat med linjär skalning från basen, och
+    marginal_efficiency är vad replikorna som lades till sedan föregående
+    punkt gav, i andelar av basens kapacitet per replika.
+
+    Args:
+        points: Punkter med replicas och capacity_cps, i stigande ordning
+
+    Returns:
+        Samma punkter med per_replica_cps, efficiency och marginal_efficiency
+    """
+    measured = [p for p in points if p.get("capacity_cps")]
+    base = measured[0]["capacity_cps"] / measured[0]["replicas"] if measured else 0.0
+    previous = None
+    curve = []
+    for point in points:
+        point = dict(point)
+        cps = point.get("capacity_cps") or 0.0
+        point["per_replica_cps"] = round(cps / point["replicas"], 1) if point["replicas"] else 0.0
+        point["efficiency"] = round(cps / (base * point["replicas"]), 3) if base and cps else None
+        point["marginal_efficiency"] = None
+        if previous is not None and base and cps and point["replicas"] > previous["replicas"]:
+            added = point["replicas"] - previous["replicas"]
+            point["marginal_efficiency"] = round((cps - previous["capacity_cps"]) / (added * base), 3)
+        if cps:
+            previous = point
+        curve.append(point)
+    return curve
+
+
+def diagnose(curve: List[Dict]) -> List[str]:
+    """Tips om när poddar respektive noder ska läggas till"""
+    hints = []
+    for point in curve:
+        if point.get("error"):
+            hints.append(f"{point['replicas']} replikor: {point['error']}")
+    measured = [p for p in curve if p.get("capacity_cps")]
+    if len(measured) < 2:
+        return hints + ["För få mätpunkter för en skalningskurva"]
+
+    for point in measured[1:]:
+        marginal = point["marginal_efficiency"]
+        if marginal is None or marginal >= EFFICIENCY_LIMIT:
+            continue
+        utilization = point.get("cpu_utilization")
+        if utilization is not None and utilization >= CPU_BOUND_UTILIZATION:
+            hints.append(f"Vid {point['replicas']} replikor gav varje ny replika {marginal * 100:.0f}% och "
+                         f"replikorna går på {utilization * 100:.0f}% av CPU-gränsen: noderna räcker inte, "
+                         "lägg till noder")
+        else:
+            hints.append(f"Vid {point['replicas']} replikor gav varje ny replika {marginal * 100:.0f}% utan att "
+                         "replikorna är CPU-bundna: flaskhalsen ligger utanför poddarna (lastbalanserare, "
+                         "nodens nätverk eller lastgeneratorn)")
+        break
+    else:
+        hints.append(f"Nära linjär skalning upp till {measured[-1]['replicas']} replikor: lägg till poddar")
+    return hints
+
+
+def _cpu_per_replica(summary: Dict) -> Dict:
+    """CPU per pod vid kapaciteten från PodResourceSampler-sammanfattningen"""
+    pods = (summary.get("resources") or {}).get("pods", {})
+    cores = {pod: values["cpu_cores_avg"] for pod, values in pods.items()}
+    utilizations = [values["cpu_utilization"] for values in pods.values() if values.get("cpu_utilization")]
+    return {
+        "cpu_cores": cores,
+        "cpu_cores_avg": round(sum(cores.values()) / len(cores), 4) if cores else None,
+        "cpu_utilization": round(max(utilizations), 3) if utilizations else None,
+    }
+
+
+class ScalingExperiment:
+    """
+    Skala Kamailio-deploymenten och mät kapaciteten vid varje antal replikor
+
+    Args:
+        tester: SippTester som kör kapacitetssökningarna
+        replica_counts: Antal replikor att mäta, t.ex. [1, 2, 3, 4]
+        scenario: Scenario för lasten
+        deployment: Deploymenten som skalas
+        namespace: Deploymentens namespace
+        ready_timeout: Sekunder att vänta på att replikerna blir redo
+        source_ports_per_replica: Källportar per replika, så att lasten sprids
+        **search_options: Vidare till SippTester.find_capacity (start_rate, p99_ms, ...)
+    """
+
+    def __init__(self, tester, replica_counts: List[int], scenario: str = "options",
+                 deployment: str = DEFAULT_DEPLOYMENT, namespace: str = "kamailio",
+                 ready_timeout: int = 300, source_ports_per_replica: int = 32, **search_options):
+        if not replica_counts or min(replica_counts) < 1:
+            raise ValueError("replica_counts måste innehålla antal större än 0")
+        self.tester = tester
+        self.replica_counts = sorted(set(replica_counts))
+        self.scenario = scenario
+        self.deployment = deployment
+        self.namespace = namespace
+        self.ready_timeout = ready_timeout
+        self.source_ports_per_replica = source_ports_per_replica
+        self.search_options = search_options
+        self.points: List[Dict] = []
+
+    def measure(self, replicas: int) -> Dict:
+        """Skala till replicas och kör en kapacitetssökning"""
+        from sip_test_utils import KubernetesUtils
+
+        logger.info(f"📈 Skalar {self.deployment} till {replicas} replikor")
+        if not KubernetesUtils.scale_deployment(self.deployment, self.namespace, replicas, self.ready_timeout):
+            return {"replicas": replicas, "capacity_cps": None,
+                    "error": f"replikorna blev inte redo inom {self.ready_timeout}s"}
+
+        options = dict(self.search_options)
+        options.setdefault("source_ports", self.source_ports_per_replica * replicas)
+        result = self.tester.find_capacity(self.scenario, sample_resources=True, **options)
+        summary = result.statistics
+        point = {
+            "replicas": replicas,
+            "capacity_cps": summary.get("capacity_cps") or None,
+            "target_rate": summary.get("target_rate"),
+            "latency_ms": summary.get("latency_ms", {}),
+            "limit": summary.get("limit"),
+        }
+        point.update(_cpu_per_replica(summary))
+        if "distribution" in summary:
+            point["imbalance"] = summary["distribution"].get("imbalance")
+        if not point["capacity_cps"]:
+            point["error"] = result.error or summary.get("limit") or "inget steg klarade kraven"
+        return point
+
+    def run(self) -> Dict:
+        """
+        Mät alla punkter och återställ deploymentens antal replikor
+
+        Returns:
+            Se summarize()
+        """
+        from sip_test_utils import KubernetesUtils
+
+        original = KubernetesUtils.get_deployment_replicas(self.deployment, self.namespace)
+        self.points = []
+        try:
+            for replicas in self.replica_counts:
+                self.points.append(self.measure(replicas))
+        finally:
+            if original is not None:
+                logger.info(f"↩️  Återställer {self.deployment} till {original} replikor")
+                KubernetesUtils.scale_deployment(self.deployment, self.namespace, original, self.ready_timeout)
+        return self.summarize()
+
+    def summarize(self) -> Dict:
+        """
+        Returns:
+            Dict med skalningskurvan (curve), scenario och hints
+        """
+        curve = scaling_curve(self.points)
+        return {
+            "scenario": self.scenario,
+            "deployment": f"{self.namespace}/{self.deployment}",
+            "curve": curve,
+            "hints": diagnose(curve),
+        }
+
+
+def format_scaling_curve(summary: Dict) -> str:
+    """Skalningskurvan som tabell"""
+    lines = [f"Skalning av {summary['deployment']} ({summary['scenario']}):",
+             f"{'replikor':>8} {'CPS':>9} {'CPS/replika':>11} {'p99 ms':>8} {'cores/replika':>13} "
+             f"{'effektivitet':>12} {'marginal':>8}"]
+    for point in summary["curve"]:
+        if not point.get("capacity_cps"):
+            lines.append(f"{point['replicas']:>8} {'-':>9} {point.get('error', '')}")
+            continue
+
+        def pct(value: Optional[float]) -> str:
+            return f"{value * 100:.0f}%" if value is not None else "-"
+
+        cores = point.get("cpu_cores_avg")
+        lines.append(f"{point['replicas']:>8} {point['capacity_cps']:>9.1f} {point['per_replica_cps']:>11.1f} "
+                     f"{point['latency_ms'].get('p99', '-')!s:>8} {cores if cores is not None else '-'!s:>13} "
+                     f"{pct(point['efficiency']):>12} {pct(point['marginal_efficiency']):>8}")
+    lines.extend(f"Skalning: {hint}" for hint in summary["hints"])
+    return "\n".join(lines)
@@ -0,0 +1,968 @@
+#!/usr/bin/env python3
+"""
+SIP Load Generator
+Lastgenerator för Kamailio över UDP, TCP eller TLS med transaktionshantering
+enligt RFC 3261 (omsändningar, timeouts) och live-mätvärden via metrics.LoadMetrics
+"""
+
+import heapq
+import os
+import random
+import select
+import selectors
+import socket
+import ssl
+import threading
+import time
+import logging
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# SIP-metod per scenario (samma requests som SIPp-scenarierna skickar)
+SCENARIO_METHODS = {
+    "options": "OPTIONS",
+    "register": "REGISTER",
+    "invite": "INVITE",
+    "ping": "MESSAGE",
+}
+
+BRANCH_MAGIC = "z9hG4bK"
+
+# Transport -> värdet i Via; TCP och TLS är tillförlitliga och skickas inte om (RFC 3261 17.1.1.2)
+TRANSPORTS = {"udp": "UDP", "tcp": "TCP", "tls": "TLS"}
+
+# Ankomstprocesser för nya transaktioner (öppen loop: schemat väntar aldrig på svar)
+ARRIVALS = ("constant", "poisson", "onoff")
+
+# Sista biten före en planerad sändning väntas ut aktivt; time.sleep kan sova
+# en schemaläggningsperiod för länge och skulle annars synas som latens
+SPIN_S = 0.0002
+
+
+def arrival_offsets(arrival: str = "constant", rate: float = 10.0, seed: Optional[int] = None,
+                    burst_on: float = 1.0, burst_off: float = 1.0) -> Iterator[float]:
+    """
+    Planerade sändtider i sekunder från start, i oändlighet
+
+    Args:
+        arrival: constant (jämnt avstånd), poisson (exponentialfördelade
+                 mellanankomsttider) eller onoff (skurar: burst_on sekunder
+                 med last, burst_off sekunder tyst)
+        rate: Medeltakt i transaktioner per sekund (onoff skickar med
+              rate * (burst_on + burst_off) / burst_on under skurarna)
+        seed: Frö för poisson, så att samma schema kan köras om
+        burst_on: Sekunder per skur (onoff)
+        burst_off: Sekunder tyst mellan skurar (onoff)
+    """
+    if arrival not in ARRIVALS:
+        raise ValueError(f"Okänd ankomstprocess: {arrival} (välj bland {', '.join(ARRIVALS)})")
+    if arrival == "onoff" and (burst_on <= 0 or burst_off < 0):
+        raise ValueError("burst_on måste vara större än 0 och burst_off minst 0")
+
+    def poisson() -> Iterator[float]:
+        rng = random.Random(seed)
+        offset = 0.0
+        while True:
+            yield offset
+            offset += rng.expovariate(rate)
+
+    def onoff() -> Iterator[float]:
+        interval = burst_on / (rate * (burst_on + burst_off))
+        seq = 0
+        while True:
+            # Tid räknad i på-tid, förskjuten med de tysta perioderna före
+            active = seq * interval
+            # (avrundningsmarginal så att en sändning exakt på skurgränsen hamnar i nästa skur)
+            yield active + int(active / burst_on + 1e-9) * burst_off
+            seq += 1
+
+    def constant() -> Iterator[float]:
+        seq = 0
+        while True:
+            yield seq / rate
+            seq += 1
+
+    return {"constant": constant, "poisson": poisson, "onoff": onoff}[arrival]()
+
+
+def build_request(method: str, target: Tuple[str, int], local: Tuple[str, int],
+                  branch: str, call_id: str, seq: int, transport: str = "UDP") -> bytes:
+    """
+    Bygg en SIP-request som motsvarar SIPp-scenariot för metoden
+
+    Args:
+        method: SIP-metod
+        target: (host, port) för Kamailio
+        local: (ip, port) som används i Via och Contact
+        branch: Via-branch (transaktions-ID)
+        call_id: Call-ID
+        seq: Löpnummer (används i From-tag)
+        transport: Transport i Via (UDP, TCP, TLS)
+
+    Returns:
+        Rå SIP-request
+    """
+    local_ip, local_port = local
+    user = "ping" if method == "MESSAGE" else "load"
+    uri = "sip:test@kamailio.local" if method == "INVITE" else "sip:kamailio.local"
+    body = "ping" if method == "MESSAGE" else ""
+    lines = [
+        f"{method} {uri} SIP/2.0",
+        f"Via: SIP/2.0/{transport} {local_ip}:{local_port};branch={branch};rport",
+        "Max-Forwards: 70",
+        f"From: <sip:{user}@kamailio.local>;tag={seq}",
+        f"To: <{uri}>",
+        f"Call-ID: {call_id}",
+        f"CSeq: 1 {method}",
+        f"Contact: <sip:{user}@{local_ip}:{local_port}>",
+        "User-Agent: sip-k8s-lab load",
+    ]
+    if body:
+        lines.append("Content-Type: text/plain")
+    lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n" + body).encode()
+
+
+def build_ack(request: bytes, response: bytes) -> bytes:
+    """ACK på ett slutgiltigt INVITE-svar (To-tag tas från svaret)"""
+    head = request.split(b"\r\n\r\n", 1)[0].decode().split("\r\n")
+    to_header = ""
+    for line in response.split(b"\r\n\r\n", 1)[0].decode(errors="replace").split("\r\n"):
+        if line.lower().startswith("to:"):
+            to_header = line
+            break
+    lines = ["ACK " + head[0].split(" ")[1] + " SIP/2.0"]
+    for line in head[1:]:
+        name = line.split(":", 1)[0].lower()
+        if name in ("via", "max-forwards", "from", "call-id"):
+            lines.append(line)
+        elif name == "to":
+            lines.append(to_header or line)
+        elif name == "cseq":
+            lines.append("CSeq: 1 ACK")
+    lines.append("Content-Length: 0")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+def parse_response(data: bytes) -> Optional[Tuple[int, str]]:
+    """
+    Plocka ut svarskod och branch ur översta Via
+
+    Returns:
+        (svarskod, branch) eller None om meddelandet inte är ett svar
+    """
+    if not data.startswith(b"SIP/2.0 "):
+        return None
+    try:
+        code = int(data[8:11])
+    except ValueError:
+        return None
+    start = data.find(b"branch=")
+    if start < 0:
+        return None
+    start += 7
+    end = start
+    while end < len(data) and data[end] not in b";,\r\n ":
+        end += 1
+    return code, data[start:end].decode(errors="replace")
+
+
+def split_stream_messages(buffer: bytes) -> Tuple[List[bytes], bytes]:
+    """
+    Dela upp en TCP/TLS-ström i hela SIP-meddelanden via Content-Length
+
+    Args:
+        buffer: Mottagna bytes som ännu inte hanterats
+
+    Returns:
+        (hela meddelanden, rest som väntar på fler bytes)
+    """
+    messages = []
+    while True:
+        # CRLF-keepalives (RFC 5626) mellan meddelanden
+        stripped = buffer.lstrip(b"\r\n")
+        end = stripped.find(b"\r\n\r\n")
+        if end < 0:
+            return messages, stripped
+        length = 0
+        for line in stripped[:end].split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            if name.strip().lower() in (b"content-length", b"l"):
+                try:
+                    length = int(value.strip())
+                except ValueError:
+                    length = 0
+                break
+        total = end + 4 + length
+        if len(stripped) < total:
+            return messages, stripped
+        messages.append(stripped[:total])
+        buffer = stripped[total:]
+
+
+def tls_client_context(ca_file: Optional[str] = None) -> ssl.SSLContext:
+    """
+    TLS-kontext för lastgeneratorn
+
+    Utan ca_file verifieras inte certifikatet (labbets Kamailio har
+    självsignerade certifikat), med ca_file verifieras kedjan men inte
+    värdnamnet eftersom målet ofta är en IP-adress.
+    """
+    context = ssl.create_default_context(cafile=ca_file)
+    context.check_hostname = False
+    if not ca_file:
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _read_session_ticket(sock: ssl.SSLSocket, timeout: float = 0.2) -> None:
+    """I TLS 1.3 kommer sessionsbiljetten efter handskakningen och behandlas först vid recv"""
+    if sock.version() != "TLSv1.3":
+        return
+    previous = sock.gettimeout()
+    deadline = time.perf_counter() + timeout
+    sock.setblocking(False)
+    try:
+        while not (sock.session and sock.session.has_ticket) and time.perf_counter() < deadline:
+            select.select([sock], [], [], max(0.0, deadline - time.perf_counter()))
+            try:
+                sock.recv(1)
+            except (ssl.SSLWantReadError, BlockingIOError):
+                pass
+    except OSError:
+        pass
+    finally:
+        sock.settimeout(previous)
+
+
+def open_stream(host: str, port: int, transport: str = "tcp", local: Optional[Tuple[str, int]] = None,
+                tls_context: Optional[ssl.SSLContext] = None, session: Optional[ssl.SSLSession] = None,
+                timeout: float = 5.0) -> Tuple[socket.socket, Dict]:
+    """
+    Öppna en TCP- eller TLS-anslutning och mät uppkopplingen
+
+    Args:
+        host, port: Målet
+        transport: tcp eller tls
+        local: (ip, port) att binda, standard valfri
+        tls_context: Se tls_client_context()
+        session: TLS-session att återuppta
+        timeout: Sekunder för connect och handskakning
+
+    Returns:
+        (socket, dict med connect_s, handshake_s och resumed)
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if local:
+            sock.bind(local)
+        sock.settimeout(timeout)
+        start = time.perf_counter()
+        sock.connect((host, port))
+        connected = time.perf_counter()
+        timing = {"connect_s": connected - start, "handshake_s": 0.0, "resumed": False}
+        if transport == "tls":
+            context = tls_context or tls_client_context()
+            sock = context.wrap_socket(sock, server_hostname=host if context.check_hostname else None,
+                                       session=session)
+            timing["handshake_s"] = time.perf_counter() - connected
+            timing["resumed"] = sock.session_reused
+        return sock, timing
+    except (OSError, ssl.SSLError):
+        sock.close()
+        raise
+
+
+def measure_handshakes(host: str, port: int, transport: str = "tls", count: int = 100,
+                       tls_context: Optional[ssl.SSLContext] = None, resumption: bool = False,
+                       timeout: float = 5.0) -> Dict:
+    """
+    Öppna och stäng count anslutningar i följd och mät uppkopplingens kostnad
+
+    Args:
+        host, port: Målet
+        transport: tcp eller tls
+        count: Antal anslutningar
+        tls_context: Se tls_client_context()
+        resumption: Återuppta föregående anslutnings TLS-session
+        timeout: Sekunder per anslutning
+
+    Returns:
+        Dict med antal, återupptagna, takt (anslutningar/s) och latens i ms
+        för connect och handskakning
+    """
+    from metrics import LatencyHistogram
+
+    context = tls_context or (tls_client_context() if transport == "tls" else None)
+    connect, handshake = LatencyHistogram(), LatencyHistogram()
+    completed = resumed = 0
+    errors: List[str] = []
+    session = None
+    start = time.perf_counter()
+    for _ in range(count):
+        try:
+            sock, timing = open_stream(host, port, transport, tls_context=context,
+                                       session=session if resumption else None, timeout=timeout)
+        except (OSError, ssl.SSLError) as e:
+            errors.append(str(e))
+            continue
+        try:
+            if resumption and transport == "tls":
+                _read_session_ticket(sock)
+                session = sock.session
+        finally:
+            sock.close()
+        completed += 1
+        resumed += timing["resumed"]
+        connect.record(timing["connect_s"])
+        if transport == "tls":
+            handshake.record(timing["handshake_s"])
+    elapsed = time.perf_counter() - start
+    return {
+        "transport": transport,
+        "target": f"{host}:{port}",
+        "resumption": resumption,
+        "attempted": count,
+        "completed": completed,
+        "failed": len(errors),
+        "resumed": resumed,
+        "rate": round(completed / elapsed, 1) if elapsed else 0.0,
+        "connect_ms": connect.summary_ms(),
+        "handshake_ms": handshake.summary_ms(),
+        "errors": errors[:3],
+    }
+
+
+def _local_ip_for(host: str) -> str:
+    """IP-adressen som kärnan väljer för att nå host"""
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        probe.connect((host, 9))
+        return probe.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+    finally:
+        probe.close()
+
+
+class _Transaction:
+    """En klienttransaktion som väntar på slutgiltigt svar"""
+    __slots__ = ("data", "sock", "intended", "first_sent", "interval", "deadline", "is_invite", "provisional")
+
+    def __init__(self, data: bytes, sock: socket.socket, intended: float, first_sent: float, interval: float,
+                 deadline: float, is_invite: bool):
+        self.data = data
+        self.sock = sock
+        self.intended = intended
+        self.first_sent = first_sent
+        self.interval = interval
+        self.deadline = deadline
+        self.is_invite = is_invite
+        self.provisional = False
+
+
+class SipLoadGenerator:
+    """
+    Skickar SIP-requests enligt en ankomstprocess och mäter svar
+
+    Lasten är en öppen loop: varje transaktion har en planerad sändtid
+    (arrival_offsets) som inte beror på svaren, och latensen räknas från
+    den planerade tiden. Om Kamailio eller generatorn stannar upp skickas
+    det som skulle ha skickats så fort det går, och väntetiden syns i
+    p99/p999 i stället för att döljas (coordinated omission). Latensen
+    från faktisk sändning och hur sent sändningarna låg mot schemat
+    redovisas separat.
+
+    Sändartråden äger takten, omsändningar och timeouts; mottagartråden
+    matchar svar mot öppna transaktioner via branch. Transaktionstabellen
+    är en dict där båda trådarna bara gör atomära get/pop, och varje
+    räknare i LoadMetrics har en enda skrivare, så inget lås tas per request.
+
+    Med source_ports/source_ips sprids transaktionerna över flera lokala
+    sockets. UDP från en enda källport hamnar på samma replika via
+    conntrack, så spridningen behövs för att lasten ska fördelas som från
+    många riktiga klienter. Omsändningar går från samma socket som originalet.
+
+    Över TCP och TLS är varje källa en anslutning som öppnas innan lasten
+    startar. Sändartråden och mottagartråden delar anslutningen, så skrivning
+    och läsning tas under ett lås per anslutning (SSL-sockets tål inte
+    samtidiga anrop). Requests skickas inte om, bara Timer B/F gäller.
+    """
+
+    def __init__(self, host: str, port: int = 5060, scenario: str = "options",
+                 rate: float = 10.0, duration: float = 10.0, max_requests: Optional[int] = None,
+                 local_host: str = "0.0.0.0", local_port: int = 0,
+                 t1: float = 0.5, t2: float = 4.0, transaction_timeout: Optional[float] = None,
+                 metrics=None, register_metrics: bool = True, record_send_times: bool = False,
+                 source_ports: int = 1, source_ips: Optional[List[str]] = None,
+                 transport: str = "udp", tls_context: Optional[ssl.SSLContext] = None,
+                 tls_resumption: bool = True, arrival: str = "constant", seed: Optional[int] = None,
+                 burst_on: float = 1.0, burst_off: float = 1.0):
+        """
+        Args:
+            host: Kamailio-adress
+            port: Kamailio-port
+            scenario: Scenario (options, register, invite, ping)
+            rate: Nya transaktioner per sekund (medeltakt)
+            duration: Hur länge nya transaktioner skickas (sekunder)
+            max_requests: Sluta efter så många transaktioner (None = ingen gräns)
+            local_host: Lokal adress att binda
+            local_port: Lokal port att binda (0 väljer en ledig port)
+            t1: RFC 3261 T1, första omsändningsintervall
+            t2: RFC 3261 T2, max omsändningsintervall för icke-INVITE
+            transaction_timeout: Timer B/F (standard 64*T1)
+            metrics: LoadMetrics att uppdatera (skapas om None)
+            register_metrics: Exponera mätvärdena i det gemensamma metrics-registret
+            record_send_times: Spara väggklocktiden för varje ny transaktion (8 byte per
+                               request), för envägsfördröjning mot serverns loggar
+            source_ports: Antal lokala portar per källadress att sprida transaktionerna över
+                          (med local_port satt används local_port, local_port+1, ...)
+            source_ips: Lokala adresser att binda (standard local_host), t.ex. flera
+                        IP-alias för att även variera källadressen
+            transport: udp, tcp eller tls (source_ports blir antal anslutningar)
+            tls_context: TLS-kontext (standard tls_client_context())
+            tls_resumption: Återuppta första anslutningens TLS-session i övriga
+            arrival: Ankomstprocess: constant, poisson eller onoff (se arrival_offsets)
+            seed: Frö för poisson
+            burst_on: Sekunder per skur (onoff)
+            burst_off: Sekunder tyst mellan skurar (onoff)
+        """
+        from metrics import LoadMetrics, get_metrics_registry
+
+        scenario = scenario.lower()
+        if scenario not in SCENARIO_METHODS:
+            raise ValueError(f"Okänt scenario: {scenario} (välj bland {', '.join(SCENARIO_METHODS)})")
+        if rate <= 0:
+            raise ValueError("rate måste vara större än 0")
+        if source_ports < 1:
+            raise ValueError("source_ports måste vara minst 1")
+        transport = transport.lower()
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Okänd transport: {transport} (välj bland {', '.join(TRANSPORTS)})")
+        arrival = arrival.lower()
+        self._offsets = arrival_offsets(arrival, rate, seed, burst_on, burst_off)
+
+        self.host = host
+        self.port = int(port)
+        self.scenario = scenario
+        self.method = SCENARIO_METHODS[scenario]
+        self.rate = float(rate)
+        self.arrival = arrival
+        self.duration = float(duration)
+        self.max_requests = max_requests
+        self.local_host = local_host
+        self.local_port = local_port
+        self.t1 = t1
+        self.t2 = t2
+        self.source_ports = int(source_ports)
+        self.source_ips = list(source_ips) if source_ips else [local_host]
+        self.transaction_timeout = transaction_timeout if transaction_timeout is not None else 64 * t1
+        self.transport = transport
+        self.reliable = transport != "udp"
+        self.tls_context = tls_context
+        self.tls_resumption = tls_resumption
+        self.metrics = metrics or LoadMetrics({"scenario": scenario, "target": f"{host}:{self.port}"})
+        if register_metrics:
+            get_metrics_registry().register(self.metrics)
+
+        self._pending: Dict[str, _Transaction] = {}
+        self._socks: List[socket.socket] = []
+        self._locks: Dict[socket.socket, threading.Lock] = {}
+        self._connections: Dict = {}
+        # Jitter som medelvärdet av |skillnaden| mellan på varandra följande latenser
+        self._last_latency: Optional[float] = None
+        self._jitter_total = 0.0
+        self._jitter_count = 0
+        self._stop = threading.Event()
+        self._receiving = threading.Event()
+        self._run_id = f"{os.getpid():x}{int(time.time() * 1000) & 0xffffff:x}"
+        self.send_times: Optional[array] = array("d") if record_send_times else None
+        self._wall_offset = 0.0
+        # Sändfönstret (perf_counter): första planerade sändning till sista sändningen
+        self._send_start = 0.0
+        self._send_end: Optional[float] = None
+
+    def stop(self) -> None:
+        """Avbryt en pågående körning (öppna transaktioner räknas inte som timeouts)"""
+        self._stop.set()
+
+    def run(self) -> Dict:
+        """
+        Kör lasten till duration/max_requests är nådd och alla transaktioner avslutats
+
+        Returns:
+            Statistik för körningen (se statistics())
+        """
+        locals_: List[Tuple[str, int]] = []
+        try:
+            for ip in self.source_ips:
+                for offset in range(self.source_ports):
+                    # Anslutningar får alltid en ledig port: en fast port hamnar i TIME_WAIT
+                    # när anslutningen stängs och kan inte återanvändas i nästa körning
+                    local = (ip, self.local_port + offset if self.local_port and not self.reliable else 0)
+                    sock = self._open_stream(local) if self.reliable else self._open_datagram(local)
+                    if self.reliable:
+                        # Låset per anslutning får aldrig hållas medan en läsning väntar
+                        sock.setblocking(False)
+                    else:
+                        sock.settimeout(0.1)
+                    via_ip = ip if ip not in ("0.0.0.0", "") else _local_ip_for(self.host)
+                    locals_.append((via_ip, sock.getsockname()[1]))
+        except (OSError, ssl.SSLError):
+            self._close_sockets()
+            raise
+
+        source = f"{locals_[0][0]}:{locals_[0][1]}"
+        if len(locals_) > 1:
+            source += f" (+{len(locals_) - 1} {'anslutningar' if self.reliable else 'källadresser'})"
+        logger.info(f"🚀 Last: {self.method} över {TRANSPORTS[self.transport]} mot {self.host}:{self.port}, "
+                    f"{self.rate:g}/s i {self.duration:g}s från {source}")
+
+        self._receiving.set()
+        receiver = threading.Thread(target=self._receive_loop, daemon=True)
+        receiver.start()
+        start = time.perf_counter()
+        self._wall_offset = time.time() - start
+        self._send_start, self._send_end = start, None
+        try:
+            self._send_loop(locals_, start)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.metrics.target_rate = 0.0
+            self._receiving.clear()
+            receiver.join(timeout=2)
+            self._close_sockets()
+
+        return self.statistics(elapsed)
+
+    def _open_datagram(self, local: Tuple[str, int]) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socks.append(sock)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        sock.bind(local)
+        return sock
+
+    def _open_stream(self, local: Tuple[str, int]) -> socket.socket:
+        """Öppna en anslutning; uppkopplingen mäts separat från lasten"""
+        from metrics import LatencyHistogram
+
+        connections = self._connections
+        if not connections:
+            connections.update(opened=0, resumed=0, closed_by_peer=0, session=None,
+                               connect=LatencyHistogram(), handshake=LatencyHistogram())
+            if self.transport == "tls" and self.tls_context is None:
+                self.tls_context = tls_client_context()
+        sock, timing = open_stream(self.host, self.port, self.transport, local, self.tls_context,
+                                   connections["session"] if self.tls_resumption else None)
+        self._socks.append(sock)
+        self._locks[sock] = threading.Lock()
+        connections["opened"] += 1
+        connections["resumed"] += timing["resumed"]
+        connections["connect"].record(timing["connect_s"])
+        if self.transport == "tls":
+            connections["handshake"].record(timing["handshake_s"])
+            if self.tls_resumption and connections["session"] is None:
+                _read_session_ticket(sock)
+                connections["session"] = sock.session
+        return sock
+
+    def _send_stream(self, sock: socket.socket, data: bytes, timeout: float = 5.0) -> None:
+        """Skriv hela meddelandet; låset släpps medan sändbufferten är full"""
+        lock = self._locks[sock]
+        view = memoryview(data)
+        deadline = time.perf_counter() + timeout
+        while view:
+            with lock:
+                try:
+                    sent = sock.send(view)
+                except (BlockingIOError, ssl.SSLWantWriteError, ssl.SSLWantReadError):
+                    sent = 0
+            if sent:
+                view = view[sent:]
+            elif time.perf_counter() > deadline:
+                raise OSError(f"sändbufferten mot {self.host}:{self.port} har varit full i {timeout:g}s")
+            else:
+                select.select([], [sock], [], 0.01)
+
+    def _close_sockets(self) -> None:
+        for sock in self._socks:
+            sock.close()
+        self._socks = []
+        self._locks = {}
+
+    def _send_loop(self, locals_: List[Tuple[str, int]], start: float) -> None:
+        metrics = self.metrics
+        pending = self._pending
+        socks = self._socks
+        sources = len(socks)
+        target = (self.host, self.port)
+        is_invite = self.method == "INVITE"
+        reliable = self.reliable
+        via = TRANSPORTS[self.transport]
+        # Över TCP/TLS finns bara Timer B/F, så första timern är tidsgränsen
+        first_timer = self.transaction_timeout if reliable else self.t1
+        end = start + self.duration
+        offsets = self._offsets
+        timers: List[Tuple[float, int, str]] = []
+        seq = 0
+        next_send = start + next(offsets)
+        send_times = self.send_times
+        wall_offset = self._wall_offset
+        metrics.target_rate = self.rate
+
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            sending = next_send < end and (self.max_requests is None or seq < self.max_requests)
+
+            # Nya transaktioner enligt schemat (ikapp om vi legat efter); latensen
+            # räknas från next_send, så en försenad sändning räknas in
+            while sending and next_send <= now:
+                branch = f"{BRANCH_MAGIC}-{self._run_id}-{seq}"
+                sock = socks[seq % sources]
+                data = build_request(self.method, target, locals_[seq % sources], branch,
+                                     f"{self._run_id}-{seq}@sip-k8s-lab", seq, via)
+                # Faktisk sändtid: efter en stall är now inaktuellt för hela ikappsändningen
+                sent = time.perf_counter()
+                pending[branch] = _Transaction(data, sock, next_send, sent, self.t1,
+                                               sent + self.transaction_timeout, is_invite)
+                metrics.schedule_lag.record(sent - next_send)
+                try:
+                    if reliable:
+                        self._send_stream(sock, data)
+                    else:
+                        sock.sendto(data, target)
+                except OSError as e:
+                    logger.debug(f"sändning misslyckades: {e}")
+                metrics.requests_sent += 1
+                if send_times is not None:
+                    send_times.append(sent + wall_offset)
+                heapq.heappush(timers, (sent + first_timer, seq, branch))
+                seq += 1
+                next_send = start + next(offsets)
+                if next_send >= end or (self.max_requests is not None and seq >= self.max_requests):
+                    sending = False
+                    self._send_end = sent
+
+            # Omsändningar (Timer A/E) och timeouts (Timer B/F)
+            while timers and timers[0][0] <= now:
+                _, order, branch = heapq.heappop(timers)
+                tx = pending.get(branch)
+                if tx is None:
+                    continue
+                if now >= tx.deadline:
+                    if pending.pop(branch, None) is not None:
+                        metrics.timeouts += 1
+                    continue
+                if not (tx.is_invite and tx.provisional):
+                    try:
+                        tx.sock.sendto(tx.data, target)
+                    except OSError:
+                        pass
+                    metrics.retransmissions += 1
+                tx.interval = tx.interval * 2 if tx.is_invite else min(tx.interval * 2, self.t2)
+                heapq.heappush(timers, (min(now + tx.interval, tx.deadline), order, branch))
+
+            if not sending and not pending:
+                break
+
+            wake = next_send if sending else now + 0.05
+            if timers:
+                wake = min(wake, timers[0][0])
+            delay = wake - time.perf_counter()
+            if delay > SPIN_S:
+                time.sleep(min(delay - SPIN_S, 0.05))
+
+    def send_time(self, call_id: str) -> Optional[float]:
+        """
+        Väggklocktid då transaktionen med Call-ID skickades första gången
+
+        Returns:
+            Tidsstämpel, eller None om Call-ID inte kommer från denna körning
+            eller record_send_times inte är satt
+        """
+        prefix = f"{self._run_id}-"
+        if self.send_times is None or not call_id.startswith(prefix):
+            return None
+        try:
+            seq = int(call_id[len(prefix):].split("@", 1)[0])
+        except ValueError:
+            return None
+        return self.send_times[seq] if seq < len(self.send_times) else None
+
+    def _receive_loop(self) -> None:
+        target = (self.host, self.port)
+        if self.reliable:
+            self._receive_stream(target)
+            return
+        if len(self._socks) > 1:
+            self._receive_many(target)
+            return
+        sock = self._socks[0]
+
+        while self._receiving.is_set():
+            try:
+                data = sock.recv(65535)
+            except (socket.timeout, ConnectionRefusedError):
+                continue
+            except OSError:
+                break
+            self._handle_response(data, time.perf_counter(), target)
+
+    def _receive_many(self, target: Tuple[str, int]) -> None:
+        """Mottagarloop för flera källsockets (blockerande med timeout, som sändaren kräver)"""
+        with selectors.DefaultSelector() as selector:
+            for sock in self._socks:
+                selector.register(sock, selectors.EVENT_READ)
+            while self._receiving.is_set():
+                try:
+                    ready = selector.select(timeout=0.1)
+                except OSError:
+                    break
+                for key, _ in ready:
+                    try:
+                        data = key.fileobj.recv(65535)
+                    except (socket.timeout, ConnectionRefusedError):
+                        continue
+                    except OSError:
+                        return
+                    self._handle_response(data, time.perf_counter(), target)
+
+    def _receive_stream(self, target: Tuple[str, int]) -> None:
+        """Mottagarloop för TCP/TLS: läs under anslutningens lås och dela upp strömmen i meddelanden"""
+        buffers = {sock: b"" for sock in self._socks}
+        with selectors.DefaultSelector() as selector:
+            for sock in self._socks:
+                selector.register(sock, selectors.EVENT_READ)
+            while self._receiving.is_set() and buffers:
+                try:
+                    ready = selector.select(timeout=0.1)
+                except OSError:
+                    break
+                for key, _ in ready:
+                    sock = key.fileobj
+                    try:
+                        with self._locks[sock]:
+                            data = sock.recv(65535)
+                            # Dekrypterade bytes som select inte ser
+                            while isinstance(sock, ssl.SSLSocket) and sock.pending():
+                                data += sock.recv(sock.pending())
+                    except (BlockingIOError, ssl.SSLWantReadError, ssl.SSLWantWriteError):
+                        continue
+                    except (OSError, KeyError):
+                        data = b""
+                    if not data:
+                        selector.unregister(sock)
+                        buffers.pop(sock, None)
+                        if self._receiving.is_set():
+                            self._connections["closed_by_peer"] += 1
+                            logger.warning(f"⚠️  Anslutningen {sock.getsockname()} stängdes av {self.host}")
+                        continue
+                    messages, buffers[sock] = split_stream_messages(buffers[sock] + data)
+                    now = time.perf_counter()
+                    for message in messages:
+                        self._handle_response(message, now, target)
+
+    def _handle_response(self, data: bytes, now: float, target: Tuple[str, int]) -> None:
+        """Matcha ett svar mot sin transaktion via branch"""
+        parsed = parse_response(data)
+        if parsed is None:
+            return
+        code, branch = parsed
+        metrics = self.metrics
+
+        if code < 200:
+            tx = self._pending.get(branch)
+            if tx is None:
+                metrics.stray_responses += 1
+                return
+            tx.provisional = True
+            metrics.record_response(code)
+            return
+
+        tx = self._pending.pop(branch, None)
+        if tx is None:
+            # Svar på en omsändning eller en transaktion som redan tagit timeout
+            metrics.stray_responses += 1
+            return
+        latency = now - tx.intended
+        metrics.record_response(code)
+        metrics.latency.record(latency)
+        metrics.service_latency.record(now - tx.first_sent)
+        metrics.completed += 1
+        if self._last_latency is not None:
+            self._jitter_total += abs(latency - self._last_latency)
+            self._jitter_count += 1
+        self._last_latency = latency
+
+        if tx.is_invite:
+            try:
+                if self.reliable:
+                    self._send_stream(tx.sock, build_ack(tx.data, data))
+                else:
+                    tx.sock.sendto(build_ack(tx.data, data), target)
+            except (OSError, KeyError):
+                pass
+
+    def statistics(self, elapsed: float) -> Dict:
+        """
+        Sammanställ statistik för körningen
+
+        Args:
+            elapsed: Körningens längd i sekunder
+
+        Returns:
+            Dict med räknare, svar per kod, takt och latens-percentiler (ms)
+        """
+        metrics = self.metrics
+        by_code = metrics.responses_by_code()
+        successful = sum(c for code, c in by_code.items() if 200 <= code < 300)
+        failed = sum(c for code, c in by_code.items() if code >= 300)
+        send_time = min(elapsed, self.duration) or elapsed
+        # Avbruten körning: fönstret slutar när sändningen borde ha slutat, senast vid stop
+        send_end = self._send_end if self._send_end is not None else self._send_start + send_time
+        statistics = {
+            "scenario": self.scenario,
+            "method": self.method,
+            "transport": self.transport,
+            "arrival": self.arrival,
+            "target": f"{self.host}:{self.port}",
+            "target_rate": self.rate,
+            "duration_s": round(elapsed, 3),
+            "requests_sent": metrics.requests_sent,
+            "responses": {str(code): count for code, count in sorted(by_code.items())},
+            "successful": successful,
+            "failed": failed,
+            "timeouts": metrics.timeouts,
+            "retransmissions": metrics.retransmissions,
+            "stray_responses": metrics.stray_responses,
+            "source_addresses": self.source_ports * len(self.source_ips),
+            "achieved_rate": round(metrics.requests_sent / send_time, 2) if send_time else 0.0,
+            "throughput": round(successful / elapsed, 2) if elapsed else 0.0,
+            # Från planerad sändtid; service_latency_ms från faktisk sändning
+            "latency_ms": metrics.latency.summary_ms(),
+            "service_latency_ms": metrics.service_latency.summary_ms(),
+            "schedule_lag_ms": metrics.schedule_lag.summary_ms(),
+            "jitter_ms": round(self._jitter_total / self._jitter_count * 1000, 3) if self._jitter_count else None,
+            # Väggklocktid då lasten skickades (utan avvecklingen av öppna transaktioner), för samplers
+            "send_window": {"start": round(self._send_start + self._wall_offset, 3),
+                            "end": round(send_end + self._wall_offset, 3)},
+        }
+        connections = self._connections
+        if connections:
+            statistics["connections"] = {
+                "opened": connections["opened"],
+                "resumed": connections["resumed"],
+                "closed_by_peer": connections["closed_by_peer"],
+                "connect_ms": connections["connect"].summary_ms(),
+                "handshake_ms": connections["handshake"].summary_ms(),
+            }
+        return statistics
+
+
+def format_load_summary(stats: Dict) -> str:
+    """Kort textsammanfattning av en lastkörning"""
+    latency = stats.get("latency_ms", {})
+    lines = [
+        f"{stats['method']} mot {stats['target']}: {stats['requests_sent']} skickade "
+        f"({stats['achieved_rate']}/s av {stats['target_rate']:g}/s)",
+        f"Svar: {stats['responses'] or '-'}, timeouts: {stats['timeouts']}, "
+        f"omsändningar: {stats['retransmissions']}",
+    ]
+    if latency:
+        lines.append(f"Latens: p50 {latency['p50']}ms, p90 {latency['p90']}ms, "
+                     f"p99 {latency['p99']}ms, p999 {latency['p999']}ms, max {latency['max']}ms"
+                     + (f", jitter {stats['jitter_ms']}ms" if stats.get("jitter_ms") is not None else ""))
+    lag = stats.get("schedule_lag_ms") or {}
+    service = stats.get("service_latency_ms") or {}
+    if lag and service:
+        # Stor skillnad betyder att sändningar legat efter schemat (generatorn eller en stall)
+        lines.append(f"Ankomster ({stats.get('arrival', 'constant')}): försening mot schemat p99 {lag['p99']}ms, "
+                     f"max {lag['max']}ms; latens från faktisk sändning p99 {service['p99']}ms")
+    connections = stats.get("connections")
+    if connections:
+        line = (f"Anslutningar ({TRANSPORTS[stats['transport']]}): {connections['opened']}, "
+                f"connect p50 {connections['connect_ms'].get('p50')}ms")
+        if connections["handshake_ms"]:
+            line += (f", TLS-handskakning p50 {connections['handshake_ms']['p50']}ms "
+                     f"({connections['resumed']} återupptagna)")
+        if connections["closed_by_peer"]:
+            line += f", {connections['closed_by_peer']} stängda av servern"
+        lines.append(line)
+    resources = stats.get("resources")
+    if resources:
+        cost = resources.get("millicores_per_1k_rps")
+        lines.append(f"CPU: {resources['cpu_cores_total']:g} cores totalt"
+                     + (f", {cost:g} millicores per 1k RPS" if cost is not None else ""))
+        for row in resources.get("profile", []):
+            lines.append(f"  {row['time_s']:>7.1f}s {row['rate']:>9.1f}/s {row['cpu_cores']:>7.3f} cores "
+                         f"{row['throttled_pct']:>5.1f}% throttlat")
+    logs = stats.get("kamailio_logs")
+    if logs and logs.get("total_received"):
+        shares = ", ".join(f"{pod} {values['share'] * 100:.0f}%" for pod, values in logs["pods"].items())
+        lines.append(f"Kamailio-loggar: {logs['total_received']} mottagna ({shares})")
+        delay = logs.get("one_way_delay", {})
+        if delay.get("matched"):
+            lines.append(f"Envägsfördröjning: p50 {delay['delay_ms']['p50']}ms, p99 {delay['delay_ms']['p99']}ms "
+                         f"({delay['matched']} Call-ID)")
+    distribution = stats.get("distribution")
+    if distribution and distribution.get("replicas"):
+        per_replica = ", ".join(f"{pod} {values['rate']:g}/s" for pod, values in distribution["replicas"].items())
+        lines.append(f"Replikor ({distribution['source']}, {stats.get('source_addresses', 1)} källadresser): "
+                     f"obalans {distribution['imbalance']}x, {per_replica}")
+    distributed = stats.get("distributed")
+    if distributed:
+        lines.append(f"Distribuerad: {distributed['workers']} workers i {distributed['namespace']} "
+                     f"på {len(distributed['nodes'])} noder")
+        for shard in distributed["shards"]:
+            lines.append(f"  shard {shard['shard']} {shard['pod'] or '-'} ({shard['node'] or '-'}): "
+                         f"{shard['requests_sent']} skickade, {shard['achieved_rate']:g}/s")
+    coordinated = stats.get("coordinator")
+    if coordinated:
+        lines.append(f"Koordinerad: {coordinated['workers']} workers via {coordinated['coordinator']}")
+        for shard in coordinated["shards"]:
+            lines.append(f"  {shard['worker']} ({shard['address']}): "
+                         f"{shard['requests_sent']} skickade, {shard['achieved_rate']:g}/s")
+    capture = stats.get("capture")
+    if capture and "transactions" in capture:
+        lines.append(f"Capture ({' → '.join(capture['hops'])}): {capture['lost']} av "
+                     f"{capture['transactions']} transaktioner förlorade, pcap i {capture['directory']}")
+    for source, label in (("kamailio", "Kamailio"), ("resources", "Resurser"), ("kamailio_logs", "Loggar"),
+                          ("capture", "Capture"), ("distributed", "Distribuerad"),
+                          ("coordinator", "Koordinator"), ("distribution", "Fördelning")):
+        for hint in stats.get(source, {}).get("hints", []):
+            lines.append(f"{label}: {hint}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="SIP-lastgenerator")
+    parser.add_argument("host")
+    parser.add_argument("--port", type=int, default=5060)
+    parser.add_argument("--scenario", default="options", choices=sorted(SCENARIO_METHODS))
+    parser.add_argument("--rate", type=float, default=100.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--source-ports", type=int, default=1, help="Sprid lasten över så många källportar")
+    parser.add_argument("--transport", default="udp", choices=sorted(TRANSPORTS))
+    parser.add_argument("--arrival", default="constant", choices=ARRIVALS, help="Ankomstprocess")
+    parser.add_argument("--seed", type=int, help="Frö för poisson")
+    parser.add_argument("--burst-on", type=float, default=1.0, help="Sekunder per skur (onoff)")
+    parser.add_argument("--burst-off", type=float, default=1.0, help="Sekunder tyst mellan skurar (onoff)")
+    parser.add_argument("--metrics-port", type=int, help="Exponera /metrics på denna port")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.metrics_port is not None:
+        from metrics import start_metrics_server
+        start_metrics_server(args.metrics_port)
+    generator = SipLoadGenerator(args.host, args.port, args.scenario, args.rate, args.duration,
+                                 source_ports=args.source_ports, transport=args.transport,
+                                 arrival=args.arrival, seed=args.seed, burst_on=args.burst_on,
+                                 burst_off=args.burst_off)
+    print(json.dumps(generator.run(), indent=2))
@@ -13,11 +13,6 @@ from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
 
-# Konfigurera logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
@@ -162,6 +157,194 @@ class KubernetesUtils:
             pass
         return None
 
+    @staticmethod
+    def get_service_addresses(service_name: str, namespace: str, port: int = 5060,
+                              protocol: str = "UDP") -> Dict[str, Optional[object]]:
+        """Hämta ClusterIP, LoadBalancer-IP (MetalLB) och NodePort för en port på service"""
+        addresses = {"cluster_ip": None, "load_balancer_ip": None, "node_port": None}
+        try:
+            result = subprocess.run(
+                ["kubectl", "get", "svc", service_name, "-n", namespace, "-o", "json"],
+                capture_output=True,
+                text=True,
+                timeout=10
+            )
+            if result.returncode == 0 and result.stdout:
+                service = json.loads(result.stdout)
+                spec = service.get("spec", {})
+                if spec.get("clusterIP") not in (None, "", "None"):
+                    addresses["cluster_ip"] = spec["clusterIP"]
+                ingress = service.get("status", {}).get("loadBalancer", {}).get("ingress") or [{}]
+                addresses["load_balancer_ip"] = ingress[0].get("ip")
+                addresses["node_port"] = next(
+                    (p.get("nodePort") for p in spec.get("ports", [])
+                     if p.get("port") == port and p.get("protocol", "TCP") == protocol), None)
+        except Exception:
+            pass
+        return addresses
+
+    @staticmethod
+    def get_pod_addresses(namespace: str, label_selector: str) -> List[Dict[str, str]]:
+        """Hämta pod-IP och nodens IP för körande pods"""
+        try:
+            result = subprocess.run(
+                ["kubectl", "get", "pods", "-n", namespace, "-l", label_selector, "-o", "json"],
+                capture_output=True,
+                text=True,
+                timeout=10
+            )
+            if result.returncode != 0:
+                return []
+            return [{"name": pod["metadata"]["name"], "pod_ip": pod["status"].get("podIP"),
+                     "host_ip": pod["status"].get("hostIP")}
+                    for pod in json.loads(result.stdout).get("items", [])
+                    if pod["status"].get("phase") == "Running" and pod["status"].get("podIP")]
+        except Exception:
+            return []
+
+    @staticmethod
+    def get_pod_metrics(pod_name: str, namespace: str) -> Optional[Dict]:
+        """Hämta CPU/minne för en pod från metrics API (kräver metrics-server)"""
+        try:
+            result = subprocess.run(
+                ["kubectl", "get", "--raw", f"/apis/metrics.k8s.io/v1beta1/namespaces/{namespace}/pods/{pod_name}"],
+                capture_output=True,
+                text=True,
+                timeout=10
+            )
+            if result.returncode == 0 and result.stdout:
+                return json.loads(result.stdout)
+        except Exception:
+            pass
+        return None
+    
+    @staticmethod
+    def get_deployment_replicas(name: str, namespace: str) -> Optional[int]:
+        """Hämta önskat antal repliker för en deployment"""
+        try:
+            result = subprocess.run(
+                ["kubectl", "get", "deployment", name, "-n", namespace, "-o", "jsonpath={.spec.replicas}"],
+                capture_output=True,
+                text=True,
+                timeout=10
+            )
+            if result.returncode == 0 and result.stdout.strip():
+                return int(result.stdout.strip())
+        except Exception:
+            pass
+        return None
+
+    @staticmethod
+    def wait_for_rollout(name: str, namespace: str, timeout: int = 300) -> bool:
+        """Vänta tills en deployment är utrullad och alla repliker är redo"""
+        try:
+            result = subprocess.run(
+                ["kubectl", "rollout", "status", f"deployment/{name}", "-n", namespace, f"--timeout={timeout}s"],
+                capture_output=True,
+                text=True,
+                timeout=timeout + 10
+            )
+            return result.returncode == 0
+        except Exception:
+            return False
+
+    @staticmethod
+    def scale_deployment(name: str, namespace: str, replicas: int, timeout: int = 300) -> bool:
+        """Skala en deployment och vänta tills replikerna är redo"""
+        try:
+            result = subprocess.run(
+                ["kubectl", "scale", "deployment", name, "-n", namespace, f"--replicas={replicas}"],
+                capture_output=True,
+                text=True,
+                timeout=30
+            )
+            if result.returncode != 0:
+                return False
+        except Exception:
+            return False
+        return KubernetesUtils.wait_for_rollout(name, namespace, timeout)
+
+    @staticmethod
+    def _container_index(name: str, namespace: str, container: str) -> Tuple[Optional[int], Optional[Dict]]:
+        """(index, container-spec) för en container i en deployment"""
+        try:
+            result = subprocess.run(
+                ["kubectl", "get", "deployment", name, "-n", namespace, "-o", "json"],
+                capture_output=True,
+                text=True,
+                timeout=10
+            )
+            if result.returncode != 0:
+                return None, None
+            containers = json.loads(result.stdout)["spec"]["template"]["spec"]["containers"]
+        except Exception:
+            return None, None
+        for index, spec in enumerate(containers):
+            if spec.get("name") == container:
+                return index, spec
+        return None, None
+
+    @staticmethod
+    def get_container_resources(name: str, namespace: str, container: str) -> Optional[Dict]:
+        """Hämta requests/limits för en container i en deployment"""
+        _, spec = KubernetesUtils._container_index(name, namespace, container)
+        return spec.get("resources", {}) if spec is not None else None
+
+    @staticmethod
+    def set_container_resources(name: str, namespace: str, container: str, resources: Dict,
+                                timeout: int = 300) -> bool:
+        """Ersätt requests/limits för en container och vänta tills de nya poddarna är redo"""
+        index, _ = KubernetesUtils._container_index(name, namespace, container)
+        if index is None:
+            return False
+        patch = [{"op": "add", "path": f"/spec/template/spec/containers/{index}/resources", "value": resources}]
+        try:
+            result = subprocess.run(
+                ["kubectl", "patch", "deployment", name, "-n", namespace, "--type=json", "-p", json.dumps(patch)],
+                capture_output=True,
+                text=True,
+                timeout=30
+            )
+            if result.returncode != 0:
+                return False
+        except Exception:
+            return False
+        return KubernetesUtils.wait_for_rollout(name, namespace, timeout)
+
+    @staticmethod
+    def restart_deployment(name: str, namespace: str, timeout: int = 300) -> bool:
+        """Rulla om poddarna i en deployment (t.ex. efter ändrad ConfigMap) och vänta tills de är redo"""
+        try:
+            result = subprocess.run(
+                ["kubectl", "rollout", "restart", f"deployment/{name}", "-n", namespace],
+                capture_output=True,
+                text=True,
+                timeout=30
+            )
+            if result.returncode != 0:
+                return False
+        except Exception:
+            return False
+        return KubernetesUtils.wait_for_rollout(name, namespace, timeout)
+
+    @staticmethod
+    def exec_in_pod(pod_name: str, namespace: str, command: List[str],
+                    container: Optional[str] = None, timeout: int = 10) -> Optional[str]:
+        """Kör ett kommando i en pod och returnera stdout (None vid fel)"""
+        container_args = ["-c", container] if container else []
+        try:
+            result = subprocess.run(
+                ["kubectl", "exec", pod_name, "-n", namespace] + container_args + ["--"] + command,
+                capture_output=True,
+                text=True,
+                timeout=timeout
+            )
+            if result.returncode == 0:
+                return result.stdout
+        except Exception:
+            pass
+        return None
+
 
 class DockerUtils:
     """Utility-funktioner för Docker"""
@@ -181,16 +364,11 @@ class DockerUtils:
             return False
     
     @staticmethod
-    def build_image(image_name: str, dockerfile_path: str) -> bool:
-        """Bygg Docker-image"""
+    def build_image(image_name: str, dockerfile_path: str, force: bool = False) -> bool:
+        """Bygg Docker-image om indata ändrats (innehållshash, se image_builder.py)"""
         try:
-            result = subprocess.run(
-                ["docker", "build", "-t", image_name, dockerfile_path],
-                capture_output=True,
-                text=True,
-                timeout=300
-            )
-            return result.returncode == 0
+            from image_builder import ImageBuilder
+            return bool(ImageBuilder(dockerfile_path, image_name).ensure_image(force=force)["success"])
         except Exception:
             return False
     
@@ -241,16 +419,17 @@ class NetworkUtils:
             return False
     
     @staticmethod
-    def port_forward_service(service_name: str, namespace: str, local_port: int, remote_port: int) -> Optional[subprocess.Popen]:
-        """Starta port-forward för service"""
+    def port_forward_service(service_name: str, namespace: str, local_port: int, remote_port: int):
+        """
+        Hämta delad port-forward för service
+
+        Port-forward startas en gång per (service, port) och återanvänds under
+        hela sessionen. Handtaget har poll/terminate/wait som subprocess.Popen,
+        där terminate() bara släpper handtaget.
+        """
         try:
-            process = subprocess.Popen(
-                ["kubectl", "port-forward", f"svc/{service_name}", f"{local_port}:{remote_port}", "-n", namespace],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            time.sleep(3)  # Vänta lite för att port-forward ska starta
-            return process
+            from port_forward import get_port_forward_manager
+            return get_port_forward_manager().acquire(service_name, namespace, local_port, remote_port)
         except Exception:
             return None
 
@@ -338,18 +517,23 @@ class KamailioUtils:
             host_port = config.port
             port_accessible = NetworkUtils.test_udp_connection(host_ip, host_port)
         else:
-            # För andra miljöer, använd port-forward
-            process = NetworkUtils.port_forward_service("kamailio-service", "kamailio", config.port, config.port)
-            if process:
-                port_accessible = NetworkUtils.test_tcp_connection("localhost", config.port)
-                process.terminate()
-                process.wait()
+            # För andra miljöer, använd delad port-forward (ingen ny process per anrop)
+            handle = NetworkUtils.port_forward_service("kamailio-service", "kamailio", config.port, config.port)
+            if handle:
+                port_accessible = NetworkUtils.test_tcp_connection("localhost", handle.local_port)
+                handle.release()
             else:
                 port_accessible = False
         results['port_accessible'] = port_accessible
         
         return results
     
+    @staticmethod
+    def kamcmd(pod_name: str, *args: str, namespace: str = "kamailio") -> Optional[str]:
+        """Kör kamcmd (kräver ctl-modulen) i en Kamailio-pod"""
+        return KubernetesUtils.exec_in_pod(pod_name, namespace, ["kamcmd"] + list(args),
+                                           container="kamailio", timeout=5)
+    
     @staticmethod
     def get_kamailio_config() -> Optional[str]:
         """Hämta Kamailio-konfiguration"""
@@ -570,6 +754,7 @@ def create_kamailio_connection_string(host: str = None, port: int = None, enviro
 
 if __name__ == "__main__":
     """Testa utility-funktioner"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     print("🔍 Kontrollerar miljö...")
     status = get_environment_status()
     
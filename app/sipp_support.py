@@ -13,10 +13,17 @@ from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from pathlib import Path
 
-# Konfigurera logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Fungerar både som paket (import app) och platt med app/ på sys.path (testerna, python -m app)
+try:
+    from .result_storage import bounded_text, run_captured
+except ImportError:
+    from result_storage import bounded_text, run_captured
+
 logger = logging.getLogger(__name__)
 
+# Adresser som bara nås från hostens nätverk (port-forward), inte från en container
+LOCAL_HOSTS = ("localhost", "127.0.0.1")
+
 
 @dataclass
 class TestResult:
@@ -29,6 +36,12 @@ class TestResult:
     duration: float
     statistics: Dict
 
+    def __post_init__(self):
+        # Stora texter skrivs komprimerade till disk (SpilledText) så att
+        # minnet hålls begränsat oavsett hur stora körningarna är
+        self.output = bounded_text(self.output, "output")
+        self.error = bounded_text(self.error, "error")
+
 
 class SippTester:
     """Huvudklass för SIPp-testing"""
@@ -38,7 +51,9 @@ class SippTester:
                  kamailio_port: int = 5060,
                  timeout: int = 30,
                  docker_image: str = "local/sipp-tester:latest",
-                 environment: str = "auto"):
+                 environment: str = "auto",
+                 local_port: int = 5065,
+                 scenario_dir: Optional[str] = None):
         """
         Initiera SIPp-tester
         
@@ -48,6 +63,12 @@ class SippTester:
             timeout: Timeout för tester i sekunder
             docker_image: Docker-image för SIPp-tester
             environment: "local" för Kind, "prod" för hårdvaru, "auto" för auto-detektering
+            local_port: Lokal port som SIPp binder (unik per worker vid parallella tester)
+            scenario_dir: Scenariokatalog som monteras i containern
+                          (None = SIP_LAB_SCENARIO_DIR eller sipp-tester/sipp-scenarios)
+        
+        Kamailio-endpointen detekteras först när kamailio_host/kamailio_port
+        används, så att konstruktorn inte kör kubectl eller nc.
         """
         # Kontrollera environment-variabler först
         import os
@@ -56,41 +77,87 @@ class SippTester:
         env_environment = os.getenv('KAMAILIO_ENVIRONMENT')
         
         # Använd environment-variabler om de finns, annars parametrar
-        self.kamailio_port = int(env_port) if env_port else kamailio_port
         self.timeout = timeout
+        self.local_port = local_port
         self.docker_image = docker_image
         self.environment = env_environment if env_environment else environment
         self.base_path = Path(__file__).parent
+        self.scenario_dir = scenario_dir
         
+        # Kamailio-endpointen detekteras först när den behövs (kubectl/nc-probning)
+        self._requested_host = env_host or kamailio_host
+        self._default_port = kamailio_port
+        self._fallback_port = int(env_port) if env_port else kamailio_port
+        self._kamailio_host: Optional[str] = None
+        self._kamailio_port: Optional[int] = None
+    
+    def _resolve_endpoint(self) -> None:
+        """Bestäm Kamailio host och port (detekteras om ingen host angivits)"""
         # Auto-detektera Kamailio host
-        detected_host = env_host or kamailio_host or self._detect_kamailio_host()
+        detected_host = self._requested_host or self._detect_kamailio_host()
         
         # Använd central funktion för att hantera host och port
         from sip_test_utils import parse_kamailio_address
         
         # Parsa host och port från detected_host
-        host_ip, host_port = parse_kamailio_address(detected_host, kamailio_port)
-        
-        self.kamailio_host = f"{host_ip}:{host_port}"
-        self.kamailio_port = int(host_port)
+        host_ip, host_port = parse_kamailio_address(detected_host, self._default_port)
         
-        # Miljövariabler för Docker
-        self.env_vars = {
+        self._kamailio_host = f"{host_ip}:{host_port}"
+        self._kamailio_port = int(host_port)
+        logger.info(f"Använder Kamailio host: {self._kamailio_host}")
+    
+    @property
+    def kamailio_host(self) -> str:
+        """Kamailio-endpoint (host:port), detekteras vid första användningen"""
+        if self._kamailio_host is None:
+            self._resolve_endpoint()
+        return self._kamailio_host
+    
+    @kamailio_host.setter
+    def kamailio_host(self, value: str) -> None:
+        self._kamailio_host = value
+    
+    @property
+    def kamailio_port(self) -> int:
+        """Kamailio-port, detekteras tillsammans med host"""
+        if self._kamailio_port is None:
+            if self._kamailio_host is None:
+                self._resolve_endpoint()
+            else:
+                self._kamailio_port = self._fallback_port
+        return self._kamailio_port
+    
+    @kamailio_port.setter
+    def kamailio_port(self, value: int) -> None:
+        self._kamailio_port = int(value)
+    
+    @property
+    def env_vars(self) -> Dict[str, str]:
+        """Miljövariabler för Docker"""
+        return {
             'KAMAILIO_HOST': self.kamailio_host,
             'KAMAILIO_PORT': str(self.kamailio_port),
-            'TEST_TIMEOUT': str(self.timeout)
+            'TEST_TIMEOUT': str(self.timeout),
+            'SIPP_LOCAL_PORT': str(self.local_port)
         }
-        
-        logger.info(f"Använder Kamailio host: {self.kamailio_host}")
     
     def _detect_kamailio_host(self) -> str:
         """
         Auto-detektera bästa Kamailio host baserat på miljö
         
+        Resultatet delas via miljö-cachen, så att health_check, run_sipp_test
+        och nya SippTester-instanser inte probar om samma endpoint.
+        
         Returns:
             Bästa hostname/IP för Kamailio
         """
-        
+        from env_cache import get_environment_cache
+        return get_environment_cache().get_or_compute(
+            f"endpoint:{self.environment}", self._probe_kamailio_host
+        )
+    
+    def _probe_kamailio_host(self) -> str:
+        """Proba fram Kamailio host utan cache"""
         # Använd environment-flaggan för att bestämma strategi
         if self.environment == "local":
             return self._detect_local_host()
@@ -228,12 +295,12 @@ class SippTester:
                 network_args = ["--network=host"]
             
             # Kör Docker-kommando
-            result = subprocess.run([
+            result = run_captured([
                 "docker", "run", "--rm"
             ] + network_args + [
                 self.docker_image,
                 "bash", "-c", command
-            ], capture_output=True, text=True, timeout=timeout)
+            ], timeout=timeout)
             
             return TestResult(
                 scenario="docker_command",
@@ -275,8 +342,8 @@ class SippTester:
         logger.info("🏥 Health Check för Kamailio...")
         start_time = time.time()
         
-        # Bestäm Kamailio host
-        kamailio_host = self._detect_kamailio_host()
+        # Bestäm Kamailio host (angiven host, t.ex. workerns port-forward, före detektering)
+        kamailio_host = self.kamailio_host
         logger.info(f"📍 Target: {kamailio_host}")
         
         # Testa anslutning med netcat
@@ -301,7 +368,7 @@ class SippTester:
             try:
                 # Bestäm nätverksargument baserat på host
                 network_args = []
-                if kamailio_host == "localhost":
+                if host_ip in LOCAL_HOSTS:
                     network_args = ["--network=host"]
                 
                 result = subprocess.run([
@@ -349,33 +416,63 @@ class SippTester:
             statistics={}
         )
     
-    def run_sipp_test(self, scenario: str) -> TestResult:
-        """Kör ett SIPp-test"""
+    def _capture_session(self, name: str, kamailio_host: str, capture: Optional[bool]):
+        """
+        CaptureSession för en körning om capture är påslaget
+        
+        Args:
+            name: Körningens namn
+            kamailio_host: Target (host:port)
+            capture: True/False, eller None för env-variabeln SIP_LAB_CAPTURE
+            
+        Returns:
+            CaptureSession eller None
+        """
+        if capture is None:
+            capture = os.getenv('SIP_LAB_CAPTURE', '').lower() in ('1', 'true', 'yes')
+        if not capture:
+            return None
+        from sip_test_utils import parse_kamailio_address
+        from packet_capture import build_capture_session
+        _, host_port = parse_kamailio_address(kamailio_host, self.kamailio_port)
+        return build_capture_session(name, [int(host_port), 5060, self.local_port],
+                                     kind="172.18." in kamailio_host)
+    
+    def run_sipp_test(self, scenario: str, capture: Optional[bool] = None) -> TestResult:
+        """
+        Kör ett SIPp-test
+        
+        Args:
+            scenario: SIPp-scenario (filnamn utan .xml)
+            capture: Spela in SIP-trafiken till pcap och analysera den
+                     (None = env-variabeln SIP_LAB_CAPTURE)
+        """
         start_time = time.time()
         
-        # Bestäm Kamailio host
-        kamailio_host = self._detect_kamailio_host()
+        # Bestäm Kamailio host (angiven host, t.ex. workerns port-forward, före detektering)
+        kamailio_host = self.kamailio_host
+        capture_session = self._capture_session(scenario, kamailio_host, capture)
         
-        # SIPp-kommando med lokal port 5065 för att undvika konflikter
-        sipp_command = f"sipp -sf /app/sipp-scenarios/{scenario}.xml {kamailio_host} -p 5065 -d 1000 -m 1 -r 1"
+        # SIPp-kommando med egen lokal port för att undvika konflikter
+        sipp_command = f"sipp -sf /app/sipp-scenarios/{scenario}.xml {kamailio_host} -p {self.local_port} -d 1000 -m 1 -r 1"
         
         logger.info(f"Kör SIPp-test: {scenario}")
         logger.info(f"Target: {kamailio_host}")
         logger.info(f"Command: {sipp_command}")
         
+        # stdout/stderr går via filer så att stora SIPp-utskrifter inte hålls i minnet
+        from image_builder import scenario_volume_args
+        
+        if capture_session:
+            capture_session.start()
         try:
             # Försök köra SIPp från host först (för Kind-kluster)
             if "172.18." in kamailio_host:
                 logger.info("Försöker köra SIPp från host för Kind-kluster")
-                host_sipp_command = f"sipp -sf {self.base_path}/../sipp-tester/sipp-scenarios/{scenario}.xml {kamailio_host} -p 5065 -d 1000 -m 1 -r 1"
+                host_sipp_command = f"sipp -sf {self.base_path}/../sipp-tester/sipp-scenarios/{scenario}.xml {kamailio_host} -p {self.local_port} -d 1000 -m 1 -r 1"
                 
                 try:
-                    result = subprocess.run(
-                        host_sipp_command.split(),
-                        capture_output=True,
-                        text=True,
-                        timeout=10
-                    )
+                    result = run_captured(host_sipp_command.split(), timeout=10)
                     if result.returncode == 0:
                         logger.info("SIPp kördes framgångsrikt från host")
                     else:
@@ -385,28 +482,31 @@ class SippTester:
                     logger.info(f"Kör SIPp från Docker: {e}")
                     # Fallback till Docker
                     network_args = ["--network=host"]
-                    result = subprocess.run([
+                    result = run_captured([
                         "docker", "run", "--rm"
-                    ] + network_args + [
+                    ] + network_args + scenario_volume_args(self.scenario_dir) + [
                         self.docker_image,
                         "bash", "-c", sipp_command
-                    ], capture_output=True, text=True, timeout=30)
+                    ], timeout=30)
             else:
-                # För andra miljöer, använd Docker
-                network_args = []
-                result = subprocess.run([
+                # För andra miljöer, använd Docker (en lokal port-forward nås bara från hostens nätverk)
+                network_args = ["--network=host"] if kamailio_host.split(":")[0] in LOCAL_HOSTS else []
+                result = run_captured([
                     "docker", "run", "--rm"
-                ] + network_args + [
+                ] + network_args + scenario_volume_args(self.scenario_dir) + [
                     self.docker_image,
                     "bash", "-c", sipp_command
-                ], capture_output=True, text=True, timeout=30)
+                ], timeout=30)
             
             duration = time.time() - start_time
             
             # Analysera output för statistik
             statistics = self._parse_sipp_statistics(result.stdout)
+            if capture_session:
+                capture_session.stop()
+                statistics["capture"] = self._summarize_capture(capture_session)
             
-            return TestResult(
+            return self._record_result(TestResult(
                 scenario=scenario,
                 success=result.returncode == 0,
                 exit_code=result.returncode,
@@ -414,12 +514,12 @@ class SippTester:
                 error=result.stderr,
                 duration=duration,
                 statistics=statistics
-            )
+            ))
             
         except subprocess.TimeoutExpired:
             duration = time.time() - start_time
             logger.error(f"Timeout efter {duration:.1f} sekunder")
-            return TestResult(
+            return self._record_result(TestResult(
                 scenario=scenario,
                 success=False,
                 exit_code=-1,
@@ -427,11 +527,11 @@ class SippTester:
                 error="Timeout expired",
                 duration=duration,
                 statistics={}
-            )
+            ))
         except Exception as e:
             duration = time.time() - start_time
             logger.error(f"Fel vid körning av SIPp-test: {e}")
-            return TestResult(
+            return self._record_result(TestResult(
                 scenario=scenario,
                 success=False,
                 exit_code=-1,
@@ -439,8 +539,625 @@ class SippTester:
                 error=str(e),
                 duration=duration,
                 statistics={}
+            ))
+        finally:
+            if capture_session:
+                capture_session.stop()
+    
+    def _summarize_capture(self, capture_session) -> Dict:
+        """Analysera en inspelning och logga rapporten"""
+        from pcap_analyzer import format_capture_report
+        report = capture_session.summarize()
+        if "transactions" in report:
+            logger.info(f"{format_capture_report(report)}\n   pcap: {report['directory']}")
+        else:
+            for hint in report.get("hints", []):
+                logger.warning(f"Capture: {hint}")
+        return report
+    
+    def _record_result(self, result: TestResult, samplers: Optional[List] = None) -> TestResult:
+        """Spara resultatet, och eventuella samplers tidsserier, i resultatdatabasen"""
+        from results_store import get_results_store
+        store = get_results_store()
+        run_id = store.record(result, environment=self.environment)
+        if run_id is not None:
+            for sampler in samplers or []:
+                store.record_samples(run_id, sampler.source, sampler.samples)
+        return result
+    
+    def run_load_test(self, scenario: str = "options", rate: float = 100.0, duration: float = 10.0,
+                      metrics_port: Optional[int] = None, sample_kamailio: bool = False,
+                      sample_resources: bool = False, sample_interval: float = 1.0,
+                      capture: Optional[bool] = None, stream_logs: bool = False,
+                      port: Optional[int] = None, host: Optional[str] = None, **load_options) -> TestResult:
+        """
+        Kör en lastkörning mot Kamailio med den inbyggda lastgeneratorn
+
+        Under körningen finns räknare, gauges och latens-histogram på
+        /metrics i Prometheus-format om metrics_port (eller env-variabeln
+        SIP_LAB_METRICS_PORT) är satt.
+
+        Args:
+            scenario: Scenario (options, register, invite, ping)
+            rate: Nya transaktioner per sekund
+            duration: Hur länge lasten körs i sekunder
+            metrics_port: Port för /metrics (None = ingen endpoint)
+            sample_kamailio: Sampla Kamailios interna statistik (kamcmd) under körningen
+            sample_resources: Sampla CPU, throttling och minne per pod under körningen
+            sample_interval: Sekunder mellan samplingar
+            capture: Spela in SIP-trafiken till pcap och analysera den
+                     (None = env-variabeln SIP_LAB_CAPTURE)
+            stream_logs: Följ Kamailios loggar för mottagna requests per replika
+                         och envägsfördröjning per Call-ID
+            port: Annan port än Kamailio-adressens (t.ex. 5061 för TLS)
+            host: Annan host[:port] än kamailio_host för just den här körningen
+            **load_options: Vidare till SipLoadGenerator (t.ex. t1, max_requests, transport)
+
+        Returns:
+            TestResult med lastgeneratorns statistik
+        """
+        from sip_test_utils import parse_kamailio_address
+        from sip_load import SipLoadGenerator, format_load_summary
+
+        start_time = time.time()
+        # Angiven host används som den är; annars detekteras den (via miljö-cachen)
+        kamailio_host = host or self.kamailio_host
+        host_ip, host_port = parse_kamailio_address(kamailio_host, self._default_port if host else self.kamailio_port)
+        host_port = port or host_port
+
+        if metrics_port is None and os.getenv('SIP_LAB_METRICS_PORT'):
+            metrics_port = int(os.environ['SIP_LAB_METRICS_PORT'])
+        if metrics_port is not None:
+            from metrics import start_metrics_server
+            start_metrics_server(metrics_port)
+
+        logger.info(f"Kör lasttest: {scenario} med {rate:g}/s i {duration:g}s mot {host_ip}:{host_port}")
+
+        samplers = []
+        if stream_logs:
+            load_options.setdefault("record_send_times", True)
+        try:
+            generator = SipLoadGenerator(host_ip, int(host_port), scenario, rate, duration,
+                                         local_port=self.local_port, **load_options)
+            if sample_kamailio:
+                from samplers import KamailioStatsSampler
+                samplers.append(KamailioStatsSampler(interval=sample_interval,
+                                                     client_metrics=generator.metrics))
+            if sample_resources:
+                from samplers import PodResourceSampler
+                samplers.append(PodResourceSampler(interval=sample_interval,
+                                                   client_metrics=generator.metrics))
+            if stream_logs:
+                from kamailio_logs import KamailioLogStreamer
+                samplers.append(KamailioLogStreamer(send_time=generator.send_time))
+            capture_session = self._capture_session(f"load_{scenario}", kamailio_host, capture)
+            if capture_session:
+                samplers.append(capture_session)
+            for sampler in samplers:
+                sampler.start()
+            try:
+                statistics = generator.run()
+            finally:
+                for sampler in samplers:
+                    sampler.stop()
+            for sampler in samplers:
+                statistics[sampler.source] = sampler.summarize(statistics)
+            from replica_balance import summarize_distribution
+            distribution = summarize_distribution(statistics)
+            if distribution:
+                statistics["distribution"] = distribution
+        except Exception as e:
+            logger.error(f"Fel vid lasttest: {e}")
+            return self._record_result(TestResult(
+                scenario=f"load_{scenario}",
+                success=False,
+                exit_code=-1,
+                output="",
+                error=str(e),
+                duration=time.time() - start_time,
+                statistics={}
+            ), samplers)
+
+        success = (statistics["requests_sent"] > 0 and statistics["timeouts"] == 0
+                   and statistics["failed"] == 0)
+        error = ""
+        if not success:
+            error = f"{statistics['timeouts']} timeouts, {statistics['failed']} felsvar"
+
+        return self._record_result(TestResult(
+            scenario=f"load_{scenario}",
+            success=success,
+            exit_code=0 if success else 1,
+            output=format_load_summary(statistics),
+            error=error,
+            duration=time.time() - start_time,
+            statistics=statistics
+        ), samplers)
+
+    def run_distribution_test(self, scenario: str = "options", rate: float = 200.0, duration: float = 10.0,
+                              source_ports: int = 64, source_ips: Optional[List[str]] = None,
+                              stream_logs: bool = False, compare: bool = True, **load_options) -> TestResult:
+        """
+        Mät hur lasten fördelas mellan Kamailio-replikorna
+
+        Lasten sprids över source_ports källportar (och source_ips) så att
+        Servicen ser många klienter i stället för ett enda UDP-flöde, och
+        mottagna requests per replika räknas på serversidan. Med compare körs
+        först samma last från en enda källport som jämförelse.
+
+        Args:
+            scenario: Scenario (options, register, invite, ping)
+            rate: Nya transaktioner per sekund
+            duration: Sekunder per körning
+            source_ports: Källportar per källadress
+            source_ips: Lokala adresser att binda (t.ex. IP-alias), standard en
+            stream_logs: Räkna via Kamailios loggar i stället för kamcmd
+            compare: Kör även en körning från en källport och jämför obalansen
+            **load_options: Vidare till run_load_test/SipLoadGenerator
+
+        Returns:
+            TestResult för körningen med spridd last; statistics["distribution"]
+            har andel, takt och obalans per replika
+        """
+        counters = {"sample_kamailio": not stream_logs, "stream_logs": stream_logs}
+        baseline = None
+        if compare:
+            baseline = self.run_load_test(scenario, rate, duration, source_ports=1, **counters, **load_options)
+        result = self.run_load_test(scenario, rate, duration, source_ports=source_ports,
+                                    source_ips=source_ips, **counters, **load_options)
+
+        distribution = result.statistics.get("distribution")
+        if baseline is not None and distribution:
+            before = (baseline.statistics.get("distribution") or {}).get("imbalance")
+            distribution["baseline_imbalance"] = before
+            result.output += (f"\nObalans från en källport: {before}x, "
+                              f"från {result.statistics.get('source_addresses')}: {distribution['imbalance']}x")
+        return result
+
+    def run_distributed_load_test(self, scenario: str = "options", rate: float = 1000.0,
+                                  duration: float = 10.0, workers: int = 2, namespace: str = "kamailio",
+                                  target: Optional[str] = None, image: Optional[str] = None,
+                                  sample_resources: bool = False, stream_logs: bool = False,
+                                  sample_interval: float = 1.0, **load_options) -> TestResult:
+        """
+        Kör lasten från N poddar i klustret (Kubernetes Job) i stället för från hosten
+        
+        Varje pod tar rate/workers och går direkt mot Servicens ClusterIP, så
+        lasten begränsas inte av en hosts väg via NodePort eller MetalLB.
+        Workernas statistik strömmas via loggen och slås ihop till ett resultat.
+        
+        Args:
+            scenario: Scenario (options, register, invite, ping)
+            rate: Total takt för alla workers
+            duration: Hur länge lasten körs i sekunder
+            workers: Antal generator-poddar
+            namespace: Namespace för Job:et (skapas om det inte finns)
+            target: Kamailio host[:port] sedd inifrån klustret (standard Servicens DNS-namn)
+            image: Image med Python 3 för workers (se distributed_load.DEFAULT_IMAGE)
+            sample_resources: Sampla CPU, throttling och minne per Kamailio-pod
+            stream_logs: Följ Kamailios loggar för mottagna requests per replika
+            sample_interval: Sekunder mellan samplingar
+            **load_options: Vidare till DistributedLoadTest (t.ex. start_delay, cpu, t1, max_requests)
+        
+        Returns:
+            TestResult med sammanslagen statistik
+        """
+        from sip_test_utils import parse_kamailio_address
+        from sip_load import format_load_summary
+        from distributed_load import DistributedLoadTest
+        
+        start_time = time.time()
+        host, port = parse_kamailio_address(target, 5060) if target else (None, 5060)
+        samplers = []
+        try:
+            load = DistributedLoadTest(scenario, rate, duration, workers, namespace, host, int(port), image,
+                                       **load_options)
+            load.start()
+            samplers.append(load)
+            if sample_resources:
+                from samplers import PodResourceSampler
+                samplers.append(PodResourceSampler(interval=sample_interval, client_metrics=load.metrics))
+            if stream_logs:
+                from kamailio_logs import KamailioLogStreamer
+                samplers.append(KamailioLogStreamer())
+            for sampler in samplers[1:]:
+                sampler.start()
+            try:
+                statistics = load.wait()
+            finally:
+                for sampler in reversed(samplers):
+                    sampler.stop()
+            for sampler in samplers:
+                statistics[sampler.source] = sampler.summarize(statistics)
+        except Exception as e:
+            logger.error(f"Fel vid distribuerat lasttest: {e}")
+            for sampler in samplers:
+                sampler.stop()
+            return TestResult(
+                scenario=f"load_{scenario}",
+                success=False,
+                exit_code=-1,
+                output="",
+                error=str(e),
+                duration=time.time() - start_time,
+                statistics={}
             )
+        
+        reported = len(load.results)
+        success = (reported == workers and statistics["requests_sent"] > 0
+                   and statistics["timeouts"] == 0 and statistics["failed"] == 0)
+        error = ""
+        if not success:
+            error = (f"{reported} av {workers} workers rapporterade, {statistics['timeouts']} timeouts, "
+                     f"{statistics['failed']} felsvar")
+        
+        return self._record_result(TestResult(
+            scenario=f"load_{scenario}",
+            success=success,
+            exit_code=0 if success else 1,
+            output=format_load_summary(statistics),
+            error=error,
+            duration=time.time() - start_time,
+            statistics=statistics
+        ), samplers)
     
+    def run_coordinated_load_test(self, scenario: str = "options", rate: float = 1000.0,
+                                  duration: float = 10.0, workers: int = 2, listen: Optional[str] = None,
+                                  target: Optional[str] = None, wait_timeout: float = 60.0,
+                                  coordinator=None, **load_options) -> TestResult:
+        """
+        Kör lasten från flera lasthosts via en koordinator (load_coordinator.py)
+        
+        Workers startas på lasthostarna med
+        "python load_coordinator.py worker --coordinator <denna host>:5099"
+        och registrerar sig; lasten delas lika och startar samtidigt.
+        
+        Args:
+            scenario: Scenario (options, register, invite, ping)
+            rate: Total takt för alla workers
+            duration: Hur länge lasten körs i sekunder
+            workers: Antal workers att vänta på
+            listen: Koordinatorns host:port (SIP_LAB_COORDINATOR, annars 0.0.0.0:5099)
+            target: Kamailio host[:port] sett från workers (standard kamailio_host,
+                    dvs LoadBalancer-IP:n med environment="prod")
+            wait_timeout: Sekunder att vänta på att workers registrerar sig
+            coordinator: En redan startad LoadCoordinator (annars skapas en)
+            **load_options: Vidare till LoadCoordinator.run (start_in, t1, max_requests)
+        
+        Returns:
+            TestResult med sammanslagen statistik
+        """
+        from sip_test_utils import parse_kamailio_address
+        from sip_load import format_load_summary
+        from load_coordinator import DEFAULT_PORT, LoadCoordinator
+        
+        start_time = time.time()
+        host, port = parse_kamailio_address(target or self.kamailio_host, self.kamailio_port)
+        owned = coordinator is None
+        try:
+            if owned:
+                address = listen or os.getenv("SIP_LAB_COORDINATOR") or f"0.0.0.0:{DEFAULT_PORT}"
+                listen_host, _, listen_port = address.rpartition(":")
+                coordinator = LoadCoordinator(listen_host or "0.0.0.0", int(listen_port)).start()
+            registered = coordinator.wait_for_workers(workers, wait_timeout)
+            if registered < workers:
+                raise RuntimeError(f"Bara {registered} av {workers} workers registrerade "
+                                   f"hos {coordinator.address} inom {wait_timeout:g}s")
+            statistics = coordinator.run(scenario, rate, duration, host, int(port), **load_options)
+            statistics[coordinator.source] = coordinator.summarize(statistics)
+        except Exception as e:
+            logger.error(f"Fel vid koordinerat lasttest: {e}")
+            return TestResult(
+                scenario=f"load_{scenario}",
+                success=False,
+                exit_code=-1,
+                output="",
+                error=str(e),
+                duration=time.time() - start_time,
+                statistics={}
+            )
+        finally:
+            if owned and coordinator is not None:
+                coordinator.stop()
+        
+        reported = len(coordinator.results)
+        success = (reported == workers and statistics["requests_sent"] > 0
+                   and statistics["timeouts"] == 0 and statistics["failed"] == 0)
+        error = ""
+        if not success:
+            error = (f"{reported} av {workers} workers rapporterade, {statistics['timeouts']} timeouts, "
+                     f"{statistics['failed']} felsvar")
+        
+        return self._record_result(TestResult(
+            scenario=f"load_{scenario}",
+            success=success,
+            exit_code=0 if success else 1,
+            output=format_load_summary(statistics),
+            error=error,
+            duration=time.time() - start_time,
+            statistics=statistics
+        ), [coordinator])
+
+    def find_capacity(self, scenario: str = "options", start_rate: float = 100.0, max_rate: float = 20000.0,
+                      step_duration: float = 10.0, p99_ms: float = 100.0, max_error_ratio: float = 0.01,
+                      resolution: float = 0.05, max_steps: int = 12, **load_options) -> TestResult:
+        """
+        Sök högsta takt som Kamailio klarar inom fel- och latensgränsen
+
+        Varje steg är en run_load_test-körning (och sparas som en sådan);
+        takten dubbleras tills ett steg underkänns och halveras sedan in.
+
+        Args:
+            scenario: Scenario (options, register, invite, ping)
+            start_rate: Första stegets takt
+            max_rate: Högsta takt som provas
+            step_duration: Sekunder per steg
+            p99_ms: Högsta tillåtna p99-latens
+            max_error_ratio: Högsta andel timeouts och felsvar
+            resolution: Sökningens upplösning som andel av takten
+            max_steps: Högsta antal steg
+            **load_options: Vidare till run_load_test (t.ex. sample_resources, source_ports)
+
+        Returns:
+            TestResult med kapaciteten (CPS), takt och latens vid kapaciteten och alla steg
+        """
+        from capacity_search import CapacitySearch, format_capacity_summary
+
+        start_time = time.time()
+        search = CapacitySearch(
+            lambda rate: self.run_load_test(scenario, rate, step_duration, **load_options).statistics,
+            start_rate=start_rate, max_rate=max_rate, resolution=resolution, max_steps=max_steps,
+            p99_ms=p99_ms, max_error_ratio=max_error_ratio)
+        statistics = search.search()
+
+        success = statistics["capacity_cps"] > 0
+        return self._record_result(TestResult(
+            scenario=f"capacity_{scenario}",
+            success=success,
+            exit_code=0 if success else 1,
+            output=format_capacity_summary(statistics),
+            error="" if success else f"Inget steg klarade kraven ({statistics['limit']})",
+            duration=time.time() - start_time,
+            statistics=statistics
+        ))
+
+    def run_scaling_experiment(self, replica_counts: List[int], scenario: str = "options",
+                               deployment: str = "kamailio", namespace: str = "kamailio",
+                               **options) -> TestResult:
+        """
+        Mät kapaciteten vid olika antal Kamailio-replikor
+
+        Args:
+            replica_counts: Antal replikor att mäta, t.ex. [1, 2, 3, 4]
+            scenario: Scenario för lasten
+            deployment: Deploymenten som skalas
+            namespace: Deploymentens namespace
+            **options: Vidare till ScalingExperiment och find_capacity
+
+        Returns:
+            TestResult med skalningskurvan och effektivitet per tillagd replika
+        """
+        from scaling_experiment import ScalingExperiment, format_scaling_curve
+
+        start_time = time.time()
+        experiment = ScalingExperiment(self, replica_counts, scenario, deployment, namespace, **options)
+        statistics = experiment.run()
+
+        failed = [point["replicas"] for point in statistics["curve"] if not point.get("capacity_cps")]
+        return self._record_result(TestResult(
+            scenario=f"scaling_{scenario}",
+            success=not failed,
+            exit_code=0 if not failed else 1,
+            output=format_scaling_curve(statistics),
+            error=f"Ingen kapacitet uppmätt för {failed} replikor" if failed else "",
+            duration=time.time() - start_time,
+            statistics=statistics
+        ))
+    
+    def run_config_sweep(self, grid: Optional[Dict[str, List]] = None, scenario: str = "options",
+                         rate: float = 1000.0, duration: float = 30.0, **options) -> TestResult:
+        """
+        Kör samma lastprofil mot varianter av Kamailio-konfigurationen och ranka dem
+
+        Args:
+            grid: Parameterrutnät, t.ex. {"children": [4, 8], "reply": ["sl", "tm"]}
+                  (standard config_sweep.DEFAULT_GRID)
+            scenario: Scenario för lasten
+            rate: Takt för lastprofilen
+            duration: Sekunder per variant
+            **options: Vidare till ConfigSweep (capacity, namespace, ...) och lasten
+
+        Returns:
+            TestResult med varianterna rankade (bäst först)
+        """
+        from config_sweep import ConfigSweep, format_sweep_ranking
+
+        start_time = time.time()
+        sweep = ConfigSweep(self, grid, scenario, rate, duration, **options)
+        statistics = sweep.run()
+
+        failed = [entry["name"] for entry in statistics["variants"] if not entry["ok"]]
+        success = len(failed) < len(statistics["variants"])
+        return self._record_result(TestResult(
+            scenario=f"sweep_{scenario}",
+            success=success,
+            exit_code=0 if success else 1,
+            output=format_sweep_ranking(statistics),
+            error=f"Underkända varianter: {', '.join(failed)}" if failed else "",
+            duration=time.time() - start_time,
+            statistics=statistics
+        ))
+
+    def run_cpu_limit_sweep(self, limits_m: List[int], scenarios: Optional[List[str]] = None,
+                            export_path: Optional[str] = None, **options) -> TestResult:
+        """
+        Mät kapaciteten vid olika CPU-gränser och exportera en kostnadsmodell
+
+        Args:
+            limits_m: CPU-gränser för Kamailio-containern i millicores
+            scenarios: Scenarier att mäta vid varje gräns (standard options)
+            export_path: Fil för kostnadsmodellen (se cpu_limit_sweep.model_path)
+            **options: Vidare till CpuLimitSweep och find_capacity
+
+        Returns:
+            TestResult med mätpunkter och millicores per 1k CPS per scenario
+        """
+        from cpu_limit_sweep import CpuLimitSweep, export_cost_model, format_cost_model
+        from results_store import get_results_store
+
+        start_time = time.time()
+        sweep = CpuLimitSweep(self, limits_m, scenarios, **options)
+        statistics = sweep.run()
+
+        output = format_cost_model(statistics)
+        if statistics["model"]:
+            config_hash = get_results_store().context.get("config_hash")
+            path = export_cost_model(statistics, export_path, config_hash)
+            statistics["exported"] = str(path)
+            output += f"\nKostnadsmodellen exporterad till {path}"
+
+        missing = [scenario for scenario in statistics["points"] if scenario not in statistics["model"]]
+        success = bool(statistics["model"]) and not missing
+        return self._record_result(TestResult(
+            scenario="cost_model",
+            success=success,
+            exit_code=0 if success else 1,
+            output=output,
+            error="" if success else f"Ingen modell för {', '.join(missing) or 'något scenario'}",
+            duration=time.time() - start_time,
+            statistics=statistics
+        ))
+
+    def run_transport_benchmark(self, transports: Optional[List[str]] = None,
+                                scenarios: Optional[List[str]] = None, **options) -> TestResult:
+        """
+        Jämför samma scenariomix över UDP, TCP och TLS
+
+        Args:
+            transports: Transporter (standard udp, tcp, tls)
+            scenarios: Scenariomixen (standard options)
+            **options: Vidare till TransportBenchmark (rate, duration, connections,
+                       handshakes, ports, tls_ca) och run_load_test
+
+        Returns:
+            TestResult med genomströmning, latens och serverns CPU per transport
+            samt kostnaden för TCP-connect och TLS-handskakning
+        """
+        from transport_benchmark import TransportBenchmark, format_transport_comparison
+
+        start_time = time.time()
+        benchmark = TransportBenchmark(self, transports, scenarios, **options)
+        statistics = benchmark.run()
+
+        failed = [f"{transport}/{scenario}" for transport, entries in statistics["transports"].items()
+                  for scenario, entry in entries.items() if "error" in entry]
+        success = not failed
+        return self._record_result(TestResult(
+            scenario="transport_benchmark",
+            success=success,
+            exit_code=0 if success else 1,
+            output=format_transport_comparison(statistics),
+            error="" if success else f"Inga resultat för {', '.join(failed)}",
+            duration=time.time() - start_time,
+            statistics=statistics
+        ))
+
+    def run_network_path_benchmark(self, paths: Optional[Dict[str, str]] = None, scenario: str = "options",
+                                   **options) -> TestResult:
+        """
+        Jämför vägarna till Kamailio: pod-IP, ClusterIP, NodePort och MetalLB
+
+        Args:
+            paths: {väg: "ip:port"} (standard slås adresserna upp med kubectl)
+            scenario: Scenario för lasten
+            **options: Vidare till NetworkPathBenchmark (rate, duration, capacity,
+                       in_cluster, ...) och lasten
+
+        Returns:
+            TestResult med latens, jitter och kapacitet per väg och skillnaden mot pod-IP
+        """
+        from network_paths import NetworkPathBenchmark, format_network_paths
+
+        start_time = time.time()
+        benchmark = NetworkPathBenchmark(self, paths, scenario, **options)
+        statistics = benchmark.run()
+
+        measured = [path for path, entry in statistics["results"].items() if "error" not in entry]
+        success = bool(measured)
+        return self._record_result(TestResult(
+            scenario="network_paths",
+            success=success,
+            exit_code=0 if success else 1,
+            output=format_network_paths(statistics),
+            error="" if success else "Ingen väg till Kamailio kunde mätas",
+            duration=time.time() - start_time,
+            statistics=statistics
+        ))
+
+    def run_soak_test(self, scenario: str = "options", rate: float = 100.0, hours: float = 12.0,
+                      window: float = 60.0, compact_every: int = 60, output: Optional[str] = None,
+                      sample_kamailio: bool = True, namespace: str = "kamailio", **load_options) -> TestResult:
+        """
+        Lång lastkörning med rullande fönster på disk och driftflaggor
+
+        Minnet är konstant oavsett längd: generatorn har fasta histogram och
+        bara den senaste timmens minutfönster hålls i minnet. Varje fönster
+        skrivs direkt till en JSONL-fil.
+
+        Args:
+            scenario: Scenario (options, register, invite, ping)
+            rate: Nya transaktioner per sekund
+            hours: Körningens längd i timmar
+            window: Sekunder per fönster
+            compact_every: Fönster per timfönster
+            output: JSONL-fil för fönstren (standard SIP_LAB_SOAK_DIR eller ~/.local/share/sip-k8s-lab/soak)
+            sample_kamailio: Läs Kamailios shm via kamcmd en gång per fönster
+            namespace: Kamailios namespace
+            **load_options: Vidare till SipLoadGenerator (t.ex. arrival, source_ports, transport)
+
+        Returns:
+            TestResult med timfönster och drift; misslyckas om någon drift flaggats
+        """
+        from sip_test_utils import parse_kamailio_address
+        from sip_load import SipLoadGenerator, format_load_summary
+        from soak import SoakTest, format_soak_summary
+
+        start_time = time.time()
+        kamailio_host = self.kamailio_host
+        host_ip, host_port = parse_kamailio_address(kamailio_host, self.kamailio_port)
+        try:
+            generator = SipLoadGenerator(host_ip, int(host_port), scenario, rate, hours * 3600,
+                                         local_port=self.local_port, **load_options)
+            kamailio = None
+            if sample_kamailio:
+                from samplers import KamailioStatsSampler
+                kamailio = KamailioStatsSampler(namespace=namespace)
+            soak = SoakTest(generator, window, compact_every, output, kamailio)
+            statistics = soak.run()
+        except Exception as e:
+            logger.error(f"Fel vid soak-test: {e}")
+            return TestResult(
+                scenario=f"soak_{scenario}",
+                success=False,
+                exit_code=-1,
+                output="",
+                error=str(e),
+                duration=time.time() - start_time,
+                statistics={}
+            )
+
+        flags = statistics["soak"]["hints"]
+        success = statistics["requests_sent"] > 0 and not flags
+        return self._record_result(TestResult(
+            scenario=f"soak_{scenario}",
+            success=success,
+            exit_code=0 if success else 1,
+            output=format_load_summary(statistics) + "\n" + format_soak_summary(statistics["soak"]),
+            error="; ".join(flags) if flags else ("" if success else "Inga requests skickades"),
+            duration=time.time() - start_time,
+            statistics=statistics
+        ))
+
     def run_all_tests(self) -> List[TestResult]:
         """
         Kör alla SIPp-tester
@@ -476,15 +1193,15 @@ class SippTester:
         Parsa SIPp-statistik från output
         
         Args:
-            output: SIPp output
+            output: SIPp output (str eller SpilledText)
             
         Returns:
             Dictionary med statistik
         """
         stats = {}
         
-        # Enkel parsing av SIPp-statistik
-        lines = output.split('\n')
+        # Enkel parsing av SIPp-statistik (SpilledText läses strömmande)
+        lines = output.iter_lines() if hasattr(output, "iter_lines") else output.split('\n')
         for line in lines:
             if 'Total' in line and 'Messages' in line:
                 # Exempel: "Total: 1 Messages, 0 Errors, 0 Failures"
@@ -499,33 +1216,22 @@ class SippTester:
         
         return stats
     
-    def build_docker_image(self) -> bool:
+    def build_docker_image(self, force: bool = False) -> bool:
         """
-        Bygg Docker-image för SIPp-tester
+        Bygg Docker-image för SIPp-tester om Dockerfile eller test-script ändrats
+        
+        Imagen märks med en hash av indata och bygget hoppas över när en
+        image med samma hash finns (se image_builder.py).
+        
+        Args:
+            force: Bygg även om imagen är aktuell
         
         Returns:
-            True om bygget lyckades
+            True om imagen finns efteråt
         """
-        logger.info("Bygger Docker-image för SIPp-tester...")
-        
-        try:
-            result = subprocess.run(
-                ['docker', 'build', '-t', self.docker_image, '.'],
-                capture_output=True,
-                text=True,
-                timeout=300
-            )
-            
-            if result.returncode == 0:
-                logger.info("Docker-image byggd framgångsrikt")
-                return True
-            else:
-                logger.error(f"Fel vid byggning av Docker-image: {result.stderr}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Fel vid byggning av Docker-image: {e}")
-            return False
+        logger.info("Kontrollerar Docker-image för SIPp-tester...")
+        from image_builder import ImageBuilder
+        return bool(ImageBuilder(image=self.docker_image).ensure_image(force=force)["success"])
     
     def check_docker_image(self) -> bool:
         """
@@ -582,15 +1288,15 @@ def print_test_results(results: List[TestResult]) -> None:
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
     # Exempel på användning
     tester = SippTester()
     
-    # Kontrollera om Docker-image finns
-    if not tester.check_docker_image():
-        print("Bygger Docker-image...")
-        if not tester.build_docker_image():
-            print("Kunde inte bygga Docker-image")
-            exit(1)
+    # Bygg Docker-image om Dockerfile eller test-script ändrats
+    if not tester.build_docker_image():
+        print("Kunde inte bygga Docker-image")
+        exit(1)
     
     # Kör alla tester
     results = tester.run_all_tests()
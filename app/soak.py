@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Soak-test: lång lastkörning (12-24 h) med konstant minnesåtgång
+
+Lastgeneratorn kör hela tiden; var window:e sekund stängs ett fönster med
+räknare och latens-histogram för fönstret (skillnaden mot föregående
+ögonblicksbild), Kamailios shm och generatorns RSS. Fönstren skrivs direkt
+till en JSONL-fil och hålls bara för den senaste timmen i minnet; var
+compact_every:e fönster slås de ihop till ett timfönster. Drift flaggas
+när p99, felandelen eller Kamailios shm stiger mellan början och slutet
+av körningen.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOAK_DIR = Path.home() / ".local" / "share" / "sip-k8s-lab" / "soak"
+WINDOW_S = 60.0
+# Minutfönster per timfönster
+COMPACT_EVERY = 60
+
+# Driftgränser: sista tredjedelen av körningen mot första
+P99_RATIO = 1.5
+P99_MIN_INCREASE_MS = 1.0
+# Svar per tredjedel som krävs för att jämföra p99 (färre ger brus, inte drift)
+P99_MIN_SAMPLES = 1000
+ERROR_RATIO_INCREASE = 0.001
+SHM_GROWTH = 0.05
+RSS_GROWTH = 0.10
+
+
+def soak_path(path: Optional[Path] = None, scenario: str = "options") -> Path:
+    """Fönsterfilen (argument, SIP_LAB_SOAK_DIR eller standardkatalogen med tidsstämpel)"""
+    if path:
+        return Path(path)
+    directory = Path(os.getenv("SIP_LAB_SOAK_DIR") or DEFAULT_SOAK_DIR)
+    return directory / f"soak-{scenario}-{time.strftime('%Y%m%d-%H%M%S')}.jsonl"
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Processens nuvarande RSS (Linux /proc), annars None"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _window_entry(kind: str, start: float, end: float, counters: Dict[str, int], latency) -> Dict:
+    """Ett fönster som dict: räknare, felandel och latens (percentiler och glesa buckets)"""
+    errors = counters["failed"] + counters["timeouts"]
+    return {
+        "type": kind,
+        "start": round(start, 3),
+        "end": round(end, 3),
+        **counters,
+        "error_ratio": round(errors / counters["sent"], 6) if counters["sent"] else 0.0,
+        "latency_ms": latency.summary_ms(),
+        "latency": latency.to_dict(),
+    }
+
+
+def compact_windows(windows: List[Dict]) -> Dict:
+    """Slå ihop minutfönster till ett timfönster (summerade räknare, mergade histogram)"""
+    from metrics import LatencyHistogram
+
+    latency = LatencyHistogram.from_dict(windows[0]["latency"])
+    for window in windows[1:]:
+        latency.merge(LatencyHistogram.from_dict(window["latency"]))
+    counters = {key: sum(window[key] for window in windows)
+                for key in ("sent", "successful", "failed", "timeouts", "retransmissions")}
+    entry = _window_entry("hour", windows[0]["start"], windows[-1]["end"], counters, latency)
+    entry["windows"] = len(windows)
+    for key in ("shm_used_bytes", "rss_bytes"):
+        values = [window[key] for window in windows if window.get(key) is not None]
+        entry[key] = max(values) if values else None
+    return entry
+
+
+def detect_drift(windows: List[Dict]) -> Dict:
+    """
+    Jämför sista tredjedelen av fönstren med första
+
+    Args:
+        windows: Fönster i tidsordning (timfönster, eller minutfönster för korta körningar)
+
+    Returns:
+        {"trends": {mått: {"first", "last"}}, "flags": {mått: beskrivning}}
+    """
+    from metrics import LatencyHistogram
+
+    if len(windows) < 3:
+        return {"trends": {}, "flags": {}}
+    third = len(windows) // 3
+    first, last = windows[:third], windows[-third:]
+
+    def mean(part: List[Dict], key: str) -> Optional[float]:
+        values = [window.get(key) for window in part if window.get(key) is not None]
+        return sum(values) / len(values) if values else None
+
+    def p99_ms(part: List[Dict]) -> Optional[float]:
+        """p99 ur de sammanslagna histogrammen (inte medel av fönstrens p99)"""
+        latency = LatencyHistogram.from_dict(part[0]["latency"])
+        for window in part[1:]:
+            latency.merge(LatencyHistogram.from_dict(window["latency"]))
+        return latency.percentile(99) * 1000 if latency.count >= P99_MIN_SAMPLES else None
+
+    def error_ratio(part: List[Dict]) -> float:
+        sent = sum(window["sent"] for window in part)
+        return sum(window["failed"] + window["timeouts"] for window in part) / sent if sent else 0.0
+
+    trends = {key: (mean(first, key), mean(last, key)) for key in ("shm_used_bytes", "rss_bytes")}
+    trends["p99_ms"] = (p99_ms(first), p99_ms(last))
+    trends["error_ratio"] = (error_ratio(first), error_ratio(last))
+    flags = {}
+    before, after = trends["p99_ms"]
+    if before and after and after > before * P99_RATIO and after - before > P99_MIN_INCREASE_MS:
+        flags["p99_ms"] = f"p99 stiger: {before:.2f}ms i början, {after:.2f}ms i slutet"
+    before, after = trends["error_ratio"]
+    if after - before > ERROR_RATIO_INCREASE:
+        flags["error_ratio"] = f"Felandelen stiger: {before * 100:.2f}% i början, {after * 100:.2f}% i slutet"
+    before, after = trends["shm_used_bytes"]
+    if before and after and after > before * (1 + SHM_GROWTH):
+        flags["shm_used_bytes"] = (f"Kamailios shm växer: {before / 2**20:.1f} MiB i början, "
+                                   f"{after / 2**20:.1f} MiB i slutet (minnesläcka?)")
+    before, after = trends["rss_bytes"]
+    if before and after and after > before * (1 + RSS_GROWTH):
+        flags["rss_bytes"] = (f"Generatorns RSS växer: {before / 2**20:.1f} MiB i början, "
+                              f"{after / 2**20:.1f} MiB i slutet")
+    return {"trends": {name: {"first": values[0], "last": values[1]} for name, values in trends.items()},
+            "flags": flags}
+
+
+class SoakTest:
+    """
+    Kör en lastgenerator länge och håll bara rullande fönster i minnet
+
+    Args:
+        generator: SipLoadGenerator att köra (duration = soak-tiden, utan record_send_times)
+        window: Sekunder per fönster
+        compact_every: Fönster per timfönster
+        output: JSONL-fil för fönstren (se soak_path)
+        kamailio: KamailioStatsSampler att läsa shm från en gång per fönster (None = ingen)
+    """
+
+    source = "soak"
+
+    def __init__(self, generator, window: float = WINDOW_S, compact_every: int = COMPACT_EVERY,
+                 output: Optional[Path] = None, kamailio=None):
+        if window <= 0 or compact_every < 1:
+            raise ValueError("window måste vara större än 0 och compact_every minst 1")
+        if generator.send_times is not None:
+            raise ValueError("record_send_times växer med varje request och kan inte användas i soak")
+        self.generator = generator
+        self.window = window
+        self.compact_every = compact_every
+        self.output = soak_path(output, generator.scenario)
+        self.kamailio = kamailio
+        self.minutes: deque = deque(maxlen=compact_every)
+        self.hours: List[Dict] = []
+        self.flags: Dict[str, str] = {}
+        self.windows = 0
+        self._since_compaction = 0
+        self._file = None
+        self._snapshot = None
+
+    def _write(self, entry: Dict) -> None:
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def _counters(self) -> Dict:
+        metrics = self.generator.metrics
+        by_code = metrics.responses_by_code()
+        return {
+            "time": time.time(),
+            "sent": metrics.requests_sent,
+            "successful": sum(c for code, c in by_code.items() if 200 <= code < 300),
+            "failed": sum(c for code, c in by_code.items() if code >= 300),
+            "timeouts": metrics.timeouts,
+            "retransmissions": metrics.retransmissions,
+            "latency": metrics.latency.copy(),
+        }
+
+    def _shm_used(self) -> Optional[float]:
+        """Största shm-användningen bland poddarna just nu"""
+        if self.kamailio is None:
+            return None
+        if not self.kamailio.pods:
+            self.kamailio.pods = self.kamailio.discover_pods()
+        values = [self.kamailio.collect(pod) for pod in self.kamailio.pods]
+        used = [v["shmem:real_used_size"] for v in values if v and "shmem:real_used_size" in v]
+        if len(used) < len(values):
+            # En pod som startats om eller försvunnit hittas igen vid nästa fönster
+            self.kamailio.pods = []
+        return max(used) if used else None
+
+    def _close_window(self) -> None:
+        current = self._counters()
+        previous = self._snapshot
+        counters = {key: current[key] - previous[key]
+                    for key in ("sent", "successful", "failed", "timeouts", "retransmissions")}
+        entry = _window_entry("minute", previous["time"], current["time"], counters,
+                              current["latency"].difference(previous["latency"]))
+        entry["shm_used_bytes"] = self._shm_used()
+        entry["rss_bytes"] = process_rss_bytes()
+        self._snapshot = current
+        self.minutes.append(entry)
+        self.windows += 1
+        self._since_compaction += 1
+        self._write(entry)
+        if self._since_compaction == self.compact_every:
+            self._compact()
+
+    def _compact(self) -> None:
+        if not self._since_compaction:
+            return
+        hour = compact_windows(list(self.minutes)[-self._since_compaction:])
+        self._since_compaction = 0
+        self.hours.append(hour)
+        self._write(hour)
+        logger.info(f"🕐 Soak timme {len(self.hours)}: {hour['sent']} skickade, "
+                    f"p99 {hour['latency_ms'].get('p99')}ms, fel {hour['error_ratio'] * 100:.2f}%")
+        for metric, flag in detect_drift(self.series())["flags"].items():
+            if metric not in self.flags:
+                logger.warning(f"⚠️  Drift: {flag}")
+            self.flags[metric] = flag
+
+    def series(self) -> List[Dict]:
+        """Fönstren som driften bedöms på: timfönstren, eller minutfönstren tills tre timmar finns"""
+        return self.hours if len(self.hours) >= 3 else list(self.minutes)
+
+    def run(self) -> Dict:
+        """
+        Kör generatorn och stäng fönster tills den är klar (Ctrl-C avslutar i förtid)
+
+        Returns:
+            Generatorns statistik plus soak-sammanfattningen (se summarize())
+
+        Raises:
+            Felet från generatorn om den avbryts av ett undantag
+        """
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        generator = self.generator
+        outcome: Dict = {}
+        errors: List[BaseException] = []
+
+        def run_generator() -> None:
+            try:
+                outcome.update(generator.run())
+            except BaseException as e:
+                errors.append(e)
+
+        runner = threading.Thread(target=run_generator, daemon=True)
+        self._file = open(self.output, "a")
+        try:
+            self._write({"type": "start", "time": round(time.time(), 3), "scenario": generator.scenario,
+                         "target": f"{generator.host}:{generator.port}", "rate": generator.rate,
+                         "arrival": generator.arrival, "duration_s": generator.duration,
+                         "window_s": self.window, "compact_every": self.compact_every})
+            logger.info(f"🧪 Soak: {generator.rate:g}/s {generator.scenario} i {generator.duration / 3600:g} h, "
+                        f"fönster {self.window:g}s, till {self.output}")
+            self._snapshot = self._counters()
+            runner.start()
+            next_close = time.monotonic() + self.window
+            try:
+                while runner.is_alive():
+                    runner.join(max(0.0, next_close - time.monotonic()))
+                    if time.monotonic() >= next_close:
+                        self._close_window()
+                        next_close += self.window
+            except KeyboardInterrupt:
+                logger.warning("⏹️  Soak avbryts, väntar på öppna transaktioner")
+                generator.stop()
+                runner.join()
+            if errors:
+                # Generatorn dog i tråden - fönstren hittills finns kvar i filen
+                self._write({"type": "error", "time": round(time.time(), 3), "error": str(errors[0])})
+                raise errors[0]
+            self._close_window()
+            self._compact()
+            summary = self.summarize()
+            self._write({"type": "summary", "time": round(time.time(), 3), "drift": summary["drift"]})
+        finally:
+            self._file.close()
+            self._file = None
+        statistics = dict(outcome)
+        statistics[self.source] = summary
+        return statistics
+
+    def summarize(self, client_stats: Optional[Dict] = None) -> Dict:
+        """
+        Returns:
+            Timfönster (utan histogram), drift och var fönstren finns på disk
+        """
+        drift = detect_drift(self.series())
+        rss = [window["rss_bytes"] for window in self.hours if window.get("rss_bytes")]
+        return {
+            "output": str(self.output),
+            "windows": self.windows,
+            "window_s": self.window,
+            "hours": [{key: value for key, value in hour.items() if key != "latency"} for hour in self.hours],
+            "rss_bytes_max": max(rss) if rss else None,
+            "drift": drift,
+            # Även drift som syntes under körningen men inte i slutbedömningen
+            "hints": list({**self.flags, **drift["flags"]}.values()),
+        }
+
+
+def format_soak_summary(summary: Dict) -> str:
+    """Soak-sammanfattningen som text"""
+    lines = [f"Soak: {summary['windows']} fönster à {summary['window_s']:g}s, {len(summary['hours'])} timfönster "
+             f"i {summary['output']}"]
+    for index, hour in enumerate(summary["hours"], 1):
+        latency = hour["latency_ms"]
+        shm = hour.get("shm_used_bytes")
+        lines.append(f"  {index:>3}: {hour['sent']:>9} skickade, p99 {latency.get('p99')}ms "
+                     f"p999 {latency.get('p999')}ms, fel {hour['error_ratio'] * 100:.2f}%"
+                     + (f", shm {shm / 2**20:.1f} MiB" if shm is not None else ""))
+    if summary["rss_bytes_max"]:
+        lines.append(f"Generatorns RSS: högst {summary['rss_bytes_max'] / 2**20:.1f} MiB")
+    lines.extend(f"Drift: {flag}" for flag in summary["hints"])
+    return "\n".join(lines)
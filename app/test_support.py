@@ -4,17 +4,14 @@ Test Support Classes
 Innehåller klasser och funktioner som används av testerna
 """
 
-import pytest
 import time
 import subprocess
 import json
 import os
 from typing import Dict, Any, Optional, Tuple
-import sys
-from pathlib import Path
-sys.path.append(str(Path(__file__).parent.parent / "sipp-tester"))
 from sipp_support import SippTester
-from sip_test_utils import get_environment_status, NetworkUtils
+from sip_test_utils import NetworkUtils
+from env_cache import get_cached_environment_status
 
 
 class TestEnvironmentSupport:
@@ -268,19 +265,21 @@ class SippTestSupport:
     """Support-klass för SIPp-tester"""
     
     @staticmethod
-    def create_sipp_tester(environment: str) -> SippTester:
+    def create_sipp_tester(environment: str, local_port: int = 5065) -> SippTester:
         """Skapa SippTester-instans"""
         return SippTester(
             kamailio_host="localhost",
             kamailio_port=5060,
             timeout=30,
-            environment=environment
+            environment=environment,
+            local_port=local_port
         )
     
     @staticmethod
     def ensure_environment_ready() -> Dict[str, bool]:
         """Kontrollera att miljön är redo för SIPp-tester"""
-        env_status = get_environment_status()
+        import pytest
+        env_status = get_cached_environment_status()
         
         # Kontrollera kritiska komponenter för SIPp-tester
         # Ändra från "sipp_installed" till "sipp_container" eftersom SIPp är i Docker
@@ -295,7 +294,8 @@ class SippTestSupport:
     @staticmethod
     def ensure_kamailio_ready() -> Dict[str, bool]:
         """Kontrollera att Kamailio är redo"""
-        env_status = get_environment_status()
+        import pytest
+        env_status = get_cached_environment_status()
         
         print(f"🔍 Kamailio readiness check:")
         for check, status in env_status.items():
@@ -313,8 +313,9 @@ class SippTestSupport:
         return env_status
     
     @staticmethod
-    def start_port_forward() -> subprocess.Popen:
-        """Starta port-forward för Kamailio"""
+    def start_port_forward(local_port: int = 5060) -> subprocess.Popen:
+        """Starta port-forward för Kamailio på given lokal port"""
+        import pytest
         try:
             # För Kind-kluster använder vi NodePort istället för port-forward
             # Kontrollera om vi kör i Kind-kluster
@@ -327,39 +328,35 @@ class SippTestSupport:
             
             if result.returncode == 0 and "sipp-k8s-lab" in result.stdout:
                 print("🔍 Kind-kluster detekterat, använder NodePort istället för port-forward")
-                # Returnera en dummy-process för Kind-kluster
+                # Returnera en dummy-process för Kind-kluster (hostPort 5060 i kind-config.yaml)
                 class DummyProcess:
+                    local_port = 5060
                     def poll(self): return None
                     def terminate(self): pass
                     def wait(self): pass
                 return DummyProcess()
             
-            # För andra kluster, använd port-forward
+            # För andra kluster, använd delad port-forward (redo när kubectl skriver "Forwarding from")
             print("🔍 Använder port-forward för Kamailio")
-            process = subprocess.Popen(
-                ["kubectl", "port-forward", "svc/kamailio-service", "5060:5060", "-n", "kamailio"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
+            handle = NetworkUtils.port_forward_service("kamailio-service", "kamailio", local_port, 5060)
             
-            # Vänta lite för att port-forward ska starta
-            time.sleep(2)
-            
-            if process.poll() is None:
-                return process
+            if handle is not None:
+                return handle
             else:
                 pytest.skip("Kunde inte starta port-forward för Kamailio")
         except Exception as e:
             pytest.skip(f"Kunde inte starta port-forward: {e}")
     
     @staticmethod
-    def create_sipp_tester_with_kamailio(environment: str) -> SippTester:
-        """Skapa SippTester-instans för Kamailio-tester"""
+    def create_sipp_tester_with_kamailio(environment: str, local_port: int = 5065,
+                                         kamailio_port: int = 5060) -> SippTester:
+        """Skapa SippTester-instans för Kamailio-tester (kamailio_port = port-forwardens lokala port)"""
         return SippTester(
             kamailio_host="localhost",
-            kamailio_port=5060,
+            kamailio_port=kamailio_port,
             timeout=30,
-            environment=environment
+            environment=environment,
+            local_port=local_port
         ) 
 
 
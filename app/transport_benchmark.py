@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Transportjämförelse: UDP, TCP och TLS
+
+Samma scenariomix körs över varje transport med samma takt och samma
+antal källor (källportar för UDP, anslutningar för TCP och TLS). Per
+transport rapporteras genomströmning, latens och serverns CPU per
+transaktion. Uppkopplingen mäts för sig: TCP-connect och
+TLS-handskakning, med och utan sessionsåterupptagning, så att kostnaden
+för en ny anslutning skiljs från kostnaden per meddelande på en öppen.
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRANSPORT_ORDER = ("udp", "tcp", "tls")
+# Port per transport; None betyder Kamailios vanliga SIP-port
+DEFAULT_PORTS = {"udp": None, "tcp": None, "tls": 5061}
+
+
+def transport_entry(statistics: Dict) -> Dict:
+    """
+    Nyckeltal för en lastkörning över en transport
+
+    Serverns CPU i mikrosekunder per transaktion är samma tal som
+    millicores per 1k RPS (cores / RPS * 1e6).
+    """
+    from capacity_search import completed_rate
+
+    latency = statistics.get("latency_ms", {})
+    resources = statistics.get("resources") or {}
+    sent = statistics.get("requests_sent", 0)
+    errors = statistics.get("timeouts", 0) + statistics.get("failed", 0)
+    return {
+        "throughput": statistics.get("throughput", 0.0),
+        "cps": completed_rate(statistics),
+        "p50_ms": latency.get("p50"),
+        "p99_ms": latency.get("p99"),
+        "error_ratio": round(errors / sent, 4) if sent else None,
+        "cpu_us_per_transaction": resources.get("millicores_per_1k_rps"),
+        "connections": statistics.get("connections"),
+    }
+
+
+def handshake_entry(result: Dict, resources: Optional[Dict] = None) -> Dict:
+    """Nyckeltal för en serie uppkopplingar (sip_load.measure_handshakes)"""
+    cores = (resources or {}).get("cpu_cores_total")
+    return {
+        "completed": result["completed"],
+        "failed": result["failed"],
+        "resumed": result["resumed"],
+        "rate": result["rate"],
+        "connect_p50_ms": result["connect_ms"].get("p50"),
+        "handshake_p50_ms": result["handshake_ms"].get("p50"),
+        "handshake_p99_ms": result["handshake_ms"].get("p99"),
+        "cpu_ms_per_handshake": round(cores / result["rate"] * 1000, 3) if cores and result["rate"] else None,
+        "errors": result["errors"],
+    }
+
+
+def compare_transports(transports: Dict[str, Dict[str, Dict]], baseline: str = "udp") -> Dict[str, Dict[str, Dict]]:
+    """
+    Skillnad mot baslinjetransporten per scenario
+
+    Returns:
+        {transport: {scenario: {p99_delta_ms, cps_ratio, cpu_ratio}}}
+    """
+    base = transports.get(baseline) or {}
+    relative: Dict[str, Dict[str, Dict]] = {}
+    for transport, scenarios in transports.items():
+        if transport == baseline:
+            continue
+        for scenario, entry in scenarios.items():
+            reference = base.get(scenario)
+            if not reference or "error" in entry or "error" in reference:
+                continue
+            p99, ref_p99 = entry.get("p99_ms"), reference.get("p99_ms")
+            cpu, ref_cpu = entry.get("cpu_us_per_transaction"), reference.get("cpu_us_per_transaction")
+            relative.setdefault(transport, {})[scenario] = {
+                "p99_delta_ms": round(p99 - ref_p99, 3) if p99 is not None and ref_p99 is not None else None,
+                "cps_ratio": round(entry["cps"] / reference["cps"], 3) if reference.get("cps") else None,
+                "cpu_ratio": round(cpu / ref_cpu, 2) if cpu and ref_cpu else None,
+            }
+    return relative
+
+
+class TransportBenchmark:
+    """
+    Kör samma scenariomix över UDP, TCP och TLS
+
+    Args:
+        tester: SippTester som kör lastkörningarna
+        transports: Transporter att jämföra
+        scenarios: Scenariomixen (samma för alla transporter)
+        rate: Takt per lastkörning
+        duration: Sekunder per lastkörning
+        connections: Källportar (UDP) respektive anslutningar (TCP/TLS)
+        handshakes: Antal uppkopplingar i följd för att mäta connect/handskakning
+        ports: Port per transport (standard DEFAULT_PORTS)
+        tls_ca: CA-fil för att verifiera Kamailios certifikat (standard ingen verifiering)
+        sample_resources: Sampla serverns CPU under varje del
+        sample_interval: Sekunder mellan samplingar
+        **load_options: Vidare till run_load_test
+    """
+
+    def __init__(self, tester, transports: Optional[List[str]] = None, scenarios: Optional[List[str]] = None,
+                 rate: float = 500.0, duration: float = 10.0, connections: int = 16, handshakes: int = 500,
+                 ports: Optional[Dict[str, int]] = None, tls_ca: Optional[str] = None,
+                 sample_resources: bool = True, sample_interval: float = 1.0, **load_options):
+        transports = [t.lower() for t in (transports or TRANSPORT_ORDER)]
+        unknown = [t for t in transports if t not in TRANSPORT_ORDER]
+        if unknown:
+            raise ValueError(f"Okänd transport: {', '.join(unknown)} (välj bland {', '.join(TRANSPORT_ORDER)})")
+        self.tester = tester
+        self.transports = [t for t in TRANSPORT_ORDER if t in transports]
+        self.scenarios = scenarios or ["options"]
+        self.rate = rate
+        self.duration = duration
+        self.connections = connections
+        self.handshakes = handshakes
+        self.ports = dict(DEFAULT_PORTS, **(ports or {}))
+        self.tls_ca = tls_ca
+        self.sample_resources = sample_resources
+        self.sample_interval = sample_interval
+        self.load_options = load_options
+        self.targets: Dict[str, str] = {}
+        self.results: Dict[str, Dict[str, Dict]] = {}
+        self.setup: Dict[str, Dict] = {}
+        self.errors: List[str] = []
+
+    def _address(self, transport: str):
+        from sip_test_utils import parse_kamailio_address
+
+        host, port = parse_kamailio_address(self.tester.kamailio_host, self.tester.kamailio_port)
+        return host, self.ports.get(transport) or port
+
+    def _handshakes(self, host: str, port: int, transport: str, resumption: bool, tls_context) -> Dict:
+        """Uppkopplingar i följd, med serverns CPU om resurser samplas"""
+        from sip_load import measure_handshakes
+
+        sampler = None
+        if self.sample_resources:
+            from samplers import PodResourceSampler
+            sampler = PodResourceSampler(interval=self.sample_interval)
+            sampler.start()
+        try:
+            result = measure_handshakes(host, port, transport, self.handshakes, tls_context, resumption)
+        finally:
+            if sampler:
+                sampler.stop()
+        resources = sampler.summarize({"throughput": result["rate"]}) if sampler else None
+        return handshake_entry(result, resources)
+
+    def run(self) -> Dict:
+        """
+        Mät uppkoppling och lastkörningar för varje transport
+
+        Returns:
+            Se summarize()
+        """
+        from sip_load import tls_client_context
+
+        tls_context = tls_client_context(self.tls_ca) if "tls" in self.transports else None
+        for transport in self.transports:
+            host, port = self._address(transport)
+            self.targets[transport] = f"{host}:{port}"
+            if transport != "udp":
+                logger.info(f"🔌 {self.handshakes} uppkopplingar över {transport.upper()} mot {host}:{port}")
+                variants = [("full", False), ("resumed", True)] if transport == "tls" else [("connect", False)]
+                self.setup[transport] = {name: self._handshakes(host, port, transport, resumption, tls_context)
+                                         for name, resumption in variants}
+                if not any(entry["completed"] for entry in self.setup[transport].values()):
+                    error = next((e for entry in self.setup[transport].values() for e in entry["errors"]), "")
+                    self.errors.append(f"{transport.upper()} på {host}:{port} svarar inte ({error})")
+                    self.results[transport] = {scenario: {"error": "ingen anslutning"} for scenario in self.scenarios}
+                    continue
+
+            self.results[transport] = {}
+            for scenario in self.scenarios:
+                result = self.tester.run_load_test(
+                    scenario, self.rate, self.duration, port=port, transport=transport,
+                    source_ports=self.connections, sample_resources=self.sample_resources,
+                    sample_interval=self.sample_interval, tls_context=tls_context, **self.load_options)
+                if not result.statistics:
+                    self.results[transport][scenario] = {"error": result.error}
+                    continue
+                self.results[transport][scenario] = transport_entry(result.statistics)
+        return self.summarize()
+
+    def summarize(self) -> Dict:
+        """
+        Returns:
+            Dict med nyckeltal per transport och scenario, uppkopplingens
+            kostnad per transport, skillnad mot UDP och hints
+        """
+        hints = list(self.errors)
+        if any("TLS" in error for error in self.errors):
+            hints.append("k8s/configmap.yaml lyssnar bara på udp/tcp 5060 och laddar inte tls.so, och Servicen "
+                         "exponerar inte 5061 - TLS kräver listen=tls:0.0.0.0:5061, tls.so med certifikat och "
+                         "porten i Servicen")
+        tls = self.setup.get("tls", {})
+        full, resumed = tls.get("full", {}), tls.get("resumed", {})
+        if full.get("completed") and resumed.get("completed") and not resumed.get("resumed"):
+            hints.append("Ingen TLS-session återupptogs - servern har troligen sessionscache och biljetter avstängda")
+
+        # En full handskakning uttryckt i antal transaktioner på en öppen TLS-anslutning
+        per_message = [entry["cpu_us_per_transaction"] for entry in self.results.get("tls", {}).values()
+                       if entry.get("cpu_us_per_transaction")]
+        if full.get("cpu_ms_per_handshake") and per_message:
+            full["transactions_equivalent"] = round(full["cpu_ms_per_handshake"] * 1000 / max(per_message), 1)
+        return {
+            "targets": self.targets,
+            "rate": self.rate,
+            "duration": self.duration,
+            "connections": self.connections,
+            "scenarios": self.scenarios,
+            "transports": self.results,
+            "setup": self.setup,
+            "relative": compare_transports(self.results),
+            "hints": hints,
+        }
+
+
+def format_transport_comparison(summary: Dict) -> str:
+    """Transportjämförelsen som text"""
+    lines = [f"Transportjämförelse ({summary['rate']:g}/s i {summary['duration']:g}s, "
+             f"{summary['connections']} källor):"]
+    for transport, scenarios in summary["transports"].items():
+        lines.append(f"  {transport.upper()} ({summary['targets'].get(transport, '-')}):")
+        for scenario, entry in scenarios.items():
+            if "error" in entry:
+                lines.append(f"    {scenario:<9} - ({entry['error']})")
+                continue
+            cpu = entry["cpu_us_per_transaction"]
+            line = (f"    {scenario:<9} {entry['cps']:>9.1f} CPS p50 {entry['p50_ms']}ms p99 {entry['p99_ms']}ms"
+                    + (f", {cpu:g} µs CPU per transaktion" if cpu is not None else ""))
+            relative = summary["relative"].get(transport, {}).get(scenario)
+            if relative and relative["p99_delta_ms"] is not None:
+                line += f" (p99 {relative['p99_delta_ms']:+g}ms"
+                line += f", CPU {relative['cpu_ratio']:g}x" if relative["cpu_ratio"] else ""
+                line += " mot UDP)"
+            lines.append(line)
+        for name, setup in summary["setup"].get(transport, {}).items():
+            if not setup["completed"]:
+                continue
+            line = (f"    {name:<9} {setup['completed']} uppkopplingar, {setup['rate']:g}/s, "
+                    f"connect p50 {setup['connect_p50_ms']}ms")
+            if setup["handshake_p50_ms"] is not None:
+                line += (f", handskakning p50 {setup['handshake_p50_ms']}ms p99 {setup['handshake_p99_ms']}ms "
+                         f"({setup['resumed']} återupptagna)")
+            if setup["cpu_ms_per_handshake"] is not None:
+                line += f", {setup['cpu_ms_per_handshake']:g} ms CPU per uppkoppling"
+            if setup.get("transactions_equivalent"):
+                line += f" = {setup['transactions_equivalent']:g} transaktioner"
+            lines.append(line)
+    lines.extend(f"Transport: {hint}" for hint in summary["hints"])
+    return "\n".join(lines)
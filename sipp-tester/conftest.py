@@ -3,11 +3,22 @@
 Pytest-konfiguration för SIPp-tester
 """
 
+import json
 import pytest
 import subprocess
+import sys
 import time
 from pathlib import Path
 
+# Lägg till app directory för att importera port-forward-managern
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+from port_forward import get_port_forward_manager
+from env_cache import get_environment_cache
+from parallel_support import get_worker_id, get_worker_port, is_parallel_run, run_once
+from command_tracing import start_tracing, stop_tracing, get_tracer
+from metrics import start_metrics_server
+from image_builder import ImageBuilder
+
 
 def pytest_configure(config):
     """Konfigurera pytest"""
@@ -15,6 +26,40 @@ def pytest_configure(config):
     config.addinivalue_line("markers", "slow: mark test as slow to run")
     config.addinivalue_line("markers", "integration: mark test as integration test")
     config.addinivalue_line("markers", "kamailio: mark test as requiring Kamailio")
+    
+    # Töm miljö-cachen om det begärts
+    if config.getoption("--refresh-env-cache"):
+        get_environment_cache().clear()
+    
+    # Spåra alla externa kommandon om det begärts
+    if config.getoption("--trace-commands"):
+        start_tracing()
+        if is_xdist_controller(config):
+            # Workers startas efter detta; gamla worker-filer ska inte slås ihop med nya
+            for stale in worker_trace_files(config.getoption("--trace-commands")):
+                stale.unlink()
+    
+    # Exponera lastkörningarnas mätvärden på /metrics (en port per xdist-worker,
+    # controllern kör inga tester och skulle dela port med gw0)
+    if config.getoption("--metrics-port") is not None and not is_xdist_controller(config):
+        port = get_worker_port(config.getoption("--metrics-port"))
+        try:
+            start_metrics_server(port)
+        except OSError as e:
+            config.issue_config_time_warning(
+                pytest.PytestConfigWarning(f"Kunde inte starta /metrics på port {port}: {e} - fortsätter utan"),
+                stacklevel=2)
+
+
+def is_xdist_controller(config) -> bool:
+    """Kontrollera om processen är xdist-controllern (fördelar tester, kör inga själv)"""
+    return not hasattr(config, "workerinput") and bool(getattr(config.option, "numprocesses", None))
+
+
+def worker_trace_files(trace_path: str):
+    """De trace-filer som xdist-workers skriver bredvid trace_path (trace-gw0.json, ...)"""
+    path = Path(trace_path)
+    return sorted(path.parent.glob(f"{path.stem}-gw*{path.suffix}"))
 
 
 def pytest_addoption(parser):
@@ -41,6 +86,26 @@ def pytest_addoption(parser):
         action="store_true",
         help="Bygg Docker-image innan tester"
     )
+    parser.addoption(
+        "--trace-commands",
+        action="store",
+        default=None,
+        metavar="PATH",
+        help="Spåra alla externa kommandon och skriv Chrome trace-JSON till PATH"
+    )
+    parser.addoption(
+        "--metrics-port",
+        action="store",
+        type=int,
+        default=None,
+        metavar="PORT",
+        help="Exponera Prometheus-metrics för lastkörningar på http://localhost:PORT/metrics"
+    )
+    parser.addoption(
+        "--refresh-env-cache",
+        action="store_true",
+        help="Töm miljö-cachen (snapshot av miljöstatus och endpoint) innan tester"
+    )
     parser.addoption(
         "--environment",
         action="store",
@@ -81,23 +146,40 @@ def environment(request):
 
 
 @pytest.fixture(scope="session")
-def docker_image_built(request):
-    """Fixture som bygger Docker-image om det behövs"""
+def session_shared_dir(tmp_path_factory):
+    """Katalog som delas av alla xdist-workers i samma testsession"""
+    base = tmp_path_factory.getbasetemp()
+    return base.parent if is_parallel_run() else base
+
+
+@pytest.fixture(scope="session")
+def sipp_local_port():
+    """Lokal SIPp-port, unik per xdist-worker (5065, 5075, 5085, ...)"""
+    return get_worker_port(5065)
+
+
+@pytest.fixture(scope="session")
+def port_forward_local_port():
+    """Lokal port för port-forward (5060 utan xdist, annars unik per worker)"""
+    return get_worker_port(15060) if is_parallel_run() else 5060
+
+
+@pytest.fixture(scope="session")
+def docker_image_built(request, session_shared_dir):
+    """Fixture som bygger Docker-image om det behövs (en gång för alla workers)"""
     if request.config.getoption("--build-docker"):
-        print("Bygger Docker-image...")
-        result = subprocess.run(
-            ["docker", "build", "-t", "local/sipp-tester:latest", "."],
-            cwd=Path(__file__).parent,
-            capture_output=True,
-            text=True
-        )
-        if result.returncode != 0:
-            pytest.fail(f"Kunde inte bygga Docker-image: {result.stderr}")
-        print("Docker-image byggdes framgångsrikt")
+        def build():
+            print("Kontrollerar Docker-image...")
+            return ImageBuilder(Path(__file__).parent).ensure_image()
+        
+        result = run_once("docker_image_built", session_shared_dir, build)
+        if not result["success"]:
+            pytest.fail(f"Kunde inte bygga Docker-image (hash {result['hash']})")
+        print(f"Docker-image {'byggdes framgångsrikt' if result['built'] else 'är aktuell'} (hash {result['hash']})")
 
 
 @pytest.fixture(scope="session")
-def port_forward_process(request):
+def port_forward_process(request, port_forward_local_port):
     """Fixture som startar port-forward om det behövs"""
     if request.config.getoption("--run-with-kamailio"):
         print("Startar port-forward till Kamailio...")
@@ -109,34 +191,51 @@ def port_forward_process(request):
         except (subprocess.CalledProcessError, FileNotFoundError):
             pytest.fail("kubectl hittades inte")
         
-        # Starta port-forward
-        process = subprocess.Popen([
-            "kubectl", "port-forward", "svc/kamailio-service", 
-            "5060:5060", "-n", "kamailio"
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        # Vänta lite för att port-forward ska starta
-        time.sleep(3)
-        
-        # Kontrollera att port-forward fungerar
-        try:
-            subprocess.run(["nc", "-z", "localhost", "5060"], 
-                         capture_output=True, check=True, timeout=5)
-            print("Port-forward är aktivt")
-        except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
-            process.terminate()
+        # Hämta delad port-forward (redo när kubectl skriver "Forwarding from")
+        handle = get_port_forward_manager().acquire("kamailio-service", "kamailio", port_forward_local_port, 5060)
+        if handle is None:
             pytest.fail("Port-forward startade inte korrekt")
+        print("Port-forward är aktivt")
         
-        yield process
+        yield handle
         
-        # Stoppa port-forward
-        print("Stoppar port-forward...")
-        process.terminate()
-        process.wait()
+        # Släpp handtaget, port-forward stoppas när sessionen avslutas
+        handle.release()
     else:
         yield None
 
 
+def pytest_sessionfinish(session, exitstatus):
+    """Stoppa alla delade port-forwards och skriv trace när sessionen avslutas"""
+    manager = get_port_forward_manager()
+    if manager.active_sessions():
+        print("Stoppar port-forwards...")
+    manager.stop_all()
+    
+    trace_path = session.config.getoption("--trace-commands")
+    tracer = get_tracer()
+    if trace_path and tracer:
+        # Varje xdist-worker skriver en egen fil; controllern (vars sessionfinish
+        # körs när alla workers är klara) slår ihop dem till trace_path
+        if is_parallel_run():
+            path = Path(trace_path)
+            trace_path = str(path.with_name(f"{path.stem}-{get_worker_id()}{path.suffix}"))
+        elif is_xdist_controller(session.config):
+            for worker_file in worker_trace_files(trace_path):
+                tracer.merge_chrome_trace(json.loads(worker_file.read_text()))
+        tracer.write_chrome_trace(trace_path)
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    """Visa de kommandon som tog mest tid"""
+    tracer = stop_tracing()
+    if tracer and tracer.spans:
+        terminalreporter.section("Externa kommandon (mest tid först)")
+        for line in tracer.format_summary().splitlines():
+            terminalreporter.write_line(line)
+        terminalreporter.write_line(f"Chrome trace: {config.getoption('--trace-commands')}")
+
+
 def pytest_runtest_setup(item):
     """Setup för varje test"""
     # Hoppa över Kamailio-tester om flaggan inte är satt
@@ -126,11 +126,12 @@ def build_docker_image():
     """Bygg Docker-image"""
     print("\n🔨 Bygger Docker-image...")
     
-    cmd = ["docker", "build", "-t", "local/sipp-tester:latest", "."]
+    # Bygger bara om Dockerfile eller test-script ändrats (innehållshash)
+    cmd = [sys.executable, "../app/image_builder.py"]
     
     try:
         subprocess.run(cmd, check=True)
-        print("\n✅ Docker-image byggdes framgångsrikt!")
+        print("\n✅ Docker-image är byggd och aktuell!")
     except subprocess.CalledProcessError as e:
         print(f"\n❌ Kunde inte bygga Docker-image: {e}")
         sys.exit(1)
@@ -145,6 +146,7 @@ def show_help():
     print("  python -m pytest test_sipp_pytest.py   # Kör alla tester")
     print("  python -m pytest --run-with-kamailio   # Kör med Kamailio")
     print("  python -m pytest -k 'health'           # Kör specifikt test")
+    print("  python -m pytest -n auto               # Kör parallellt (pytest-xdist)")
     print("\nExempel:")
     print("  # Kör grundläggande tester")
     print("  python -m pytest test_sipp_pytest.py::TestSippTester")
@@ -19,7 +19,7 @@ eval $(minikube docker-env)
 
 # Bygg containern
 echo "🏗️ Bygger SIPp test-container..."
-docker build -t local/sipp-tester:latest .
+python3 ../app/image_builder.py
 
 echo "✅ SIPp test-container byggd!"
 
@@ -44,8 +44,10 @@ docker run --rm \
 echo ""
 echo "📋 Kör SIPp-scenarios..."
 
-# Kör huvudtester
+# Kör huvudtester (scenarierna monteras så att ändrade XML-filer inte kräver bygge)
+SCENARIO_DIR="$(cd "$(dirname "$0")/.." && pwd)/sipp-scenarios"
 docker run --rm \
+    -v "$SCENARIO_DIR:/app/sipp-scenarios:ro" \
     --network host \
     local/sipp-tester:latest \
     /app/test-scripts/run-tests.sh
@@ -19,11 +19,9 @@ echo "🧪 Kör SIPp-tester mot extern Kamailio-server..."
 echo "📍 Target: $KAMAILIO_HOST:$KAMAILIO_PORT"
 echo ""
 
-# Kontrollera att containern är byggd
-if ! docker images | grep -q "local/sipp-tester"; then
-    echo "🔨 Bygger SIPp test-container..."
-    docker build -t local/sipp-tester:latest .
-fi
+# Bygg containern om Dockerfile eller test-script ändrats (annars hoppas bygget över)
+echo "🔨 Kontrollerar SIPp test-container..."
+python3 ../app/image_builder.py
 
 # Kör health check
 echo "🏥 Kör health check..."
@@ -34,8 +32,10 @@ docker run --rm \
 echo ""
 echo "📋 Kör SIPp-scenarios..."
 
-# Kör huvudtester
+# Kör huvudtester (scenarierna monteras så att ändrade XML-filer inte kräver bygge)
+SCENARIO_DIR="$(cd "$(dirname "$0")/.." && pwd)/sipp-scenarios"
 docker run --rm \
+    -v "$SCENARIO_DIR:/app/sipp-scenarios:ro" \
     local/sipp-tester:latest \
     /app/test-scripts/run-tests.sh
 
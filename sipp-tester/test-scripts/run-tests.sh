@@ -9,6 +9,7 @@ set -e
 KAMAILIO_HOST=${KAMAILIO_HOST:-"localhost"}
 KAMAILIO_PORT=${KAMAILIO_PORT:-"5060"}
 TEST_TIMEOUT=${TEST_TIMEOUT:-"30"}
+SIPP_LOCAL_PORT=${SIPP_LOCAL_PORT:-"5061"}  # Unik per worker vid parallella tester
 
 echo "🚀 Startar SIPp-tester mot Kamailio..."
 echo "📍 Target: $KAMAILIO_HOST:$KAMAILIO_PORT"
@@ -48,7 +49,7 @@ run_test() {
     
     # Kör SIPp-testet
     sipp -sn $scenario_file \
-         -p 5061 \
+         -p $SIPP_LOCAL_PORT \
          -m 1 \
          -timeout $TEST_TIMEOUT \
          -trace_msg \
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för lata imports och kommandoraden python -m app
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+from sipp_support import SippTester
+
+REPO_ROOT = Path(__file__).parent.parent
+
+
+def run_app(*args, env=None):
+    return subprocess.run([sys.executable, "-m", "app", *args], cwd=REPO_ROOT, capture_output=True,
+                          text=True, timeout=30, env={**os.environ, **(env or {})})
+
+
+class TestLazyImports:
+    """Tester för att import och konstruktion är fria från sidoeffekter"""
+
+    def test_import_app_loads_nothing(self):
+        """import app ska inte ladda modulerna, pytest eller konfigurera logging"""
+        code = ("import sys, logging, app\n"
+                "print(sorted(m for m in ('app.sipp_support', 'sipp_support', 'pytest') if m in sys.modules),"
+                " len(logging.getLogger().handlers))")
+        result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True)
+        assert result.stdout.strip() == "[] 0"
+
+    def test_result_from_package(self):
+        """app.TestResult ska gå att skapa utan att app/ ligger på sys.path"""
+        code = ("import sys, app\n"
+                "result = app.TestResult('options', True, 0, 'utdata', '', 0.1, {})\n"
+                "print(result.output, 'result_storage' in sys.modules)")
+        result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True)
+        assert result.stdout.strip() == "utdata False", result.stderr
+
+    def test_library_modules_do_not_configure_logging(self):
+        code = ("import sys, logging; sys.path.insert(0, 'app')\n"
+                "import sipp_support, sip_test_utils, test_support\n"
+                "print(len(logging.getLogger().handlers), 'pytest' in sys.modules)")
+        result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True)
+        assert result.stdout.strip() == "0 False"
+
+    def test_endpoint_is_detected_on_first_use(self, monkeypatch):
+        """SippTester() ska inte proba förrän kamailio_host används"""
+        monkeypatch.delenv("KAMAILIO_HOST", raising=False)
+        calls = []
+        monkeypatch.setattr(SippTester, "_detect_kamailio_host", lambda self: calls.append(1) or "10.1.2.3:30600")
+
+        tester = SippTester(environment="local")
+        assert calls == []
+        assert tester.kamailio_host == "10.1.2.3:30600"
+        assert tester.kamailio_port == 30600
+        assert tester.env_vars["KAMAILIO_PORT"] == "30600"
+        assert len(calls) == 1
+
+    def test_explicit_host_is_not_probed(self, monkeypatch):
+        """Angiven host ska användas utan auto-detektering"""
+        def detect(self):
+            raise AssertionError("endpointen ska inte detekteras")
+
+        monkeypatch.setattr(SippTester, "_detect_kamailio_host", detect)
+        tester = SippTester(kamailio_host="192.168.1.10", kamailio_port=5070)
+        assert (tester.kamailio_host, tester.kamailio_port) == ("192.168.1.10:5070", 5070)
+
+
+class TestCli:
+    """Tester för python -m app"""
+
+    def test_help(self):
+        result = run_app("--help")
+        assert result.returncode == 0
+        for command in ("run", "probe", "status", "bench"):
+            assert command in result.stdout
+
+    def test_status_reads_snapshot_without_probing(self, tmp_path):
+        """status ska visa senaste snapshot och köras utan kubectl i PATH"""
+        snapshot = {"kube_context": "kind-sipp-k8s-lab", "entries": {
+            "endpoint:local": {"created_at": time.time() - 30, "value": "172.18.0.2:30600"},
+            "environment_status": {"created_at": time.time() - 30, "value": {"docker": True, "kubectl": False}},
+        }}
+        (tmp_path / "env-abc.json").write_text(json.dumps(snapshot))
+        result = run_app("status", env={"SIP_LAB_CACHE_DIR": str(tmp_path), "PATH": "/nonexistent",
+                                        "SIP_LAB_RESULTS_DB": str(tmp_path / "none.sqlite")})
+
+        assert result.returncode == 0
+        assert "kind-sipp-k8s-lab" in result.stdout
+        assert "172.18.0.2:30600" in result.stdout
+        assert "✅ docker" in result.stdout and "❌ kubectl" in result.stdout
+        assert not (tmp_path / "none.sqlite").exists()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för kapacitetsplaneringen ur sparade mätningar
+"""
+
+import json
+import sys
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+from capacity_planner import load_measurements, parse_mix, plan_capacity, traffic_demand
+from results_store import ResultsStore
+from sipp_support import TestResult
+
+MiB = 1024 * 1024
+
+OPTIONS_MODEL = {"millicores_per_1k_cps": 500.0, "fixed_millicores": 0.0, "r2": 1.0, "points": 2,
+                 "replicas": 2, "p99_ms": 4.0, "memory_bytes_per_replica": 50e6,
+                 "cps_per_replica": {"250": 500.0, "500": 1000.0}}
+
+
+def capacity_statistics(capacity_cps=400.0):
+    pod = {"cpu_limit_cores": 0.5, "memory_working_set_max": 60e6, "cpu_cores_avg": 0.24}
+    return {
+        "capacity_cps": capacity_cps, "target_rate": capacity_cps, "latency_ms": {"p99": 8.0},
+        "steps": [{"rate": r, "cps": r, "p99_ms": p99, "ok": ok} for r, p99, ok in
+                  ((100.0, 2.0, True), (200.0, 3.0, True), (400.0, 8.0, True), (800.0, 90.0, False))],
+        "resources": {"pods": {"kamailio-a": pod, "kamailio-b": pod}, "millicores_per_1k_rps": 1200.0},
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(tmp_path / "results.sqlite")
+    store.enabled = True
+    store._context = {"git_sha": "abc123", "kube_context": "kind-sipp-k8s-lab", "config_hash": "cfg1"}
+    return store
+
+
+class TestDemand:
+    """Tester för trafikmixen"""
+
+    def test_mix_and_registrations(self):
+        mix = parse_mix(["options=50", "message=10", "register=5"])
+        assert mix == {"options": 50.0, "ping": 10.0, "register": 5.0}
+        assert traffic_demand(mix, registrations=36000)["register"] == 15.0
+        with pytest.raises(ValueError):
+            parse_mix(["bye=3"])
+
+
+class TestPlan:
+    """Tester för planen ur mätunderlaget"""
+
+    def test_plan_from_cost_model(self, store, tmp_path):
+        store.record(TestResult("cost_model", True, 0, "", "", 1.0, statistics={"model": {"options": OPTIONS_MODEL}}))
+        measurements, _ = load_measurements(store, cost_model_path=tmp_path / "saknas.json")
+
+        plan = plan_capacity(measurements, {"options": 1500.0}, headroom_pct=50)
+        # 1500 CPS * 1.5 mot 1000 CPS per replika vid 500m
+        assert plan["replicas"] == 3 and plan["cpu_limit_m"] == 500
+        assert plan["utilization"] == 0.5
+        assert plan["cpu_request_m"] == 380
+        assert plan["memory_request_bytes"] == 72 * MiB
+        assert plan["p99_ms"] == 4.0
+
+    def test_measurements_follow_config_hash(self, store, tmp_path):
+        store.record(TestResult("cost_model", True, 0, "", "", 1.0, statistics={"model": {"options": OPTIONS_MODEL}}))
+        store.record(TestResult("capacity_invite", True, 0, "", "", 1.0, statistics=capacity_statistics()))
+        store._context["config_hash"] = "cfg2"
+        store.record(TestResult("capacity_options", True, 0, "", "", 1.0, statistics=capacity_statistics(50.0)))
+        (tmp_path / "model.json").write_text(json.dumps({"config_hash": "cfg0", "scenarios": {}}))
+
+        measurements, notes = load_measurements(store, "cfg1", tmp_path / "model.json")
+        assert measurements["options"]["source"].startswith("cost_model #")
+        invite = measurements["invite"]
+        assert invite["cps_per_replica"] == 200.0 and invite["cpu_limit_m"] == 500
+        assert invite["curve"] == [[0.25, 2.0], [0.5, 3.0], [1.0, 8.0]]
+        assert any("cfg0" in note for note in notes)
+
+        # Halv belastning per replika ger p99 från steget vid 50% av kapaciteten
+        plan = plan_capacity(measurements, {"options": 500.0, "invite": 100.0}, headroom_pct=0, min_replicas=2)
+        assert plan["replicas"] == 2 and plan["utilization"] == 0.5
+        assert plan["scenarios"]["invite"]["p99_ms"] == 3.0
+        assert plan["p99_ms"] == 4.0
+
+    def test_missing_scenario(self, store, tmp_path):
+        measurements, _ = load_measurements(store, cost_model_path=tmp_path / "saknas.json")
+        plan = plan_capacity(measurements, {"register": 10.0})
+        assert plan["replicas"] is None and plan["missing"] == ["register"]
+        assert "python -m app cost --scenarios register" in plan["hints"][0]
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för spårning av externa kommandon
+"""
+
+import sys
+import json
+import subprocess
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+from command_tracing import CommandTracer, command_key
+
+
+class TestCommandTracer:
+    """Tester för CommandTracer"""
+
+    @pytest.fixture
+    def tracer(self):
+        tracer = CommandTracer().install()
+        yield tracer
+        tracer.uninstall()
+
+    def test_run_and_popen_are_traced(self, tracer):
+        """subprocess.run och Popen ska ge en span var med exit code och test"""
+        subprocess.run([sys.executable, "-c", "pass"], capture_output=True)
+        process = subprocess.Popen([sys.executable, "-c", "import sys; sys.exit(3)"])
+        process.wait()
+
+        commands = [s for s in tracer.spans if s.kind == "command"]
+        assert len(commands) == 2
+        assert commands[0].exit_code == 0
+        assert commands[1].exit_code == 3
+        assert commands[0].duration > 0
+        assert "test_run_and_popen_are_traced" in commands[0].test
+
+    def test_missing_command_is_traced(self, tracer):
+        """Kommandon som inte finns ska ge en span med fel"""
+        with pytest.raises(FileNotFoundError):
+            subprocess.run(["sip-lab-command-that-does-not-exist"], capture_output=True)
+        assert tracer.spans[-1].error
+        assert tracer.summary()[0]["failures"] == 1
+
+    def test_uninstall_restores_popen(self):
+        """uninstall() ska återställa subprocess.Popen"""
+        original = subprocess.Popen
+        tracer = CommandTracer().install()
+        assert subprocess.Popen is not original
+        tracer.uninstall()
+        assert subprocess.Popen is original
+
+    def test_chrome_trace_and_summary(self, tracer, tmp_path):
+        """Export till Chrome trace-JSON och sammanställning per kommando"""
+        with tracer.span("detect endpoint"):
+            for _ in range(3):
+                subprocess.run([sys.executable, "-c", "pass"])
+
+        path = tmp_path / "trace.json"
+        tracer.write_chrome_trace(str(path))
+        trace = json.loads(path.read_text())
+        events = trace["traceEvents"]
+        assert len(events) == 4
+        assert all(e["ph"] == "X" for e in events)
+        assert {e["cat"] for e in events} == {"command", "probe"}
+
+        rows = tracer.summary()
+        assert rows[0]["count"] == 3
+        assert 0 < rows[0]["share"] <= 1
+        assert "antal" in tracer.format_summary()
+
+    def test_worker_traces_are_merged_on_controller(self, tmp_path, monkeypatch):
+        """Controllern ska slå ihop workernas trace-filer till den angivna filen och tabellen"""
+        import conftest
+
+        monkeypatch.delenv("PYTEST_XDIST_WORKER", raising=False)
+        controller = CommandTracer()
+        for worker in ("gw0", "gw1"):
+            worker_tracer = CommandTracer().install()
+            subprocess.run([sys.executable, "-c", "pass"])
+            worker_tracer.uninstall()
+            worker_tracer.write_chrome_trace(str(tmp_path / f"trace-{worker}.json"))
+
+        monkeypatch.setattr(conftest, "get_tracer", lambda: controller)
+        trace_path = tmp_path / "trace.json"
+        options = {"--trace-commands": str(trace_path)}
+        config = SimpleNamespace(option=SimpleNamespace(numprocesses=2), getoption=options.get)
+        conftest.pytest_sessionfinish(SimpleNamespace(config=config), 0)
+
+        events = json.loads(trace_path.read_text())["traceEvents"]
+        assert len(events) == 2 and all(e["args"]["argv"] for e in events)
+        assert controller.summary()[0]["count"] == 2
+        assert all(0 <= span.start < 60 for span in controller.spans)
+
+    def test_command_key_groups_similar_calls(self):
+        """Adresser, portar och sökvägar ska inte ge egna grupper"""
+        assert command_key(["kubectl", "get", "nodes", "sipp-k8s-lab-worker", "-o", "jsonpath={}"]) == \
+            "kubectl get nodes"
+        assert command_key(["nc", "-zu", "172.18.0.2", "30600"]) == "nc"
+        assert command_key(["/usr/bin/docker", "images", "-q", "local/sipp-tester:latest"]) == "docker images"
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för parametersvepet över kamailio.cfg
+Lasten körs mot den lokala SIP-respondern och kubectl fejkas
+"""
+
+import json
+import os
+import stat
+import sys
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+import results_store
+from config_sweep import expand_grid, rank_variants, read_repo_config, render_config, variant_name
+from local_responder import LocalSipResponder
+from results_store import ResultsStore
+from sipp_support import SippTester
+
+
+FAKE_KUBECTL = """#!{python}
+import json, os, sys
+state = os.environ["FAKE_STATE_DIR"]
+configmap = os.path.join(state, "configmap.json")
+args = sys.argv[1:]
+open(os.path.join(state, "calls"), "a").write(" ".join(args) + "\\n")
+if args[:3] == ["apply", "-f", "-"]:
+    data = sys.stdin.read()
+    open(configmap, "w").write(data)
+    open(os.path.join(state, "applied"), "a").write(json.dumps(json.loads(data)["data"]["kamailio.cfg"]) + "\\n")
+elif args[:2] == ["get", "configmap"] and "json" in args:
+    print(open(configmap).read())
+elif args[:2] == ["get", "configmap"] and "jsonpath={{.data}}" in args:
+    print(json.dumps(json.load(open(configmap))["data"]))
+elif args[0] == "rollout":
+    pass
+else:
+    sys.exit(1)
+"""
+
+
+class TestRender:
+    """Tester för rendering av konfigurationsvarianter"""
+
+    def test_repo_config_is_read(self):
+        config = read_repo_config()
+        assert config.startswith("#!KAMAILIO\n")
+        assert "children=4" in config and 'sl_send_reply("200", "OK");' in config
+
+    def test_parameters_are_rendered(self):
+        config = render_config(read_repo_config(), children=8, debug=0, xlog=False, reply="tm", tcp_workers=2)
+
+        assert "\nchildren=8\ntcp_children=2\n" in config
+        assert "\ndebug=0\n" in config
+        assert "    # xlog(" in config
+        assert "    t_reply(\"200\", \"OK\");" in config and "t_newtran()" in config
+        assert "sl_send_reply(\"200\"" not in config
+
+    def test_unchanged_without_parameters(self):
+        base = read_repo_config()
+        assert render_config(base, xlog=True, reply="sl") == base
+
+    def test_missing_anchor_is_an_error(self):
+        with pytest.raises(ValueError):
+            render_config("#!KAMAILIO\n", children=2)
+
+    def test_grid_and_names(self):
+        variants = expand_grid({"reply": ["sl", "tm"], "children": [4, 8], "xlog": [False]})
+        assert len(variants) == 4
+        assert variant_name(variants[-1]) == "children=8 xlog=off reply=tm"
+        with pytest.raises(ValueError):
+            expand_grid({"workers": [1]})
+
+    def test_ranking(self):
+        ranked = rank_variants([
+            {"name": "a", "ok": True, "p99_ms": 9.0, "millicores_per_1k_rps": 100.0},
+            {"name": "b", "ok": False, "p99_ms": 1.0},
+            {"name": "c", "ok": True, "p99_ms": 9.0, "millicores_per_1k_rps": 50.0},
+            {"name": "d", "ok": True, "p99_ms": 2.0},
+        ])
+        assert [entry["name"] for entry in ranked] == ["d", "c", "a", "b"]
+        assert ranked[0]["rank"] == 1
+
+
+class TestSweepRun:
+    """Hela svepet via SippTester med fejkad kubectl"""
+
+    @pytest.fixture
+    def fake_cluster(self, tmp_path, monkeypatch):
+        script = tmp_path / "kubectl"
+        script.write_text(FAKE_KUBECTL.format(python=sys.executable))
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        (tmp_path / "configmap.json").write_text(json.dumps({"data": {"kamailio.cfg": read_repo_config()}}))
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        monkeypatch.setenv("FAKE_STATE_DIR", str(tmp_path))
+        store = ResultsStore(tmp_path / "results.sqlite")
+        store.enabled = True
+        monkeypatch.setattr(results_store, "_store", store)
+        return tmp_path
+
+    def test_variants_are_applied_ranked_and_restored(self, fake_cluster):
+        with LocalSipResponder() as responder:
+            tester = SippTester(kamailio_host=f"127.0.0.1:{responder.port}", local_port=0)
+            result = tester.run_config_sweep({"children": [4, 8]}, rate=100, duration=0.2)
+
+        assert result.success, result.error
+        variants = result.statistics["variants"]
+        assert sorted(entry["name"] for entry in variants) == ["children=4", "children=8"]
+        assert [entry["rank"] for entry in variants] == [1, 2]
+
+        applied = [json.loads(line) for line in (fake_cluster / "applied").read_text().splitlines()]
+        assert "children=8" in applied[1]
+        assert applied[-1] == read_repo_config()
+        calls = (fake_cluster / "calls").read_text()
+        assert calls.count("rollout restart deployment/kamailio") == 3
+
+        # Varje variant sparas med sin egen config-hash
+        hashes = {run["config_hash"] for run in results_store._store.query(scenario="load_options")}
+        assert len(hashes) == 2
+        assert "Konfigurationssvep" in str(result.output)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för CPU-gränssvepet och kostnadsmodellen
+Lasten körs mot den lokala SIP-respondern och kubectl fejkas
+"""
+
+import json
+import os
+import stat
+import sys
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+import results_store
+from cpu_limit_sweep import CpuLimitSweep, export_cost_model, fit_cost_model, load_cost_model
+from local_responder import LocalSipResponder
+from results_store import ResultsStore
+from sipp_support import SippTester
+
+
+FAKE_KUBECTL = """#!{python}
+import json, os, sys
+state = os.path.join(os.environ["FAKE_STATE_DIR"], "deployment.json")
+args = sys.argv[1:]
+deployment = json.load(open(state))
+containers = deployment["spec"]["template"]["spec"]["containers"]
+if args[:2] == ["get", "deployment"] and "json" in args:
+    print(json.dumps(deployment))
+elif args[:2] == ["get", "deployment"]:
+    print(deployment["spec"]["replicas"])
+elif args[:2] == ["patch", "deployment"]:
+    for op in json.loads(args[args.index("-p") + 1]):
+        index = int(op["path"].split("/")[5])
+        containers[index]["resources"] = op["value"]
+    json.dump(deployment, open(state, "w"))
+    open(state + ".log", "a").write(json.dumps(containers[1]["resources"]) + "\\n")
+elif args[0] == "rollout":
+    pass
+else:
+    sys.exit(1)
+"""
+
+ORIGINAL = {"requests": {"memory": "256Mi", "cpu": "250m"}, "limits": {"memory": "512Mi", "cpu": "500m"}}
+
+
+def point(limit_m, cps, replicas=2, cpu_bound=True):
+    return {"cpu_limit_m": limit_m, "replicas": replicas, "allotted_m": limit_m * replicas, "capacity_cps": cps,
+            "p99_ms": 4.0, "memory_bytes": 50e6, "cpu_bound": cpu_bound, "limit": "p99 120ms"}
+
+
+class TestCostModel:
+    """Tester för anpassningen av millicores per 1k CPS"""
+
+    def test_linear_fit(self):
+        # 2 CPS per millicore efter 100m fast kostnad
+        fit = fit_cost_model([point(250, 800.0), point(500, 1800.0), point(1000, 3800.0)])
+        assert fit["millicores_per_1k_cps"] == 500.0
+        assert fit["fixed_millicores"] == 100.0
+        assert fit["r2"] == 1.0 and fit["points"] == 3
+
+    def test_points_not_cpu_bound_are_excluded(self):
+        fit = fit_cost_model([point(250, 1000.0), point(2000, 1100.0, cpu_bound=False)])
+        assert fit == {"millicores_per_1k_cps": 500.0, "fixed_millicores": 0.0, "r2": 1.0, "points": 1}
+        assert fit_cost_model([point(250, 1000.0, cpu_bound=False)]) is None
+
+    def test_export_roundtrip(self, tmp_path):
+        sweep = CpuLimitSweep(None, [250, 500], scenarios=["options", "invite"])
+        sweep.points = {"options": [point(250, 1000.0), point(500, 2000.0)],
+                        "invite": [point(250, 250.0), point(500, 500.0)]}
+        summary = sweep.summarize()
+
+        path = export_cost_model(summary, tmp_path / "model.json", config_hash="abc123")
+        model = load_cost_model(path)
+        assert model["config_hash"] == "abc123"
+        assert model["scenarios"]["options"]["millicores_per_1k_cps"] == 500.0
+        assert model["scenarios"]["invite"]["millicores_per_1k_cps"] == 2000.0
+        assert model["scenarios"]["invite"]["cps_per_replica"] == {"250": 125.0, "500": 250.0}
+        assert load_cost_model(tmp_path / "saknas.json") is None
+
+
+class TestSweepRun:
+    """Hela svepet via SippTester med fejkad kubectl"""
+
+    @pytest.fixture
+    def fake_cluster(self, tmp_path, monkeypatch):
+        script = tmp_path / "kubectl"
+        script.write_text(FAKE_KUBECTL.format(python=sys.executable))
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        deployment = {"spec": {"replicas": 2, "template": {"spec": {"containers": [
+            {"name": "sidecar", "resources": {}}, {"name": "kamailio", "resources": ORIGINAL}]}}}}
+        (tmp_path / "deployment.json").write_text(json.dumps(deployment))
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        monkeypatch.setenv("FAKE_STATE_DIR", str(tmp_path))
+        store = ResultsStore(tmp_path / "results.sqlite")
+        store.enabled = True
+        monkeypatch.setattr(results_store, "_store", store)
+        return tmp_path
+
+    def test_limits_are_patched_and_restored(self, fake_cluster):
+        """Den lokala respondern har ingen CPU-gräns, så ingen modell kan anpassas"""
+        with LocalSipResponder() as responder:
+            tester = SippTester(kamailio_host=f"127.0.0.1:{responder.port}", local_port=0)
+            result = tester.run_cpu_limit_sweep([500, 250], export_path=str(fake_cluster / "model.json"),
+                                                start_rate=50, max_rate=100, step_duration=0.2)
+
+        patched = [json.loads(line) for line in (fake_cluster / "deployment.json.log").read_text().splitlines()]
+        assert [p["limits"]["cpu"] for p in patched] == ["250m", "500m", "500m"]
+        assert patched[0]["requests"] == {"memory": "256Mi", "cpu": "250m"}
+        assert patched[0]["limits"]["memory"] == "512Mi"
+        assert patched[-1] == ORIGINAL
+
+        points = result.statistics["points"]["options"]
+        assert [(p["cpu_limit_m"], p["allotted_m"]) for p in points] == [(250, 500), (500, 1000)]
+        assert all(p["capacity_cps"] for p in points)
+        assert not result.success and not (fake_cluster / "model.json").exists()
+        assert results_store._store.query(scenario="cost_model")
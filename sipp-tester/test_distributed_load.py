@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för distribuerad lastgenerering via Kubernetes Job
+Workers körs som lokala processer mot den lokala SIP-respondern, och
+kubectl fejkas så att hela flödet kan testas utan kluster
+"""
+
+import os
+import stat
+import subprocess
+import sys
+import time
+import pytest
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent.parent / "app"
+sys.path.append(str(APP_DIR))
+import results_store
+from distributed_load import (RUN_LABEL, WORKER_MODULES, DistributedLoadTest, build_manifests,
+                              merge_shard_results, shard_requests)
+from local_responder import LocalSipResponder
+from results_store import ResultsStore
+from sipp_support import SippTester
+
+
+FAKE_KUBECTL = """#!{python}
+import json, os, sys
+state = os.environ["FAKE_STATE_DIR"]
+applied = os.path.join(state, "applied.json")
+args = sys.argv[1:]
+if args[:3] == ["apply", "-f", "-"]:
+    with open(applied, "w") as f:
+        f.write(sys.stdin.read())
+    sys.exit(0)
+job = [item for item in json.load(open(applied))["items"] if item["kind"] == "Job"][0]
+name = job["metadata"]["name"]
+if args[:2] == ["get", "pods"]:
+    pods = [{{"metadata": {{"name": f"{{name}}-{{i}}"}}, "status": {{"phase": "Running"}}}}
+            for i in range(job["spec"]["completions"])]
+    print(json.dumps({{"items": pods}}))
+elif args[:2] == ["logs", "-f"]:
+    # Kör workern lokalt med koden från app/ i stället för ConfigMap-volymen
+    index = args[2].rsplit("-", 1)[1]
+    command = job["spec"]["template"]["spec"]["containers"][0]["command"]
+    command = [sys.executable] + [arg.replace("/opt/sip-load", os.environ["FAKE_APP_DIR"]) for arg in command[1:]]
+    env = dict(os.environ, JOB_COMPLETION_INDEX=index, NODE_NAME=f"node-{{int(index) % 2}}")
+    os.execve(sys.executable, command, env)
+elif args[0] == "delete":
+    open(os.path.join(state, "deleted"), "w").write(" ".join(args))
+"""
+
+
+def run_workers(port, workers, rate=200, duration=0.5):
+    """Starta workers som lokala processer och returnera deras stdout"""
+    start_at = time.time() + 0.3
+    processes = [subprocess.Popen(
+        [sys.executable, str(APP_DIR / "distributed_load.py"), "worker", "--host", "127.0.0.1",
+         "--port", str(port), "--rate", str(rate), "--workers", str(workers), "--shard", str(index),
+         "--duration", str(duration), "--start-at", str(start_at), "--interval", "0.2"],
+        stdout=subprocess.PIPE, text=True) for index in range(workers)]
+    return [process.communicate(timeout=30)[0] for process in processes]
+
+
+class TestManifests:
+    """Tester för Job- och ConfigMap-manifesten"""
+
+    def test_indexed_job_with_code_configmap(self):
+        """Job:et ska vara Indexed med en pod per worker och koden i en ConfigMap"""
+        manifests = build_manifests("sip-load-test", "kamailio", 3, "options", "kamailio-loadbalancer", 5060,
+                                    900, 30, 1700000000.0, cpu="500m", worker_options={"t1": 0.2})
+        configmap, job = manifests
+        assert sorted(configmap["data"]) == sorted(WORKER_MODULES)
+        assert job["spec"]["completionMode"] == "Indexed"
+        assert job["spec"]["completions"] == job["spec"]["parallelism"] == 3
+        container = job["spec"]["template"]["spec"]["containers"][0]
+        command = container["command"]
+        assert command[command.index("--rate") + 1] == "900.0"
+        assert command[command.index("--workers") + 1] == "3"
+        assert command[command.index("--t1") + 1] == "0.2"
+        assert container["resources"]["requests"]["cpu"] == "500m"
+        assert job["spec"]["template"]["metadata"]["labels"][RUN_LABEL] == "sip-load-test"
+
+    def test_dedicated_namespace_is_created(self):
+        manifests = build_manifests("x", "sip-load", 1, "ping", "h", 5060, 10, 1, 0.0, create_namespace=True)
+        assert [m["kind"] for m in manifests] == ["Namespace", "ConfigMap", "Job"]
+        assert all(m["metadata"].get("namespace", "sip-load") == "sip-load" for m in manifests)
+
+    def test_shard_requests_sum(self):
+        assert [shard_requests(10, 3, i) for i in range(3)] == [4, 3, 3]
+        assert shard_requests(None, 3, 0) is None
+
+
+class TestWorkers:
+    """Tester för workernas strömmade statistik"""
+
+    def test_worker_streams_are_merged(self):
+        """Två workers ska ge ett sammanslaget resultat som motsvarar serverns räkning"""
+        with LocalSipResponder() as responder:
+            outputs = run_workers(responder.port, 2)
+            received = responder.requests_received
+
+        load = DistributedLoadTest("options", rate=200, duration=0.5, workers=2)
+        for index, output in enumerate(outputs):
+            load.feed(f"pod-{index}", output.splitlines())
+        merged = merge_shard_results(load.results)
+
+        assert sorted(load.results) == [0, 1]
+        assert merged["requests_sent"] == received
+        assert merged["responses"] == {"200": received}
+        assert 80 <= received <= 102
+        assert merged["latency_ms"]["p50"] > 0
+        assert 0.4 <= merged["send_window"]["end"] - merged["send_window"]["start"] < 1.0
+        assert load.metrics.requests_sent == received
+        assert load.samples and {sample.pod for sample in load.samples} == {"shard-0", "shard-1"}
+
+    def test_missing_shard_is_reported(self):
+        load = DistributedLoadTest("options", rate=100, workers=2)
+        load.feed("pod-0", ['@sip-load {"type":"result","shard":0,"stats":{"requests_sent":5,'
+                            '"achieved_rate":50.0},"latency":null}', "annan loggrad"])
+        hints = load.summarize()["hints"]
+        assert any("shard 1 rapporterade inget resultat" in hint for hint in hints)
+
+
+class TestDistributedRun:
+    """Hela flödet via SippTester med fejkad kubectl"""
+
+    @pytest.fixture
+    def fake_kubectl(self, tmp_path, monkeypatch):
+        script = tmp_path / "kubectl"
+        script.write_text(FAKE_KUBECTL.format(python=sys.executable))
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        monkeypatch.setenv("FAKE_STATE_DIR", str(tmp_path))
+        monkeypatch.setenv("FAKE_APP_DIR", str(APP_DIR))
+        store = ResultsStore(tmp_path / "results.sqlite")
+        store.enabled = True
+        monkeypatch.setattr(results_store, "_store", store)
+        return tmp_path
+
+    def test_run_distributed_load_test(self, fake_kubectl):
+        """Job:et ska skapas, workers följas, resultatet slås ihop och Job:et tas bort"""
+        with LocalSipResponder() as responder:
+            tester = SippTester(kamailio_host="127.0.0.1:5060")
+            result = tester.run_distributed_load_test("options", rate=300, duration=0.5, workers=3,
+                                                      target=f"127.0.0.1:{responder.port}", start_delay=0.5)
+            received = responder.requests_received
+
+        statistics = result.statistics
+        assert result.success, result.error
+        assert statistics["requests_sent"] == received
+        assert statistics["target_rate"] == 300
+        distributed = statistics["distributed"]
+        assert distributed["nodes"] == ["node-0", "node-1"]
+        assert [shard["shard"] for shard in distributed["shards"]] == [0, 1, 2]
+        assert "Distribuerad: 3 workers" in str(result.output)
+        assert f"{RUN_LABEL}=" in (fake_kubectl / "deleted").read_text()
+
+        run = results_store._store.query(limit=1)[0]
+        assert results_store._store.query_samples(run["id"], source="distributed")
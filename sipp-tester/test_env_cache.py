@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för miljö-cachen
+"""
+
+import sys
+import time
+import multiprocessing
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+from env_cache import EnvironmentCache
+
+
+def _compute_in_worker(cache_dir, counter_file):
+    """Hjälpfunktion som körs i separata processer"""
+    cache = EnvironmentCache(cache_dir=cache_dir, ttl=60)
+    cache._key = "testkey"
+
+    def probe():
+        with open(counter_file, "a") as f:
+            f.write("probe\n")
+        time.sleep(0.3)
+        return {"docker": True}
+
+    assert cache.get_or_compute("environment_status", probe) == {"docker": True}
+
+
+class TestEnvironmentCache:
+    """Tester för snapshot-cachen"""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        cache = EnvironmentCache(cache_dir=tmp_path, ttl=60)
+        cache._key = "testkey"
+        return cache
+
+    def test_value_is_computed_once(self, cache):
+        """Andra anropet ska läsas från disk utan att proba"""
+        calls = []
+
+        def probe():
+            calls.append(1)
+            return "172.18.0.2:30600"
+
+        assert cache.get_or_compute("endpoint:auto", probe) == "172.18.0.2:30600"
+        assert cache.get_or_compute("endpoint:auto", probe) == "172.18.0.2:30600"
+        assert len(calls) == 1
+        assert cache.path.exists()
+
+    def test_snapshot_is_shared_between_instances(self, cache, tmp_path):
+        """En ny process (instans) med samma nyckel ska se snapshoten"""
+        cache.put("environment_status", {"docker": True, "kubectl": False})
+
+        other = EnvironmentCache(cache_dir=tmp_path, ttl=60)
+        other._key = "testkey"
+        assert other.get("environment_status") == {"docker": True, "kubectl": False}
+
+        changed = EnvironmentCache(cache_dir=tmp_path, ttl=60)
+        changed._key = "otherkey"
+        assert changed.get("environment_status") is None
+
+    def test_expired_entries_are_recomputed(self, cache):
+        """Poster äldre än TTL ska probas om"""
+        cache.ttl = 0.1
+        cache.put("environment_status", {"docker": True})
+        time.sleep(0.2)
+        assert cache.get("environment_status") is None
+        assert cache.get_or_compute("environment_status", lambda: {"docker": False}) == {"docker": False}
+
+    def test_none_is_not_cached(self, cache):
+        """Misslyckad detektering ska inte cachas"""
+        assert cache.get_or_compute("endpoint:local", lambda: None) is None
+        assert cache.get_or_compute("endpoint:local", lambda: "10.0.0.1") == "10.0.0.1"
+
+    def test_unhealthy_status_expires_quickly(self, cache):
+        """En misslyckad miljökontroll ska bara cachas negative_ttl, en lyckad hela TTL"""
+        cache.negative_ttl = 0.1
+        healthy = lambda status: all(status.values())
+        assert cache.get_or_compute("environment_status", lambda: {"kubectl": False}, healthy) == {"kubectl": False}
+        assert cache.get("environment_status") == {"kubectl": False}
+        time.sleep(0.2)
+
+        assert cache.get_or_compute("environment_status", lambda: {"kubectl": True}, healthy) == {"kubectl": True}
+        time.sleep(0.2)
+        assert cache.get("environment_status") == {"kubectl": True}
+
+    def test_concurrent_workers_probe_once(self, tmp_path):
+        """Parallella processer ska dela en probe"""
+        counter_file = tmp_path / "probes.txt"
+        workers = [
+            multiprocessing.Process(target=_compute_in_worker, args=(str(tmp_path), str(counter_file)))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=10)
+            assert worker.exitcode == 0
+
+        assert counter_file.read_text().count("probe") == 1
+
+    def test_invalidate_removes_snapshot(self, cache):
+        """invalidate() ska ta bort snapshoten"""
+        cache.put("environment_status", {"docker": True})
+        path = cache.path
+        cache.invalidate()
+        assert not path.exists()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för harness-benchmarken och den lokala SIP-respondern
+Körs offline mot fejkade kubectl/docker/nc/sipp
+"""
+
+import sys
+import socket
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+from harness_bench import run_benchmarks, compare_results
+from local_responder import LocalSipResponder, build_response
+
+
+OPTIONS_REQUEST = (
+    "OPTIONS sip:kamailio.local SIP/2.0\r\n"
+    "Via: SIP/2.0/UDP 127.0.0.1:5065;branch=z9hG4bK-1\r\n"
+    "From: <sip:test@kamailio.local>;tag=1\r\n"
+    "To: <sip:kamailio.local>\r\n"
+    "Call-ID: test-1\r\n"
+    "CSeq: 1 OPTIONS\r\n"
+    "Content-Length: 0\r\n\r\n"
+).encode()
+
+
+class TestLocalResponder:
+    """Tester för den lokala SIP-respondern"""
+
+    def test_response_copies_transaction_headers(self):
+        """Svaret ska ha samma Via/Call-ID/CSeq och en To-tag"""
+        response = build_response(OPTIONS_REQUEST).decode()
+        assert response.startswith("SIP/2.0 200 OK\r\n")
+        assert "Via: SIP/2.0/UDP 127.0.0.1:5065;branch=z9hG4bK-1" in response
+        assert "Call-ID: test-1" in response
+        assert "CSeq: 1 OPTIONS" in response
+        assert "To: <sip:kamailio.local>;tag=" in response
+        assert build_response(response.encode()) is None
+
+    def test_responder_answers_over_udp(self):
+        """Respondern ska svara på UDP"""
+        with LocalSipResponder() as responder:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.settimeout(2)
+            sock.sendto(OPTIONS_REQUEST, responder.address)
+            data, _ = sock.recvfrom(65535)
+            sock.close()
+        assert data.startswith(b"SIP/2.0 200 OK")
+        assert responder.requests_received == 1
+
+
+class TestHarnessBenchmark:
+    """Tester för benchmark-sviten"""
+
+    def test_benchmarks_run_offline(self):
+        """Sviten ska gå att köra utan kluster och ge statistik per fall"""
+        report = run_benchmarks(iterations=2, warmup=0,
+                                only=["sipp_tester_init", "sipp_tester_init_cached", "run_sipp_test_host"])
+
+        assert set(report["results"]) == {"sipp_tester_init", "sipp_tester_init_cached", "run_sipp_test_host"}
+        for stats in report["results"].values():
+            assert stats["iterations"] == 2
+            assert 0 < stats["min_ms"] <= stats["median_ms"] <= stats["max_ms"]
+        assert report["meta"]["iterations"] == 2
+        # Init-fallet ska mäta endpoint-detekteringen (fejkad kubectl/nc), inte en tom konstruktor
+        assert report["results"]["sipp_tester_init"]["median_ms"] > 1.0
+
+    def test_compare_flags_slowdowns(self):
+        """compare_results ska flagga fall som blivit långsammare"""
+        baseline = {"results": {"health_check": {"median_ms": 100.0}, "sipp_tester_init": {"median_ms": 50.0}}}
+        current = {"results": {"health_check": {"median_ms": 150.0}, "sipp_tester_init": {"median_ms": 52.0}}}
+
+        regressions = compare_results(baseline, current, threshold=0.2)
+        assert len(regressions) == 1
+        assert regressions[0].startswith("health_check")
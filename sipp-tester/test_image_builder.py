@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för det innehållsadresserade image-bygget
+Använder en fejkad docker så att testerna kan köras utan Docker
+"""
+
+import json
+import os
+import shutil
+import stat
+import sys
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+from image_builder import HASH_LABEL, ImageBuilder, scenario_volume_args
+
+
+FAKE_DOCKER = """#!{python}
+import json, os, sys
+state = os.environ["FAKE_STATE_DIR"]
+args = sys.argv[1:]
+with open(os.path.join(state, "calls.log"), "a") as f:
+    f.write(json.dumps(args) + "\\n")
+labels_file = os.path.join(state, "labels.json")
+labels = json.load(open(labels_file)) if os.path.exists(labels_file) else {{}}
+if args[0] == "images":
+    wanted = args[args.index("--filter") + 1].split("=", 2)[2]
+    if wanted in labels:
+        print(labels[wanted])
+elif args[0] == "build":
+    label = args[args.index("--label") + 1].split("=", 1)[1]
+    labels[label] = f"sha256-{{len(labels)}}"
+    json.dump(labels, open(labels_file, "w"))
+"""
+
+
+@pytest.fixture
+def context(tmp_path):
+    """Kopia av sipp-tester/:s bygg-kontext"""
+    source = Path(__file__).parent
+    target = tmp_path / "context"
+    target.mkdir()
+    for name in ("Dockerfile", "Dockerfile.base"):
+        shutil.copy(source / name, target / name)
+    for name in ("test-scripts", "sipp-scenarios"):
+        shutil.copytree(source / name, target / name)
+    return target
+
+
+@pytest.fixture
+def fake_docker(tmp_path, monkeypatch):
+    """Lägg en fejkad docker först i PATH och returnera loggade anrop"""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "docker"
+    script.write_text(FAKE_DOCKER.format(python=sys.executable))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_STATE_DIR", str(tmp_path))
+    monkeypatch.setenv("SIP_LAB_NO_ENV_CACHE", "1")
+
+    def calls(command):
+        log = tmp_path / "calls.log"
+        lines = log.read_text().splitlines() if log.exists() else []
+        return [json.loads(line) for line in lines if json.loads(line)[0] == command]
+    return calls
+
+
+class TestContentHash:
+    """Tester för vilka filer som ingår i hashen"""
+
+    def test_scenarios_do_not_change_hash(self, context):
+        """Ändrade scenarier ska inte ge ny hash, ändrade script ska det"""
+        builder = ImageBuilder(context)
+        before = builder.image_hash()
+        (context / "sipp-scenarios" / "options.xml").write_text("<scenario/>")
+        assert builder.image_hash() == before
+
+        (context / "test-scripts" / "run-tests.sh").write_text("#!/bin/bash\necho ny\n")
+        assert builder.image_hash() != before
+
+    def test_base_change_changes_both_hashes(self, context):
+        builder = ImageBuilder(context)
+        base, image = builder.base_hash(), builder.image_hash()
+        with open(context / "Dockerfile.base", "a") as f:
+            f.write("\n# ny SIPp-version\n")
+        assert builder.base_hash() != base
+        assert builder.image_hash() != image
+
+
+class TestImageBuilder:
+    """Tester för att bygget bara körs när hashen saknas"""
+
+    def test_builds_base_then_image_once(self, context, fake_docker):
+        """Första gången byggs bas och test-lager, andra gången ingenting"""
+        builder = ImageBuilder(context)
+        first = builder.ensure_image()
+        builds = fake_docker("build")
+
+        assert first["success"] and first["built"]
+        assert len(builds) == 2
+        assert f"{HASH_LABEL}={builder.base_hash()}" in builds[0]
+        assert builds[0][builds[0].index("-f") + 1].endswith("Dockerfile.base")
+        assert f"BASE_IMAGE={builder.base_tag}" in builds[1]
+        assert f"{HASH_LABEL}={first['hash']}" in builds[1]
+
+        second = builder.ensure_image()
+        assert second == {**first, "built": False}
+        assert len(fake_docker("build")) == 2
+        assert ["tag", "sha256-1", "local/sipp-tester:latest"] in fake_docker("tag")
+
+    def test_script_change_reuses_base(self, context, fake_docker):
+        """Ändrat test-script ska bygga om test-lagret men inte SIPp-basen"""
+        builder = ImageBuilder(context)
+        builder.ensure_image()
+        (context / "test-scripts" / "health-check.sh").write_text("#!/bin/bash\nexit 0\n")
+        result = builder.ensure_image()
+
+        builds = fake_docker("build")
+        assert result["built"]
+        assert len(builds) == 3
+        assert not builds[2][builds[2].index("-f") + 1].endswith("Dockerfile.base")
+
+    def test_failed_build_is_reported(self, context, fake_docker, tmp_path):
+        (tmp_path / "bin" / "docker").write_text("#!/bin/sh\necho trasig >&2\nexit 1\n")
+        result = ImageBuilder(context).ensure_image()
+        assert not result["success"] and not result["built"]
+
+
+class TestScenarioVolume:
+    """Tester för montering av scenarier"""
+
+    def test_default_mounts_repo_scenarios(self, monkeypatch):
+        monkeypatch.delenv("SIP_LAB_SCENARIO_DIR", raising=False)
+        args = scenario_volume_args()
+        assert args[0] == "-v"
+        assert args[1] == f"{(Path(__file__).parent / 'sipp-scenarios').resolve()}:/app/sipp-scenarios:ro"
+
+    def test_env_override_and_image(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("SIP_LAB_SCENARIO_DIR", str(tmp_path))
+        assert scenario_volume_args() == ["-v", f"{tmp_path.resolve()}:/app/sipp-scenarios:ro"]
+        monkeypatch.setenv("SIP_LAB_SCENARIO_DIR", "image")
+        assert scenario_volume_args() == []
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för uppföljning av Kamailios loggar
+Använder en fejkad kubectl så att testerna kan köras utan kluster
+"""
+
+import os
+import sys
+import stat
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+from kamailio_logs import KamailioLogStreamer, parse_kubectl_timestamp, parse_log_line
+
+
+FAKE_KUBECTL = """#!{python}
+import sys, time
+args = sys.argv[1:]
+if args[0] != "logs":
+    sys.exit(1)
+pod = args[4]
+now = time.time()
+counts = {{"kamailio-a": 30, "kamailio-b": 10}}
+for i in range(counts.get(pod, 0)):
+    line = f" 0(17) INFO: <script>: Received SIP request OPTIONS call{{i}}-{{pod}}@lab 10.0.0.1:5065 t={{now + i * 0.01:.6f}}"
+    print("2025-08-04T10:00:00.000000000Z " + line, flush=True)
+print("2025-08-04T10:00:00.000000000Z  0(18) INFO: <core> annan rad", flush=True)
+time.sleep(30)
+"""
+
+
+class TestParsing:
+    """Tester för parsning av loggrader"""
+
+    def test_new_format(self):
+        record = parse_log_line("2025-08-04T10:00:00.5Z  0(17) INFO: <script>: Received SIP request "
+                                "INVITE abc@host 10.0.0.1:5065 t=1754301600.250000", "kamailio-a")
+        assert (record.method, record.call_id, record.source) == ("INVITE", "abc@host", "10.0.0.1:5065")
+        assert record.timestamp == 1754301600.25
+
+    def test_old_format_uses_kubectl_timestamp(self):
+        """Rader utan metod och t= ska räknas med kubectl:s tidsstämpel"""
+        record = parse_log_line("2025-08-04T10:00:00.123456789Z  0(17) INFO: <script>: Received SIP request",
+                                "kamailio-a")
+        assert record.call_id is None
+        assert record.timestamp == pytest.approx(1754301600.123457)
+        assert parse_log_line("2025-08-04T10:00:00Z  0(17) INFO: <core> startar", "kamailio-a") is None
+
+    def test_kubectl_timestamp_with_offset(self):
+        assert parse_kubectl_timestamp("2025-08-04T12:00:00+02:00 x") == 1754301600.0
+        assert parse_kubectl_timestamp("ingen tid") is None
+
+
+class TestStreamer:
+    """Tester för KamailioLogStreamer"""
+
+    @pytest.fixture
+    def fake_kubectl(self, tmp_path, monkeypatch):
+        """Lägg en fejkad kubectl först i PATH"""
+        script = tmp_path / "kubectl"
+        script.write_text(FAKE_KUBECTL.format(python=sys.executable))
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+    def test_rate_and_distribution(self, fake_kubectl):
+        """Mottagna requests och andel per replika ska räknas fram"""
+        sent = {}
+        streamer = KamailioLogStreamer(pods=["kamailio-a", "kamailio-b"], send_time=sent.get)
+        streamer.start()
+        streamer.stop(settle=0.5)
+
+        summary = streamer.summarize({"requests_sent": 40, "retransmissions": 0})
+        assert summary["total_received"] == 40
+        assert summary["pods"]["kamailio-a"]["share"] == 0.75
+        assert summary["pods"]["kamailio-a"]["methods"] == {"OPTIONS": 30}
+        assert summary["imbalance"] == 1.5
+        assert sum(sum(series) for series in summary["per_second"].values()) == 40
+        assert sum(s.values["kamailio:received_per_second"] for s in streamer.samples) == 40
+        assert summary["one_way_delay"]["matched"] == 0
+
+    def test_one_way_delay(self):
+        """Ankomsttid per Call-ID minus klientens sändtid"""
+        streamer = KamailioLogStreamer(pods=["kamailio-a"])
+        streamer.feed("kamailio-a", [
+            "x Received SIP request OPTIONS c1@lab 10.0.0.1:5065 t=100.002000",
+            "x Received SIP request OPTIONS c1@lab 10.0.0.1:5065 t=100.502000",
+            "x Received SIP request OPTIONS c2@lab 10.0.0.1:5065 t=101.004000",
+            "x Received SIP request OPTIONS c3@lab 10.0.0.1:5065 t=101.500000",
+        ])
+        sent = {"c1@lab": 100.0, "c2@lab": 101.0, "c3@lab": 102.0}
+        delays = streamer.one_way_delays(sent.get)
+
+        assert streamer.stats["kamailio-a"].received == 4
+        assert delays["matched"] == 2
+        assert delays["clock_skew"] == 1
+        assert delays["delay_ms"]["max"] == pytest.approx(4.0, rel=0.01)
+
+    def test_missing_requests_hint(self):
+        streamer = KamailioLogStreamer(pods=["kamailio-a", "kamailio-b"])
+        streamer.feed("kamailio-a", ["Received SIP request OPTIONS c1@lab 1.2.3.4:5 t=100.0"])
+        streamer.feed("kamailio-b", [])
+        hints = streamer.summarize({"requests_sent": 100, "retransmissions": 0})["hints"]
+        assert any("kamailio-b fick inga requests" in hint for hint in hints)
+        assert any("99 av 100" in hint for hint in hints)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för koordinator/worker-protokollet
+Flera workers körs som trådar på localhost mot den lokala SIP-respondern
+"""
+
+import sys
+import threading
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+import results_store
+from load_coordinator import (STATS_HEADER, DeltaTracker, LoadCoordinator, LoadWorker, StatsDelta,
+                              decode_stats, encode_stats)
+from local_responder import LocalSipResponder
+from metrics import LoadMetrics
+from results_store import ResultsStore
+from sipp_support import SippTester
+
+
+def start_workers(coordinator, count, interval=0.2):
+    """Starta workers i trådar som ansluter till koordinatorn"""
+    workers = [LoadWorker(f"127.0.0.1:{coordinator.port}", name=f"host-{i}", interval=interval)
+               for i in range(count)]
+    for worker in workers:
+        threading.Thread(target=worker.run, daemon=True).start()
+    assert coordinator.wait_for_workers(count, timeout=5) == count
+    return workers
+
+
+class TestProtocol:
+    """Tester för det binära deltaformatet"""
+
+    def test_stats_roundtrip(self):
+        delta = StatsDelta(3, sent=500, completed=498, timeouts=1, retransmissions=7, stray=2,
+                           latency_total=1.25, latency_min=0.0005, latency_max=0.25,
+                           responses={200: 490, 503: 8}, buckets={120: 300, 121: 198})
+        payload = encode_stats(delta)
+
+        assert len(payload) == STATS_HEADER.size + 4 * 6
+        decoded = decode_stats(payload)
+        assert decoded.responses == delta.responses
+        assert decoded.buckets == delta.buckets
+        assert (decoded.second, decoded.sent, decoded.completed, decoded.latency_total) == (3, 500, 498, 1.25)
+        assert decoded.latency_max == pytest.approx(0.25)
+
+    def test_delta_tracker_sums_to_totals(self):
+        """Summan av deltan ska vara de kumulativa räknarna"""
+        metrics = LoadMetrics()
+        tracker = DeltaTracker(metrics)
+        deltas = []
+        for step in range(3):
+            metrics.requests_sent += 10
+            metrics.completed += 9
+            metrics.record_response(200)
+            metrics.latency.record(0.001 * (step + 1))
+            deltas.append(tracker.delta(step + 1))
+
+        assert sum(d.sent for d in deltas) == metrics.requests_sent
+        assert sum(sum(d.responses.values()) for d in deltas) == 3
+        assert sum(sum(d.buckets.values()) for d in deltas) == metrics.latency.count
+        assert tracker.delta(4).buckets == {}
+
+
+class TestCoordinatedRun:
+    """Tester för synkad körning och sammanslagning med flera workers"""
+
+    def test_workers_are_merged_live_and_at_end(self):
+        """Deltan ska summeras live och stämma med slutresultat och serverns räkning"""
+        with LocalSipResponder() as responder, LoadCoordinator("127.0.0.1", 0) as coordinator:
+            start_workers(coordinator, 3)
+            statistics = coordinator.run("options", rate=300, duration=0.6, host="127.0.0.1",
+                                         port=responder.port, start_in=0.2)
+            received = responder.requests_received
+
+        summary = coordinator.summarize(statistics)
+        assert statistics["requests_sent"] == received
+        assert 150 <= received <= 183
+        assert statistics["responses"] == {"200": received}
+        assert coordinator.metrics.requests_sent == received
+        assert coordinator.metrics.latency.count == received
+        assert sum(summary["rate_per_second"]) == received
+        assert sorted(shard["worker"] for shard in summary["shards"]) == ["host-0", "host-1", "host-2"]
+        assert all(shard["requests_sent"] > 0 for shard in summary["shards"])
+        assert summary["hints"] == []
+
+    def test_worker_error_is_reported(self):
+        with LoadCoordinator("127.0.0.1", 0) as coordinator:
+            start_workers(coordinator, 1)
+            statistics = coordinator.run("finns-inte", rate=10, duration=0.1, host="127.0.0.1")
+
+        assert statistics["requests_sent"] == 0
+        assert any("Okänt scenario" in hint for hint in coordinator.summarize()["hints"])
+
+    def test_run_coordinated_load_test(self, tmp_path, monkeypatch):
+        """SippTester ska vänta på workers, köra lasten och spara deltan som samples"""
+        store = ResultsStore(tmp_path / "results.sqlite")
+        store.enabled = True
+        monkeypatch.setattr(results_store, "_store", store)
+
+        with LocalSipResponder() as responder, LoadCoordinator("127.0.0.1", 0) as coordinator:
+            start_workers(coordinator, 2)
+            tester = SippTester(kamailio_host=f"127.0.0.1:{responder.port}")
+            result = tester.run_coordinated_load_test("register", rate=100, duration=0.5, workers=2,
+                                                      coordinator=coordinator, start_in=0.1)
+
+        assert result.success, result.error
+        assert "Koordinerad: 2 workers" in str(result.output)
+        run = store.query(limit=1)[0]
+        assert store.query_samples(run["id"], source="coordinator")
+
+    def test_missing_workers_fail_fast(self):
+        with LoadCoordinator("127.0.0.1", 0) as coordinator:
+            result = SippTester(kamailio_host="127.0.0.1:5060").run_coordinated_load_test(
+                workers=2, coordinator=coordinator, wait_timeout=0.2)
+        assert not result.success
+        assert "0 av 2 workers" in result.error
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för jämförelsen av nätverksvägar till Kamailio
+Vägarna är lokala SIP-respondrar och kubectl fejkas
+"""
+
+import json
+import os
+import stat
+import sys
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+import results_store
+from local_responder import LocalSipResponder
+from network_paths import compare_to_baseline, discover_paths
+from results_store import ResultsStore
+from sip_load import SipLoadGenerator
+from sipp_support import SippTester
+
+
+FAKE_KUBECTL = """#!{python}
+import json, sys
+args = sys.argv[1:]
+if args[:2] == ["get", "pods"]:
+    print(json.dumps({{"items": [
+        {{"metadata": {{"name": "kamailio-a"}}, "status": {{"phase": "Running", "podIP": "10.244.1.5", "hostIP": "172.18.0.2"}}}},
+        {{"metadata": {{"name": "kamailio-b"}}, "status": {{"phase": "Pending", "podIP": "10.244.1.6", "hostIP": "172.18.0.3"}}}}]}}))
+elif args[:2] == ["get", "svc"]:
+    print(json.dumps({{"spec": {{"clusterIP": "10.96.14.2", "ports": [
+        {{"port": 5060, "protocol": "UDP", "nodePort": 31234}}, {{"port": 5060, "protocol": "TCP", "nodePort": 31235}}]}},
+        "status": {{"loadBalancer": {{"ingress": [{{"ip": "172.18.0.242"}}]}}}}}}))
+else:
+    sys.exit(1)
+"""
+
+
+def entry(p50, p99, jitter, capacity=None):
+    return {"cps": 100.0, "p50_ms": p50, "p99_ms": p99, "jitter_ms": jitter, "timeouts": 0,
+            "capacity_cps": capacity, "capacity_limit": None}
+
+
+class TestComparison:
+    """Tester för skillnaden mot pod-IP"""
+
+    def test_added_latency_and_capacity_ratio(self):
+        relative = compare_to_baseline({
+            "pod_ip": entry(0.4, 1.0, 0.05, 8000.0),
+            "node_port": entry(0.5, 1.5, 0.08, 6000.0),
+            "metallb": {"error": "nås inte"},
+        })
+        assert relative == {"node_port": {"added_p50_ms": 0.1, "added_p99_ms": 0.5, "added_jitter_ms": 0.03,
+                                          "capacity_ratio": 0.75}}
+        assert compare_to_baseline({"pod_ip": {"error": "nås inte"}, "metallb": entry(1, 2, 0.1)}) == {}
+
+    def test_generator_reports_jitter(self):
+        with LocalSipResponder() as responder:
+            stats = SipLoadGenerator("127.0.0.1", responder.port, "options", rate=200, duration=0.2,
+                                     register_metrics=False).run()
+        assert stats["successful"] == 40 and stats["jitter_ms"] >= 0
+
+
+class TestDiscovery:
+    """Adresserna ur fejkad kubectl"""
+
+    def test_paths_from_pods_and_service(self, tmp_path, monkeypatch):
+        script = tmp_path / "kubectl"
+        script.write_text(FAKE_KUBECTL.format(python=sys.executable))
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+        paths, notes = discover_paths()
+        assert paths == {"pod_ip": "10.244.1.5:5060", "cluster_ip": "10.96.14.2:5060",
+                         "node_port": "172.18.0.2:31234", "metallb": "172.18.0.242:5060"}
+        assert notes == []
+
+
+class TestPathBenchmark:
+    """Hela jämförelsen via SippTester mot lokala respondrar"""
+
+    def test_reachable_and_unreachable_paths(self, tmp_path, monkeypatch):
+        store = ResultsStore(tmp_path / "results.sqlite")
+        store.enabled = True
+        store._context = {"git_sha": "abc123", "kube_context": "kind-sipp-k8s-lab", "config_hash": "cfg1"}
+        monkeypatch.setattr(results_store, "_store", store)
+
+        closed = LocalSipResponder().start()
+        closed.stop()
+        with LocalSipResponder() as pod, LocalSipResponder() as metallb:
+            tester = SippTester(local_port=0)
+            result = tester.run_network_path_benchmark(
+                {"metallb": f"127.0.0.1:{metallb.port}", "pod_ip": f"127.0.0.1:{pod.port}",
+                 "cluster_ip": f"127.0.0.1:{closed.port}"},
+                rate=100, duration=0.2, start_rate=50, max_rate=100, step_duration=0.2)
+
+        assert result.success, result.error
+        stats = result.statistics
+        assert list(stats["results"]) == ["pod_ip", "cluster_ip", "metallb"]
+        assert stats["results"]["cluster_ip"] == {"error": "nås inte"}
+        assert stats["results"]["metallb"]["capacity_cps"] > 0
+        assert set(stats["relative"]) == {"metallb"}
+        assert stats["relative"]["metallb"]["capacity_ratio"] is not None
+        assert any("--in-cluster" in hint for hint in stats["hints"])
+        assert "MetalLB (127.0.0.1:" in result.output and "mot Pod-IP" in result.output
+        assert [run["scenario"] for run in store.query(limit=1)] == ["network_paths"]
+
+    def test_unknown_path(self):
+        with pytest.raises(ValueError):
+            SippTester(local_port=0).run_network_path_benchmark({"ingress": "127.0.0.1:5060"})
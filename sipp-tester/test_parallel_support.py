@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för stöd för parallella tester (pytest-xdist)
+"""
+
+import os
+import sys
+import time
+import multiprocessing
+import subprocess
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+import sipp_support
+import test_support
+from parallel_support import get_worker_id, get_worker_port, run_once
+from sipp_support import SippTester
+from test_support import SippTestSupport
+
+
+def _build_in_worker(worker_id, shared_dir, counter_file):
+    """Simulerar en xdist-worker som behöver en session-fixture"""
+    os.environ["PYTEST_XDIST_WORKER"] = worker_id
+
+    def build():
+        with open(counter_file, "a") as f:
+            f.write(f"{worker_id}\n")
+        time.sleep(0.3)
+        return {"returncode": 0}
+
+    assert run_once("docker_image_built", Path(shared_dir), build) == {"returncode": 0}
+
+
+class TestParallelSupport:
+    """Tester för portintervall och koordinering mellan workers"""
+
+    def test_ports_without_xdist(self, monkeypatch):
+        """Utan xdist ska standardportarna användas"""
+        monkeypatch.delenv("PYTEST_XDIST_WORKER", raising=False)
+        assert get_worker_id() == "master"
+        assert get_worker_port(5065) == 5065
+
+    def test_ports_are_unique_per_worker(self, monkeypatch):
+        """Varje worker ska få ett eget portintervall"""
+        ports = set()
+        for index in range(8):
+            monkeypatch.setenv("PYTEST_XDIST_WORKER", f"gw{index}")
+            ports.update(get_worker_port(5065, offset) for offset in range(3))
+        assert len(ports) == 24
+
+        with pytest.raises(ValueError):
+            get_worker_port(5065, offset=10)
+
+    def test_run_once_across_workers(self, tmp_path):
+        """Dyra fixtures ska köras exakt en gång per session"""
+        counter_file = tmp_path / "builds.txt"
+        workers = [
+            multiprocessing.Process(target=_build_in_worker,
+                                    args=(f"gw{index}", str(tmp_path / "shared"), str(counter_file)))
+            for index in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=10)
+            assert worker.exitcode == 0
+
+        assert len(counter_file.read_text().splitlines()) == 1
+
+    def test_tester_targets_the_workers_port_forward(self, monkeypatch):
+        """SippTester ska skicka till den port som workerns port-forward lyssnar på"""
+        monkeypatch.setenv("PYTEST_XDIST_WORKER", "gw1")
+        monkeypatch.delenv("KAMAILIO_HOST", raising=False)
+        monkeypatch.delenv("KAMAILIO_PORT", raising=False)
+        commands = []
+
+        def run(command, *args, **kwargs):
+            commands.append(command)
+            return subprocess.CompletedProcess(command, 0, stdout="other-cluster-control-plane", stderr="")
+
+        # subprocess.run (kubectl, nc via docker) och run_captured (SIPp) spelas in
+        monkeypatch.setattr(subprocess, "run", run)
+        monkeypatch.setattr(sipp_support, "run_captured", run)
+        monkeypatch.setattr(SippTester, "_record_result", lambda self, result: result)
+        monkeypatch.setattr(SippTester, "_detect_kamailio_host", lambda self: "172.18.0.2:30600")
+        forwards = []
+
+        def port_forward_service(service_name, namespace, local_port, remote_port):
+            forwards.append(local_port)
+            return SimpleNamespace(local_port=local_port, remote_port=remote_port)
+
+        monkeypatch.setattr(test_support.NetworkUtils, "port_forward_service", port_forward_service)
+
+        handle = SippTestSupport.start_port_forward(get_worker_port(15060))
+        tester = SippTestSupport.create_sipp_tester_with_kamailio("local", local_port=get_worker_port(5065),
+                                                                  kamailio_port=handle.local_port)
+        assert forwards == [15070]
+        assert tester.kamailio_host == "localhost:15070" and tester.kamailio_port == 15070
+        assert tester.local_port == 5075
+
+        # Trafiken ska gå till workerns port-forward, inte till den delade detekterade endpointen
+        commands.clear()
+        assert tester.health_check().success
+        assert "--network=host" in commands[0] and commands[0][-1] == "nc -zu -w 5 localhost 15070"
+        commands.clear()
+        assert tester.run_sipp_test("options").success
+        sipp = commands[-1][-1].split()
+        assert "--network=host" in commands[-1]
+        assert sipp[sipp.index("-sf") + 2] == "localhost:15070" and sipp[sipp.index("-p") + 1] == "5075"
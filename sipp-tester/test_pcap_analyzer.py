@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för pcap-inspelning och transaktionsanalys
+Använder syntetiska pcap-filer och en fejkad tcpdump
+"""
+
+import os
+import sys
+import stat
+import struct
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+from packet_capture import CaptureSession, PacketCapture
+from pcap_analyzer import analyze_captures, main, parse_sip_message
+from sip_load import build_request
+
+CLIENT = ("10.0.0.1", 5065)
+SERVER = ("10.0.0.2", 5060)
+
+
+def response(code: int, branch: str, call_id: str) -> bytes:
+    return (f"SIP/2.0 {code} OK\r\nVia: SIP/2.0/UDP 10.0.0.1:5065;branch={branch};rport=5065\r\n"
+            f"Call-ID: {call_id}\r\nCSeq: 1 OPTIONS\r\nContent-Length: 0\r\n\r\n").encode()
+
+
+def request(branch: str, call_id: str) -> bytes:
+    return build_request("OPTIONS", SERVER, CLIENT, branch, call_id, 1)
+
+
+def ethernet_frame(payload: bytes, src, dst) -> bytes:
+    udp = struct.pack("!HHHH", src[1], dst[1], 8 + len(payload), 0) + payload
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0,
+                     bytes(map(int, src[0].split("."))), bytes(map(int, dst[0].split("."))))
+    return b"\x00" * 12 + b"\x08\x00" + ip + udp
+
+
+def write_pcap(path: Path, packets, linktype: int = 1) -> Path:
+    """packets: [(tid, payload, till_servern)]"""
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 65535, linktype))
+        for timestamp, payload, outbound in packets:
+            src, dst = (CLIENT, SERVER) if outbound else (SERVER, CLIENT)
+            frame = ethernet_frame(payload, src, dst)
+            seconds = int(timestamp)
+            f.write(struct.pack("<IIII", seconds, int(round((timestamp - seconds) * 1e6)), len(frame), len(frame)))
+            f.write(frame)
+    return path
+
+
+class TestParsing:
+    """Tester för SIP-parsning"""
+
+    def test_request_and_response(self):
+        message = parse_sip_message(request("z9hG4bK-1", "c1"))
+        assert (message.method, message.branch, message.call_id) == ("OPTIONS", "z9hG4bK-1", "c1")
+        assert message.transaction_key == ("z9hG4bK-1", "OPTIONS")
+        reply = parse_sip_message(response(404, "z9hG4bK-1", "c1"))
+        assert (reply.code, reply.transaction_key) == (404, ("z9hG4bK-1", "OPTIONS"))
+
+    def test_keepalive_is_not_sip(self):
+        assert parse_sip_message(b"\r\n\r\n") is None
+        assert parse_sip_message(b"hello world") is None
+
+
+class TestAnalyzer:
+    """Tester för parning av transaktioner"""
+
+    def test_single_hop(self, tmp_path):
+        """Latens, omsändningar, svarskoder och förluster hos klienten"""
+        pcap = write_pcap(tmp_path / "client.pcap", [
+            (100.000, request("b1", "c1"), True),
+            (100.010, response(200, "b1", "c1"), False),
+            (101.000, request("b2", "c2"), True),
+            (101.500, request("b2", "c2"), True),
+            (101.520, response(503, "b2", "c2"), False),
+            (102.000, request("b3", "c3"), True),
+            (200.000, response(200, "stray", "c9"), False),
+        ])
+        report = analyze_captures([("client", [str(pcap)])])
+
+        assert report["packets"] == 7
+        assert (report["transactions"], report["completed"], report["lost"]) == (3, 2, 1)
+        assert report["retransmissions"] == {"client": 1}
+        assert report["responses"] == {"200": 1, "503": 1}
+        assert report["latency_ms"]["p50"] == pytest.approx(10.0, rel=0.06)
+        assert report["stray_responses"] == 1
+        assert report["lost_at_end"] == 0
+        assert any("node/pod-capture" in hint for hint in report["hints"])
+
+    def test_drop_is_located_per_hop(self, tmp_path):
+        """Förlorade transaktioner ska knytas till hoppet där de försvann"""
+        client = [(1.0, request("a", "a"), True), (1.02, response(200, "a", "a"), False),
+                  (2.0, request("b", "b"), True),
+                  (3.0, request("c", "c"), True),
+                  (4.0, request("d", "d"), True)]
+        node = [(1.005, request("a", "a"), True), (1.015, response(200, "a", "a"), False),
+                (2.005, request("b", "b"), True),
+                (3.005, request("c", "c"), True), (3.015, response(200, "c", "c"), False),
+                (4.005, request("d", "d"), True)]
+        pod = [(1.007, request("a", "a"), True), (1.012, response(200, "a", "a"), False),
+               (3.007, request("c", "c"), True), (3.012, response(200, "c", "c"), False),
+               (4.007, request("d", "d"), True)]
+        hops = [("client", [str(write_pcap(tmp_path / "client.pcap", client))]),
+                ("node", [str(write_pcap(tmp_path / "node.pcap", node))]),
+                ("pod", [str(write_pcap(tmp_path / "pod.pcap", pod))])]
+        report = analyze_captures(hops)
+
+        assert (report["completed"], report["lost"]) == (1, 3)
+        assert report["drops"] == {"request": {"node → pod": 1},
+                                   "response": {"node → client": 1},
+                                   "no_response": {"pod": 1}}
+        assert report["hop_latency_ms"]["pod"]["max"] == pytest.approx(5.0, rel=0.06)
+        assert report["latency_ms"]["max"] == pytest.approx(20.0, rel=0.06)
+
+    def test_memory_is_bounded_by_open_transactions(self, tmp_path):
+        """Öppna transaktioner ska släppas löpande, inte växa med filstorleken"""
+        packets = []
+        for i in range(20000):
+            t = 1000.0 + i * 0.1
+            packets.append((t, request(f"b{i}", f"c{i}"), True))
+            packets.append((t + 0.005, response(200, f"b{i}", f"c{i}"), False))
+        pcap = write_pcap(tmp_path / "big.pcap", packets)
+        report = analyze_captures([("client", [str(pcap)])])
+
+        assert report["completed"] == 20000
+        assert report["max_open_transactions"] < 100
+
+    def test_pcapng_and_truncated_files(self, tmp_path):
+        """pcapng ska ge ett tydligt fel och ett avbrutet sista paket ignoreras"""
+        pcapng = tmp_path / "x.pcapng"
+        pcapng.write_bytes(b"\x0a\x0d\x0d\x0a" + b"\x00" * 40)
+        with pytest.raises(ValueError, match="pcapng"):
+            analyze_captures([("client", [str(pcapng)])])
+
+        pcap = write_pcap(tmp_path / "cut.pcap", [(1.0, request("a", "a"), True),
+                                                  (1.01, response(200, "a", "a"), False)])
+        pcap.write_bytes(pcap.read_bytes()[:-20])
+        report = analyze_captures([("client", [str(pcap)])])
+        assert (report["packets"], report["lost"], report["lost_at_end"]) == (1, 1, 1)
+
+    def test_cli(self, tmp_path, capsys):
+        pcap = write_pcap(tmp_path / "client.pcap", [(1.0, request("a", "a"), True),
+                                                     (1.01, response(200, "a", "a"), False)])
+        assert main([str(pcap)]) == 0
+        assert "Transaktioner: 1, besvarade: 1" in capsys.readouterr().out
+
+
+FAKE_TCPDUMP = """#!{python}
+import signal, sys, time
+path = sys.argv[sys.argv.index("-w") + 1]
+with open(path, "wb") as f:
+    f.write(open(sys.argv[0] + ".pcap", "rb").read())
+signal.signal(signal.SIGINT, lambda *args: sys.exit(0))
+time.sleep(30)
+"""
+
+
+class TestCapture:
+    """Tester för inspelningen med en fejkad tcpdump"""
+
+    def test_capture_session(self, tmp_path, monkeypatch):
+        """En lyckad inspelning ska analyseras, misslyckade hops hoppas över"""
+        bin_dir = tmp_path / "bin"
+        bin_dir.mkdir()
+        script = bin_dir / "tcpdump"
+        script.write_text(FAKE_TCPDUMP.format(python=sys.executable))
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        write_pcap(bin_dir / "tcpdump.pcap", [(1.0, request("a", "a"), True),
+                                              (1.01, response(200, "a", "a"), False)])
+        monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+        out = tmp_path / "run"
+        session = CaptureSession(out, [
+            PacketCapture.local(out / "client.pcap", [5060, 5065]),
+            PacketCapture("pod", ["false"], out / "pod-x.pcap", remote=True),
+        ])
+        session.start()
+        session.stop()
+        report = session.summarize()
+
+        assert session.failed == ["pod"]
+        assert report["hops"] == ["client"]
+        assert report["completed"] == 1
+        assert report["directory"] == str(out)
+
+    def test_without_tcpdump(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("PATH", str(tmp_path))
+        session = CaptureSession(tmp_path, [PacketCapture.local(tmp_path / "client.pcap", [5060])])
+        session.start()
+        session.stop()
+        assert "CAP_NET_RAW" in session.summarize()["hints"][0]
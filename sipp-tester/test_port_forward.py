@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för port-forward-managern
+Använder en fejkad kubectl så att testerna kan köras utan kluster
+"""
+
+import os
+import sys
+import stat
+import threading
+import time
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+from port_forward import PortForwardManager
+
+
+FAKE_KUBECTL = """#!{python}
+import os, sys, time
+with open(os.environ["FAKE_KUBECTL_LOG"], "a") as f:
+    f.write(" ".join(sys.argv[1:]) + "\\n")
+if os.environ.get("FAKE_KUBECTL_FAIL"):
+    print("error: unable to forward port", flush=True)
+    sys.exit(1)
+local, remote = sys.argv[3].split(":")
+local = local or "41234"
+time.sleep(3 if local == os.environ.get("FAKE_KUBECTL_SLOW_PORT") else 0.2)
+print(f"Forwarding from 127.0.0.1:{{local}} -> {{remote}}", flush=True)
+print(f"Forwarding from [::1]:{{local}} -> {{remote}}", flush=True)
+time.sleep(60)
+"""
+
+
+class TestPortForwardManager:
+    """Tester för delade port-forwards"""
+
+    @pytest.fixture
+    def fake_kubectl(self, tmp_path, monkeypatch):
+        """Lägg en fejkad kubectl först i PATH"""
+        script = tmp_path / "kubectl"
+        script.write_text(FAKE_KUBECTL.format(python=sys.executable))
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        log = tmp_path / "kubectl.log"
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        monkeypatch.setenv("FAKE_KUBECTL_LOG", str(log))
+        return log
+
+    @pytest.fixture
+    def manager(self):
+        manager = PortForwardManager(ready_timeout=5)
+        yield manager
+        manager.stop_all()
+
+    def test_handles_are_shared(self, fake_kubectl, manager):
+        """Flera acquire för samma (service, port) ska dela en process"""
+        first = manager.acquire("kamailio-service", "kamailio", 15060, 5060)
+        second = manager.acquire("kamailio-service", "kamailio", 15060, 5060)
+
+        assert first is not None and second is not None
+        assert first.is_alive() and second.is_alive()
+        assert first.local_port == 15060
+        assert len(fake_kubectl.read_text().splitlines()) == 1
+
+        first.terminate()
+        first.wait()
+        assert second.poll() is None, "terminate() ska bara släppa handtaget"
+
+    def test_readiness_reports_chosen_local_port(self, fake_kubectl, manager):
+        """Lokal port 0 ska ge porten som kubectl rapporterar"""
+        handle = manager.acquire("kamailio-service", "kamailio", 0, 5060)
+        assert handle is not None
+        assert handle.local_port == 41234
+
+    def test_dead_forward_is_restarted(self, fake_kubectl, manager):
+        """En port-forward som dött ska startas om, fler gånger än max_restarts under en lång session"""
+        handle = manager.acquire("kamailio-service", "kamailio", 15061, 5060)
+        assert handle is not None
+
+        session = manager.active_sessions()[0]
+        for _ in range(manager.max_restarts + 1):
+            session.process.kill()
+            session.process.wait()
+            assert not handle.is_alive()
+
+            assert handle.ensure_ready()
+            assert handle.is_alive()
+            assert session.restarts == 0, "en lyckad omstart nollställer räknaren"
+        assert len(fake_kubectl.read_text().splitlines()) == manager.max_restarts + 2
+
+    def test_slow_forward_does_not_block_other_services(self, fake_kubectl, manager, monkeypatch):
+        """Väntan på en port-forward ska inte hålla managerns lås"""
+        monkeypatch.setenv("FAKE_KUBECTL_SLOW_PORT", "15063")
+        ready = manager.acquire("kamailio-service", "kamailio", 15064, 5060)
+        slow = threading.Thread(target=manager.acquire, args=("kamailio-service", "kamailio", 15063, 5060))
+        slow.start()
+        time.sleep(0.5)
+
+        start = time.monotonic()
+        other = manager.acquire("mysql", "kamailio", 15065, 3306)
+        ready.release()
+        assert other is not None
+        assert time.monotonic() - start < 2.0
+        slow.join()
+
+    def test_failed_forward_returns_none(self, fake_kubectl, manager, monkeypatch):
+        """Om kubectl avslutas utan "Forwarding from" ska acquire ge None direkt"""
+        monkeypatch.setenv("FAKE_KUBECTL_FAIL", "1")
+        assert manager.acquire("kamailio-service", "kamailio", 15062, 5060) is None
+        assert manager.active_sessions() == []
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för källadress-spridning och lastfördelning per replika
+Spridningen körs offline mot den lokala SIP-respondern
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+from local_responder import LocalSipResponder
+from replica_balance import replica_distribution, server_side_counts, summarize_distribution
+from sip_load import SipLoadGenerator, format_load_summary
+
+
+class TestSourceSpreading:
+    """Tester för att generatorn sprider transaktionerna över flera sockets"""
+
+    def test_requests_are_spread_over_source_ports(self):
+        """Varje källport ska användas och svaren ska komma tillbaka till rätt socket"""
+        with LocalSipResponder() as responder:
+            generator = SipLoadGenerator("127.0.0.1", responder.port, "options", rate=400, duration=0.25,
+                                         local_host="127.0.0.1", source_ports=4, register_metrics=False)
+            stats = generator.run()
+
+        assert stats["source_addresses"] == 4
+        assert len(responder.sources) == 4
+        assert stats["requests_sent"] == responder.requests_received
+        assert stats["responses"] == {"200": stats["requests_sent"]}
+        assert stats["timeouts"] == 0 and stats["stray_responses"] == 0
+
+    def test_source_ips_vary_the_address(self):
+        with LocalSipResponder() as responder:
+            generator = SipLoadGenerator("127.0.0.1", responder.port, "invite", rate=200, duration=0.2,
+                                         source_ports=2, source_ips=["127.0.0.1", "127.0.0.2"],
+                                         register_metrics=False)
+            stats = generator.run()
+
+        assert {ip for ip, _ in responder.sources} == {"127.0.0.1", "127.0.0.2"}
+        # ACK skickas från samma socket som INVITE, så inga nya källadresser
+        assert len(responder.sources) == 4
+        assert stats["successful"] == stats["requests_sent"]
+
+    def test_single_socket_is_default(self):
+        with LocalSipResponder() as responder:
+            stats = SipLoadGenerator("127.0.0.1", responder.port, rate=100, duration=0.1,
+                                     register_metrics=False).run()
+        assert stats["source_addresses"] == 1
+        assert len(responder.sources) == 1
+
+
+class TestReplicaDistribution:
+    """Tester för obalans och takt per replika"""
+
+    def test_pinned_load_is_reported(self):
+        """En källport mot två replikor ska ge obalans 2x och peka ut conntrack"""
+        distribution = replica_distribution({"kamailio-a": 1000, "kamailio-b": 0}, 10.0, "kamcmd")
+
+        assert distribution["imbalance"] == 2.0
+        assert distribution["min_max_ratio"] == 0.0
+        assert distribution["idle"] == ["kamailio-b"]
+        assert distribution["replicas"]["kamailio-a"] == {"received": 1000, "share": 1.0, "rate": 100.0}
+        assert any("conntrack" in hint for hint in distribution["hints"])
+
+    def test_spread_load_is_balanced(self):
+        distribution = replica_distribution({"kamailio-a": 510, "kamailio-b": 490}, 5.0, source_addresses=64)
+        assert distribution["imbalance"] == 1.02
+        assert distribution["hints"] == []
+
+    def test_too_few_sources_hint(self):
+        distribution = replica_distribution({"a": 350, "b": 50}, 1.0, source_addresses=3)
+        assert any("för få" in hint for hint in distribution["hints"])
+
+    def test_counter_source_is_preferred_over_logs(self):
+        statistics = {
+            "duration_s": 2.0,
+            "source_addresses": 64,
+            "kamailio": {"pods": {"a": {"received_requests": 100.0}, "b": {"received_requests": 300.0}}},
+            "kamailio_logs": {"pods": {"a": {"received": 1}}},
+        }
+        assert server_side_counts(statistics) == ("kamcmd", {"a": 100.0, "b": 300.0})
+        assert server_side_counts({"kamailio_logs": {"pods": {"a": {"received": 5}}}}) == ("loggar", {"a": 5})
+        assert server_side_counts({}) is None
+
+        statistics["distribution"] = summarize_distribution(statistics)
+        statistics.update(method="OPTIONS", target="x:5060", requests_sent=400, achieved_rate=200.0,
+                          target_rate=200.0, responses={"200": 400}, timeouts=0, retransmissions=0)
+        summary = format_load_summary(statistics)
+        assert "Replikor (kamcmd, 64 källadresser): obalans 1.5x, a 50/s, b 150/s" in summary
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för begränsad lagring av testresultatens output
+"""
+
+import sys
+import gzip
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+import result_storage
+from result_storage import SpilledText, bounded_text, run_captured
+from sipp_support import SippTester, TestResult
+
+
+@pytest.fixture(autouse=True)
+def spill_dir(tmp_path, monkeypatch):
+    """Låg tröskel och en egen katalog per test"""
+    monkeypatch.setenv("SIP_LAB_SPILL_DIR", str(tmp_path / "spill"))
+    monkeypatch.setenv("SIP_LAB_SPILL_THRESHOLD", "1000")
+    monkeypatch.setattr(result_storage, "_spill_dir", None)
+    return tmp_path / "spill"
+
+
+class TestSpilledText:
+    """Tester för det lata handtaget"""
+
+    def test_small_text_stays_in_memory(self):
+        assert bounded_text("kort text") == "kort text"
+        assert bounded_text(None) == ""
+
+    def test_large_text_is_compressed_to_disk(self, spill_dir):
+        """Stora texter ska ligga komprimerade på disk med head/tail i minnet"""
+        text = "".join(f"rad {i}\n" for i in range(20000))
+        spilled = bounded_text(text, "output")
+
+        assert isinstance(spilled, SpilledText)
+        assert spilled.path.parent == spill_dir
+        assert spilled.path.stat().st_size < len(text) / 3
+        assert len(spilled) == len(text)
+        assert spilled.head == text[:result_storage.PREVIEW_CHARS]
+        assert spilled.tail == text[-result_storage.PREVIEW_CHARS:]
+        assert spilled.read() == text
+        assert list(spilled.iter_lines())[12345] == "rad 12345"
+
+    def test_behaves_like_str(self):
+        """in, f-strängar, strip() och bool ska fungera som för str"""
+        text = "start\n" + "x" * 50000 + "\nTimeout expired\n"
+        spilled = bounded_text(text, "error")
+
+        assert "Timeout expired" in spilled
+        assert "finns inte" not in spilled
+        assert spilled
+        rendered = f"Fel: {spilled}"
+        assert len(rendered) < 3 * result_storage.PREVIEW_CHARS
+        assert "tecken utelämnade" in rendered
+        assert spilled.strip().endswith("Timeout expired")
+
+    def test_search_across_chunk_boundary(self, monkeypatch):
+        """En sträng som delas av en chunk-gräns ska ändå hittas"""
+        monkeypatch.setattr(result_storage, "CHUNK_CHARS", 1024)
+        text = "a" * 1020 + "NEEDLE" + "b" * 3000
+        assert "NEEDLE" in bounded_text(text)
+
+    def test_test_result_spills_output(self):
+        """TestResult ska själv skriva ut stora output/error"""
+        result = TestResult("options", False, 1, "o" * 5000, "kort fel", 1.0, {})
+        assert isinstance(result.output, SpilledText)
+        assert result.error == "kort fel"
+
+
+class TestRunCaptured:
+    """Tester för subprocess-körning med begränsat minne"""
+
+    def test_large_stdout_never_fully_in_memory(self):
+        """Stor stdout ska bli SpilledText, liten stderr en vanlig str"""
+        result = run_captured([sys.executable, "-c",
+                               "import sys\nfor i in range(5000): print(f'Total: {i} Messages, 0 Errors')\n"
+                               "sys.stderr.write('varning')\nsys.exit(3)"])
+        assert result.returncode == 3
+        assert isinstance(result.stdout, SpilledText)
+        assert result.stderr == "varning"
+        with gzip.open(result.stdout.path, "rt") as f:
+            assert f.readline() == "Total: 0 Messages, 0 Errors\n"
+
+    def test_timeout_is_raised(self):
+        import subprocess
+        with pytest.raises(subprocess.TimeoutExpired):
+            run_captured([sys.executable, "-c", "import time; time.sleep(5)"], timeout=0.2)
+
+    def test_statistics_parsed_from_spilled_output(self):
+        """SIPp-statistiken ska kunna parsas strömmande från disk"""
+        output = bounded_text("brus\n" * 1000 + "Total: 7 Messages, 1 Errors, 2 Failures\n")
+        stats = SippTester._parse_sipp_statistics(None, output)
+        assert (stats["errors"], stats["failures"]) == ("1", "2")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för resultatdatabasen och regressionskontrollen
+"""
+
+import sys
+import sqlite3
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+import results_store
+from results_store import ResultsStore, student_t_sf
+from sipp_support import SippTester, TestResult
+
+
+def load_result(throughput: float, p99: float, timeouts: int = 0) -> TestResult:
+    """Ett TestResult som ser ut som run_load_test():s"""
+    return TestResult(
+        scenario="load_options", success=timeouts == 0, exit_code=0, output="", error="", duration=10.0,
+        statistics={
+            "target": "10.0.0.1:5060", "target_rate": 1000.0, "requests_sent": 10000,
+            "successful": 10000 - timeouts, "failed": 0, "timeouts": timeouts, "retransmissions": 3,
+            "throughput": throughput, "responses": {"200": 10000 - timeouts},
+            "latency_ms": {"mean": 1.0, "p50": 0.8, "p90": 1.5, "p99": p99, "p999": 5.0, "max": 9.0},
+        }
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(tmp_path / "results.sqlite")
+    store.enabled = True
+    store._context = {"git_sha": "abc123", "kube_context": "kind-sipp-k8s-lab", "config_hash": "cfg1"}
+    return store
+
+
+class TestResultsStore:
+    """Tester för lagring och frågor"""
+
+    def test_record_flattens_statistics(self, store):
+        """Statistiken ska hamna i typade kolumner"""
+        run_id = store.record(load_result(990.0, 4.2), environment="local")
+        run = store.get(run_id)
+
+        assert run["scenario"] == "load_options"
+        assert run["rate"] == 1000.0
+        assert run["requests"] == 10000
+        assert run["p99_ms"] == 4.2
+        assert run["git_sha"] == "abc123"
+        assert run["config_hash"] == "cfg1"
+        assert run["environment"] == "local"
+        assert '"200": 10000' in run["extra"]
+
+    def test_record_sipp_statistics(self, store):
+        """SIPp-statistik (strängar) ska också gå att spara"""
+        result = TestResult("options", True, 0, "", "", 1.2,
+                            {"total_messages": "2", "errors": "0", "failures": "0"})
+        run = store.get(store.record(result))
+        assert (run["requests"], run["errors"], run["failed"]) == (2, 0, 0)
+
+    def test_query_filters(self, store):
+        """query() ska filtrera och returnera nyaste först"""
+        first = store.record(load_result(1000.0, 4.0))
+        store._context["config_hash"] = "cfg2"
+        second = store.record(load_result(1000.0, 4.0))
+
+        assert [r["id"] for r in store.query()] == [second, first]
+        assert [r["id"] for r in store.query(config_hash="cfg1")] == [first]
+        assert store.query(scenario="load_register") == []
+
+    def test_failed_load_run_is_recorded(self, store, monkeypatch):
+        """Ett lasttest som inte kommer igång ska också hamna i historiken"""
+        monkeypatch.setattr(results_store, "_store", store)
+        result = SippTester(kamailio_host="127.0.0.1:9", local_port=0).run_load_test(
+            "options", rate=10, duration=0.1, arrival="bursty", register_metrics=False)
+
+        assert not result.success and "bursty" in result.error
+        runs = store.query(limit=1)
+        assert [run["scenario"] for run in runs] == ["load_options"] and not runs[0]["success"]
+
+    def test_missing_columns_are_added(self, tmp_path):
+        """En äldre databas ska få nya kolumner automatiskt"""
+        path = tmp_path / "old.sqlite"
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE runs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp REAL, scenario TEXT)")
+        conn.close()
+
+        store = ResultsStore(path)
+        store.enabled = True
+        store._context = {}
+        assert store.get(store.record(load_result(1000.0, 4.0)))["p99_ms"] == 4.0
+
+    def test_disabled_store_does_not_write(self, tmp_path):
+        """En avstängd databas ska inte skapa någon fil"""
+        store = ResultsStore(tmp_path / "results.sqlite")
+        store.enabled = False
+        assert store.record(load_result(1000.0, 4.0)) is None
+        assert not (tmp_path / "results.sqlite").exists()
+
+
+class TestRegressionCheck:
+    """Tester för regressionskontrollen"""
+
+    def _baseline(self, store):
+        for throughput, p99 in [(1000, 4.0), (1010, 4.1), (995, 3.9), (1005, 4.0), (990, 4.2), (1002, 4.0)]:
+            store.record(load_result(throughput, p99))
+
+    def test_significant_drop_is_flagged(self, store):
+        """En tydlig försämring av throughput och p99 ska flaggas"""
+        self._baseline(store)
+        store.record(load_result(800.0, 9.0))
+
+        metrics = {r.metric for r in store.check_regression()}
+        assert metrics == {"throughput", "p99_ms"}
+
+    def test_noise_is_not_flagged(self, store):
+        """Variation inom baselinens brus ska inte flaggas"""
+        self._baseline(store)
+        store.record(load_result(997.0, 4.1))
+        assert store.check_regression() == []
+
+    def test_errors_are_flagged(self, store):
+        """Ökad felkvot ska flaggas"""
+        self._baseline(store)
+        store.record(load_result(1000.0, 4.0, timeouts=200))
+        assert [r.metric for r in store.check_regression()] == ["error_rate"]
+
+    def test_too_short_baseline(self, store):
+        """Utan tillräcklig baseline ska inget flaggas"""
+        store.record(load_result(1000.0, 4.0))
+        store.record(load_result(500.0, 20.0))
+        assert store.check_regression() == []
+
+    def test_student_t_tail(self):
+        """t-fördelningens svans ska stämma mot tabellvärden"""
+        assert student_t_sf(2.228, 10) == pytest.approx(0.025, abs=1e-4)
+        assert student_t_sf(0.0, 5) == pytest.approx(0.5)
+        assert student_t_sf(-2.228, 10) == pytest.approx(0.975, abs=1e-4)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för samplers av serverstatistik
+Använder en fejkad kubectl så att testerna kan köras utan kluster
+"""
+
+import os
+import sys
+import stat
+import time
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+from metrics import LoadMetrics
+from results_store import ResultsStore
+from samplers import (KamailioStatsSampler, PodResourceSampler, Sample, parse_cgroup_output, parse_cgroup_v1,
+                      parse_pkg_stats, parse_quantity, parse_statistics)
+
+
+FAKE_KUBECTL = """#!{python}
+import json, os, sys
+args = sys.argv[1:]
+if args[:2] == ["get", "pods"]:
+    pods = [{{"metadata": {{"name": name}}, "status": {{"phase": "Running"}}}} for name in ("kamailio-a", "kamailio-b")]
+    print(json.dumps({{"items": pods}}))
+    sys.exit(0)
+if args[0] == "exec":
+    pod = args[1]
+    command = args[args.index("--") + 1:]
+    counter = os.path.join(os.environ["FAKE_STATE_DIR"], pod)
+    calls = int(open(counter).read()) if os.path.exists(counter) else 0
+    if command[1] == "stats.get_statistics":
+        with open(counter, "w") as f:
+            f.write(str(calls + 1))
+        print(f"core:rcv_requests = {{calls * 100}}")
+        print(f"core:drop_requests = 0")
+        print(f"sl:sent_replies = {{calls * 90}}")
+        print(f"shmem:real_used_size = {{1000 + calls}}")
+        print(f"shmem:total_size = 67108864")
+        sys.exit(0)
+    if command[1] == "pkg.stats":
+        print("{{\\n\\tentry: 0\\n\\tpid: 10\\n\\tused: 100\\n\\treal_used: 200\\n\\tfree: 800\\n}}")
+        sys.exit(0)
+sys.exit(1)
+"""
+
+STATISTICS_OUTPUT = """core:rcv_requests = 1234
+tm:inuse_transactions = 3
+shmem:real_used_size = 2097152
+"""
+
+PKG_OUTPUT = """{
+	entry: 0
+	pid: 10
+	used: 1000
+	real_used: 2000
+	free: 6000
+	desc: main process
+}
+{
+	entry: 1
+	pid: 11
+	used: 500
+	real_used: 3000
+	free: 5000
+	desc: udp receiver child=0
+}
+"""
+
+
+class TestParsing:
+    """Tester för parsning av kamcmd-output"""
+
+    def test_parse_statistics(self):
+        stats = parse_statistics(STATISTICS_OUTPUT)
+        assert stats == {"core:rcv_requests": 1234.0, "tm:inuse_transactions": 3.0,
+                         "shmem:real_used_size": 2097152.0}
+
+    def test_parse_pkg_stats(self):
+        """Privat minne ska summeras och maxas över processerna"""
+        stats = parse_pkg_stats(PKG_OUTPUT)
+        assert stats["pkg:processes"] == 2
+        assert stats["pkg:real_used_total"] == 5000
+        assert stats["pkg:real_used_max"] == 3000
+        assert stats["pkg:free_min"] == 5000
+
+
+class TestStatsSampler:
+    """Tester för sampling via kubectl exec kamcmd"""
+
+    @pytest.fixture
+    def fake_kubectl(self, tmp_path, monkeypatch):
+        """Lägg en fejkad kubectl först i PATH"""
+        script = tmp_path / "kubectl"
+        script.write_text(FAKE_KUBECTL.format(python=sys.executable))
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        monkeypatch.setenv("FAKE_STATE_DIR", str(tmp_path))
+        return tmp_path
+
+    def test_samples_are_aligned_with_client(self, fake_kubectl):
+        """Varje tick ska ge ett sampel per pod plus klientens räknare med samma tid"""
+        client = LoadMetrics()
+        client.requests_sent = 150
+        sampler = KamailioStatsSampler(interval=0.05, client_metrics=client)
+        sampler.start()
+        sampler.stop()
+
+        assert sampler.pods == ["kamailio-a", "kamailio-b"]
+        by_time = {}
+        for sample in sampler.samples:
+            by_time.setdefault(sample.timestamp, set()).add(sample.pod)
+        assert all(pods == {"kamailio-a", "kamailio-b", "client"} for pods in by_time.values())
+        assert len(by_time) >= 2
+        assert sampler.series("client", "client:requests_sent")[0][1] == 150
+
+    def test_summary_points_at_bottleneck(self, fake_kubectl):
+        """Färre svar än mottagna requests ska ge en hint om workers"""
+        sampler = KamailioStatsSampler(pods=["kamailio-a"])
+        sampler.sample_once()
+        sampler.sample_once()
+        sampler.sample_once()
+
+        summary = sampler.summarize({"requests_sent": 200, "retransmissions": 0})
+        pod = summary["pods"]["kamailio-a"]
+        assert pod["received_requests"] == 200
+        assert pod["sent_replies"] == 180
+        assert pod["pkg_real_used_max"] == 200
+        assert any("workers" in hint for hint in summary["hints"])
+        assert not any("Nätverksvägen" in hint for hint in summary["hints"])
+
+    def test_samples_are_stored_with_run(self, fake_kubectl, tmp_path):
+        """Samplen ska kunna sparas och läsas tillbaka per körning"""
+        sampler = KamailioStatsSampler(pods=["kamailio-a"])
+        sampler.sample_once()
+        store = ResultsStore(tmp_path / "results.sqlite")
+        store.enabled = True
+
+        assert store.record_samples(1, sampler.source, sampler.samples) == 10
+        rows = store.query_samples(1, source="kamailio", name="core:rcv_requests")
+        assert [(r["pod"], r["value"]) for r in rows] == [("kamailio-a", 0.0)]
+
+    def test_failed_exec_is_counted(self, tmp_path, monkeypatch):
+        """Poddar som inte svarar ska räknas som fel, inte krascha"""
+        monkeypatch.setenv("PATH", str(tmp_path))
+        sampler = KamailioStatsSampler(pods=["kamailio-a"])
+        sampler.sample_once()
+        assert sampler.samples == []
+        assert sampler.errors == 1
+        assert sampler.summarize()["hints"]
+
+
+FAKE_RESOURCE_KUBECTL = """#!{python}
+import json, os, sys
+args = sys.argv[1:]
+state = os.path.join(os.environ["FAKE_STATE_DIR"], "ticks")
+if args[0] == "exec" and args[1] == "cgroup-pod":
+    ticks = int(open(state).read()) if os.path.exists(state) else 0
+    with open(state, "w") as f:
+        f.write(str(ticks + 1))
+    files = {{
+        "/sys/fs/cgroup/cpu.stat": [f"usage_usec {{ticks * 400000}}", f"nr_periods {{ticks * 10}}",
+                                    f"nr_throttled {{ticks * 5}}", f"throttled_usec {{ticks * 50000}}"],
+        "/sys/fs/cgroup/cpu.max": ["50000 100000"],
+        "/sys/fs/cgroup/memory.current": ["104857600"],
+        "/sys/fs/cgroup/memory.max": ["536870912"],
+        "/sys/fs/cgroup/memory.stat": ["anon 94371840", "inactive_file 4194304"],
+    }}
+    for path in args[args.index("--") + 4:]:
+        for line in files.get(path, []):
+            print(f"{{path}}:{{line}}")
+    sys.exit(0 if args[args.index("--") + 4] in files else 2)
+if args[:2] == ["get", "--raw"]:
+    print(json.dumps({{"containers": [{{"name": "kamailio", "usage": {{"cpu": "125000000n", "memory": "65536Ki"}}}}]}}))
+    sys.exit(0)
+sys.exit(1)
+"""
+
+
+class TestResourceSampler:
+    """Tester för CPU/minne/throttling-samplern"""
+
+    @pytest.fixture
+    def fake_kubectl(self, tmp_path, monkeypatch):
+        """Lägg en fejkad kubectl (cgroup v2 och metrics API) först i PATH"""
+        script = tmp_path / "kubectl"
+        script.write_text(FAKE_RESOURCE_KUBECTL.format(python=sys.executable))
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        monkeypatch.setenv("FAKE_STATE_DIR", str(tmp_path))
+
+    def test_parse_quantity(self):
+        assert parse_quantity("250m") == 0.25
+        assert parse_quantity("125000000n") == pytest.approx(0.125)
+        assert parse_quantity("512Mi") == 512 * 1024 * 1024
+        with pytest.raises(ValueError):
+            parse_quantity("12 cores")
+
+    def test_parse_cgroup_v1(self):
+        """cgroup v1 ska normaliseras till samma namn som v2"""
+        files = parse_cgroup_output(
+            "/sys/fs/cgroup/cpuacct/cpuacct.usage:2000000000\n"
+            "/sys/fs/cgroup/cpu/cpu.stat:nr_periods 100\n"
+            "/sys/fs/cgroup/cpu/cpu.stat:nr_throttled 7\n"
+            "/sys/fs/cgroup/cpu/cpu.cfs_quota_us:50000\n"
+            "/sys/fs/cgroup/cpu/cpu.cfs_period_us:100000\n"
+            "/sys/fs/cgroup/memory/memory.limit_in_bytes:9223372036854771712\n"
+        )
+        values = parse_cgroup_v1(files)
+        assert values["cpu:usage_seconds"] == 2.0
+        assert values["cpu:throttled_periods"] == 7
+        assert values["cpu:limit_cores"] == 0.5
+        assert "memory:limit_bytes" not in values
+
+    def test_cgroup_sampling_and_cost(self, fake_kubectl):
+        """CPU-användning, throttling och kostnad per 1k RPS ska räknas fram"""
+        client = LoadMetrics()
+        sampler = PodResourceSampler(pods=["cgroup-pod"], client_metrics=client)
+        for _ in range(3):
+            sampler.sample_once()
+            client.requests_sent += 400
+            time.sleep(0.05)
+
+        summary = sampler.summarize({"throughput": 800.0})
+        pod = summary["pods"]["cgroup-pod"]
+        assert pod["method"] == "cgroup-v2"
+        assert pod["cpu_limit_cores"] == 0.5
+        assert pod["throttled_ratio"] == 0.5
+        assert pod["memory_working_set_max"] == 96 * 1024 * 1024
+        assert pod["memory_utilization"] == 0.188
+        assert pod["cpu_cores_avg"] > 0
+        assert summary["millicores_per_1k_rps"] == pytest.approx(summary["cpu_cores_total"] * 1000 / 0.8, rel=1e-3)
+        assert any("CPU-gränsen" in hint for hint in summary["hints"])
+        assert len(summary["profile"]) == 2
+        assert summary["profile"][0]["throttled_pct"] == 50.0
+
+    def test_cpu_is_averaged_over_send_window(self):
+        """Tomgång före lasten och avvecklingen efter ska inte sänka utnyttjandet"""
+        sampler = PodResourceSampler(pods=["cgroup-pod"])
+        usage = 0.0
+        for second in range(11):
+            sampler.samples.append(Sample(1000.0 + second, "cgroup-pod",
+                                          {"cpu:usage_seconds": usage, "cpu:limit_cores": 1.0}))
+            # 0.5 cores från 1002 till 1008, annars tomgång
+            usage += 0.5 if 2 <= second < 8 else 0.0
+
+        everything = sampler.summarize({"throughput": 1000.0})["pods"]["cgroup-pod"]
+        assert everything["cpu_cores_avg"] == pytest.approx(0.3)
+
+        # 6000 svar under 6 s sändning, men throughput delar med 32 s avveckling efter en timeout
+        stats = {"successful": 6000, "throughput": round(6000 / 38, 2), "send_window": {"start": 1002.0, "end": 1008.0}}
+        summary = sampler.summarize(stats)
+        pod = summary["pods"]["cgroup-pod"]
+        assert pod["cpu_cores_avg"] == pytest.approx(0.5)
+        assert pod["cpu_utilization"] == 0.5
+        assert summary["millicores_per_1k_rps"] == 500.0
+
+    def test_falls_back_to_metrics_api(self, fake_kubectl):
+        """Utan cgroup-åtkomst ska metrics API användas"""
+        sampler = PodResourceSampler(pods=["distroless-pod"])
+        sampler.sample_once()
+        sampler.sample_once()
+
+        summary = sampler.summarize({"throughput": 500.0})
+        pod = summary["pods"]["distroless-pod"]
+        assert pod["method"] == "metrics-api"
+        assert pod["cpu_cores_avg"] == pytest.approx(0.125)
+        assert pod["memory_working_set_max"] == 64 * 1024 * 1024
+        assert summary["millicores_per_1k_rps"] == 250.0
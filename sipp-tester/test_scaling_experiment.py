@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för kapacitetssökningen och skalningsexperimentet
+Kapaciteten mäts mot den lokala SIP-respondern och kubectl fejkas
+"""
+
+import os
+import stat
+import sys
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+import results_store
+from capacity_search import CapacitySearch, evaluate_step
+from local_responder import LocalSipResponder
+from results_store import ResultsStore
+from scaling_experiment import diagnose, scaling_curve
+from sipp_support import SippTester
+
+
+FAKE_KUBECTL = """#!{python}
+import os, sys
+state = os.path.join(os.environ["FAKE_STATE_DIR"], "replicas")
+log = os.path.join(os.environ["FAKE_STATE_DIR"], "calls")
+args = sys.argv[1:]
+open(log, "a").write(" ".join(args) + "\\n")
+if args[0] == "scale":
+    open(state, "w").write(args[-1].split("=")[1])
+elif args[0] == "rollout":
+    pass
+elif args[:2] == ["get", "deployment"]:
+    print(open(state).read() if os.path.exists(state) else "2")
+else:
+    sys.exit(1)
+"""
+
+
+def model(capacity):
+    """Lastgeneratorstatistik för en server som klarar capacity/s och sedan tappar requests"""
+    def run(rate):
+        sent = int(rate * 10)
+        timeouts = 0 if rate <= capacity else int(sent * (1 - capacity / rate))
+        return {"requests_sent": sent, "successful": sent - timeouts, "failed": 0, "timeouts": timeouts,
+                "achieved_rate": rate, "throughput": rate, "latency_ms": {"p50": 1.0, "p99": 5.0}}
+    return run
+
+
+class TestCapacitySearch:
+    """Tester för dubblering och halvering av takten"""
+
+    def test_search_converges_on_capacity(self):
+        search = CapacitySearch(model(1000), start_rate=100, max_rate=10000, resolution=0.02)
+        summary = search.search()
+
+        rates = [step["rate"] for step in summary["steps"]]
+        assert rates[:5] == [100, 200, 400, 800, 1600]
+        assert 980 <= summary["capacity_cps"] <= 1000
+        assert summary["limit"].endswith("% fel")
+        assert all(step["ok"] == (step["rate"] <= 1000) for step in summary["steps"])
+
+    def test_latency_limit_fails_step(self):
+        ok, reason = evaluate_step({"requests_sent": 100, "successful": 100, "failed": 0, "timeouts": 0,
+                                    "achieved_rate": 100.0, "latency_ms": {"p99": 250.0}}, 100, p99_ms=100)
+        assert not ok and reason == "p99 250.0ms"
+
+    def test_max_rate_caps_search(self):
+        summary = CapacitySearch(model(10 ** 6), start_rate=100, max_rate=300).search()
+        assert [step["rate"] for step in summary["steps"]] == [100, 200, 300]
+        assert summary["capacity_cps"] == 300
+        assert "max_rate" in summary["limit"]
+
+
+class TestScalingCurve:
+    """Tester för effektivitet per tillagd replika"""
+
+    def test_efficiency_and_marginal(self):
+        curve = scaling_curve([{"replicas": 1, "capacity_cps": 1000.0},
+                               {"replicas": 2, "capacity_cps": 1900.0},
+                               {"replicas": 4, "capacity_cps": 2500.0, "cpu_utilization": 0.95}])
+
+        assert [p["efficiency"] for p in curve] == [1.0, 0.95, 0.625]
+        assert [p["marginal_efficiency"] for p in curve] == [None, 0.9, 0.3]
+        assert curve[2]["per_replica_cps"] == 625.0
+        assert "lägg till noder" in diagnose(curve)[0]
+
+    def test_linear_scaling_hint(self):
+        curve = scaling_curve([{"replicas": 1, "capacity_cps": 500.0}, {"replicas": 3, "capacity_cps": 1480.0}])
+        assert diagnose(curve) == ["Nära linjär skalning upp till 3 replikor: lägg till poddar"]
+
+
+class TestScalingRun:
+    """Hela flödet via SippTester mot den lokala respondern"""
+
+    @pytest.fixture
+    def fake_cluster(self, tmp_path, monkeypatch):
+        script = tmp_path / "kubectl"
+        script.write_text(FAKE_KUBECTL.format(python=sys.executable))
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        monkeypatch.setenv("FAKE_STATE_DIR", str(tmp_path))
+        store = ResultsStore(tmp_path / "results.sqlite")
+        store.enabled = True
+        monkeypatch.setattr(results_store, "_store", store)
+        return tmp_path
+
+    def test_find_capacity_records_steps(self, fake_cluster):
+        with LocalSipResponder() as responder:
+            tester = SippTester(kamailio_host=f"127.0.0.1:{responder.port}", local_port=0)
+            result = tester.find_capacity("options", start_rate=50, max_rate=100, step_duration=0.2)
+
+        assert result.success, result.error
+        assert result.statistics["target_rate"] == 100
+        assert "Kapacitet:" in str(result.output)
+        scenarios = [run["scenario"] for run in results_store._store.query(limit=10)]
+        assert scenarios.count("load_options") == 2 and "capacity_options" in scenarios
+
+    def test_scaling_experiment_restores_replicas(self, fake_cluster):
+        with LocalSipResponder() as responder:
+            tester = SippTester(kamailio_host=f"127.0.0.1:{responder.port}", local_port=0)
+            result = tester.run_scaling_experiment([2, 1], start_rate=50, max_rate=100, step_duration=0.2,
+                                                   source_ports_per_replica=2)
+
+        assert result.success, result.error
+        curve = result.statistics["curve"]
+        assert [point["replicas"] for point in curve] == [1, 2]
+        assert curve[0]["efficiency"] == 1.0
+        calls = (fake_cluster / "calls").read_text().splitlines()
+        assert [c for c in calls if c.startswith("scale")][-1].endswith("--replicas=2")
+        assert "replikor" in str(result.output)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för lastgeneratorn och Prometheus-metrics
+Körs offline mot den lokala SIP-respondern
+"""
+
+import itertools
+import socket
+import sys
+import threading
+import time
+import urllib.request
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+from local_responder import LocalSipResponder
+from metrics import LatencyHistogram, LoadMetrics, MetricsRegistry, MetricsServer, render_prometheus
+import metrics
+import sip_load
+from sip_load import SipLoadGenerator, arrival_offsets, parse_response
+
+
+def _sample(text: str, name: str) -> float:
+    """Första värdet för ett metric-namn i Prometheus-text"""
+    for line in text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{name} saknas i metrics")
+
+
+class TestLatencyHistogram:
+    """Tester för latens-histogrammet"""
+
+    def test_percentiles_within_bucket_resolution(self):
+        """Percentiler ska ligga inom en bucket från det exakta värdet"""
+        histogram = LatencyHistogram()
+        for i in range(1, 1001):
+            histogram.record(i / 1000.0)
+
+        assert histogram.count == 1000
+        assert abs(histogram.percentile(50) - 0.5) <= 0.5 * 0.05
+        assert abs(histogram.percentile(99) - 0.99) <= 0.99 * 0.05
+        assert histogram.percentile(100) == histogram.max == 1.0
+
+    def test_merge_and_roundtrip(self):
+        """merge() och to_dict()/from_dict() ska bevara antal och percentiler"""
+        a, b = LatencyHistogram(), LatencyHistogram()
+        for _ in range(10):
+            a.record(0.001)
+            b.record(0.1)
+        a.merge(b)
+        restored = LatencyHistogram.from_dict(a.to_dict())
+
+        assert restored.count == 20
+        assert restored.percentile(50) == a.percentile(50)
+        assert restored.summary_ms()["max"] == 100.0
+
+
+class TestPrometheusExposition:
+    """Tester för text-formatet och /metrics-servern"""
+
+    def test_render_counters_and_histogram(self):
+        """Räknare, svar per kod och kumulativa buckets ska renderas"""
+        metrics = LoadMetrics({"scenario": "options"})
+        metrics.requests_sent = 3
+        metrics.record_response(200)
+        metrics.record_response(200)
+        metrics.record_response(503)
+        metrics.latency.record(0.002)
+        metrics.latency.record(0.2)
+
+        text = render_prometheus([metrics])
+        assert "# TYPE sip_load_requests_sent_total counter" in text
+        assert 'sip_load_responses_total{scenario="options",code="200"} 2' in text
+        assert 'sip_load_responses_total{scenario="options",code="503"} 1' in text
+        assert 'sip_load_latency_seconds_bucket{scenario="options",le="0.005"} 1' in text
+        assert 'sip_load_latency_seconds_bucket{scenario="options",le="+Inf"} 2' in text
+        assert 'sip_load_latency_seconds_count{scenario="options"} 2' in text
+
+    def test_server_serves_metrics(self):
+        """Servern ska svara på /metrics och ge 404 på andra sökvägar"""
+        registry = MetricsRegistry()
+        registry.register(LoadMetrics({"scenario": "ping"}))
+        with MetricsServer(registry, host="127.0.0.1", port=0) as server:
+            with urllib.request.urlopen(server.url, timeout=5) as response:
+                assert response.headers["Content-Type"].startswith("text/plain")
+                body = response.read().decode()
+        assert 'sip_load_inflight_transactions{scenario="ping"} 0' in body
+
+    def test_metrics_port_per_process(self, monkeypatch):
+        """Controllern ska inte starta servern och en upptagen port ska bara ge en varning"""
+        import conftest
+
+        class Config:
+            def __init__(self, numprocesses=None, worker=False):
+                self.option = SimpleNamespace(numprocesses=numprocesses)
+                if worker:
+                    self.workerinput = {"workerid": "gw0"}
+                self.warnings = []
+
+            def addinivalue_line(self, name, line):
+                pass
+
+            def getoption(self, name):
+                return port if name == "--metrics-port" else None
+
+            def issue_config_time_warning(self, warning, stacklevel):
+                self.warnings.append(str(warning))
+
+        monkeypatch.setattr(metrics, "_server", None)
+        monkeypatch.setenv("PYTEST_XDIST_WORKER", "gw0")
+        with socket.socket() as busy:
+            busy.bind(("0.0.0.0", 0))
+            busy.listen()
+            port = busy.getsockname()[1]
+
+            controller = Config(numprocesses=2)
+            conftest.pytest_configure(controller)
+            assert metrics._server is None and controller.warnings == []
+
+            worker = Config(numprocesses=2, worker=True)
+            conftest.pytest_configure(worker)
+            assert metrics._server is None
+            assert len(worker.warnings) == 1 and f"port {port}" in worker.warnings[0]
+
+
+class TestArrivals:
+    """Tester för ankomstprocesserna och latens från planerad sändtid"""
+
+    def test_offsets_per_process(self):
+        assert list(itertools.islice(arrival_offsets("constant", 4), 3)) == [0.0, 0.25, 0.5]
+
+        poisson = list(itertools.islice(arrival_offsets("poisson", 100, seed=7), 5001))
+        assert poisson[:10] == list(itertools.islice(arrival_offsets("poisson", 100, seed=7), 10))
+        assert 45 < poisson[-1] < 55
+
+        # Medeltakt 10/s med skurar på 0.5s var 2:a sekund: 40/s under skurarna
+        onoff = list(itertools.islice(arrival_offsets("onoff", 10, burst_on=0.5, burst_off=1.5), 40))
+        assert onoff[19] == pytest.approx(0.475) and onoff[20] == pytest.approx(2.0)
+        assert all(offset % 2.0 < 0.5 - 1e-9 for offset in onoff)
+
+    def test_sender_stall_counts_from_intended_time(self, monkeypatch):
+        """En stall hos sändaren ska synas i latensen men inte i latensen från faktisk sändning"""
+        original = sip_load.build_request
+        calls = itertools.count()
+
+        def stalling_build(*args, **kwargs):
+            if next(calls) == 10:
+                time.sleep(0.2)
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(sip_load, "build_request", stalling_build)
+        with LocalSipResponder() as responder:
+            stats = SipLoadGenerator("127.0.0.1", responder.port, "options", rate=200, duration=0.4,
+                                     register_metrics=False).run()
+
+        assert stats["requests_sent"] == 80 and stats["successful"] == 80
+        assert stats["schedule_lag_ms"]["max"] >= 190
+        assert stats["latency_ms"]["p99"] >= 150
+        assert stats["service_latency_ms"]["p99"] < 100
+
+
+class TestSipLoadGenerator:
+    """Tester för lastgeneratorn mot den lokala respondern"""
+
+    def test_parse_response(self):
+        """Svarskod och branch ska plockas ur svaret"""
+        response = b"SIP/2.0 200 OK\r\nVia: SIP/2.0/UDP 10.0.0.1:5065;branch=z9hG4bK-a-1;rport\r\n\r\n"
+        assert parse_response(response) == (200, "z9hG4bK-a-1")
+        assert parse_response(b"OPTIONS sip:x SIP/2.0\r\n\r\n") is None
+
+    def test_load_run_counts_responses(self):
+        """Alla requests ska få svar och räknas per kod med latens"""
+        with LocalSipResponder() as responder:
+            generator = SipLoadGenerator("127.0.0.1", responder.port, "options", rate=200,
+                                         duration=0.5, register_metrics=False)
+            stats = generator.run()
+
+        assert stats["requests_sent"] == responder.requests_received
+        assert 80 <= stats["requests_sent"] <= 101
+        assert stats["responses"] == {"200": stats["requests_sent"]}
+        assert stats["timeouts"] == 0
+        assert 0 < stats["latency_ms"]["p50"] <= stats["latency_ms"]["max"]
+        assert generator.metrics.inflight == 0
+
+    def test_dropped_requests_are_retransmitted(self):
+        """Requests utan svar ska sändas om och till slut få svar"""
+        with LocalSipResponder(drop_every=4) as responder:
+            stats = SipLoadGenerator("127.0.0.1", responder.port, "register", rate=100, duration=0.3,
+                                     t1=0.02, register_metrics=False).run()
+
+        assert stats["retransmissions"] > 0
+        assert stats["successful"] == stats["requests_sent"]
+
+    def test_send_times_per_call_id(self):
+        """Sändtiden ska kunna slås upp per Call-ID för envägsfördröjning"""
+        with LocalSipResponder() as responder:
+            before = time.time()
+            generator = SipLoadGenerator("127.0.0.1", responder.port, "options", rate=100, max_requests=3,
+                                         duration=1, register_metrics=False, record_send_times=True)
+            generator.run()
+
+        assert len(generator.send_times) == 3
+        sent = generator.send_time(f"{generator._run_id}-2@sip-k8s-lab")
+        assert before <= sent <= time.time()
+        assert generator.send_time("främmande@host") is None
+
+    def test_unanswered_requests_time_out(self):
+        """Utan server ska alla transaktioner ta timeout"""
+        with LocalSipResponder() as responder:
+            port = responder.port
+        stats = SipLoadGenerator("127.0.0.1", port, "ping", max_requests=5, rate=50, duration=1,
+                                 t1=0.02, transaction_timeout=0.1, register_metrics=False).run()
+
+        assert stats["requests_sent"] == 5
+        assert stats["timeouts"] == 5
+        assert stats["successful"] == 0
+        # Sändfönstret slutar vid sista sändningen, före avvecklingen till Timer B
+        window = stats["send_window"]
+        assert 0.07 <= window["end"] - window["start"] < stats["duration_s"] - 0.05
+
+    def test_metrics_scraped_during_run(self):
+        """/metrics ska visa en pågående körning"""
+        registry = MetricsRegistry()
+        with LocalSipResponder() as responder, MetricsServer(registry, host="127.0.0.1", port=0) as server:
+            generator = SipLoadGenerator("127.0.0.1", responder.port, "options", rate=100,
+                                         duration=0.6, register_metrics=False)
+            registry.register(generator.metrics)
+            worker = threading.Thread(target=generator.run)
+            worker.start()
+            generator._receiving.wait(2)
+            worker.join(0.3)
+            with urllib.request.urlopen(server.url, timeout=5) as response:
+                during = response.read().decode()
+            worker.join()
+            with urllib.request.urlopen(server.url, timeout=5) as response:
+                after = response.read().decode()
+
+        assert _sample(during, "sip_load_target_rate") == 100
+        assert _sample(during, "sip_load_requests_sent_total") > 0
+        assert _sample(after, "sip_load_target_rate") == 0
+        assert _sample(after, "sip_load_latency_seconds_count") == _sample(after, "sip_load_requests_sent_total")
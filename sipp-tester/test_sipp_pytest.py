@@ -23,12 +23,12 @@ class TestSippTester:
     """Pytest-klass för SIPp-testing"""
     
     @pytest.fixture(scope="class")
-    def sipp_tester(self, environment):
+    def sipp_tester(self, environment, sipp_local_port):
         """Fixture för SippTester-instans"""
-        return SippTestSupport.create_sipp_tester(environment)
+        return SippTestSupport.create_sipp_tester(environment, local_port=sipp_local_port)
     
     @pytest.fixture(scope="class")
-    def ensure_environment_ready(self):
+    def ensure_environment_ready(self, docker_image_built):
         """Fixture som säkerställer att miljön är redo för SIPp-tester"""
         return SippTestSupport.ensure_environment_ready()
     
@@ -45,7 +45,7 @@ class TestSippTester:
         # Hantera vanliga fel
         if not result.success:
             if "Address already in use" in result.error:
-                pytest.skip("Port 5061 används redan - starta om systemet eller ändra port")
+                pytest.skip(f"Port {sipp_tester.local_port} används redan - starta om systemet eller ändra port")
             elif "command not found" in result.error or "executable file not found" in result.error:
                 pytest.skip("SIPp inte installerat i Docker-image")
             elif "Timeout expired" in result.error:
@@ -67,7 +67,7 @@ class TestSippTester:
         # Hantera vanliga fel
         if not result.success:
             if "Address already in use" in result.error:
-                pytest.skip("Port 5061 används redan - starta om systemet eller ändra port")
+                pytest.skip(f"Port {sipp_tester.local_port} används redan - starta om systemet eller ändra port")
             elif "command not found" in result.error or "executable file not found" in result.error:
                 pytest.skip("SIPp inte installerat i Docker-image")
             elif "Timeout expired" in result.error:
@@ -89,7 +89,7 @@ class TestSippTester:
         # Hantera vanliga fel
         if not result.success:
             if "Address already in use" in result.error:
-                pytest.skip("Port 5061 används redan - starta om systemet eller ändra port")
+                pytest.skip(f"Port {sipp_tester.local_port} används redan - starta om systemet eller ändra port")
             elif "command not found" in result.error or "executable file not found" in result.error:
                 pytest.skip("SIPp inte installerat i Docker-image")
             elif "Timeout expired" in result.error:
@@ -110,7 +110,7 @@ class TestSippTester:
         # Hantera vanliga fel
         if not result.success:
             if "Address already in use" in result.error:
-                pytest.skip("Port 5061 används redan - starta om systemet eller ändra port")
+                pytest.skip(f"Port {sipp_tester.local_port} används redan - starta om systemet eller ändra port")
             elif "command not found" in result.error or "executable file not found" in result.error:
                 pytest.skip("SIPp inte installerat i Docker-image")
             elif "Timeout expired" in result.error:
@@ -147,14 +147,15 @@ class TestSippTesterWithKamailio:
         return SippTestSupport.ensure_kamailio_ready()
     
     @pytest.fixture(scope="class")
-    def start_port_forward(self):
+    def start_port_forward(self, port_forward_local_port):
         """Starta port-forward till Kamailio"""
-        return SippTestSupport.start_port_forward()
+        return SippTestSupport.start_port_forward(port_forward_local_port)
     
     @pytest.fixture(scope="class")
-    def sipp_tester_with_kamailio(self, start_port_forward, environment):
-        """SippTester med Kamailio tillgänglig"""
-        return SippTestSupport.create_sipp_tester_with_kamailio(environment)
+    def sipp_tester_with_kamailio(self, start_port_forward, environment, sipp_local_port):
+        """SippTester med Kamailio tillgänglig via port-forwardens lokala port"""
+        return SippTestSupport.create_sipp_tester_with_kamailio(environment, local_port=sipp_local_port,
+                                                                kamailio_port=start_port_forward.local_port)
     
     def test_health_check_with_kamailio(self, sipp_tester_with_kamailio, ensure_kamailio_ready):
         """Testa health check när Kamailio är igång"""
@@ -180,7 +181,7 @@ class TestSippTesterWithKamailio:
         # Hantera vanliga fel
         if not result.success:
             if "Address already in use" in result.error:
-                pytest.skip("Port 5061 används redan - starta om systemet eller ändra port")
+                pytest.skip(f"Port {sipp_tester_with_kamailio.local_port} används redan - starta om systemet eller ändra port")
             elif "command not found" in result.error or "executable file not found" in result.error:
                 pytest.skip("SIPp inte installerat i Docker-image")
             elif "Timeout expired" in result.error:
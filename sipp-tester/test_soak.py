@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för soak-läget: fönster, komprimering och driftflaggor
+Lasten körs mot den lokala SIP-respondern
+"""
+
+import json
+import sys
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+import results_store
+import sip_load
+from local_responder import LocalSipResponder
+from metrics import LatencyHistogram
+from results_store import ResultsStore
+from sipp_support import SippTester
+from soak import SoakTest, compact_windows, detect_drift
+
+
+def window(p99, errors=0, shm=50e6, rss=30e6, sent=1000):
+    latency = LatencyHistogram()
+    for _ in range(sent - errors):
+        latency.record(p99 / 1000)
+    return {"sent": sent, "successful": sent - errors, "failed": errors, "timeouts": 0, "retransmissions": 0,
+            "latency_ms": latency.summary_ms(), "latency": latency.to_dict(), "start": 0.0, "end": 60.0,
+            "shm_used_bytes": shm, "rss_bytes": rss}
+
+
+class TestWindows:
+    """Tester för fönstren och komprimeringen"""
+
+    def test_histogram_difference(self):
+        histogram = LatencyHistogram()
+        for value in (0.001, 0.002):
+            histogram.record(value)
+        before = histogram.copy()
+        for value in (0.010, 0.020, 0.030):
+            histogram.record(value)
+
+        window_latency = histogram.difference(before)
+        assert window_latency.count == 3
+        assert abs(window_latency.total - 0.060) < 1e-9
+        assert 0.0095 <= window_latency.percentile(50) <= 0.021
+        assert window_latency.max == 0.030 and window_latency.min > 0.002
+
+    def test_compaction(self):
+        hour = compact_windows([window(2.0), window(4.0, errors=10, shm=60e6)])
+        assert hour["type"] == "hour" and hour["windows"] == 2
+        assert hour["sent"] == 2000 and hour["failed"] == 10
+        assert hour["latency"]["count"] == 1990
+        assert hour["shm_used_bytes"] == 60e6
+        assert hour["error_ratio"] == 0.005
+
+
+class TestDrift:
+    """Tester för driftflaggorna"""
+
+    def test_stable_run_is_not_flagged(self):
+        assert detect_drift([window(2.0) for _ in range(6)])["flags"] == {}
+
+    def test_rising_p99_errors_and_shm(self):
+        windows = ([window(2.0, shm=50e6) for _ in range(3)]
+                   + [window(8.0, errors=20, shm=80e6, rss=50e6) for _ in range(3)])
+        flags = detect_drift(windows)["flags"]
+        assert set(flags) == {"p99_ms", "error_ratio", "shm_used_bytes", "rss_bytes"}
+        assert flags["p99_ms"].startswith("p99 stiger")
+        assert flags["shm_used_bytes"].startswith("Kamailios shm växer")
+
+    def test_p99_needs_enough_samples(self):
+        windows = [window(2.0, sent=100)] * 3 + [window(8.0, sent=100)] * 3
+        assert "p99_ms" not in detect_drift(windows)["flags"]
+
+
+class TestSoakRun:
+    """Hela soak-körningen via SippTester mot den lokala respondern"""
+
+    def test_windows_are_written_and_compacted(self, tmp_path, monkeypatch):
+        store = ResultsStore(tmp_path / "results.sqlite")
+        store.enabled = True
+        store._context = {"git_sha": "abc123", "kube_context": "kind-sipp-k8s-lab", "config_hash": "cfg1"}
+        monkeypatch.setattr(results_store, "_store", store)
+
+        output = tmp_path / "soak.jsonl"
+        with LocalSipResponder() as responder:
+            tester = SippTester(kamailio_host=f"127.0.0.1:{responder.port}", local_port=0)
+            result = tester.run_soak_test("options", rate=200, hours=0.8 / 3600, window=0.1, compact_every=3,
+                                          output=str(output), sample_kamailio=False, register_metrics=False)
+
+        assert result.success, result.error
+        soak = result.statistics["soak"]
+        lines = [json.loads(line) for line in output.read_text().splitlines()]
+        minutes = [line for line in lines if line["type"] == "minute"]
+        hours = [line for line in lines if line["type"] == "hour"]
+        assert lines[0]["type"] == "start" and lines[-1]["type"] == "summary"
+        assert len(minutes) == soak["windows"] >= 8
+        assert len(hours) == len(soak["hours"]) == -(-len(minutes) // 3)
+        assert sum(hour["sent"] for hour in hours) == result.statistics["requests_sent"] == 160
+        assert all(minute["rss_bytes"] for minute in minutes)
+        assert "latency" not in soak["hours"][0]
+        assert [run["scenario"] for run in store.query(limit=1)] == ["soak_options"]
+
+    def test_generator_error_is_raised_and_reported(self, tmp_path, monkeypatch):
+        def broken_run(self):
+            raise OSError("Network is unreachable")
+
+        monkeypatch.setattr(sip_load.SipLoadGenerator, "run", broken_run)
+        output = tmp_path / "soak.jsonl"
+        generator = sip_load.SipLoadGenerator("127.0.0.1", 9, "options", rate=100, duration=1.0,
+                                              register_metrics=False)
+        with pytest.raises(OSError):
+            SoakTest(generator, window=0.1, output=output).run()
+        assert json.loads(output.read_text().splitlines()[-1])["type"] == "error"
+
+        tester = SippTester(kamailio_host="127.0.0.1:9", local_port=0)
+        result = tester.run_soak_test("options", rate=100, hours=1 / 3600, window=0.1,
+                                      output=str(tmp_path / "tester.jsonl"), sample_kamailio=False,
+                                      register_metrics=False)
+        assert not result.success and "Network is unreachable" in result.error
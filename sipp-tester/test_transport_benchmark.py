@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Pytest-tester för lastgeneratorn över TCP/TLS och transportjämförelsen
+Körs offline mot den lokala SIP-respondern
+"""
+
+import shutil
+import ssl
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+import results_store
+from local_responder import LocalSipResponder
+from results_store import ResultsStore
+from sip_load import SipLoadGenerator, build_request, split_stream_messages
+from sipp_support import SippTester
+
+
+@pytest.fixture
+def server_tls_context(tmp_path):
+    if not shutil.which("openssl"):
+        pytest.skip("openssl saknas för att skapa ett testcertifikat")
+    key, cert = tmp_path / "key.pem", tmp_path / "cert.pem"
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", str(key),
+                    "-out", str(cert), "-days", "1", "-subj", "/CN=kamailio.local"],
+                   check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(str(cert), str(key))
+    return context
+
+
+class TestStreamFraming:
+    """Tester för uppdelningen av en TCP-ström i SIP-meddelanden"""
+
+    def test_messages_keepalives_and_partial(self):
+        first = build_request("MESSAGE", ("127.0.0.1", 5060), ("127.0.0.1", 5065), "z9hG4bK-1", "1@lab", 1, "TCP")
+        second = build_request("OPTIONS", ("127.0.0.1", 5060), ("127.0.0.1", 5065), "z9hG4bK-2", "2@lab", 2, "TCP")
+        assert b"Via: SIP/2.0/TCP " in first and first.endswith(b"\r\n\r\nping")
+
+        messages, rest = split_stream_messages(b"\r\n\r\n" + first + second[:20])
+        assert messages == [first] and rest == second[:20]
+        messages, rest = split_stream_messages(rest + second[20:])
+        assert messages == [second] and rest == b""
+
+
+class TestStreamLoad:
+    """Lastgeneratorn över TCP och TLS"""
+
+    def test_tcp_load(self):
+        with LocalSipResponder(transport="tcp") as responder:
+            stats = SipLoadGenerator("127.0.0.1", responder.port, "invite", rate=200, duration=0.3,
+                                     transport="tcp", source_ports=3, register_metrics=False).run()
+
+        assert stats["transport"] == "tcp"
+        assert stats["successful"] == stats["requests_sent"] == 60
+        assert stats["retransmissions"] == 0 and stats["timeouts"] == 0
+        assert stats["connections"]["opened"] == 3 and stats["connections"]["handshake_ms"] == {}
+        assert responder.connections == 3
+
+    def test_tls_load_resumes_session(self, server_tls_context):
+        with LocalSipResponder(transport="tls", tls_context=server_tls_context) as responder:
+            stats = SipLoadGenerator("127.0.0.1", responder.port, "options", rate=200, duration=0.3,
+                                     transport="tls", source_ports=3, register_metrics=False).run()
+
+        assert stats["successful"] == stats["requests_sent"] == 60
+        connections = stats["connections"]
+        assert connections["opened"] == 3 and connections["resumed"] == 2
+        assert connections["handshake_ms"]["p50"] > 0
+
+
+class TestTransportBenchmark:
+    """Hela jämförelsen via SippTester mot lokala respondrar"""
+
+    def test_udp_tcp_tls(self, server_tls_context, tmp_path, monkeypatch):
+        store = ResultsStore(tmp_path / "results.sqlite")
+        store.enabled = True
+        store._context = {"git_sha": "abc123", "kube_context": "kind-sipp-k8s-lab", "config_hash": "cfg1"}
+        monkeypatch.setattr(results_store, "_store", store)
+
+        with LocalSipResponder() as udp, \
+                LocalSipResponder(port=udp.port, transport="tcp"), \
+                LocalSipResponder(transport="tls", tls_context=server_tls_context) as tls:
+            tester = SippTester(kamailio_host=f"127.0.0.1:{udp.port}", local_port=0)
+            result = tester.run_transport_benchmark(scenarios=["options", "register"], rate=100, duration=0.2,
+                                                    connections=2, handshakes=10, ports={"tls": tls.port},
+                                                    sample_resources=False)
+
+        assert result.success, result.error
+        stats = result.statistics
+        assert list(stats["transports"]) == ["udp", "tcp", "tls"]
+        assert all(entry["cps"] > 0 for entries in stats["transports"].values() for entry in entries.values())
+        assert set(stats["relative"]) == {"tcp", "tls"}
+        assert stats["setup"]["tls"]["full"]["resumed"] == 0
+        assert stats["setup"]["tls"]["resumed"]["resumed"] == 9
+        assert "TLS (127.0.0.1:" in result.output
+        assert [run["scenario"] for run in store.query(limit=1)] == ["transport_benchmark"]
+
+    def test_unreachable_tls(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("SIP_LAB_NO_RESULTS_STORE", "1")
+        monkeypatch.setattr(results_store, "_store", None)
+        with LocalSipResponder() as udp:
+            closed = LocalSipResponder(transport="tcp").start()
+            closed.stop()
+            tester = SippTester(kamailio_host=f"127.0.0.1:{udp.port}", local_port=0)
+            result = tester.run_transport_benchmark(["udp", "tls"], rate=100, duration=0.2, handshakes=3,
+                                                    ports={"tls": closed.port}, sample_resources=False)
+
+        assert not result.success
+        assert result.statistics["transports"]["tls"]["options"] == {"error": "ingen anslutning"}
+        assert any("tls.so" in hint for hint in result.statistics["hints"])